@@ -0,0 +1,317 @@
+import time
+import numpy as np
+import numba
+from numba import njit, prange
+from scipy import sparse
+from scipy.sparse import csgraph
+from scipy.sparse import linalg as splinalg
+from . import community_engine
+
+
+# Path based network statistics (shortest path distribution, diameter, eccentricity, closeness, harmonic and betweenness centrality)
+# from a single set of BFS sweeps over a CSR adjacency. Every BFS feeds every statistic, so one all-pairs (or sampled) sweep is shared by all of them.
+# Sources can be sampled and capped by a time budget, in which case the centralities are estimates with Hoeffding error bounds.
+
+
+def structure_csr(G):
+    """
+    Node list and binary CSR adjacency of a graph. Parallel edges and weights are collapsed, so a multigraph gives its simple graph.
+    """
+    nodes, A = community_engine.graph_to_csr(G, weight=None)
+    A.data[:] = 1
+    return nodes, A
+
+
+@njit(cache=True, parallel=True)
+def _bfs_sweep(indptr, indices, sources, slot_start, n, n_chunks, do_betweenness):
+    """
+    BFS from each source in parallel. Sources are split into n_chunks contiguous blocks, one per worker, and each block
+    accumulates into its own row of the outputs so no two threads write the same memory. Rows are reduced afterwards.
+    Distance counts go to slot_start[source] + distance, which gives every component its own histogram in one length-n row.
+    Brandes dependency accumulation runs on the same BFS when do_betweenness is set.
+    """
+    n_sources = sources.shape[0]
+    hist = np.zeros((n_chunks, n), dtype=np.int64)
+    dist_sum = np.zeros((n_chunks, n))
+    harm_sum = np.zeros((n_chunks, n))
+    farthest = np.zeros((n_chunks, n), dtype=np.int64)
+    if do_betweenness:
+        between = np.zeros((n_chunks, n))
+    else:
+        between = np.zeros((n_chunks, 1))
+
+    for c in prange(n_chunks):
+        start = (n_sources * c) // n_chunks
+        end = (n_sources * (c + 1)) // n_chunks
+
+        dist = np.full(n, -1, dtype=np.int64)
+        sigma = np.zeros(n)
+        delta = np.zeros(n)
+        visited = np.empty(n, dtype=np.int64)
+
+        for si in range(start, end):
+            s = sources[si]
+            dist[s] = 0
+            sigma[s] = 1.0
+            visited[0] = s
+            head = 0
+            tail = 1
+
+            while head < tail:
+                v = visited[head]
+                head += 1
+                dv = dist[v]
+                for p in range(indptr[v], indptr[v + 1]):
+                    w = indices[p]
+                    if dist[w] < 0:
+                        dist[w] = dv + 1
+                        visited[tail] = w
+                        tail += 1
+                    if dist[w] == dv + 1:
+                        sigma[w] += sigma[v]
+
+            base = slot_start[s]
+            for q in range(1, tail):
+                v = visited[q]
+                d = dist[v]
+                hist[c, base + d] += 1
+                dist_sum[c, v] += d
+                harm_sum[c, v] += 1.0 / d
+                if d > farthest[c, v]:
+                    farthest[c, v] = d
+            # BFS order is by distance, so the last node visited is the farthest from the source
+            d = dist[visited[tail - 1]]
+            if d > farthest[c, s]:
+                farthest[c, s] = d
+
+            if do_betweenness:
+                for q in range(tail - 1, 0, -1):
+                    w = visited[q]
+                    coeff = (1.0 + delta[w]) / sigma[w]
+                    for p in range(indptr[w], indptr[w + 1]):
+                        v = indices[p]
+                        if dist[v] == dist[w] - 1:
+                            delta[v] += sigma[v] * coeff
+                    between[c, w] += delta[w]
+
+            # Reset only what this BFS touched
+            for q in range(tail):
+                v = visited[q]
+                dist[v] = -1
+                sigma[v] = 0.0
+                delta[v] = 0.0
+
+    return hist, dist_sum, harm_sum, farthest, between
+
+
+def _source_order(components, seed):
+    """
+    Order every node as a BFS source so that any prefix covers all components proportionally: each component is shuffled
+    and nodes are sorted by their rank within the component divided by the component size.
+    Every component's first source therefore comes before any component's second.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(components)
+    perm = rng.permutation(n)
+    comp_perm = components[perm]
+    grouped = np.argsort(comp_perm, kind='stable')
+    sizes = np.bincount(components)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    rank = np.empty(n, dtype=np.int64)
+    rank[grouped] = np.arange(n) - starts[comp_perm[grouped]]
+    key = rank / sizes[comp_perm]
+    return perm[np.argsort(key, kind='stable')]
+
+
+def path_sweep(S, max_sources=None, time_budget=None, betweenness=True, seed=42, batch_size=None, confidence=0.95):
+    """
+    Shortest path statistics for every node from one set of BFS sweeps.
+
+    Parameters:
+    -----------
+    S : scipy.sparse.csr_array
+        Binary symmetric adjacency (see structure_csr)
+    max_sources : int or None
+        Maximum number of BFS sources. None uses every node, which makes all results exact.
+    time_budget : float or None
+        Stop starting new batches of sources after this many seconds. At least one batch always runs.
+    betweenness : bool
+        Also accumulate betweenness dependencies (roughly doubles the cost)
+    seed : int
+        Seed for source sampling
+    batch_size : int or None
+        Sources per parallel batch. Defaults to 64 per worker thread.
+    confidence : float
+        Confidence level of the reported error bounds
+
+    Returns:
+    --------
+    dict with keys:
+        'distance_histogram' : counts of ordered node pairs at each distance, index = distance (scaled up if sampled)
+        'eccentricity' : per node, exact if its component was fully swept, otherwise a lower bound
+        'closeness' : per node, networkx closeness_centrality convention (wf_improved)
+        'harmonic' : per node, networkx harmonic_centrality convention
+        'mean_distance' : per node, mean hop distance to the other nodes of its component (0 for isolated nodes)
+        'betweenness_raw' : per node sum of pair dependencies, each unordered pair counted once, or None
+        'components', 'component_sizes' : component id per node and node count per component
+        'sources_used', 'exact' : how many sources ran and whether every node was a source
+        'error_bounds' : {'betweenness': max error of component-normalized betweenness,
+                          'average_distance': max error of a node's mean distance}, holding with the given confidence
+    """
+    S = sparse.csr_array(S)
+    n = S.shape[0]
+    n_comp, components = csgraph.connected_components(S, directed=False)
+    component_sizes = np.bincount(components, minlength=n_comp)
+    comp_starts = np.concatenate(([0], np.cumsum(component_sizes)[:-1])).astype(np.int64)
+    slot_start = comp_starts[components]
+    indptr = S.indptr.astype(np.int64)
+    indices = S.indices.astype(np.int64)
+
+    order = _source_order(components, seed) if n > 0 else np.zeros(0, dtype=np.int64)
+    if max_sources is not None and n > 0:
+        order = order[:max(1, min(int(max_sources), n))]
+
+    n_threads = numba.get_num_threads()
+    if batch_size is None:
+        batch_size = 64 * n_threads
+
+    slot_counts = np.zeros(n, dtype=np.int64)
+    dist_sum = np.zeros(n)
+    harm_sum = np.zeros(n)
+    farthest = np.zeros(n, dtype=np.int64)
+    between = np.zeros(n)
+
+    t0 = time.time()
+    used = 0
+    while used < len(order):
+        batch = order[used:used + batch_size]
+        n_chunks = max(1, min(n_threads, len(batch)))
+        h, ds, hs, f, b = _bfs_sweep(indptr, indices, batch, slot_start, n, n_chunks, betweenness)
+        slot_counts += h.sum(axis=0)
+        dist_sum += ds.sum(axis=0)
+        harm_sum += hs.sum(axis=0)
+        farthest = np.maximum(farthest, f.max(axis=0))
+        if betweenness:
+            between += b.sum(axis=0)
+        used += len(batch)
+        if time_budget is not None and time.time() - t0 >= time_budget:
+            break
+
+    swept = np.zeros(n, dtype=bool)
+    swept[order[:used]] = True
+    sampled_per_comp = np.bincount(components[swept], minlength=n_comp)
+    exact_comp = sampled_per_comp == component_sizes
+
+    r_node = component_sizes[components]
+    k_node = sampled_per_comp[components]
+    # Sources other than the node itself, which in an undirected graph all reach it
+    others = k_node - swept
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        comp_scale = np.where(sampled_per_comp > 0, component_sizes / sampled_per_comp, 0.0)
+        # Mean distance to the other nodes of the component, estimated from the sampled sources
+        mean_dist = np.where(others > 0, dist_sum / others, 0.0)
+        closeness = np.where((r_node > 1) & (mean_dist > 0), (r_node - 1) / (mean_dist * max(n - 1, 1)), 0.0)
+        harmonic = np.where(others > 0, harm_sum * (r_node - 1) / others, 0.0)
+
+    # Every component's pair counts scale up by its own sampling rate
+    slot_comp = np.repeat(np.arange(n_comp), component_sizes)
+    slot_dist = np.arange(n) - comp_starts[slot_comp]
+    hist = np.bincount(slot_dist, weights=slot_counts * comp_scale[slot_comp], minlength=1)
+    max_dist = np.flatnonzero(hist)
+    hist = hist[:max_dist[-1] + 1] if len(max_dist) else hist[:1]
+    if exact_comp.all():
+        hist = np.rint(hist).astype(np.int64)
+
+    # Dependencies count each unordered pair from both of its ends, so halve them (networkx's undirected convention)
+    betweenness_raw = between * comp_scale[components] / 2 if betweenness else None
+
+    # Hoeffding bounds, with a union bound over the nodes of each sampled component
+    alpha = 1.0 - confidence
+    bc_error = 0.0
+    dist_error = 0.0
+    for comp in np.flatnonzero(~exact_comp & (sampled_per_comp > 0)):
+        r = component_sizes[comp]
+        k = sampled_per_comp[comp]
+        half_width = np.sqrt(np.log(2 * r / alpha) / (2 * k))
+        bc_error = max(bc_error, half_width * r / max(r - 1, 1))
+        dist_error = max(dist_error, 2 * farthest[components == comp].max() * half_width)
+
+    return {
+        'distance_histogram': hist,
+        'eccentricity': farthest,
+        'closeness': closeness,
+        'harmonic': harmonic,
+        'mean_distance': mean_dist,
+        'betweenness_raw': betweenness_raw,
+        'components': components,
+        'component_sizes': component_sizes,
+        'sources_used': used,
+        'exact': bool(exact_comp.all()),
+        'error_bounds': {'betweenness': bc_error, 'average_distance': dist_error}
+    }
+
+
+def normalized_betweenness(sweep, per_component=False):
+    """
+    Betweenness from a path_sweep result, normalized like networkx's betweenness_centrality.
+    per_component normalizes each node by its own component's size, as if each component were computed as its own graph.
+    """
+    raw = sweep['betweenness_raw']
+    n = len(raw)
+    if per_component:
+        r = sweep['component_sizes'][sweep['components']].astype(np.float64)
+    else:
+        r = np.full(n, float(n))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # raw counts each unordered pair once, networkx's normalization assumes both orders
+        return np.where(r > 2, 2 * raw / ((r - 1) * (r - 2)), raw)
+
+
+def eigenvector_centrality(A):
+    """
+    Leading eigenvector of the adjacency, scaled to unit length and positive, like networkx's eigenvector_centrality.
+    Pass the binary adjacency for networkx's default (weight=None) behavior.
+    Computed with ARPACK instead of power iteration.
+    """
+    n = A.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    if n < 3:
+        vals, vecs = np.linalg.eigh(A.toarray())
+        vec = vecs[:, -1]
+    else:
+        vals, vecs = splinalg.eigsh(sparse.csr_array(A, dtype=np.float64), k=1, which='LA')
+        vec = vecs[:, 0]
+    vec = np.abs(vec)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+
+def triangles(S):
+    """Triangles through each node of a binary adjacency, ignoring self-loops"""
+    S = S.copy()
+    S.setdiag(0)
+    S.eliminate_zeros()
+    return np.asarray((S @ S).multiply(S).sum(axis=1)).ravel() / 2
+
+
+def clustering(S):
+    """Local clustering coefficient of each node of a binary adjacency, ignoring self-loops"""
+    S = S.copy()
+    S.setdiag(0)
+    S.eliminate_zeros()
+    deg = np.asarray(S.sum(axis=1)).ravel()
+    tri = triangles(S)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(deg > 1, 2 * tri / (deg * (deg - 1)), 0.0)
+
+
+def transitivity(S):
+    """Fraction of connected triples that close into triangles, like networkx's transitivity"""
+    S = S.copy()
+    S.setdiag(0)
+    S.eliminate_zeros()
+    deg = np.asarray(S.sum(axis=1)).ravel()
+    triads = np.sum(deg * (deg - 1))
+    return float(2 * triangles(S).sum() / triads) if triads > 0 else 0.0
@@ -0,0 +1,627 @@
+import numpy as np
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from scipy import sparse
+from scipy.sparse import csgraph
+from numba import njit
+from itertools import chain
+from operator import methodcaller
+
+
+# Community detection on CSR adjacency arrays.
+# Adjacency convention: symmetric matrix, A[i, j] is the summed weight between i and j and A[i, i] holds self-loop weight once.
+# Degrees count self-loops twice, matching networkx's modularity.
+
+
+def _node_indices(nodes, ids):
+    """Row index of each node id in ids. Numeric ids are matched with a vectorized sorted search instead of a dict lookup per edge."""
+    node_arr = np.asarray(nodes)
+    if node_arr.dtype.kind in 'iuf' and len(ids) > 0:
+        ids = np.asarray(ids)
+        sorter = np.argsort(node_arr, kind='stable')
+        return sorter[np.searchsorted(node_arr[sorter], ids)].astype(np.int64)
+    index = {node: i for i, node in enumerate(nodes)}
+    return np.fromiter(map(index.__getitem__, ids), dtype=np.int64, count=len(ids))
+
+
+def graph_to_csr(G, weight='weight', nodes=None):
+    """
+    Convert a networkx graph (or multigraph) into a node list and symmetric CSR adjacency.
+
+    Parameters:
+    -----------
+    G : networkx.Graph or networkx.MultiGraph
+        The input graph. Parallel edges are summed.
+    weight : str or None
+        Edge attribute to use as weight (missing attributes count as 1). None counts edges.
+    nodes : list or None
+        Row order to use. Defaults to G.nodes() order.
+
+    Returns:
+    --------
+    nodes : list
+        Node ids in the row order of the matrix
+    A : scipy.sparse.csr_array
+        Symmetric float64 adjacency
+    """
+    if nodes is None:
+        nodes = list(G.nodes())
+    n = len(nodes)
+    if n == 0:
+        return nodes, sparse.csr_array((n, n), dtype=np.float64)
+
+    if G.is_multigraph():
+        edges = list(G.edges(data=weight, default=1)) if weight is not None else list(G.edges())
+        if len(edges) == 0:
+            return nodes, sparse.csr_array((n, n), dtype=np.float64)
+        us, vs = list(zip(*edges))[:2]
+        ws = np.asarray(list(zip(*edges))[2], dtype=np.float64) if weight is not None else np.ones(len(us))
+        rows = _node_indices(nodes, list(us))
+        cols = _node_indices(nodes, list(vs))
+        # Mirror the edges, but keep self-loops on the diagonal once
+        off = rows != cols
+        ws = np.concatenate((ws, ws[off]))
+        rows, cols = np.concatenate((rows, cols[off])), np.concatenate((cols, rows[off]))
+    else:
+        # The adjacency dicts already hold both directions (and self-loops once), so they are read in bulk
+        adjacency = dict(G.adjacency())
+        nbrs = [adjacency[node] for node in nodes]
+        counts = np.fromiter(map(len, nbrs), dtype=np.int64, count=n)
+        rows = np.repeat(np.arange(n), counts)
+        cols = _node_indices(nodes, list(chain.from_iterable(nbrs)))
+        if weight is None:
+            ws = np.ones(len(cols))
+        else:
+            ws = np.fromiter(map(methodcaller('get', weight, 1), chain.from_iterable(nbr.values() for nbr in nbrs)),
+                             dtype=np.float64, count=len(cols))
+
+    # Duplicates (parallel edges) are summed
+    A = sparse.csr_array((ws, (rows, cols)), shape=(n, n))
+    A.sum_duplicates()
+    A.sort_indices()
+    return nodes, A
+
+
+def _degrees(A):
+    """Weighted degrees with self-loops counted twice"""
+    return np.asarray(A.sum(axis=1)).ravel() + A.diagonal()
+
+
+def _relabel(membership):
+    """Renumber community ids to 0..k-1 ordered by community size, largest first"""
+    _, inverse, counts = np.unique(membership, return_inverse=True, return_counts=True)
+    order = np.argsort(-counts, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[inverse].astype(np.int64)
+
+
+@njit(cache=True)
+def _local_moving(indptr, indices, data, k, m2, resolution, order):
+    """
+    Louvain phase one with the queue-based fast local move: nodes start queued in the given order and each is greedily
+    moved to the neighbouring community with the best modularity gain. When a node moves, only its neighbours outside
+    the new community are re-queued, so settled regions are not swept again.
+    m2 is per node (twice the edge weight of the graph or component the node is scored against).
+    Returns the community of each node and whether any node moved.
+    """
+    n = k.shape[0]
+    comm = np.arange(n)
+    tot = k.copy()
+    neigh_weight = np.zeros(n)
+    neigh_comms = np.empty(n, dtype=np.int64)
+    moved_any = False
+
+    queue = order.copy()
+    in_queue = np.ones(n, dtype=np.bool_)
+    head = 0
+    size = n
+
+    while size > 0:
+        i = queue[head]
+        head = (head + 1) % n
+        size -= 1
+        in_queue[i] = False
+
+        ci = comm[i]
+        ki = k[i]
+        scale = resolution * ki / m2[i]
+
+        n_neigh = 1
+        neigh_comms[0] = ci
+        for p in range(indptr[i], indptr[i + 1]):
+            j = indices[p]
+            if j == i:
+                continue
+            cj = comm[j]
+            if neigh_weight[cj] == 0.0 and cj != ci:
+                neigh_comms[n_neigh] = cj
+                n_neigh += 1
+            neigh_weight[cj] += data[p]
+
+        # Take i out of its own community before scoring
+        tot[ci] -= ki
+        best = ci
+        best_gain = neigh_weight[ci] - tot[ci] * scale
+        for q in range(1, n_neigh):
+            c = neigh_comms[q]
+            gain = neigh_weight[c] - tot[c] * scale
+            if gain > best_gain:
+                best_gain = gain
+                best = c
+        tot[best] += ki
+
+        for q in range(n_neigh):
+            neigh_weight[neigh_comms[q]] = 0.0
+
+        if best != ci:
+            comm[i] = best
+            moved_any = True
+            for p in range(indptr[i], indptr[i + 1]):
+                j = indices[p]
+                if not in_queue[j] and comm[j] != best:
+                    queue[(head + size) % n] = j
+                    size += 1
+                    in_queue[j] = True
+
+    return comm, moved_any
+
+
+def modularity(A, membership, resolution=1.0):
+    """
+    Newman modularity of a partition, computed directly from the CSR adjacency.
+
+    Parameters:
+    -----------
+    A : scipy.sparse.csr_array
+        Symmetric adjacency
+    membership : ndarray
+        Community id of each node
+    resolution : float
+        Resolution parameter (1.0 is standard modularity)
+
+    Returns:
+    --------
+    float
+    """
+    k = _degrees(A)
+    m2 = k.sum()
+    if m2 == 0:
+        return 0.0
+    membership = np.asarray(membership)
+    coo = A.tocoo()
+    internal = membership[coo.row] == membership[coo.col]
+    # Off-diagonal entries appear twice in the symmetric matrix, so double the diagonal to match
+    in_weight = coo.data[internal].sum() + A.diagonal().sum()
+    tot = np.bincount(membership, weights=k)
+    return float(in_weight / m2 - resolution * np.sum((tot / m2) ** 2))
+
+
+def component_modularity(A, membership, components=None, resolution=1.0):
+    """
+    Modularity of the partition restricted to each connected component, each scored against that component's own edge weight.
+    Communities never span components, so this is a single pass over the global partition.
+
+    Parameters:
+    -----------
+    A : scipy.sparse.csr_array
+        Symmetric adjacency
+    membership : ndarray
+        Community id of each node
+    components : ndarray or None
+        Component id of each node. Computed if not given.
+    resolution : float
+        Resolution parameter
+
+    Returns:
+    --------
+    modularities : ndarray
+        Modularity per component id
+    sizes : ndarray
+        Node count per component id
+    """
+    membership = np.asarray(membership)
+    if components is None:
+        _, components = csgraph.connected_components(A, directed=False)
+    n_comp = components.max() + 1 if len(components) else 0
+
+    k = _degrees(A)
+    coo = A.tocoo()
+    internal = membership[coo.row] == membership[coo.col]
+    diag = A.diagonal()
+
+    comp_m2 = np.bincount(components, weights=k, minlength=n_comp)
+    comp_in = np.bincount(components[coo.row[internal]], weights=coo.data[internal], minlength=n_comp).astype(np.float64)
+    comp_in += np.bincount(components, weights=diag, minlength=n_comp)
+
+    # Community -> component (every member of a community shares one component)
+    com_component = np.zeros(membership.max() + 1, dtype=np.int64)
+    com_component[membership] = components
+    com_tot = np.bincount(membership, weights=k)
+    comp_sq = np.bincount(com_component, weights=com_tot ** 2, minlength=n_comp)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mods = np.where(comp_m2 > 0, comp_in / comp_m2 - resolution * comp_sq / comp_m2 ** 2, 0.0)
+    sizes = np.bincount(components, minlength=n_comp)
+    return mods, sizes
+
+
+def louvain(A, resolution=1.0, seed=None, threshold=1e-7, components=None):
+    """
+    Louvain community detection on a CSR adjacency.
+
+    Parameters:
+    -----------
+    A : scipy.sparse.csr_array
+        Symmetric adjacency
+    resolution : float
+        Resolution parameter. Higher values give more, smaller communities.
+    seed : int or None
+        Seed for the node visiting order
+    threshold : float
+        Stop aggregating once a level improves modularity by less than this
+    components : ndarray or None
+        Component id of each node. If given, each connected component is optimized against its own edge weight,
+        which is equivalent to running Louvain on every component separately, but done in a single run.
+
+    Returns:
+    --------
+    ndarray
+        Community id of each node, numbered by decreasing community size
+    """
+    n = A.shape[0]
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    rng = np.random.default_rng(seed)
+    membership = np.arange(n)
+    A = sparse.csr_array(A, dtype=np.float64)
+    # The working levels store self-loops doubled, so row sums are degrees and P^T A P aggregates without correction
+    level = (A + sparse.diags_array(A.diagonal())).tocsr()
+    level.sort_indices()
+    k = np.asarray(level.sum(axis=1)).ravel()
+    if k.sum() == 0:
+        return membership.astype(np.int64)
+
+    if components is None:
+        level_components = np.zeros(n, dtype=np.int64)
+        objective = lambda m: modularity(A, m, resolution)
+    else:
+        level_components = np.asarray(components, dtype=np.int64)
+        objective = lambda m: component_modularity(A, m, components, resolution)[0].sum()
+    comp_m2 = np.bincount(level_components, weights=k)
+
+    current_q = objective(membership)
+    while True:
+        order = rng.permutation(level.shape[0])
+        m2 = comp_m2[level_components]
+        m2[m2 == 0] = 1.0
+        comm, moved = _local_moving(level.indptr, level.indices, level.data, k, m2, resolution, order)
+        if not moved:
+            break
+        comm = np.unique(comm, return_inverse=True)[1]
+        candidate = comm[membership]
+        new_q = objective(candidate)
+        if new_q - current_q <= threshold:
+            if new_q > current_q:
+                membership = candidate
+            break
+        membership = candidate
+        current_q = new_q
+
+        # Collapse each community into one node
+        n_level = level.shape[0]
+        P = sparse.csr_array((np.ones(n_level), (np.arange(n_level), comm)), shape=(n_level, comm.max() + 1))
+        level = (P.T @ level @ P).tocsr()
+        level.sort_indices()
+        k = np.asarray(level.sum(axis=1)).ravel()
+        collapsed = np.zeros(comm.max() + 1, dtype=np.int64)
+        collapsed[comm] = level_components
+        level_components = collapsed
+
+    return _relabel(membership)
+
+
+def leiden(A, resolution=1.0, seed=None):
+    """
+    Leiden community detection. Requires the optional igraph and leidenalg packages.
+    The igraph graph is built straight from the CSR edge arrays.
+
+    Parameters:
+    -----------
+    A : scipy.sparse.csr_array
+        Symmetric adjacency
+    resolution : float
+        Resolution parameter
+    seed : int or None
+        Random seed
+
+    Returns:
+    --------
+    ndarray
+        Community id of each node, numbered by decreasing community size
+    """
+    import igraph as ig
+    import leidenalg
+
+    upper = sparse.triu(A, format='coo')
+    g_ig = ig.Graph(n=A.shape[0], edges=np.column_stack((upper.row, upper.col)).tolist())
+    kwargs = {'weights': upper.data.tolist(), 'resolution_parameter': resolution}
+    if seed is not None:
+        kwargs['seed'] = seed
+    partition = leidenalg.find_partition(g_ig, leidenalg.RBConfigurationVertexPartition, **kwargs)
+    return _relabel(np.asarray(partition.membership))
+
+
+def detect(A, method='louvain', resolution=1.0, seed=None):
+    """Dispatch to the requested detection method ('louvain' or 'leiden')"""
+    if method == 'leiden':
+        return leiden(A, resolution=resolution, seed=seed)
+    return louvain(A, resolution=resolution, seed=seed)
+
+
+def _sweep_worker(args):
+    """Process pool worker, one (resolution, seed) run"""
+    indptr, indices, data, n, method, resolution, seed = args
+    A = sparse.csr_array((data, indices, indptr), shape=(n, n))
+    membership = detect(A, method=method, resolution=resolution, seed=seed)
+    return {
+        'resolution': resolution,
+        'seed': seed,
+        'modularity': modularity(A, membership, resolution),
+        'num_communities': int(membership.max() + 1) if len(membership) else 0,
+        'membership': membership
+    }
+
+
+def resolution_sweep(A, resolutions=(1.0,), seeds=(None,), method='louvain', n_jobs=None):
+    """
+    Run community detection for every (resolution, seed) combination in a process pool.
+
+    Parameters:
+    -----------
+    A : scipy.sparse.csr_array
+        Symmetric adjacency
+    resolutions : iterable of float
+        Resolution parameters to try
+    seeds : iterable of int or None
+        Seeds to run at each resolution
+    method : str
+        'louvain' or 'leiden'
+    n_jobs : int or None
+        Worker processes. Defaults to the cpu count. 1 runs serially in this process.
+
+    Returns:
+    --------
+    list of dict
+        One dict per run with 'resolution', 'seed', 'modularity', 'num_communities' and 'membership'
+    """
+    A = sparse.csr_array(A, dtype=np.float64)
+    tasks = [(A.indptr, A.indices, A.data, A.shape[0], method, float(res), seed)
+             for res in resolutions for seed in seeds]
+
+    if n_jobs is None:
+        n_jobs = mp.cpu_count()
+    n_jobs = max(1, min(n_jobs, len(tasks)))
+
+    if n_jobs == 1:
+        return [_sweep_worker(task) for task in tasks]
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return list(executor.map(_sweep_worker, tasks))
+
+
+def consensus_partition(A, memberships, threshold=0.5):
+    """
+    Combine several partitions into one. An edge is kept if its endpoints share a community in at least
+    the threshold fraction of the runs, and the consensus communities are the connected components of the kept edges.
+
+    Parameters:
+    -----------
+    A : scipy.sparse.csr_array
+        Symmetric adjacency
+    memberships : list of ndarray
+        Partitions to combine, e.g. the 'membership' entries from resolution_sweep
+    threshold : float
+        Fraction of runs an edge must be internal in to be kept
+
+    Returns:
+    --------
+    ndarray
+        Community id of each node, numbered by decreasing community size
+    """
+    n = A.shape[0]
+    coo = sparse.triu(A, k=1, format='coo')
+    agreement = np.zeros(len(coo.row))
+    for membership in memberships:
+        agreement += membership[coo.row] == membership[coo.col]
+    keep = agreement >= threshold * len(memberships)
+    kept = sparse.csr_array((np.ones(keep.sum()), (coo.row[keep], coo.col[keep])), shape=(n, n))
+    _, labels = csgraph.connected_components(kept, directed=False)
+    return _relabel(labels)
+
+
+def _local_clustering(S):
+    """Unweighted local clustering coefficient per node, ignoring self-loops"""
+    S = S.copy()
+    S.setdiag(0)
+    S.eliminate_zeros()
+    S.data[:] = 1
+    deg = np.asarray(S.sum(axis=1)).ravel()
+    triangles = np.asarray((S @ S).multiply(S).sum(axis=1)).ravel() / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(deg > 1, 2 * triangles / (deg * (deg - 1)), 0.0)
+
+
+def _assortativity(D, deg):
+    """Degree assortativity over edge ends, each edge weighted by its multiplicity"""
+    coo = D.tocoo()
+    w = coo.data
+    x = deg[coo.row]
+    y = deg[coo.col]
+    total = w.sum()
+    mx = np.sum(w * x) / total
+    my = np.sum(w * y) / total
+    cov = np.sum(w * (x - mx) * (y - my)) / total
+    sx = np.sqrt(np.sum(w * (x - mx) ** 2) / total)
+    sy = np.sqrt(np.sum(w * (y - my) ** 2) / total)
+    return float(cov / (sx * sy))
+
+
+def _average_path_lengths(S, membership, n_com, path_samples=64, seed=42, chunk=256):
+    """
+    Average shortest path length inside each community's induced subgraph, or nan if the subgraph is disconnected.
+    Communities larger than path_samples are estimated from BFS out of path_samples random source nodes.
+    BFS rows are processed in chunks so memory stays at chunk * community size.
+    """
+    rng = np.random.default_rng(seed)
+    result = np.full(n_com, np.nan)
+    order = np.argsort(membership, kind='stable')
+    bounds = np.searchsorted(membership[order], np.arange(n_com + 1))
+    for c in range(n_com):
+        members = order[bounds[c]:bounds[c + 1]]
+        size = len(members)
+        if size == 1:
+            result[c] = 0.0
+            continue
+        sub = S[members][:, members]
+        n_sub, _ = csgraph.connected_components(sub, directed=False)
+        if n_sub > 1:
+            continue
+        if path_samples is not None and size > path_samples:
+            sources = rng.choice(size, path_samples, replace=False)
+        else:
+            sources = np.arange(size)
+        total = 0.0
+        for start in range(0, len(sources), chunk):
+            dist = csgraph.shortest_path(sub, directed=False, unweighted=True, indices=sources[start:start + chunk])
+            total += dist.sum()
+        result[c] = total / (len(sources) * (size - 1))
+    return result
+
+
+def partition_stats(A, membership, D=None, components=None, component_membership=None, path_samples=64):
+    """
+    Network and per-community statistics for a partition, computed on CSR arrays in one pass.
+
+    Parameters:
+    -----------
+    A : scipy.sparse.csr_array
+        Weighted adjacency the partition was computed on, used for modularity
+    membership : ndarray
+        Community id of each node in row order
+    D : scipy.sparse.csr_array or None
+        Edge-count adjacency (parallel edges counted, weights ignored), used for degree based statistics.
+        Defaults to the binary structure of A. Structural statistics (density, clustering, path length) always use the binary structure.
+    components : ndarray or None
+        Component id of each node. Computed if not given.
+    component_membership : ndarray or None
+        Partition to score each connected component with, e.g. from louvain(..., components=...).
+        Defaults to the main partition restricted to each component.
+    path_samples : int or None
+        Communities with more nodes than this get their average path length estimated from this many BFS sources.
+        None computes it exactly.
+
+    Returns:
+    --------
+    dict
+        Dictionary containing various network statistics
+    """
+    stats = {}
+    if A.shape[0] == 0:
+        return stats
+
+    membership = np.unique(np.asarray(membership), return_inverse=True)[1]
+    n_com = membership.max() + 1
+
+    S = A.copy()
+    S.data[:] = 1
+    if D is None:
+        D = S
+
+    try:
+        stats['Modularity Entire Network'] = modularity(A, membership)
+    except:
+        pass
+
+    try:
+        if components is None:
+            _, components = csgraph.connected_components(A, directed=False)
+        if components.max() > 0:
+            if component_membership is None:
+                component_membership = membership
+            mods, sizes = component_modularity(A, component_membership, components)
+            for mod, size in zip(mods, sizes):
+                stats[f'Modularity of component with {size} nodes'] = float(mod)
+    except:
+        pass
+
+    try:
+        community_sizes = np.bincount(membership)
+        stats['Number of Communities'] = int(n_com)
+        stats['Community Sizes'] = community_sizes.tolist()
+        stats['Average Community Size'] = np.mean(community_sizes)
+    except:
+        pass
+
+    try:
+        stats['Global Clustering Coefficient'] = float(np.mean(_local_clustering(S)))
+    except:
+        pass
+
+    deg = _degrees(D)
+    try:
+        stats['Assortativity'] = _assortativity(D, deg)
+    except:
+        pass
+
+    D_coo = D.tocoo()
+    external = membership[D_coo.row] != membership[D_coo.col]
+    try:
+        # Each undirected edge appears twice in the symmetric matrix
+        stats['Inter-community Edges'] = int(round(D_coo.data[external].sum() / 2))
+    except:
+        pass
+
+    try:
+        stats['Mixing Parameter'] = float(D_coo.data[external].sum() / deg.sum())
+    except:
+        pass
+
+    try:
+        # Per-community statistics
+        S_coo = S.tocoo()
+        internal = membership[S_coo.row] == membership[S_coo.col]
+        off_diag = S_coo.row != S_coo.col
+        sizes = np.bincount(membership, minlength=n_com).astype(np.float64)
+        internal_edges = np.bincount(membership[S_coo.row[internal & off_diag]], minlength=n_com) / 2
+        internal_edges += np.bincount(membership[S_coo.row[internal & ~off_diag]], minlength=n_com)
+        internal_deg = np.bincount(membership[S_coo.row[internal & off_diag]], minlength=n_com)
+        internal_deg += 2 * np.bincount(membership[S_coo.row[internal & ~off_diag]], minlength=n_com)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            density = np.where(sizes > 1, 2 * internal_edges / (sizes * (sizes - 1)), 0.0)
+            degree_centrality = np.where(sizes > 1, internal_deg / (sizes * (sizes - 1)), 1.0)
+
+        volume = np.bincount(membership, weights=deg, minlength=n_com)
+        cut = np.bincount(membership[D_coo.row[external]], weights=D_coo.data[external], minlength=n_com)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            conductance = cut / np.minimum(volume, deg.sum() - volume)
+
+        keep = internal
+        S_in = sparse.csr_array((S_coo.data[keep], (S_coo.row[keep], S_coo.col[keep])), shape=S.shape)
+        com_clustering = np.bincount(membership, weights=_local_clustering(S_in), minlength=n_com) / sizes
+
+        path_lengths = _average_path_lengths(S_in, membership, n_com, path_samples)
+
+        for i in range(n_com):
+            stats[f'Community {i+1} Density'] = float(density[i])
+            stats[f'Community {i+1} Conductance'] = float(conductance[i])
+            stats[f'Community {i+1} Avg Clustering'] = float(com_clustering[i])
+            stats[f'Community {i+1} Avg Degree Centrality'] = float(degree_centrality[i])
+            if not np.isnan(path_lengths[i]):
+                stats[f'Community {i+1} Avg Path Length'] = float(path_lengths[i])
+    except:
+        pass
+
+    return stats
@@ -6,11 +6,14 @@ from typing import List, Dict, Tuple, Union, Any
 from collections import defaultdict, Counter
 from networkx.algorithms import community
 from scipy import ndimage
-from scipy.ndimage import zoom
 from networkx.algorithms import community
 import random
 import copy
 from . import node_draw
+from . import graph_core
+from . import centrality_engine
+from . import relabel
+from . import resample
 
 
 
@@ -24,49 +27,7 @@ def binarize(image):
 
 def upsample_with_padding(data, factor, original_shape):
     # Upsample the input binary array while adding padding to match the original shape
-
-    # Get the dimensions of the original and upsampled arrays
-    original_shape = np.array(original_shape)
-    binary_array = zoom(data, factor, order=0)
-    upsampled_shape = np.array(binary_array.shape)
-
-    # Calculate the positive differences in dimensions
-    difference_dims = original_shape - upsampled_shape
-
-    # Calculate the padding amounts for each dimension
-    padding_dims = np.maximum(difference_dims, 0)
-    padding_before = padding_dims // 2
-    padding_after = padding_dims - padding_before
-
-    # Pad the binary array along each dimension
-    padded_array = np.pad(binary_array, [(padding_before[0], padding_after[0]),
-                                         (padding_before[1], padding_after[1]),
-                                         (padding_before[2], padding_after[2])], mode='constant', constant_values=0)
-
-    # Calculate the subtraction amounts for each dimension
-    sub_dims = np.maximum(-difference_dims, 0)
-    sub_before = sub_dims // 2
-    sub_after = sub_dims - sub_before
-
-    # Remove planes from the beginning and end
-    if sub_dims[0] == 0:
-        trimmed_planes = padded_array
-    else:
-        trimmed_planes = padded_array[sub_before[0]:-sub_after[0], :, :]
-
-    # Remove rows from the beginning and end
-    if sub_dims[1] == 0:
-        trimmed_rows = trimmed_planes
-    else:
-        trimmed_rows = trimmed_planes[:, sub_before[1]:-sub_after[1], :]
-
-    # Remove columns from the beginning and end
-    if sub_dims[2] == 0:
-        trimmed_array = trimmed_rows
-    else:
-        trimmed_array = trimmed_rows[:, :, sub_before[2]:-sub_after[2]]
-
-    return trimmed_array
+    return resample.upsample_to(data, factor, original_shape)
 
 def weighted_network(excel_file_path):
     """creates a network where the edges have weights proportional to the number of connections they make between the same structure"""
@@ -140,16 +101,8 @@ def downsample(data, factor, directory=None, order=0):
     else:
         data2 = None
     
-    # Check if Z dimension is too small relative to downsample factor
-    if data.ndim == 3 and data.shape[0] < factor * 4:
-        print(f"Warning: Z dimension ({data.shape[0]}) is less than 4x the downsample factor ({factor}). "
-              f"Skipping Z-axis downsampling to preserve resolution.")
-        zoom_factors = (1, 1/factor, 1/factor)
-    else:
-        zoom_factors = 1/factor
-
-    # Apply downsampling
-    data = zoom(data, zoom_factors, order=order)
+    # Apply downsampling (Z is kept when it is under 4x the factor; order 0 streams over the input)
+    data = resample.downsample(data, factor, order=order)
     
     # Save if input was a file path
     if isinstance(data2, str):
@@ -346,13 +299,13 @@ def extract_mothers(nodes, G, partition, centroid_dic = None, directory = None,
 
 
 
-def find_hub_nodes(G: nx.Graph, proportion: float = 0.1) -> List:
+def find_hub_nodes(G, proportion: float = 0.1) -> List:
     """
     Identifies hub nodes in a network based on average shortest path length,
     handling multiple connected components.
     
     Args:
-        G (nx.Graph): NetworkX graph (can have multiple components)
+        G (nx.Graph or graph_core.CompactGraph): Network (can have multiple components)
         proportion (float): Proportion of top nodes to return (0.0 to 1.0)
         
     Returns:
@@ -360,41 +313,32 @@ def find_hub_nodes(G: nx.Graph, proportion: float = 0.1) -> List:
     """
     if not 0 < proportion <= 1:
         raise ValueError("Proportion must be between 0 and 1")
-    
-    # Get connected components
-    components = list(nx.connected_components(G))
-    
-    # Dictionary to store average path lengths for all nodes
-    avg_path_lengths: Dict[int, float] = {}
-    
+
+    graph = G if isinstance(G, graph_core.CompactGraph) else graph_core.CompactGraph.from_networkx(G)
+
+    # One BFS sweep gives every node's average shortest path length within its own component
+    n_components, labels = graph.connected_components()
+    sizes = np.bincount(labels, minlength=n_components)
+    avg_path_lengths = centrality_engine.path_sweep(graph.csr(weighted=False), betweenness=False)['mean_distance']
+
+    # Calculate number of nodes to return
+    num_nodes = int(np.ceil(graph.num_nodes * proportion))
+
     output = []
 
-    # Process each component separately
-    for component in components:
-        # Create subgraph for this component
-        subgraph = G.subgraph(component)
-        if not (len(subgraph.nodes()) * proportion >= 0.75): #Skip components that are too small
+    # Process each component separately, in the order their nodes appear in the graph
+    order = graph.node_order
+    component_order = labels[order]
+    _, first = np.unique(component_order, return_index=True)
+    for component in component_order[np.sort(first)]:
+        if not (sizes[component] * proportion >= 0.75): #Skip components that are too small
             continue
-        
-        # Calculate average shortest path length for each node in this component
-        for node in subgraph.nodes():
-            # Get shortest paths from this node to all others in the component
-            path_lengths = nx.single_source_shortest_path_length(subgraph, node)
-            # Calculate average path length within this component
-            avg_length = sum(path_lengths.values()) / (len(subgraph.nodes()) - 1)
-            avg_path_lengths[node] = avg_length
-    
-        # Sort nodes by average path length (ascending)
-        sorted_nodes = sorted(avg_path_lengths.items(), key=lambda x: x[1])
-        
-        # Calculate number of nodes to return
-        num_nodes = int(np.ceil(len(G.nodes()) * proportion))
-        
-        # Return the top nodes (those with lowest average path lengths)
-        hub_nodes = [node for node, _ in sorted_nodes[:num_nodes]]
-        output.extend(hub_nodes)
-        avg_path_lengths: Dict[int, float] = {}
-    
+
+        members = order[component_order == component]
+        # Sort nodes by average path length (ascending) and return the top nodes (those with lowest average path lengths)
+        ranked = members[np.argsort(avg_path_lengths[members], kind='stable')]
+        output.extend(graph.node_ids[ranked[:num_nodes]].tolist())
+
     return output
 
 def get_color_name_mapping():
@@ -720,15 +664,9 @@ def assign_node_colors(node_list: List[int], labeled_array: np.ndarray) -> Tuple
     # Create mapping from node to color
     node_to_color = {node: colors_rgba[i] for i, node in enumerate(sorted_nodes)}
     
-    # Create lookup table
-    max_label = max(max(labeled_array.flat), max(node_list) if node_list else 0)
-    color_lut = np.zeros((int(max_label) + 1, 4), dtype=np.uint8)  # Transparent by default
-    
-    for node_id, color in node_to_color.items():
-        color_lut[node_id] = color
-    
-    # Single vectorized operation - eliminates all loops!
-    rgba_array = color_lut[labeled_array]
+    # One lookup table pass over the volume, unlisted labels stay transparent
+    keys = list(node_to_color.keys())
+    rgba_array = relabel.lookup(labeled_array, keys, np.array([node_to_color[k] for k in keys], dtype=np.uint8).reshape(-1, 4))
     
     # Convert colors for naming
     node_to_color_rgb = {k: tuple(v[:3]) for k, v in node_to_color.items()}
@@ -773,15 +711,9 @@ def assign_community_colors(community_dict: Dict[int, int], labeled_array: np.nd
     # Create node to color mapping using original community_dict
     node_to_color = {node: community_to_color[comm] for node, comm in community_dict.items()}
     
-    # Create lookup table - this is the key optimization
-    max_label = max(max(labeled_array.flat), max(node_to_color.keys()) if node_to_color else 0)
-    color_lut = np.zeros((int(max_label) + 1, 4), dtype=np.uint8)  # Transparent by default
-    
-    for node_id, color in node_to_color.items():
-        color_lut[node_id] = color
-    
-    # Single vectorized operation - this is much faster!
-    rgba_array = color_lut[labeled_array]
+    # One lookup table pass over the volume, nodes without a community stay transparent
+    keys = list(node_to_color.keys())
+    rgba_array = relabel.lookup(labeled_array, keys, np.array([node_to_color[k] for k in keys], dtype=np.uint8).reshape(-1, 4))
     
     # Convert to RGB for color names (including brown for outliers)
     community_to_color_rgb = {k: tuple(v[:3]) for k, v in community_to_color.items()}
@@ -829,23 +761,14 @@ def assign_community_grays(community_dict: Dict[int, Union[int, str, Any]], labe
     else:
         dtype = np.uint32
     
-    # Create output array
-    gray_array = np.zeros_like(labeled_array, dtype=dtype)
-    
     # Create mapping of unique communities to their grayscale values
     if is_numeric:
         community_to_gray = {comm: comm for comm in set(community_dict.values())}
     else:
         community_to_gray = {comm: i+1 for i, comm in enumerate(sorted(set(community_dict.values())))}
     
-    # Create lookup table
-    max_label = max(max(labeled_array.flat), max(node_to_gray.keys()) if node_to_gray else 0)
-    gray_lut = np.zeros(int(max_label) + 1, dtype=dtype)
-    
-    for node_id, gray_val in node_to_gray.items():
-        gray_lut[node_id] = gray_val
-    
-    gray_array = gray_lut[labeled_array]
+    # One lookup table pass over the volume, nodes without a community stay 0
+    gray_array = relabel.remap(labeled_array, node_to_gray, default = 0, dtype = dtype)
     
     return gray_array, community_to_gray
     
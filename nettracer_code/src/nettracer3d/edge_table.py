@@ -0,0 +1,146 @@
+import numpy as np
+from scipy import sparse
+from . import graph_core
+from . import relabel
+
+
+# Network_3D.network_lists as typed arrays.
+# network_lists is three parallel Python lists (node a, node b, the edge joining them), one row per node pair an edge makes.
+# The transforms that rewrite it (edge/trunk/community to node, pruning pairs by node identity) work on an EdgeTable instead:
+# relabeling goes through a lookup table, filtering through boolean masks and identity tests through a sparse node x identity
+# matrix, so none of them loop over rows in Python. Results go back to lists once, and the graph is rebuilt from the arrays by
+# graph_core.CompactGraph rather than through a DataFrame.
+
+
+def _column(values, n):
+    values = np.asarray(values)
+    if values.dtype.kind in 'iub':
+        return values.astype(np.int64)
+    if values.dtype.kind == 'f' and n and np.all(values == np.round(values)):
+        return values.astype(np.int64)
+    return values
+
+
+class EdgeTable:
+    """
+    Parallel arrays node_a, node_b and edge, one entry per row of network_lists.
+    """
+
+    def __init__(self, node_a, node_b, edge=None):
+        self.node_a = np.asarray(node_a)
+        self.node_b = np.asarray(node_b)
+        self.edge = np.zeros(len(self.node_a), dtype=np.int64) if edge is None else np.asarray(edge)
+
+    @classmethod
+    def from_lists(cls, network_lists):
+        n = len(network_lists[0])
+        edge = network_lists[2] if len(network_lists) > 2 and len(network_lists[2]) == n else None
+        return cls(_column(network_lists[0], n), _column(network_lists[1], n), None if edge is None else _column(edge, n))
+
+    def to_lists(self):
+        return [self.node_a.tolist(), self.node_b.tolist(), self.edge.tolist()]
+
+    def __len__(self):
+        return len(self.node_a)
+
+    def select(self, rows):
+        """Table of the given rows (boolean mask or indices)"""
+        return EdgeTable(self.node_a[rows], self.node_b[rows], self.edge[rows])
+
+    def node_ids(self):
+        """Sorted distinct nodes"""
+        return np.unique(np.concatenate((self.node_a, self.node_b)))
+
+    def max_node(self):
+        return max(self.node_a.max(), self.node_b.max()) if len(self) else 0
+
+    def remap_nodes(self, mapping):
+        """
+        Table with both node columns relabeled through {old: new}.
+        Nodes missing from the mapping keep their own id rather than being dropped, so with a community mapping
+        (Network_3D.com_to_node) a node without a community stays in the network as itself.
+        """
+        keys = np.asarray(list(mapping.keys()))
+        values = np.asarray(list(mapping.values()))
+        if self.node_a.dtype.kind in 'iu' and keys.dtype.kind in 'iu' and values.dtype.kind in 'iu':
+            return EdgeTable(relabel.remap(self.node_a, (keys, values)), relabel.remap(self.node_b, (keys, values)), self.edge)
+        get = mapping.get
+        return EdgeTable(np.array([get(v, v) for v in self.node_a.tolist()]),
+                         np.array([get(v, v) for v in self.node_b.tolist()]), self.edge)
+
+    def drop_self_loops(self):
+        return self.select(self.node_a != self.node_b)
+
+    def rows_touching(self, nodes):
+        """Mask of the rows with either node in nodes"""
+        nodes = np.asarray(list(nodes))
+        return np.isin(self.node_a, nodes) | np.isin(self.node_b, nodes)
+
+    def rows_of_edge(self, edge_id):
+        """Rows the given edge makes"""
+        return np.flatnonzero(self.edge == edge_id)
+
+    def edge_ranking(self):
+        """Distinct edge ids by the number of rows they make, most first, ties in order of first appearance (as Counter.most_common)"""
+        uniq, first, counts = np.unique(self.edge, return_index=True, return_counts=True)
+        order = np.lexsort((first, -counts))
+        return uniq[order], counts[order]
+
+    def identity_matrix(self, identities):
+        """
+        Identities of the table's nodes as a sparse boolean matrix.
+
+        Parameters:
+        -----------
+        identities : dict
+            {node: identity string or list of identity strings}; nodes missing from it have none. A bare string is one
+            identity (not a sequence of one-character identities), so {node: 'Tcell'} and {node: ['Tcell']} are the same.
+
+        Returns:
+        --------
+        tuple
+            (node_ids, names, M) with M[i, j] set when node_ids[i] carries names[j]
+        """
+        node_ids = self.node_ids()
+        rows = []
+        codes = []
+        names = {}
+        for i, node in enumerate(node_ids.tolist()):
+            ids = identities.get(node)
+            if ids is None:
+                continue
+            # A bare string is one identity, not a sequence of characters
+            for name in ([ids] if isinstance(ids, str) else ids):
+                rows.append(i)
+                codes.append(names.setdefault(str(name), len(names)))
+        M = sparse.csr_array((np.ones(len(rows), dtype=bool), (np.asarray(rows, dtype=np.int64), np.asarray(codes, dtype=np.int64))),
+                             shape=(len(node_ids), max(len(names), 1)))
+        return node_ids, list(names), M
+
+    def _endpoint_rows(self, node_ids):
+        return np.searchsorted(node_ids, self.node_a), np.searchsorted(node_ids, self.node_b)
+
+    def shares_identity(self, identities):
+        """
+        Mask of the rows whose two nodes have at least one identity in common. identities is as for identity_matrix: a bare
+        string is a single identity and nodes missing from it share nothing.
+        """
+        node_ids, names, M = self.identity_matrix(identities)
+        ia, ib = self._endpoint_rows(node_ids)
+        return np.asarray((M[ia].multiply(M[ib])).sum(axis=1)).reshape(-1) > 0
+
+    def both_have(self, identities, wanted):
+        """
+        Mask of the rows where each node carries at least one of the wanted identities. identities is as for
+        identity_matrix: a bare string is a single identity and nodes missing from it carry none.
+        """
+        node_ids, names, M = self.identity_matrix(identities)
+        wanted = {str(w) for w in wanted}
+        cols = [j for j, name in enumerate(names) if name in wanted]
+        has = np.asarray(M[:, cols].sum(axis=1)).reshape(-1) > 0 if cols else np.zeros(len(node_ids), dtype=bool)
+        ia, ib = self._endpoint_rows(node_ids)
+        return has[ia] & has[ib]
+
+    def to_graph(self):
+        """graph_core.CompactGraph of the table, pairs weighted by how many rows they have"""
+        return graph_core.CompactGraph.from_lists([self.node_a, self.node_b])
@@ -0,0 +1,257 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from sklearn.cluster import KMeans
+from sklearn.metrics import calinski_harabasz_score
+from sklearn.neighbors import NearestNeighbors
+
+
+# Feature matrices, neighbor graphs and cluster-count selection for the UMAP and neighborhood clustering paths.
+# Per-node dicts of arrays are copied once, in slabs of keys, into a preallocated float32 matrix instead of going through
+# np.array(list(...)) in float64. The k-nearest-neighbor graph of a matrix is cached by content, so the DBSCAN eps estimate and a
+# UMAP embedding of the same data search neighbors once, and the KMeans sweep that picks the cluster count runs its k values
+# concurrently, on a subsample when there are many rows.
+
+_SLAB_ROWS = 65536
+_EXACT_KNN_ROWS = 4096       # Below this, neighbors are searched exactly (UMAP does the same)
+_MIN_GRAPH_K = 15            # UMAP's default n_neighbors, so one graph covers both DBSCAN and UMAP
+_GRAPH_CACHE_SIZE = 4
+
+_graph_cache = OrderedDict()
+_graph_lock = threading.Lock()
+
+
+def feature_matrix(data_input, dtype=np.float32):
+    """
+    Stack per-node feature vectors into one matrix.
+
+    Parameters:
+    -----------
+    data_input : dict or list
+        {key: 1D array} or a list of 1D arrays (keyed by position)
+    dtype : numpy dtype
+        Output dtype
+
+    Returns:
+    --------
+    tuple
+        (keys, matrix) with matrix[i] the vector of keys[i]
+    """
+    if isinstance(data_input, dict):
+        keys = list(data_input.keys())
+        values = data_input.values()
+    else:
+        keys = list(range(len(data_input)))
+        values = data_input
+    if isinstance(values, np.ndarray) and values.ndim == 2:
+        return keys, np.ascontiguousarray(values, dtype=dtype)
+
+    values = iter(values)
+    if not keys:
+        return keys, np.zeros((0, 0), dtype=dtype)
+    first = np.ravel(np.asarray(next(values)))
+    # Rows are C-contiguous, which is what every sklearn estimator below works on without copying
+    X = np.empty((len(keys), first.shape[0]), dtype=dtype)
+    X[0] = first
+    row = 1
+    while row < len(keys):
+        stop = min(row + _SLAB_ROWS, len(keys))
+        X[row:stop] = [np.ravel(np.asarray(next(values))) for _ in range(row, stop)]
+        row = stop
+    return keys, X
+
+
+def reduce_dimensions(X, n_components=50, seed=42):
+    """
+    PCA projection of X to n_components dimensions (randomized SVD), or X unchanged if it is not wider than that.
+
+    Parameters:
+    -----------
+    X : ndarray
+        (n_samples, n_features) matrix
+    n_components : int
+        Target dimensionality
+    seed : int
+        Random seed for the randomized solver
+    """
+    if n_components is None or X.shape[1] <= n_components or X.shape[0] <= n_components:
+        return X
+    from sklearn.decomposition import PCA
+    reduced = PCA(n_components=n_components, svd_solver='randomized', random_state=seed).fit_transform(X)
+    return np.ascontiguousarray(reduced, dtype=np.float32)
+
+
+def _fingerprint(X):
+    digest = hashlib.blake2b(np.ascontiguousarray(X).view(np.uint8).reshape(-1), digest_size=16).hexdigest()
+    return (X.shape, X.dtype.str, digest)
+
+
+def knn_graph(X, k=_MIN_GRAPH_K, seed=42):
+    """
+    k-nearest-neighbor graph of the rows of X, each row counting as its own first neighbor.
+    Small inputs are searched exactly, larger ones with NN-descent when pynndescent is installed (it comes with umap-learn).
+    Graphs are cached by the content of X, and a cached graph with more neighbors serves requests for fewer.
+
+    Parameters:
+    -----------
+    X : ndarray
+        (n_samples, n_features) matrix
+    k : int
+        Neighbors per row, including the row itself
+    seed : int
+        Random seed for NN-descent
+
+    Returns:
+    --------
+    tuple
+        (indices, distances, search_index), each of the first two (n_samples, k). search_index is the NN-descent index, or None.
+    """
+    n = X.shape[0]
+    k = max(1, min(int(k), n))
+    key = _fingerprint(X)
+    with _graph_lock:
+        cached = _graph_cache.get(key)
+        if cached is not None and cached[0].shape[1] >= k:
+            _graph_cache.move_to_end(key)
+            indices, distances, index = cached
+            return indices[:, :k], distances[:, :k], index
+
+    search_k = min(max(k, _MIN_GRAPH_K), n)
+    index = None
+    if n >= _EXACT_KNN_ROWS:
+        try:
+            from pynndescent import NNDescent
+        except ImportError:
+            NNDescent = None
+        if NNDescent is not None:
+            index = NNDescent(X, n_neighbors=search_k, random_state=seed, n_jobs=-1, low_memory=True)
+            indices, distances = index.neighbor_graph
+    if index is None:
+        distances, indices = NearestNeighbors(n_neighbors=search_k, n_jobs=-1).fit(X).kneighbors(X)
+    indices = np.ascontiguousarray(indices, dtype=np.int64)
+    distances = np.ascontiguousarray(distances, dtype=np.float32)
+
+    with _graph_lock:
+        _graph_cache[key] = (indices, distances, index)
+        _graph_cache.move_to_end(key)
+        while len(_graph_cache) > _GRAPH_CACHE_SIZE:
+            _graph_cache.popitem(last=False)
+    return indices[:, :k], distances[:, :k], index
+
+
+def clear_graph_cache():
+    with _graph_lock:
+        _graph_cache.clear()
+
+
+def kth_neighbor_distances(X, k, seed=42):
+    """Distance from every row to its k-th nearest other row, from the cached neighbor graph"""
+    _, distances, _ = knn_graph(X, k + 1, seed)
+    return distances[:, k]
+
+
+def umap_embedding(X, n_components=2, random_state=42, pca_components=None, **umap_kwargs):
+    """
+    UMAP embedding of the rows of X, reusing the cached neighbor graph for inputs large enough that UMAP would search
+    neighbors approximately anyway.
+
+    Parameters:
+    -----------
+    X : ndarray
+        (n_samples, n_features) matrix
+    n_components : int
+        Embedding dimensionality
+    random_state : int
+        Random seed
+    pca_components : int, optional
+        If given, X is first projected to this many principal components
+    **umap_kwargs
+        Forwarded to umap.UMAP
+
+    Returns:
+    --------
+    ndarray
+        (n_samples, n_components) embedding
+    """
+    import umap
+
+    X = reduce_dimensions(X, pca_components, random_state)
+    kw = dict(n_components=n_components, random_state=random_state)
+    kw.update(umap_kwargs)
+    n_neighbors = kw.get('n_neighbors', 15)
+    if X.shape[0] >= _EXACT_KNN_ROWS and kw.get('metric', 'euclidean') == 'euclidean' and n_neighbors < X.shape[0]:
+        indices, distances, index = knn_graph(X, n_neighbors, random_state)
+        try:
+            return umap.UMAP(precomputed_knn=(indices, distances, index), **kw).fit_transform(X)
+        except TypeError:  # umap-learn older than 0.5.4 has no precomputed_knn
+            pass
+    return umap.UMAP(**kw).fit_transform(X)
+
+
+def _sweep_one(X, k, seed, n_init):
+    try:
+        labels = KMeans(n_clusters=k, random_state=seed, n_init=n_init).fit_predict(X)
+    except Exception:
+        return 0.0
+    # Penalize solutions that didn't achieve k clusters
+    if len(np.unique(labels)) != k:
+        return 0.0
+    return float(calinski_harabasz_score(X, labels))
+
+
+def optimal_cluster_count(X, max_k, seed=42, sample_size=50000, max_workers=None, n_init=10):
+    """
+    Cluster count with the highest Calinski-Harabasz score over KMeans runs for k = 2..max_k.
+
+    Parameters:
+    -----------
+    X : ndarray
+        (n_samples, n_features) matrix
+    max_k : int
+        Largest count to try (also capped at n_samples - 1 and 20)
+    seed : int
+        Random seed for KMeans and the subsample
+    sample_size : int
+        Rows beyond this are subsampled for the sweep
+    max_workers : int, optional
+        Concurrent KMeans fits. Defaults to the CPU count, capped at the number of k values.
+    n_init : int
+        KMeans initializations per k
+
+    Returns:
+    --------
+    int
+        The chosen count, or 1 if no k could be scored
+    """
+    n_samples = X.shape[0]
+    if n_samples < 2:
+        return 1
+    max_k = min(max_k, n_samples - 1, 20)
+    print(f"Max_k: {max_k}, n_samples: {n_samples}")
+    if max_k < 2:
+        return 1
+
+    if sample_size is not None and n_samples > sample_size:
+        rows = np.sort(np.random.default_rng(seed).choice(n_samples, sample_size, replace=False))
+        X = X[rows]
+        print(f"Scoring cluster counts on {sample_size} of {n_samples} rows")
+
+    k_range = list(range(2, max_k + 1))
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(max_workers or cpus, len(k_range)))
+    print(f"Testing {k_range[0]} to {k_range[-1]} clusters")
+    if workers == 1:
+        scores = [_sweep_one(X, k, seed, n_init) for k in k_range]
+    else:
+        # The fits share the machine, so each one's native thread pools get a slice of it
+        from threadpoolctl import threadpool_limits
+        with threadpool_limits(limits=max(1, cpus // workers)):
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                scores = list(executor.map(lambda k: _sweep_one(X, k, seed, n_init), k_range))
+
+    if max(scores) <= 0:
+        return 1
+    return k_range[int(np.argmax(scores))]
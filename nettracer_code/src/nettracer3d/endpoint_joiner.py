@@ -3,6 +3,7 @@ from scipy.spatial import cKDTree
 import warnings
 from . import nettracer as n3d
 from . import smart_dilate as sdl
+from . import rasterize
 warnings.filterwarnings('ignore')
 
 
@@ -20,102 +21,8 @@ class EndpointConnector:
             Maximum distance to connect two endpoints
         """
         self.connection_distance = connection_distance
-        self._sphere_cache = {}  # Cache sphere masks for different radii
         self.spine_removal = spine_removal
 
-    def _get_sphere_mask(self, radius):
-        """Get a cached sphere mask for the given radius"""
-        cache_key = round(radius * 2) / 2
-        
-        if cache_key not in self._sphere_cache:
-            r = max(1, int(np.ceil(cache_key)))
-            
-            size = 2 * r + 1
-            center = r
-            zz, yy, xx = np.ogrid[-r:r+1, -r:r+1, -r:r+1]
-            
-            dist_sq = zz**2 + yy**2 + xx**2
-            mask = dist_sq <= cache_key**2
-            
-            self._sphere_cache[cache_key] = {
-                'mask': mask,
-                'radius_int': r,
-                'center': center
-            }
-        
-        return self._sphere_cache[cache_key]
-
-    def _draw_sphere_3d_cached(self, array, center, radius):
-        """Draw a filled sphere using cached mask"""
-        sphere_data = self._get_sphere_mask(radius)
-        mask = sphere_data['mask']
-        r = sphere_data['radius_int']
-        
-        z, y, x = center
-        
-        # Bounding box in the array
-        z_min = max(0, int(z - r))
-        z_max = min(array.shape[0], int(z + r + 1))
-        y_min = max(0, int(y - r))
-        y_max = min(array.shape[1], int(y + r + 1))
-        x_min = max(0, int(x - r))
-        x_max = min(array.shape[2], int(x + r + 1))
-        
-        # Calculate actual slice sizes
-        array_z_size = z_max - z_min
-        array_y_size = y_max - y_min
-        array_x_size = x_max - x_min
-        
-        if array_z_size <= 0 or array_y_size <= 0 or array_x_size <= 0:
-            return
-        
-        # Calculate mask offset
-        mask_z_start = max(0, r - int(z) + z_min)
-        mask_y_start = max(0, r - int(y) + y_min)
-        mask_x_start = max(0, r - int(x) + x_min)
-        
-        mask_z_end = mask_z_start + array_z_size
-        mask_y_end = mask_y_start + array_y_size
-        mask_x_end = mask_x_start + array_x_size
-        
-        mask_z_end = min(mask_z_end, mask.shape[0])
-        mask_y_end = min(mask_y_end, mask.shape[1])
-        mask_x_end = min(mask_x_end, mask.shape[2])
-        
-        actual_z_size = mask_z_end - mask_z_start
-        actual_y_size = mask_y_end - mask_y_start
-        actual_x_size = mask_x_end - mask_x_start
-        
-        z_max = z_min + actual_z_size
-        y_max = y_min + actual_y_size
-        x_max = x_min + actual_x_size
-        
-        try:
-            array[z_min:z_max, y_min:y_max, x_min:x_max] |= \
-                mask[mask_z_start:mask_z_end, mask_y_start:mask_y_end, mask_x_start:mask_x_end]
-        except ValueError:
-            pass
-
-    def _draw_cylinder_3d_cached(self, array, pos1, pos2, radius1, radius2):
-        """Draw a tapered cylinder using cached sphere masks"""
-        distance = np.linalg.norm(pos2 - pos1)
-        if distance < 0.5:
-            self._draw_sphere_3d_cached(array, pos1, max(radius1, radius2))
-            return
-        
-        radius_change = abs(radius2 - radius1)
-        samples_per_unit = 2.0
-        if radius_change > 2:
-            samples_per_unit = 3.0
-        
-        num_samples = max(3, int(distance * samples_per_unit))
-        t_values = np.linspace(0, 1, num_samples)
-        
-        for t in t_values:
-            pos = pos1 * (1 - t) + pos2 * t
-            radius = radius1 * (1 - t) + radius2 * t
-            self._draw_sphere_3d_cached(array, pos, radius)
-
     def _find_endpoints(self, skeleton):
         """
         Find skeleton endpoints by checking connectivity
@@ -221,29 +128,21 @@ class EndpointConnector:
             print(f"Connecting endpoints within {self.connection_distance} voxels...")
         tree = cKDTree(endpoints)
         
-        # Find all pairs within connection distance
-        connections_made = 0
-        for i, ep1 in enumerate(endpoints):
-            # Query all points within connection distance
-            nearby_indices = tree.query_ball_point(ep1, self.connection_distance)
-            
-            for j in nearby_indices:
-                if j <= i:  # Skip self and already processed pairs
-                    continue
-                
-                ep2 = endpoints[j]
-                radius1 = endpoint_radii[i]
-                radius2 = endpoint_radii[j]
-                
-                # Draw tapered cylinder connection
-                self._draw_cylinder_3d_cached(
-                    result,
-                    ep1.astype(float),
-                    ep2.astype(float),
-                    radius1,
-                    radius2
-                )
-                connections_made += 1
+        # Find all pairs within connection distance (each pair once, i < j)
+        pairs = tree.query_pairs(self.connection_distance, output_type='ndarray')
+        connections_made = len(pairs)
+        
+        # Draw all tapered cylinder connections in one parallel batch, in the image's own foreground value
+        if connections_made > 0:
+            foreground = result.max() if result.any() else 1
+            rasterize.draw_cylinders(
+                result,
+                endpoints[pairs[:, 0]].astype(float),
+                endpoints[pairs[:, 1]].astype(float),
+                endpoint_radii[pairs[:, 0]],
+                endpoint_radii[pairs[:, 1]],
+                value=foreground
+            )
         
         if verbose:
             print(f"Made {connections_made} connections")
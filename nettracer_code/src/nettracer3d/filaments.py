@@ -6,6 +6,7 @@ from scipy.spatial import cKDTree
 from skimage.morphology import remove_small_objects, skeletonize
 import warnings
 from . import smart_dilate as sdl
+from . import rasterize
 warnings.filterwarnings('ignore')
 
 
@@ -92,7 +93,6 @@ class VesselDenoiser:
             cached_state = None
         
         self.cached_state = cached_state
-        self._sphere_cache = {}  # Cache sphere masks for different radii
 
     def filter_large_spherical_blobs(self, binary_array, 
                                       min_volume=200,
@@ -196,150 +196,32 @@ class VesselDenoiser:
         return filtered.astype(binary_array.dtype)
 
 
-    def _get_sphere_mask(self, radius):
-        """
-        Get a cached sphere mask for the given radius
-        This avoids recomputing the same sphere mask many times
-        """
-        # Round radius to nearest 0.5 to limit cache size
-        cache_key = round(radius * 2) / 2
-        
-        if cache_key not in self._sphere_cache:
-            r = max(1, int(np.ceil(cache_key)))
-            
-            # Create coordinate grids for a box
-            size = 2 * r + 1
-            center = r
-            zz, yy, xx = np.ogrid[-r:r+1, -r:r+1, -r:r+1]
-            
-            # Create sphere mask
-            dist_sq = zz**2 + yy**2 + xx**2
-            mask = dist_sq <= cache_key**2
-            
-            # Store the mask and its size info
-            self._sphere_cache[cache_key] = {
-                'mask': mask,
-                'radius_int': r,
-                'center': center
-            }
-        
-        return self._sphere_cache[cache_key]
-
-
-    def _draw_sphere_3d_cached(self, array, center, radius):
-        """Draw a filled sphere using cached mask (much faster)"""
-        sphere_data = self._get_sphere_mask(radius)
-        mask = sphere_data['mask']
-        r = sphere_data['radius_int']
-        
-        z, y, x = center
-        
-        # Bounding box in the array
-        z_min = max(0, int(z - r))
-        z_max = min(array.shape[0], int(z + r + 1))
-        y_min = max(0, int(y - r))
-        y_max = min(array.shape[1], int(y + r + 1))
-        x_min = max(0, int(x - r))
-        x_max = min(array.shape[2], int(x + r + 1))
-        
-        # Calculate actual slice sizes
-        array_z_size = z_max - z_min
-        array_y_size = y_max - y_min
-        array_x_size = x_max - x_min
-        
-        # Skip if completely out of bounds
-        if array_z_size <= 0 or array_y_size <= 0 or array_x_size <= 0:
-            return
-        
-        # Calculate mask offset (where sphere center maps to in mask coords)
-        # Mask center is at index r
-        mask_z_start = max(0, r - int(z) + z_min)
-        mask_y_start = max(0, r - int(y) + y_min)
-        mask_x_start = max(0, r - int(x) + x_min)
-        
-        # Mask end is start + array size (ensure exact match)
-        mask_z_end = mask_z_start + array_z_size
-        mask_y_end = mask_y_start + array_y_size
-        mask_x_end = mask_x_start + array_x_size
-        
-        # Clip mask if it goes beyond mask boundaries
-        mask_z_end = min(mask_z_end, mask.shape[0])
-        mask_y_end = min(mask_y_end, mask.shape[1])
-        mask_x_end = min(mask_x_end, mask.shape[2])
-        
-        # Recalculate array slice to match actual mask slice
-        actual_z_size = mask_z_end - mask_z_start
-        actual_y_size = mask_y_end - mask_y_start
-        actual_x_size = mask_x_end - mask_x_start
-        
-        z_max = z_min + actual_z_size
-        y_max = y_min + actual_y_size
-        x_max = x_min + actual_x_size
-        
-        # Now they should match!
-        try:
-            array[z_min:z_max, y_min:y_max, x_min:x_max] |= \
-                mask[mask_z_start:mask_z_end, mask_y_start:mask_y_end, mask_x_start:mask_x_end]
-        except ValueError as e:
-            # Debug info if it still fails
-            print(f"WARNING: Sphere drawing mismatch at pos ({z:.1f},{y:.1f},{x:.1f}), radius {radius}")
-            print(f"  Array slice: {array[z_min:z_max, y_min:y_max, x_min:x_max].shape}")
-            print(f"  Mask slice: {mask[mask_z_start:mask_z_end, mask_y_start:mask_y_end, mask_x_start:mask_x_end].shape}")
-            # Skip this sphere rather than crash
-            pass
-
-
     def draw_vessel_lines_optimized(self, G, shape):
         """
         OPTIMIZED: Reconstruct vessel structure by drawing tapered cylinders
-        Uses sphere caching for ~5-10x speedup
+        All cylinders and spheres are drawn in batched parallel passes
         """
         result = np.zeros(shape, dtype=np.uint8)
         
-        # Draw cylinders between connected kernels
-        for i, j in G.edges():
-            pos_i = G.nodes[i]['pos']
-            pos_j = G.nodes[j]['pos']
-            radius_i = G.nodes[i]['radius']
-            radius_j = G.nodes[j]['radius']
-            
-            # Draw tapered cylinder (using cached sphere method)
-            self._draw_cylinder_3d_cached(result, pos_i, pos_j, radius_i, radius_j)
+        # Draw cylinders between connected kernels (all edges in one parallel batch)
+        edges = list(G.edges())
+        if edges:
+            starts = np.array([G.nodes[i]['pos'] for i, j in edges], dtype=np.float64)
+            ends = np.array([G.nodes[j]['pos'] for i, j in edges], dtype=np.float64)
+            radii_i = np.array([G.nodes[i]['radius'] for i, j in edges], dtype=np.float64)
+            radii_j = np.array([G.nodes[j]['radius'] for i, j in edges], dtype=np.float64)
+            rasterize.draw_cylinders(result, starts, ends, radii_i, radii_j, value=1)
         
         # Also draw spheres at kernel centers to ensure continuity
-        for node in G.nodes():
-            pos = G.nodes[node]['pos']
-            radius = G.nodes[node]['radius']
-            self._draw_sphere_3d_cached(result, pos, radius)
+        nodes = list(G.nodes())
+        if nodes:
+            centers = np.array([G.nodes[node]['pos'] for node in nodes], dtype=np.float64)
+            radii = np.array([G.nodes[node]['radius'] for node in nodes], dtype=np.float64)
+            rasterize.draw_spheres(result, centers, radii, value=1)
         
         return result
 
 
-    def _draw_cylinder_3d_cached(self, array, pos1, pos2, radius1, radius2):
-        """
-        Draw a tapered cylinder using cached sphere masks
-        This is much faster than recomputing sphere masks each time
-        """
-        distance = np.linalg.norm(pos2 - pos1)
-        if distance < 0.5:
-            self._draw_sphere_3d_cached(array, pos1, max(radius1, radius2))
-            return
-        
-        # Adaptive sampling: more samples for large radius changes
-        radius_change = abs(radius2 - radius1)
-        samples_per_unit = 2.0  # Default: 2 samples per voxel
-        if radius_change > 2:
-            samples_per_unit = 3.0  # More samples for tapered vessels
-        
-        num_samples = max(3, int(distance * samples_per_unit))
-        t_values = np.linspace(0, 1, num_samples)
-        
-        # Interpolate and draw
-        for t in t_values:
-            pos = pos1 * (1 - t) + pos2 * t
-            radius = radius1 * (1 - t) + radius2 * t
-            self._draw_sphere_3d_cached(array, pos, radius)
-
     def select_kernel_points_topology(self, skeleton):
         """
         Topology-aware kernel selection.
@@ -1007,12 +889,12 @@ class VesselDenoiser:
         """Reconstruct vessel structure by drawing lines between connected kernels"""
         result = np.zeros(shape, dtype=np.uint8)
         
-        for i, j in G.edges():
-            pos_i = G.nodes[i]['pos']
-            pos_j = G.nodes[j]['pos']
-            
-            # Draw line between kernels
-            self._draw_line_3d(result, pos_i, pos_j)
+        # Draw lines between kernels
+        edges = list(G.edges())
+        if edges:
+            starts = np.array([G.nodes[i]['pos'] for i, j in edges], dtype=np.float64)
+            ends = np.array([G.nodes[j]['pos'] for i, j in edges], dtype=np.float64)
+            rasterize.draw_lines(result, starts, ends, value=1, clip=False, samples_per_unit=2)
         
         # Also mark kernel centers
         for node in G.nodes():
@@ -1026,7 +908,8 @@ class VesselDenoiser:
     def _draw_line_3d(self, array, pos1, pos2, num_points=None):
         """Draw a line in 3D array between two points"""
         if num_points is None:
-            num_points = int(np.linalg.norm(pos2 - pos1) * 2) + 1
+            rasterize.draw_lines(array, [pos1], [pos2], value=1, clip=False, samples_per_unit=2)
+            return
         
         t = np.linspace(0, 1, num_points)
         line_points = pos1[:, None] * (1 - t) + pos2[:, None] * t
@@ -2,12 +2,14 @@ import numpy as np
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
                               QSizePolicy, QApplication, QFileDialog,
                               QMessageBox, QMainWindow)
-from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QPointF
-from PyQt6.QtGui import QPainterPath, QPolygonF, QCloseEvent
+from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QRectF
+from PyQt6.QtGui import QCloseEvent
 import pyqtgraph as pg
 from pyqtgraph import ScatterPlotItem, PlotCurveItem
 import json
 import math
+from . import scatter_lod
+from . import point_select
 
 
 class FlowCytometryWidget(QWidget):
@@ -76,6 +78,13 @@ class FlowCytometryWidget(QWidget):
         self._normal_brush_list = None
         self._data_list = None
         self._base_point_size = 10.0
+        self._rgba = None
+
+        # --- level of detail for large point sets ---
+        self._lod = None                # scatter_lod.ScatterLOD
+        self._grid = None               # point_select.PointGrid (lasso hit-testing)
+        self._lod_mode = 'all'
+        self._shown_idx = None
 
         self._selected_brush = pg.mkBrush(255, 255, 0, 255)
         self._highlight_size_boost = 3.0
@@ -158,8 +167,15 @@ class FlowCytometryWidget(QWidget):
         self.plot.addItem(self.highlight_scatter)
         self.highlight_scatter.sigClicked.connect(self._on_highlight_node_clicked)
 
+        # density image, drawn instead of the base scatter when too many points are in view
+        self.density_item = pg.ImageItem(axisOrder='row-major')
+        self.density_item.setZValue(9)
+        self.density_item.hide()
+        self.plot.addItem(self.density_item)
+
         self.plot.scene().sigMouseClicked.connect(self._on_plot_clicked)
         self.plot.sigRangeChanged.connect(self._on_view_changed)
+        self.plot.vb.sigResized.connect(self._on_view_resized)
 
         layout.addWidget(self.graphics_widget, stretch=1)
 
@@ -351,27 +367,23 @@ class FlowCytometryWidget(QWidget):
             point_size = max(2, self.node_size * 0.25)
         self._base_point_size = float(point_size)
 
-        # Uniform colour (flow cytometry blue)
-        default_brush = pg.mkBrush(74, 144, 226, 180)
-        normal_brushes = [default_brush] * n
-
         self._pos_array = self.embedding.copy()
         self._size_array = np.full(n, point_size, dtype=np.float64)
-        self._normal_brush_list = list(normal_brushes)
-        self._brush_list = list(normal_brushes)
-        self._data_list = list(self.node_ids)
+        self._data_list = np.empty(n, dtype=object)
+        self._data_list[:] = self.node_ids
+        self._lod = scatter_lod.ScatterLOD(self._pos_array)
+        self._grid = point_select.PointGrid(self._pos_array)
+
+        # Uniform colour (flow cytometry blue)
+        self._rgba = scatter_lod.uniform_rgba(n, (74, 144, 226, 180))
+        self._normal_brush_list = scatter_lod.brushes(self._rgba, pg.mkBrush)
+        self._brush_list = self._normal_brush_list
 
         self.cached_node_to_index = {nid: i for i, nid in enumerate(self.node_ids)}
 
         self.highlight_scatter.clear()
 
-        self.scatter.setData(
-            pos=self._pos_array,
-            size=self._size_array,
-            brush=self._brush_list,
-            data=self._data_list,
-            pen=None,
-        )
+        self._flush_brushes()
         self.scatter.setZValue(10)
 
         self.rendered = True
@@ -423,14 +435,35 @@ class FlowCytometryWidget(QWidget):
 
     # ------------------------------------------------------- render helpers -
     def _flush_brushes(self):
-        if self._pos_array is not None:
-            self.scatter.setData(
-                pos=self._pos_array,
-                size=self._size_array,
-                brush=self._brush_list,
-                data=self._data_list,
-                pen=None,
-            )
+        if self._pos_array is None:
+            return
+        # Large point sets: only the points in view, or a density image if that is still too many
+        mode, payload = 'all', None
+        if self._lod is not None and self._lod.active:
+            (x0, x1), (y0, y1) = self.plot.viewRange()
+            rect = self.plot.vb.sceneBoundingRect()
+            point_size = float(self._size_array[0]) if len(self._size_array) else 0.0
+            mode, payload = self._lod.plan((x0, x1), (y0, y1), (rect.width(), rect.height()),
+                                           self._rgba, point_size)
+        self._lod_mode = mode
+        if mode == 'density':
+            image, (x, y, w, h) = payload
+            self.scatter.clear()
+            self._shown_idx = None
+            self.density_item.setImage(image, autoLevels=False, levels=(0, 255))
+            self.density_item.setRect(QRectF(x, y, w, h))
+            self.density_item.show()
+            return
+        self.density_item.hide()
+        idx = payload if mode == 'points' else slice(None)
+        self._shown_idx = payload
+        self.scatter.setData(
+            pos=self._pos_array[idx],
+            size=self._size_array[idx],
+            brush=self._brush_list[idx],
+            data=self._data_list[idx],
+            pen=None,
+        )
 
     def _render_nodes(self):
         if self._pos_array is None:
@@ -482,6 +515,14 @@ class FlowCytometryWidget(QWidget):
             if zoom_changed:
                 self.current_zoom_factor = zoom_factor
                 self._schedule_lod_update()
+            elif self._lod is not None and self._lod.active:
+                # Panning changes which points are in view
+                self._schedule_lod_update()
+
+    def _on_view_resized(self):
+        # The density image is binned to screen pixels
+        if self._lod is not None and self._lod.active:
+            self._schedule_lod_update()
 
     def _schedule_lod_update(self):
         if self._lod_timer is None:
@@ -505,20 +546,23 @@ class FlowCytometryWidget(QWidget):
             scale_factor = 1.0 + (math.sqrt(zf) - 1.0) * 1.0
         scale_factor = min(scale_factor, 8.0)
         new_size = self._base_point_size * scale_factor
+        self._size_array[:] = new_size
+        if self._lod is not None and self._lod.active:
+            self._flush_brushes()
+            if self.selected_nodes:
+                self._update_highlight_scatter()
+            return
         try:
             if (self.scatter.data is not None
                     and len(self.scatter.data) == len(self._size_array)):
-                self._size_array[:] = new_size
                 self.scatter.data['size'] = new_size
                 self.scatter.updateSpots()
                 self.scatter.prepareGeometryChange()
                 self.scatter.bounds = [None, None]
                 self.scatter.update()
             else:
-                self._size_array[:] = new_size
                 self._flush_brushes()
         except (AttributeError, TypeError):
-            self._size_array[:] = new_size
             self._flush_brushes()
         if self.selected_nodes:
             self._update_highlight_scatter()
@@ -575,10 +619,15 @@ class FlowCytometryWidget(QWidget):
         self.plot.setXRange(x_min - padding * xr, x_max + padding * xr, padding=0)
         self.plot.setYRange(y_min - padding * yr, y_max + padding * yr, padding=0)
 
+        # Large plots are drawn per view, so redraw for the new range
+        if self._lod is not None and self._lod.active:
+            self._flush_brushes()
+
     def _clear_plot(self):
         self._remove_loading_text()
         self.scatter.clear()
         self.highlight_scatter.clear()
+        self.density_item.hide()
 
         # Remove stray TextItems
         items_to_remove = [item for item in self.plot.items
@@ -603,6 +652,11 @@ class FlowCytometryWidget(QWidget):
         self._brush_list = None
         self._normal_brush_list = None
         self._data_list = None
+        self._rgba = None
+        self._lod = None
+        self._grid = None
+        self._lod_mode = 'all'
+        self._shown_idx = None
 
         if self._lod_timer is not None and self._lod_timer.isActive():
             self._lod_timer.stop()
@@ -693,54 +747,20 @@ class FlowCytometryWidget(QWidget):
         ys = [p.y() for p in self.lasso_points]
         self.lasso_path_item.setData(x=np.array(xs), y=np.array(ys))
 
-    @staticmethod
-    def _segments_intersect(p1, p2, p3, p4):
-        dx1 = p2[0] - p1[0]
-        dy1 = p2[1] - p1[1]
-        dx2 = p4[0] - p3[0]
-        dy2 = p4[1] - p3[1]
-        denom = dx1 * dy2 - dy1 * dx2
-        if abs(denom) < 1e-12:
-            return False, 0
-        dx3 = p3[0] - p1[0]
-        dy3 = p3[1] - p1[1]
-        t = (dx3 * dy2 - dy3 * dx2) / denom
-        u = (dx3 * dy1 - dy3 * dx1) / denom
-        if 0.0 <= t <= 1.0 and 0.0 <= u <= 1.0:
-            return True, u
-        return False, 0
-
     def _find_segment_crossing(self):
-        n = len(self.lasso_points)
-        if n < 6:
+        if len(self.lasso_points) < 6:
             return -1
-        a = self.lasso_points[-2]
-        b = self.lasso_points[-1]
-        seg_new = (a.x(), a.y()), (b.x(), b.y())
-        check_up_to = n - 5
-        for i in range(0, check_up_to):
-            c = self.lasso_points[i]
-            d = self.lasso_points[i + 1]
-            seg_old = (c.x(), c.y()), (d.x(), d.y())
-            hit, _ = self._segments_intersect(
-                seg_new[0], seg_new[1], seg_old[0], seg_old[1])
-            if hit:
-                return i
-        return -1
+        xy = np.array([(p.x(), p.y()) for p in self.lasso_points])
+        # Skips the last few segments to prevent self-crossing on tight curves
+        return point_select.first_crossing(xy)
 
     def _auto_close_lasso(self, crossing_segment_idx):
         if not self.is_lasso_selecting:
             return
         loop_points = self.lasso_points[crossing_segment_idx:]
         if len(loop_points) >= 3:
-            poly = QPolygonF([QPointF(p.x(), p.y()) for p in loop_points])
-            path = QPainterPath()
-            path.addPolygon(poly)
-            path.closeSubpath()
-            selected_in_lasso = []
-            for nid, pos in self.node_positions.items():
-                if path.contains(QPointF(float(pos[0]), float(pos[1]))):
-                    selected_in_lasso.append(nid)
+            polygon = np.array([(p.x(), p.y()) for p in loop_points])
+            selected_in_lasso = self._nodes_in_lasso(polygon)
             modifiers = QApplication.keyboardModifiers()
             ctrl = modifiers & Qt.KeyboardModifier.ControlModifier
             if not ctrl:
@@ -751,6 +771,12 @@ class FlowCytometryWidget(QWidget):
             self.node_selected.emit(list(self.selected_nodes))
         self._cleanup_lasso()
 
+    def _nodes_in_lasso(self, polygon):
+        """Node IDs inside the closed lasso *polygon* (Mx2 view coords)."""
+        if self._grid is None:
+            return []
+        return [self.node_ids[i] for i in self._grid.select_polygon(polygon)]
+
     def _cleanup_lasso(self):
         if self.lasso_path_item is not None:
             self.plot.removeItem(self.lasso_path_item)
@@ -771,14 +797,8 @@ class FlowCytometryWidget(QWidget):
             dy = scene_last.y() - scene_first.y()
             pixel_dist = math.sqrt(dx * dx + dy * dy)
             if pixel_dist < self.lasso_close_threshold:
-                poly = QPolygonF([QPointF(p.x(), p.y()) for p in self.lasso_points])
-                path = QPainterPath()
-                path.addPolygon(poly)
-                path.closeSubpath()
-                selected_in_lasso = []
-                for nid, pos in self.node_positions.items():
-                    if path.contains(QPointF(float(pos[0]), float(pos[1]))):
-                        selected_in_lasso.append(nid)
+                polygon = np.array([(p.x(), p.y()) for p in self.lasso_points])
+                selected_in_lasso = self._nodes_in_lasso(polygon)
                 modifiers = event.modifiers()
                 ctrl = modifiers & Qt.KeyboardModifier.ControlModifier
                 if not ctrl:
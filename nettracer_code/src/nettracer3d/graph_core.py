@@ -0,0 +1,288 @@
+import numpy as np
+import networkx as nx
+from numba import njit
+from scipy import sparse
+from scipy.sparse import csgraph
+from . import centrality_engine
+
+
+# Compact undirected graph for Network_3D. Nodes live in a sorted id array and are referred to by index,
+# unique edges are three flat arrays (endpoint indices and weight) and adjacency is a CSR (indptr, indices, edge ids) over them.
+# This costs a few tens of bytes per edge against several hundred for a networkx Graph, so degree, component, k-core, triangle,
+# BFS and subgraph queries run here and networkx graphs are only built when a caller asks for one.
+
+
+@njit(cache=True)
+def _bfs(indptr, indices, source, max_depth):
+    """Hop distance from source to every node, -1 where unreachable or beyond max_depth (max_depth < 0 means unlimited)"""
+    n = indptr.shape[0] - 1
+    dist = np.full(n, -1, dtype=np.int64)
+    queue = np.empty(n, dtype=np.int64)
+    dist[source] = 0
+    queue[0] = source
+    head = 0
+    tail = 1
+    while head < tail:
+        v = queue[head]
+        head += 1
+        if max_depth >= 0 and dist[v] >= max_depth:
+            continue
+        for p in range(indptr[v], indptr[v + 1]):
+            w = indices[p]
+            if dist[w] < 0:
+                dist[w] = dist[v] + 1
+                queue[tail] = w
+                tail += 1
+    return dist
+
+
+@njit(cache=True)
+def _core_number(indptr, indices):
+    """Batagelj-Zaversnik O(m) k-core decomposition, ignoring self-loops"""
+    n = indptr.shape[0] - 1
+    deg = np.zeros(n, dtype=np.int64)
+    for v in range(n):
+        for p in range(indptr[v], indptr[v + 1]):
+            if indices[p] != v:
+                deg[v] += 1
+    if n == 0:
+        return deg
+
+    max_deg = deg.max()
+    bins = np.zeros(max_deg + 1, dtype=np.int64)
+    for v in range(n):
+        bins[deg[v]] += 1
+    start = 0
+    for d in range(max_deg + 1):
+        count = bins[d]
+        bins[d] = start
+        start += count
+
+    pos = np.empty(n, dtype=np.int64)
+    vert = np.empty(n, dtype=np.int64)
+    for v in range(n):
+        pos[v] = bins[deg[v]]
+        vert[pos[v]] = v
+        bins[deg[v]] += 1
+    for d in range(max_deg, 0, -1):
+        bins[d] = bins[d - 1]
+    bins[0] = 0
+
+    # Peel nodes in order of current degree, moving each neighbor down one bin
+    for i in range(n):
+        v = vert[i]
+        for p in range(indptr[v], indptr[v + 1]):
+            u = indices[p]
+            if u == v or deg[u] <= deg[v]:
+                continue
+            du = deg[u]
+            pu = pos[u]
+            pw = bins[du]
+            w = vert[pw]
+            if u != w:
+                pos[u] = pw
+                vert[pu] = w
+                pos[w] = pu
+                vert[pw] = u
+            bins[du] += 1
+            deg[u] -= 1
+    return deg
+
+
+def _index_dtype(count):
+    return np.int32 if count < np.iinfo(np.int32).max else np.int64
+
+
+class CompactGraph:
+    """
+    Undirected weighted graph stored as flat arrays.
+
+    Attributes:
+    -----------
+    node_ids : ndarray
+        Sorted node ids. Node index i refers to node_ids[i].
+    node_order : ndarray
+        Node indices in the order nodes were first seen, used to give networkx graphs the same node order as before
+    edge_u, edge_v : ndarray
+        Endpoint indices of each unique edge (edge_u <= edge_v), in the order edges were first seen
+    weights : ndarray
+        Weight of each unique edge (the number of times the pair appears in network_lists)
+    indptr, indices, edge_ids : ndarray
+        CSR adjacency. Row i lists the neighbors of node i and the edge id joining them. Self-loops are listed once.
+    """
+
+    def __init__(self, node_ids, node_order, edge_u, edge_v, weights):
+        self.node_ids = node_ids
+        self.node_order = node_order
+        self.edge_u = edge_u
+        self.edge_v = edge_v
+        self.weights = weights
+        self._build_csr()
+
+    def _build_csr(self):
+        n = len(self.node_ids)
+        itype = _index_dtype(max(n, len(self.edge_u)))
+        edge_ids = np.arange(len(self.edge_u), dtype=itype)
+        other = self.edge_u != self.edge_v
+        rows = np.concatenate((self.edge_u, self.edge_v[other]))
+        cols = np.concatenate((self.edge_v, self.edge_u[other]))
+        eids = np.concatenate((edge_ids, edge_ids[other]))
+        order = np.lexsort((cols, rows))
+        self.indices = cols[order].astype(itype)
+        self.edge_ids = eids[order].astype(itype)
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=n)))).astype(np.int64)
+
+    @classmethod
+    def from_lists(cls, network_lists):
+        """
+        Build from Network_3D.network_lists ([node_a list, node_b list, edge list]). Repeated pairs become one edge whose
+        weight is the repeat count, exactly as network_analysis.weighted_network weighs them.
+        """
+        a = np.asarray(network_lists[0])
+        b = np.asarray(network_lists[1])
+        m = len(a)
+        if m == 0:
+            empty = np.zeros(0, dtype=np.int32)
+            return cls(np.zeros(0, dtype=np.int64), empty, empty, empty, empty)
+
+        # (min, max) pairs interleaved as weighted_network adds them, so first appearance gives its node order
+        pairs = np.empty(2 * m, dtype=np.result_type(a, b))
+        pairs[0::2] = np.minimum(a, b)
+        pairs[1::2] = np.maximum(a, b)
+        node_ids, first, inverse = np.unique(pairs, return_index=True, return_inverse=True)
+        n = len(node_ids)
+        itype = _index_dtype(n)
+        inverse = inverse.astype(np.int64)
+        node_order = inverse[np.sort(first)].astype(itype)
+
+        key = inverse[0::2] * n + inverse[1::2]
+        uniq, first_edge, weights = np.unique(key, return_index=True, return_counts=True)
+        seen = np.argsort(first_edge, kind='stable')
+        uniq = uniq[seen]
+        return cls(node_ids, node_order, (uniq // n).astype(itype), (uniq % n).astype(itype), weights[seen].astype(np.int32))
+
+    @classmethod
+    def from_networkx(cls, G, weight='weight'):
+        """Build from a networkx graph. Parallel edges of multigraphs add up into one weighted edge."""
+        order_ids = list(G.nodes())
+        node_ids = np.unique(np.asarray(order_ids))
+        n = len(node_ids)
+        itype = _index_dtype(n)
+        node_order = np.searchsorted(node_ids, np.asarray(order_ids)).astype(itype)
+        if G.number_of_edges() == 0:
+            empty = np.zeros(0, dtype=itype)
+            return cls(node_ids, node_order, empty, empty, np.zeros(0, dtype=np.int32))
+
+        u, v, w = zip(*G.edges(data=weight, default=1))
+        u = np.searchsorted(node_ids, np.asarray(u))
+        v = np.searchsorted(node_ids, np.asarray(v))
+        w = np.asarray(w)
+        lo = np.minimum(u, v).astype(np.int64)
+        hi = np.maximum(u, v).astype(np.int64)
+        key = lo * n + hi
+        uniq, first_edge, inverse = np.unique(key, return_index=True, return_inverse=True)
+        weights = np.bincount(inverse, weights=w, minlength=len(uniq))
+        if np.issubdtype(w.dtype, np.integer):
+            weights = weights.astype(np.int32)
+        seen = np.argsort(first_edge, kind='stable')
+        uniq = uniq[seen]
+        return cls(node_ids, node_order, (uniq // n).astype(itype), (uniq % n).astype(itype), weights[seen])
+
+    def to_networkx(self):
+        """networkx Graph with a 'weight' attribute on every edge, nodes and edges in first-seen order"""
+        G = nx.Graph()
+        G.add_nodes_from(self.node_ids[self.node_order].tolist())
+        G.add_weighted_edges_from(zip(self.node_ids[self.edge_u].tolist(), self.node_ids[self.edge_v].tolist(), self.weights.tolist()))
+        return G
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return len(self.edge_u)
+
+    @property
+    def nbytes(self):
+        return sum(arr.nbytes for arr in (self.node_ids, self.node_order, self.edge_u, self.edge_v, self.weights,
+                                          self.indptr, self.indices, self.edge_ids))
+
+    def index(self, nodes):
+        """Node indices of node ids. Raises KeyError for ids not in the graph."""
+        nodes = np.asarray(nodes)
+        idx = np.searchsorted(self.node_ids, nodes)
+        idx = np.minimum(idx, max(self.num_nodes - 1, 0))
+        if self.num_nodes == 0 or np.any(self.node_ids[idx] != nodes):
+            raise KeyError(f"Node(s) not in graph: {nodes[self.node_ids[idx] != nodes] if self.num_nodes else nodes}")
+        return idx
+
+    def neighbors(self, node):
+        """Node ids adjacent to node"""
+        i = self.index(node)
+        return self.node_ids[self.indices[self.indptr[i]:self.indptr[i + 1]]]
+
+    def csr(self, weighted=True):
+        """scipy CSR adjacency, with weights or as a binary structure. Self-loops sit once on the diagonal."""
+        data = self.weights[self.edge_ids].astype(np.float64) if weighted else np.ones(len(self.indices))
+        n = self.num_nodes
+        return sparse.csr_array((data, self.indices, self.indptr), shape=(n, n))
+
+    def degree(self, weighted=False):
+        """
+        Degree of every node (by index). Unweighted counts distinct neighbors, weighted sums edge weights, which equals the degree
+        of the multigraph convert_to_multigraph would build. Self-loops count twice, as in networkx.
+        """
+        loops = self.edge_u[self.edge_u == self.edge_v]
+        if weighted:
+            per_entry = self.weights[self.edge_ids]
+            rows = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+            deg = np.bincount(rows, weights=per_entry, minlength=self.num_nodes)
+            deg += np.bincount(loops, weights=self.weights[self.edge_u == self.edge_v], minlength=self.num_nodes)
+            if np.issubdtype(self.weights.dtype, np.integer):
+                deg = deg.astype(np.int64)
+            return deg
+        return np.diff(self.indptr) + np.bincount(loops, minlength=self.num_nodes)
+
+    def degree_dict(self, weighted=False):
+        return dict(zip(self.node_ids.tolist(), self.degree(weighted).tolist()))
+
+    def connected_components(self):
+        """Number of components and the component label of every node (by index)"""
+        return csgraph.connected_components(self.csr(weighted=False), directed=False)
+
+    def components(self):
+        """Node id arrays of every connected component, largest first"""
+        n_comp, labels = self.connected_components()
+        sizes = np.bincount(labels, minlength=n_comp)
+        order = np.argsort(labels, kind='stable')
+        groups = np.split(self.node_ids[order], np.cumsum(sizes)[:-1])
+        return [groups[c] for c in np.argsort(-sizes, kind='stable')]
+
+    def component_of(self, node):
+        """Node ids in the same connected component as node"""
+        dist = self.bfs(node)
+        return self.node_ids[dist >= 0]
+
+    def core_number(self):
+        """k-core number of every node (by index), self-loops ignored"""
+        return _core_number(self.indptr, self.indices)
+
+    def triangles(self):
+        """Triangles through every node (by index), self-loops ignored"""
+        return centrality_engine.triangles(self.csr(weighted=False)).astype(np.int64)
+
+    def bfs(self, source, max_depth=None):
+        """Hop distances from the source node id to every node (by index), -1 if unreachable or beyond max_depth"""
+        return _bfs(self.indptr, self.indices, int(self.index(source)), -1 if max_depth is None else int(max_depth))
+
+    def subgraph(self, nodes):
+        """Induced subgraph on the given node ids"""
+        keep = np.zeros(self.num_nodes, dtype=bool)
+        keep[self.index(np.unique(np.asarray(nodes)))] = True
+        remap = np.cumsum(keep) - 1
+        edges = keep[self.edge_u] & keep[self.edge_v]
+        itype = self.edge_u.dtype
+        order = self.node_order[keep[self.node_order]]
+        return CompactGraph(self.node_ids[keep], remap[order].astype(itype), remap[self.edge_u[edges]].astype(itype),
+                            remap[self.edge_v[edges]].astype(itype), self.weights[edges])
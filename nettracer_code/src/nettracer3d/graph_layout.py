@@ -0,0 +1,420 @@
+import numpy as np
+import numba
+from numba import njit, prange
+from scipy import sparse
+from scipy.sparse import csgraph
+from . import community_engine
+
+
+# Force-directed (Fruchterman-Reingold) layout for the network graph widget, on CSR adjacency arrays.
+# Repulsion is Barnes-Hut: nodes are bucketed into a quadtree stored as one dense grid per level, and a node feels a whole cell
+# as a single body at the cell's center of mass once the cell looks small enough from where the node is. Attraction runs over
+# the edge list only. Every node sums its own forces, so the parallel loops never write to shared memory.
+# Large graphs are laid out multilevel: edges are contracted by matching until the graph is small, the coarsest graph is laid
+# out from scratch and each finer level starts from its parent's positions and only needs a short, cool refinement.
+# A layout can also be warm-started from previous positions, in which case only the refinement runs. Callers keep the node
+# and edge sets (graph_key) a layout was computed for, so that an unchanged graph reuses it as is and only an edit of it, not
+# an unrelated graph that happens to share node ids, warm-starts from it.
+
+_MAX_DEPTH = 10             # Finest quadtree level (4^10 leaf cells)
+_COARSEST = 1000            # Coarsening stops below this many nodes...
+_MIN_SHRINK = 0.8           # ...or when a round of matching keeps more than this fraction of them
+
+
+@njit(cache=True)
+def _build_tree(pos, mass, depth):
+    """
+    Quadtree over the bounding square of pos, one dense level of 4^l cells per level l (row-major, 2^l cells per side),
+    all levels stacked in one array starting at (4^l - 1) / 3. Leaves list their nodes through leaf_start / leaf_order.
+    """
+    n = pos.shape[0]
+    lo_x = pos[:, 0].min()
+    lo_y = pos[:, 1].min()
+    side = max(pos[:, 0].max() - lo_x, pos[:, 1].max() - lo_y) * (1.0 + 1e-9) + 1e-12
+    per_side = 1 << depth
+    n_leaves = per_side * per_side
+    n_cells = (4 * n_leaves - 1) // 3
+    leaf_base = (n_leaves - 1) // 3
+
+    cell_m = np.zeros(n_cells)
+    cell_x = np.zeros(n_cells)
+    cell_y = np.zeros(n_cells)
+    leaf = np.empty(n, dtype=np.int64)
+    leaf_start = np.zeros(n_leaves + 1, dtype=np.int64)
+    for i in range(n):
+        ix = min(int((pos[i, 0] - lo_x) / side * per_side), per_side - 1)
+        iy = min(int((pos[i, 1] - lo_y) / side * per_side), per_side - 1)
+        leaf[i] = iy * per_side + ix
+        leaf_start[leaf[i] + 1] += 1
+        c = leaf_base + leaf[i]
+        cell_m[c] += mass[i]
+        cell_x[c] += mass[i] * pos[i, 0]
+        cell_y[c] += mass[i] * pos[i, 1]
+    for c in range(n_leaves):
+        leaf_start[c + 1] += leaf_start[c]
+    fill = leaf_start[:-1].copy()
+    leaf_order = np.empty(n, dtype=np.int64)
+    for i in range(n):
+        leaf_order[fill[leaf[i]]] = i
+        fill[leaf[i]] += 1
+
+    # Parents sum their four children, finest level first
+    for level in range(depth - 1, -1, -1):
+        w = 1 << level
+        base = ((1 << (2 * level)) - 1) // 3
+        child_base = ((1 << (2 * level + 2)) - 1) // 3
+        for cy in range(w):
+            for cx in range(w):
+                p = base + cy * w + cx
+                for dy in range(2):
+                    for dx in range(2):
+                        ch = child_base + (2 * cy + dy) * (2 * w) + 2 * cx + dx
+                        cell_m[p] += cell_m[ch]
+                        cell_x[p] += cell_x[ch]
+                        cell_y[p] += cell_y[ch]
+    for c in range(n_cells):
+        if cell_m[c] > 0:
+            cell_x[c] /= cell_m[c]
+            cell_y[c] /= cell_m[c]
+    return side, cell_m, cell_x, cell_y, leaf_start, leaf_order
+
+
+@njit(cache=True, parallel=True)
+def _forces(pos, mass, indptr, indices, weights, k, theta, depth, n_chunks):
+    """Displacement of every node: Barnes-Hut repulsion (k^2 m / d) plus attraction along its edges (w d^2 / k)"""
+    n = pos.shape[0]
+    side, cell_m, cell_x, cell_y, leaf_start, leaf_order = _build_tree(pos, mass, depth)
+    leaf_base = ((1 << (2 * depth)) - 1) // 3
+    k2 = k * k
+    min_d2 = (1e-3 * k) ** 2
+    theta2 = theta * theta
+    disp = np.zeros((n, 2))
+
+    for chunk in prange(n_chunks):
+        start = (n * chunk) // n_chunks
+        end = (n * (chunk + 1)) // n_chunks
+        stack_level = np.empty(3 * depth + 4, dtype=np.int64)
+        stack_cell = np.empty(3 * depth + 4, dtype=np.int64)
+        for i in range(start, end):
+            xi = pos[i, 0]
+            yi = pos[i, 1]
+            fx = 0.0
+            fy = 0.0
+            stack_level[0] = 0
+            stack_cell[0] = 0
+            top = 1
+            while top > 0:
+                top -= 1
+                level = stack_level[top]
+                cell = stack_cell[top]
+                base = ((1 << (2 * level)) - 1) // 3
+                m = cell_m[base + cell]
+                if m == 0.0:
+                    continue
+                dx = xi - cell_x[base + cell]
+                dy = yi - cell_y[base + cell]
+                d2 = max(dx * dx + dy * dy, min_d2)
+                size = side / (1 << level)
+                if size * size < theta2 * d2:
+                    # Far enough to count as one body
+                    f = k2 * m / d2
+                    fx += dx * f
+                    fy += dy * f
+                elif level == depth:
+                    leaf = base + cell - leaf_base
+                    for q in range(leaf_start[leaf], leaf_start[leaf + 1]):
+                        j = leaf_order[q]
+                        if j == i:
+                            continue
+                        ex = xi - pos[j, 0]
+                        ey = yi - pos[j, 1]
+                        e2 = max(ex * ex + ey * ey, min_d2)
+                        f = k2 * mass[j] / e2
+                        fx += ex * f
+                        fy += ey * f
+                else:
+                    w = 1 << level
+                    cy = cell // w
+                    cx = cell - cy * w
+                    for sy in range(2):
+                        for sx in range(2):
+                            stack_level[top] = level + 1
+                            stack_cell[top] = (2 * cy + sy) * (2 * w) + 2 * cx + sx
+                            top += 1
+
+            for p in range(indptr[i], indptr[i + 1]):
+                j = indices[p]
+                ex = xi - pos[j, 0]
+                ey = yi - pos[j, 1]
+                d = np.sqrt(ex * ex + ey * ey)
+                f = weights[p] * d / k
+                fx -= ex * f
+                fy -= ey * f
+            disp[i, 0] = fx
+            disp[i, 1] = fy
+    return disp
+
+
+@njit(cache=True)
+def _match(indptr, indices, weights, mass, order):
+    """
+    Greedy edge matching for coarsening: each unmatched node (in the given order) merges with the unmatched neighbor it shares
+    the heaviest edge with, per unit of combined mass, so coarse nodes stay balanced. Returns the coarse node of every node.
+    """
+    n = order.shape[0]
+    parent = np.full(n, -1, dtype=np.int64)
+    n_coarse = 0
+    for i in order:
+        if parent[i] >= 0:
+            continue
+        best = -1
+        best_score = 0.0
+        for p in range(indptr[i], indptr[i + 1]):
+            j = indices[p]
+            if parent[j] >= 0 or j == i:
+                continue
+            score = weights[p] / (mass[i] + mass[j])
+            if score > best_score:
+                best = j
+                best_score = score
+        parent[i] = n_coarse
+        if best >= 0:
+            parent[best] = n_coarse
+        n_coarse += 1
+    return parent, n_coarse
+
+
+def _tree_depth(n):
+    """About one node per leaf cell"""
+    return int(min(_MAX_DEPTH, max(1, np.ceil(np.log(max(n, 2)) / np.log(4)))))
+
+
+def _relax(pos, mass, indptr, indices, weights, k, iterations, t0, theta):
+    """Cooling schedule of the original numpy layout: steps capped at t, with t falling linearly from t0"""
+    n = pos.shape[0]
+    if n < 2:
+        return pos
+    depth = _tree_depth(n)
+    n_chunks = max(1, min(4 * numba.get_num_threads(), n))
+    t = t0
+    dt = t0 / (iterations + 1)
+    for _ in range(iterations):
+        disp = _forces(pos, mass, indptr, indices, weights, k, theta, depth, n_chunks)
+        length = np.maximum(np.sqrt((disp ** 2).sum(axis=1, keepdims=True)), 0.01 * k)
+        pos += disp * np.minimum(t / length, 1.0)
+        t -= dt
+    return pos
+
+
+def _coarsen(A, mass, rng):
+    """One round of matching. Returns (parent, coarse adjacency, coarse masses)"""
+    order = rng.permutation(A.shape[0]).astype(np.int64)
+    parent, n_coarse = _match(A.indptr, A.indices, A.data, mass, order)
+    coo = A.tocoo()
+    cu = parent[coo.row]
+    cv = parent[coo.col]
+    keep = cu != cv
+    # Edges merged into one coarse edge add up their weights
+    coarse = sparse.csr_array((coo.data[keep], (cu[keep], cv[keep])), shape=(n_coarse, n_coarse))
+    coarse.sum_duplicates()
+    return parent, coarse, np.bincount(parent, weights=mass, minlength=n_coarse)
+
+
+def _normalize(pos):
+    """Centered, with the largest coordinate at +-1 (the scale networkx layouts come in)"""
+    pos -= pos.mean(axis=0)
+    lim = np.abs(pos).max() if len(pos) else 0.0
+    if lim > 0:
+        pos /= lim
+    return pos
+
+
+def spring_layout(A, pos0=None, iterations=50, theta=0.9, multilevel=True, seed=42):
+    """
+    Force-directed layout of one graph.
+
+    Parameters:
+    -----------
+    A : scipy.sparse.csr_array
+        Symmetric adjacency with the edge weights and no self-loops
+    pos0 : ndarray, optional
+        (N, 2) starting positions. Rows that are NaN are placed at the mean of their placed neighbors. When given, the
+        layout only refines them instead of starting over.
+    iterations : int
+        Iterations at the coarsest level (and for a layout from scratch); refinements run half as many
+    theta : float
+        Barnes-Hut opening criterion, cell size over distance. 0 computes every pair exactly.
+    multilevel : bool
+        Coarsen large graphs before laying them out
+    seed : int
+        Random seed for the initial positions and the matching order
+
+    Returns:
+    --------
+    ndarray
+        (N, 2) positions, centered and scaled to [-1, 1]
+    """
+    n = A.shape[0]
+    if n == 0:
+        return np.zeros((0, 2))
+    if n == 1:
+        return np.zeros((1, 2))
+    rng = np.random.default_rng(seed)
+    A = sparse.csr_array(A, dtype=np.float64)
+    A.sort_indices()
+    # Same natural edge length as networkx and the old layout; the layout starts in (and roughly keeps to) a unit square
+    k = np.sqrt(1.0 / n)
+    refine = max(iterations // 2, 1)
+
+    if pos0 is not None:
+        pos = _warm_start(A, np.array(pos0, dtype=np.float64), rng)
+        pos = _relax(pos, np.ones(n), A.indptr, A.indices, A.data, k, refine, min(0.1, 4 * k), theta)
+        return _normalize(pos)
+
+    # Coarsen until the graph is small or stops shrinking
+    levels = []
+    graph, mass = A, np.ones(n)
+    while multilevel and graph.shape[0] > _COARSEST:
+        parent, coarse, coarse_mass = _coarsen(graph, mass, rng)
+        if coarse.shape[0] > _MIN_SHRINK * graph.shape[0]:
+            break
+        levels.append((graph, mass, parent))
+        graph, mass = coarse, coarse_mass
+
+    pos = rng.random((graph.shape[0], 2))
+    pos = _relax(pos, mass, graph.indptr, graph.indices, graph.data, k, iterations, 0.1, theta)
+    for graph, mass, parent in reversed(levels):
+        # Children start on their parent, nudged apart so coincident nodes have a direction to repel along
+        pos = pos[parent] + (rng.random((len(parent), 2)) - 0.5) * k
+        t0 = min(0.1, 4 * k * np.sqrt(mass.mean()))
+        pos = _relax(pos, mass, graph.indptr, graph.indices, graph.data, k, refine, t0, theta)
+    return _normalize(pos)
+
+
+def _warm_start(A, pos, rng):
+    """Previous positions rescaled to a unit square, with missing (NaN) rows filled from their placed neighbors"""
+    n = len(pos)
+    known = ~np.isnan(pos).any(axis=1)
+    if not known.any():
+        return rng.random((n, 2))
+    lo = pos[known].min(axis=0)
+    extent = (pos[known].max(axis=0) - lo).max()
+    pos[known] = (pos[known] - lo) / (extent if extent > 0 else 1.0)
+    missing = np.flatnonzero(~known)
+    if len(missing):
+        B = A[missing][:, np.flatnonzero(known)]
+        count = np.asarray(B.sum(axis=1)).reshape(-1)
+        mean = (B @ pos[known]) / np.maximum(count, 1e-12)[:, None]
+        jitter = (rng.random((len(missing), 2)) - 0.5) * np.sqrt(1.0 / n)
+        pos[missing] = np.where(count[:, None] > 0, mean, rng.random((len(missing), 2))) + jitter
+    return pos
+
+
+def _layout_adjacency(G, nodes):
+    _, A = community_engine.graph_to_csr(G, weight=None, nodes=nodes)
+    A.setdiag(0)
+    A.eliminate_zeros()
+    # Parallel edges pull like a single edge, as in the old layout
+    A.data[:] = 1.0
+    return sparse.csr_array(A)
+
+
+def _previous_positions(nodes, previous):
+    """Starting positions from an earlier layout, or None if it covers less than half of the nodes"""
+    if not previous:
+        return None
+    pos0 = np.full((len(nodes), 2), np.nan)
+    hits = 0
+    for i, node in enumerate(nodes):
+        p = previous.get(node)
+        if p is not None:
+            pos0[i] = p
+            hits += 1
+    return pos0 if 2 * hits >= len(nodes) else None
+
+
+def graph_key(G):
+    """(node set, edge set) of a networkx graph, edges as unordered pairs, identifying it for layout reuse"""
+    return frozenset(G.nodes()), frozenset(frozenset(edge) for edge in G.edges())
+
+
+def is_edit(key, previous_key, min_shared=0.5):
+    """
+    Whether the graph of key looks like an edit of the graph of previous_key: they share at least min_shared of the union of
+    their edges (of their nodes, if neither has edges). Graphs with integer node ids nearly always share nodes, so edges decide.
+    """
+    nodes, edges = key
+    old_nodes, old_edges = previous_key
+    if edges or old_edges:
+        return len(edges & old_edges) >= min_shared * len(edges | old_edges)
+    return len(nodes & old_nodes) >= min_shared * len(nodes | old_nodes)
+
+
+def graph_spring_layout(G, nodes=None, previous=None, separate_components=False, iterations=50, seed=42):
+    """
+    Spring layout of a networkx graph.
+
+    Parameters:
+    -----------
+    G : networkx.Graph
+        The graph. Edge weights are ignored.
+    nodes : list, optional
+        Node order. Defaults to G.nodes() order.
+    previous : dict, optional
+        {node: (x, y)} from an earlier layout of a similar graph. If it covers at least half of the nodes, they keep their
+        arrangement, new nodes are placed among their neighbors and the layout is only refined.
+    separate_components : bool
+        Lay out every connected component on its own and arrange them in a grid
+    iterations : int
+        Iterations per layout from scratch
+    seed : int
+        Random seed
+
+    Returns:
+    --------
+    dict
+        {node: ndarray([x, y])}
+    """
+    if nodes is None:
+        nodes = list(G.nodes())
+    n = len(nodes)
+    if n == 0:
+        return {}
+    A = _layout_adjacency(G, nodes)
+    pos0 = _previous_positions(nodes, previous)
+    if not separate_components:
+        pos = spring_layout(A, pos0, iterations, seed=seed)
+        return dict(zip(nodes, pos))
+
+    n_comp, labels = csgraph.connected_components(A, directed=False)
+    if n_comp == 1:
+        pos = spring_layout(A, pos0, iterations, seed=seed)
+        return dict(zip(nodes, pos))
+
+    # Components in order of their first node, as networkx lists them
+    order = np.argsort(labels, kind='stable')
+    bounds = np.searchsorted(labels[order], np.arange(n_comp + 1))
+    pos = np.zeros((n, 2))
+    for c in range(n_comp):
+        members = order[bounds[c]:bounds[c + 1]]
+        if len(members) == 1:
+            continue
+        sub = A[members][:, members]
+        sub_pos0 = pos0[members] if pos0 is not None else None
+        if sub_pos0 is not None and np.isnan(sub_pos0).all():
+            sub_pos0 = None
+        pos[members] = spring_layout(sub, sub_pos0, iterations, seed=seed + len(members))
+
+    # Grid of cells 1.5 times the largest component, as the shell layout arranges components
+    lo = np.full((n_comp, 2), np.inf)
+    hi = np.full((n_comp, 2), -np.inf)
+    np.minimum.at(lo, labels, pos)
+    np.maximum.at(hi, labels, pos)
+    spacing = (hi - lo).max(axis=0) * 1.5
+    spacing[spacing == 0] = 1.0
+    grid_cols = int(np.ceil(np.sqrt(n_comp)))
+    cell = np.arange(n_comp)
+    offset = np.stack((cell % grid_cols, cell // grid_cols), axis=1) * spacing
+    pos += offset[labels]
+    pos -= pos.mean(axis=0)
+    return dict(zip(nodes, pos))
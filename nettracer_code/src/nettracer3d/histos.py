@@ -12,6 +12,8 @@ import pandas as pd
 import networkx as nx
 import matplotlib.pyplot as plt
 import os
+from . import centrality_engine
+from . import graph_core
 
 
 def convert_to_multigraph(G, weight_attr='weight'):
@@ -60,13 +62,65 @@ def convert_to_multigraph(G, weight_attr='weight'):
     return MG
 
 class HistogramSelector(QWidget):
-    def __init__(self, network_analysis_instance, stats_dict, G):
+    def __init__(self, network_analysis_instance, stats_dict, G, max_sources = None, time_budget = None):
         super().__init__()
         self.network_analysis = network_analysis_instance
         self.stats_dict = stats_dict
         self.G_unweighted = G
         self.G = convert_to_multigraph(G)
+        # Shortest path distribution, betweenness, closeness, eccentricity and harmonic centrality share one BFS sweep,
+        # optionally sampled (max_sources) or time limited (time_budget) for large networks
+        self.max_sources = max_sources
+        self.time_budget = time_budget
+        self._sweep = None
+        self._graph = None
         self.init_ui()
+
+    def _compact(self):
+        """Compact array copy of the network, built on first use, for the structural metrics that do not need networkx"""
+        if self._graph is None:
+            self._graph = graph_core.CompactGraph.from_networkx(self.G_unweighted)
+        return self._graph
+
+    def _path_sweep(self):
+        """Run the shared BFS sweep on first use and return the cached result"""
+        if self._sweep is None:
+            graph = self._compact()
+            self._sweep = centrality_engine.path_sweep(graph.csr(weighted=False), max_sources=self.max_sources, time_budget=self.time_budget)
+            if not self._sweep['exact']:
+                print(f"Path statistics estimated from {self._sweep['sources_used']} of {graph.num_nodes} BFS sources "
+                      f"(betweenness error bound {self._sweep['error_bounds']['betweenness']:.4f} at 95% confidence)")
+        return self._sweep
+
+    def _per_node(self, values):
+        """Map a per-node array (compact graph order) back onto node ids, in the network's node order"""
+        graph = self._compact()
+        order = graph.node_order
+        return dict(zip(graph.node_ids[order].tolist(), np.asarray(values)[order].tolist()))
+
+    def _path_length_distribution(self):
+        """Shortest path length counts (index = length, from 1) and the title suffix for disconnected graphs"""
+        sweep = self._path_sweep()
+        n_components = len(sweep['component_sizes'])
+        title_suffix = f" (across {n_components} components)" if n_components > 1 else ""
+        return sweep['distance_histogram'][1:], title_suffix
+
+    def _betweenness(self):
+        """Betweenness normalized within each component, as if every component were its own graph"""
+        sweep = self._path_sweep()
+        n_components = len(sweep['component_sizes'])
+        title_suffix = f" (across {n_components} components)" if n_components > 1 else ""
+        return self._per_node(centrality_engine.normalized_betweenness(sweep, per_component=True)), title_suffix
+
+    def _eccentricity(self):
+        """Eccentricity of every node, restricted to the largest component if the graph is disconnected"""
+        sweep = self._path_sweep()
+        eccentricity = self._per_node(sweep['eccentricity'])
+        if len(sweep['component_sizes']) > 1:
+            largest = np.argmax(sweep['component_sizes'])
+            in_largest = self._per_node(sweep['components'] == largest)
+            eccentricity = {node: ecc for node, ecc in eccentricity.items() if in_largest[node]}
+        return eccentricity
         
     def init_ui(self):
         self.setWindowTitle('Network Analysis - Histogram Selector')
@@ -200,59 +254,21 @@ class HistogramSelector(QWidget):
         try:
             # 1. Shortest Path Length Distribution
             print("Computing shortest path distribution...")
-            components = list(nx.connected_components(self.G))
-            if len(components) > 1:
-                all_path_lengths = []
-                max_diameter = 0
-                for component in components:
-                    subgraph = self.G.subgraph(component)
-                    if len(component) < 2:
-                        continue
-                    shortest_path_lengths = dict(nx.all_pairs_shortest_path_length(subgraph))
-                    component_diameter = max(nx.eccentricity(subgraph, sp=shortest_path_lengths).values())
-                    max_diameter = max(max_diameter, component_diameter)
-                    for pls in shortest_path_lengths.values():
-                        all_path_lengths.extend(list(pls.values()))
-                all_path_lengths = [pl for pl in all_path_lengths if pl > 0]
-                if all_path_lengths:
-                    path_lengths = np.zeros(max_diameter + 1, dtype=int)
-                    pl, cnts = np.unique(all_path_lengths, return_counts=True)
-                    path_lengths[pl] += cnts
-                    freq_percent = 100 * path_lengths[1:] / path_lengths[1:].sum()
-                    df = pd.DataFrame({
-                        'Path_Length': np.arange(1, max_diameter + 1),
-                        'Frequency_Percent': freq_percent
-                    })
-                    df.to_csv(os.path.join(csvs_path, 'shortest_path_distribution.csv'), index=False)
-                    
-                    # Generate and save plot
-                    fig, ax = plt.subplots(figsize=(15, 8))
-                    ax.bar(np.arange(1, max_diameter + 1), height=freq_percent)
-                    ax.set_title(f"Distribution of shortest path length in G (across {len(components)} components)", 
-                                fontdict={"size": 35}, loc="center")
-                    ax.set_xlabel("Shortest Path Length", fontdict={"size": 22})
-                    ax.set_ylabel("Frequency (%)", fontdict={"size": 22})
-                    plt.tight_layout()
-                    plt.savefig(os.path.join(graphs_path, 'shortest_path_distribution.png'), dpi=150, bbox_inches='tight')
-                    plt.close(fig)
-            else:
-                shortest_path_lengths = dict(nx.all_pairs_shortest_path_length(self.G))
-                diameter = max(nx.eccentricity(self.G, sp=shortest_path_lengths).values())
-                path_lengths = np.zeros(diameter + 1, dtype=int)
-                for pls in shortest_path_lengths.values():
-                    pl, cnts = np.unique(list(pls.values()), return_counts=True)
-                    path_lengths[pl] += cnts
-                freq_percent = 100 * path_lengths[1:] / path_lengths[1:].sum()
+            path_lengths, title_suffix = self._path_length_distribution()
+            if path_lengths.sum() > 0:
+                max_diameter = len(path_lengths)
+                freq_percent = 100 * path_lengths / path_lengths.sum()
                 df = pd.DataFrame({
-                    'Path_Length': np.arange(1, diameter + 1),
+                    'Path_Length': np.arange(1, max_diameter + 1),
                     'Frequency_Percent': freq_percent
                 })
                 df.to_csv(os.path.join(csvs_path, 'shortest_path_distribution.csv'), index=False)
                 
                 # Generate and save plot
                 fig, ax = plt.subplots(figsize=(15, 8))
-                ax.bar(np.arange(1, diameter + 1), height=freq_percent)
-                ax.set_title("Distribution of shortest path length in G", fontdict={"size": 35}, loc="center")
+                ax.bar(np.arange(1, max_diameter + 1), height=freq_percent)
+                ax.set_title(f"Distribution of shortest path length in G{title_suffix}", 
+                            fontdict={"size": 35}, loc="center")
                 ax.set_xlabel("Shortest Path Length", fontdict={"size": 22})
                 ax.set_ylabel("Frequency (%)", fontdict={"size": 22})
                 plt.tight_layout()
@@ -278,22 +294,7 @@ class HistogramSelector(QWidget):
             
             # 3. Betweenness Centrality
             print("Computing betweenness centrality...")
-            components = list(nx.connected_components(self.G))
-            if len(components) > 1:
-                combined_betweenness_centrality = {}
-                for component in components:
-                    if len(component) < 2:
-                        for node in component:
-                            combined_betweenness_centrality[node] = 0.0
-                        continue
-                    subgraph = self.G.subgraph(component)
-                    component_betweenness = nx.centrality.betweenness_centrality(subgraph)
-                    combined_betweenness_centrality.update(component_betweenness)
-                betweenness_centrality = combined_betweenness_centrality
-                title_suffix = f" (across {len(components)} components)"
-            else:
-                betweenness_centrality = nx.centrality.betweenness_centrality(self.G)
-                title_suffix = ""
+            betweenness_centrality, title_suffix = self._betweenness()
             df = pd.DataFrame(list(betweenness_centrality.items()), columns=['Node', 'Betweenness_Centrality'])
             df.to_csv(os.path.join(csvs_path, 'betweenness_centrality.csv'), index=False)
             
@@ -310,7 +311,7 @@ class HistogramSelector(QWidget):
             
             # 4. Closeness Centrality
             print("Computing closeness centrality...")
-            closeness_centrality = nx.centrality.closeness_centrality(self.G)
+            closeness_centrality = self._per_node(self._path_sweep()['closeness'])
             df = pd.DataFrame(list(closeness_centrality.items()), columns=['Node', 'Closeness_Centrality'])
             df.to_csv(os.path.join(csvs_path, 'closeness_centrality.csv'), index=False)
             
@@ -327,7 +328,7 @@ class HistogramSelector(QWidget):
             # 5. Eigenvector Centrality
             print("Computing eigenvector centrality...")
             try:
-                eigenvector_centrality = nx.centrality.eigenvector_centrality(self.G_unweighted)
+                eigenvector_centrality = self._per_node(centrality_engine.eigenvector_centrality(self._compact().csr(weighted=False)))
                 df = pd.DataFrame(list(eigenvector_centrality.items()), columns=['Node', 'Eigenvector_Centrality'])
                 df.to_csv(os.path.join(csvs_path, 'eigenvector_centrality.csv'), index=False)
                 
@@ -402,12 +403,7 @@ class HistogramSelector(QWidget):
             
             # 9. Eccentricity
             print("Computing eccentricity...")
-            if not nx.is_connected(self.G):
-                largest_cc = max(nx.connected_components(self.G), key=len)
-                G_cc = self.G.subgraph(largest_cc)
-                eccentricity = nx.eccentricity(G_cc)
-            else:
-                eccentricity = nx.eccentricity(self.G)
+            eccentricity = self._eccentricity()
             df = pd.DataFrame(list(eccentricity.items()), columns=['Node', 'Eccentricity'])
             df.to_csv(os.path.join(csvs_path, 'eccentricity.csv'), index=False)
             
@@ -423,7 +419,7 @@ class HistogramSelector(QWidget):
             
             # 10. K-Core
             print("Computing k-core decomposition...")
-            kcore = nx.core_number(self.G_unweighted)
+            kcore = self._per_node(self._compact().core_number())
             df = pd.DataFrame(list(kcore.items()), columns=['Node', 'K_Core'])
             df.to_csv(os.path.join(csvs_path, 'kcore.csv'), index=False)
             
@@ -439,7 +435,7 @@ class HistogramSelector(QWidget):
             
             # 11. Triangle Count
             print("Computing triangle count...")
-            triangles = nx.triangles(self.G)
+            triangles = self._per_node(self._compact().triangles())
             df = pd.DataFrame(list(triangles.items()), columns=['Node', 'Triangle_Count'])
             df.to_csv(os.path.join(csvs_path, 'triangle_count.csv'), index=False)
             
@@ -508,7 +504,7 @@ class HistogramSelector(QWidget):
             
             # 14. Harmonic Centrality
             print("Computing harmonic centrality...")
-            harmonic_centrality = nx.harmonic_centrality(self.G)
+            harmonic_centrality = self._per_node(self._path_sweep()['harmonic'])
             df = pd.DataFrame(list(harmonic_centrality.items()), columns=['Node', 'Harmonic_Centrality'])
             df.to_csv(os.path.join(csvs_path, 'harmonic_centrality.csv'), index=False)
             
@@ -633,60 +629,14 @@ class HistogramSelector(QWidget):
 
     def shortest_path_histogram(self):
         try:
-            # Check if graph has multiple disconnected components
-            components = list(nx.connected_components(self.G))
-            
-            if len(components) > 1:
-                print(f"Warning: Graph has {len(components)} disconnected components. Computing shortest paths within each component separately.")
-                
-                # Initialize variables to collect data from all components
-                all_path_lengths = []
-                max_diameter = 0
-                
-                # Process each component separately
-                for i, component in enumerate(components):
-                    subgraph = self.G.subgraph(component)
-                    
-                    if len(component) < 2:
-                        # Skip single-node components (no paths to compute)
-                        continue
-                    
-                    # Compute shortest paths for this component
-                    shortest_path_lengths = dict(nx.all_pairs_shortest_path_length(subgraph))
-                    component_diameter = max(nx.eccentricity(subgraph, sp=shortest_path_lengths).values())
-                    max_diameter = max(max_diameter, component_diameter)
-                    
-                    # Collect path lengths from this component
-                    for pls in shortest_path_lengths.values():
-                        all_path_lengths.extend(list(pls.values()))
-                
-                # Remove self-paths (length 0) and create histogram
-                all_path_lengths = [pl for pl in all_path_lengths if pl > 0]
-                
-                if not all_path_lengths:
-                    print("No paths found across components (only single-node components)")
-                    return
-                    
-                # Create combined histogram
-                path_lengths = np.zeros(max_diameter + 1, dtype=int)
-                pl, cnts = np.unique(all_path_lengths, return_counts=True)
-                path_lengths[pl] += cnts
-                
-                title_suffix = f" (across {len(components)} components)"
-                
-            else:
-                # Single component
-                shortest_path_lengths = dict(nx.all_pairs_shortest_path_length(self.G))
-                diameter = max(nx.eccentricity(self.G, sp=shortest_path_lengths).values())
-                path_lengths = np.zeros(diameter + 1, dtype=int)
-                for pls in shortest_path_lengths.values():
-                    pl, cnts = np.unique(list(pls.values()), return_counts=True)
-                    path_lengths[pl] += cnts
-                max_diameter = diameter
-                title_suffix = ""
+            path_lengths, title_suffix = self._path_length_distribution()
+            if path_lengths.sum() == 0:
+                print("No paths found across components (only single-node components)")
+                return
+            max_diameter = len(path_lengths)
             
             # Generate visualization and results (same for both cases)
-            freq_percent = 100 * path_lengths[1:] / path_lengths[1:].sum()
+            freq_percent = 100 * path_lengths / path_lengths.sum()
             fig, ax = plt.subplots(figsize=(15, 8))
             ax.bar(np.arange(1, max_diameter + 1), height=freq_percent)
             ax.set_title(
@@ -727,39 +677,7 @@ class HistogramSelector(QWidget):
 
     def betweenness_centrality_histogram(self):
         try:
-            # Check if graph has multiple disconnected components
-            components = list(nx.connected_components(self.G))
-            
-            if len(components) > 1:
-                print(f"Warning: Graph has {len(components)} disconnected components. Computing betweenness centrality within each component separately.")
-                
-                # Initialize dictionary to collect betweenness centrality from all components
-                combined_betweenness_centrality = {}
-                
-                # Process each component separately
-                for i, component in enumerate(components):
-                    if len(component) < 2:
-                        # For single-node components, betweenness centrality is 0
-                        for node in component:
-                            combined_betweenness_centrality[node] = 0.0
-                        continue
-                    
-                    # Create subgraph for this component
-                    subgraph = self.G.subgraph(component)
-                    
-                    # Compute betweenness centrality for this component
-                    component_betweenness = nx.centrality.betweenness_centrality(subgraph)
-                    
-                    # Add to combined results
-                    combined_betweenness_centrality.update(component_betweenness)
-                
-                betweenness_centrality = combined_betweenness_centrality
-                title_suffix = f" (across {len(components)} components)"
-                
-            else:
-                # Single component
-                betweenness_centrality = nx.centrality.betweenness_centrality(self.G)
-                title_suffix = ""
+            betweenness_centrality, title_suffix = self._betweenness()
             
             # Generate visualization and results (same for both cases)
             plt.figure(figsize=(15, 8))
@@ -786,7 +704,7 @@ class HistogramSelector(QWidget):
     
     def closeness_centrality_histogram(self):
         try:
-            closeness_centrality = nx.centrality.closeness_centrality(self.G)
+            closeness_centrality = self._per_node(self._path_sweep()['closeness'])
             plt.figure(figsize=(15, 8))
             plt.hist(closeness_centrality.values(), bins=60)
             plt.title("Closeness Centrality Histogram ", fontdict={"size": 35}, loc="center")
@@ -802,7 +720,7 @@ class HistogramSelector(QWidget):
     
     def eigenvector_centrality_histogram(self):
         try:
-            eigenvector_centrality = nx.centrality.eigenvector_centrality(self.G_unweighted)
+            eigenvector_centrality = self._per_node(centrality_engine.eigenvector_centrality(self._compact().csr(weighted=False)))
             plt.figure(figsize=(15, 8))
             plt.hist(eigenvector_centrality.values(), bins=60)
             plt.xticks(ticks=[0, 0.01, 0.02, 0.04, 0.06, 0.08])
@@ -910,13 +828,9 @@ class HistogramSelector(QWidget):
     def eccentricity_histogram(self):
         """Eccentricity - maximum distance from a node to any other node"""
         try:
-            if not nx.is_connected(self.G):
+            if len(self._path_sweep()['component_sizes']) > 1:
                 print("Graph is not connected. Using largest connected component.")
-                largest_cc = max(nx.connected_components(self.G), key=len)
-                G_cc = self.G.subgraph(largest_cc)
-                eccentricity = nx.eccentricity(G_cc)
-            else:
-                eccentricity = nx.eccentricity(self.G)
+            eccentricity = self._eccentricity()
             
             plt.figure(figsize=(15, 8))
             plt.hist(eccentricity.values(), bins=20, alpha=0.7)
@@ -933,7 +847,7 @@ class HistogramSelector(QWidget):
     def kcore_histogram(self):
         """K-core decomposition - identifies cohesive subgroups"""
         try:
-            kcore = nx.core_number(self.G_unweighted)
+            kcore = self._per_node(self._compact().core_number())
             plt.figure(figsize=(15, 8))
             plt.hist(kcore.values(), bins=max(5, max(kcore.values())), alpha=0.7)
             plt.title("K-Core Distribution", fontdict={"size": 35}, loc="center")
@@ -949,7 +863,7 @@ class HistogramSelector(QWidget):
     def triangle_count_histogram(self):
         """Number of triangles each node participates in"""
         try:
-            triangles = nx.triangles(self.G)
+            triangles = self._per_node(self._compact().triangles())
             plt.figure(figsize=(15, 8))
             plt.hist(triangles.values(), bins=30, alpha=0.7)
             plt.title("Triangle Count Distribution", fontdict={"size": 35}, loc="center")
@@ -1053,7 +967,7 @@ class HistogramSelector(QWidget):
     def harmonic_centrality_histogram(self):
         """Harmonic centrality - better than closeness for disconnected networks"""
         try:
-            harmonic_centrality = nx.harmonic_centrality(self.G)
+            harmonic_centrality = self._per_node(self._path_sweep()['harmonic'])
             plt.figure(figsize=(15, 8))
             plt.hist(harmonic_centrality.values(), bins=50, alpha=0.7)
             plt.title("Harmonic Centrality Distribution", fontdict={"size": 35}, loc="center")
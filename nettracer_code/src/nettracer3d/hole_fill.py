@@ -0,0 +1,212 @@
+import numpy as np
+import numba
+from numba import njit, prange
+
+
+# Hole filling of binary volumes.
+# A hole is background that cannot reach the border of its image through background. Rather than running
+# scipy.ndimage.binary_fill_holes slice by slice into one uint8 buffer per axis, every slice is flooded from its border by a
+# small stack-based fill, in parallel over slices, and its unreached background is written straight into the single output
+# (0/255, initialized from the input). Slices of one axis are disjoint, so the axes are filled one after another into the
+# same buffer, which ends up as their union.
+# The '3d' mode floods the background of the whole volume from its six faces instead, filling only fully enclosed cavities.
+# A volume one voxel thick along some axis (including a 2D image) is all faces, so it is filled as the plane it is.
+# Connectivity is 4 in a plane and 6 in a volume, as binary_fill_holes' default structure.
+
+
+def _n_chunks(n):
+    return max(1, min(4 * numba.get_num_threads(), n))
+
+
+@njit(cache=True)
+def _flood_plane(src, reached, stack):
+    """Mark in reached (zeroed, same shape as src) the background of src connected to its border; returns nothing"""
+    height, width = src.shape
+    top = 0
+    for y in range(height):
+        for x in range(width):
+            if (y == 0 or y == height - 1 or x == 0 or x == width - 1) and src[y, x] == 0 and reached[y, x] == 0:
+                reached[y, x] = 1
+                stack[top] = y * width + x
+                top += 1
+                while top > 0:
+                    top -= 1
+                    p = stack[top]
+                    py = p // width
+                    px = p - py * width
+                    if py > 0 and src[py - 1, px] == 0 and reached[py - 1, px] == 0:
+                        reached[py - 1, px] = 1
+                        stack[top] = p - width
+                        top += 1
+                    if py < height - 1 and src[py + 1, px] == 0 and reached[py + 1, px] == 0:
+                        reached[py + 1, px] = 1
+                        stack[top] = p + width
+                        top += 1
+                    if px > 0 and src[py, px - 1] == 0 and reached[py, px - 1] == 0:
+                        reached[py, px - 1] = 1
+                        stack[top] = p - 1
+                        top += 1
+                    if px < width - 1 and src[py, px + 1] == 0 and reached[py, px + 1] == 0:
+                        reached[py, px + 1] = 1
+                        stack[top] = p + 1
+                        top += 1
+
+
+@njit(cache=True, parallel=True)
+def _fill_planes(src, out, n_chunks):
+    """Set out to 255 in the holes of every plane src[i] (planes along the first axis)"""
+    depth, height, width = src.shape
+    for chunk in prange(n_chunks):
+        # Every pixel is pushed at most once, so one plane's worth of stack is enough
+        reached = np.empty((height, width), dtype=np.uint8)
+        stack = np.empty(height * width, dtype=np.int64)
+        for i in range((depth * chunk) // n_chunks, (depth * (chunk + 1)) // n_chunks):
+            reached[:] = 0
+            _flood_plane(src[i], reached, stack)
+            for y in range(height):
+                for x in range(width):
+                    if src[i, y, x] == 0 and reached[y, x] == 0:
+                        out[i, y, x] = 255
+
+
+@njit(cache=True)
+def _grow(stack, top):
+    grown = np.empty(stack.shape[0] * 2, dtype=np.int64)
+    grown[:top] = stack[:top]
+    return grown
+
+
+@njit(cache=True)
+def _flood_volume(out):
+    """Mark background (0) of out connected to its faces as 1"""
+    depth, height, width = out.shape
+    plane = height * width
+    stack = np.empty(max(16, 2 * (plane + depth * height + depth * width)), dtype=np.int64)
+    top = 0
+    for z in range(depth):
+        for y in range(height):
+            on_face = z == 0 or z == depth - 1 or y == 0 or y == height - 1
+            for x in range(width):
+                if not (on_face or x == 0 or x == width - 1) or out[z, y, x] != 0:
+                    continue
+                out[z, y, x] = 1
+                stack[0] = (z * height + y) * width + x
+                top = 1
+                while top > 0:
+                    # Room for the six neighbors of the voxel popped below
+                    if top + 6 > stack.shape[0]:
+                        stack = _grow(stack, top)
+                    top -= 1
+                    p = stack[top]
+                    pz = p // plane
+                    r = p - pz * plane
+                    py = r // width
+                    px = r - py * width
+                    if pz > 0 and out[pz - 1, py, px] == 0:
+                        out[pz - 1, py, px] = 1
+                        stack[top] = p - plane
+                        top += 1
+                    if pz < depth - 1 and out[pz + 1, py, px] == 0:
+                        out[pz + 1, py, px] = 1
+                        stack[top] = p + plane
+                        top += 1
+                    if py > 0 and out[pz, py - 1, px] == 0:
+                        out[pz, py - 1, px] = 1
+                        stack[top] = p - width
+                        top += 1
+                    if py < height - 1 and out[pz, py + 1, px] == 0:
+                        out[pz, py + 1, px] = 1
+                        stack[top] = p + width
+                        top += 1
+                    if px > 0 and out[pz, py, px - 1] == 0:
+                        out[pz, py, px - 1] = 1
+                        stack[top] = p - 1
+                        top += 1
+                    if px < width - 1 and out[pz, py, px + 1] == 0:
+                        out[pz, py, px + 1] = 1
+                        stack[top] = p + 1
+                        top += 1
+
+
+@njit(cache=True, parallel=True)
+def _resolve_flood(flat, n_chunks):
+    """Reached background (1) back to 0, unreached background (0) to 255"""
+    n = flat.shape[0]
+    for chunk in prange(n_chunks):
+        for i in range((n * chunk) // n_chunks, (n * (chunk + 1)) // n_chunks):
+            v = flat[i]
+            if v == 0:
+                flat[i] = 255
+            elif v == 1:
+                flat[i] = 0
+
+
+@njit(cache=True, parallel=True)
+def _binary_255(data, flat, n_chunks):
+    n = flat.shape[0]
+    for chunk in prange(n_chunks):
+        for i in range((n * chunk) // n_chunks, (n * (chunk + 1)) // n_chunks):
+            flat[i] = 255 if data[i] != 0 else 0
+
+
+def _output(out, shape):
+    if out is None:
+        return np.empty(shape, dtype=np.uint8)
+    if isinstance(out, str):
+        return np.lib.format.open_memmap(out, mode='w+', dtype=np.uint8, shape=shape)
+    return out
+
+
+def fill_holes(array, axes=(0, 1, 2), mode='planes', out=None):
+    """
+    Binarize a 2D or 3D array and fill its holes.
+
+    Parameters:
+    -----------
+    array : ndarray
+        2D or 3D array, nonzero being foreground; possibly memmapped
+    axes : tuple
+        'planes' mode only: fill the planes perpendicular to each of these axes (a voxel is filled if it is a hole in any
+        of them). A 2D array is one plane.
+    mode : str
+        'planes' for 2D fills of every slice, '3d' to fill only the background enclosed in the volume (one pass over the
+        volume, but holes open to the border along some axis stay open). In '3d' mode, a 2D array or a volume one voxel
+        thick along an axis is filled as a plane.
+    out : ndarray or str, optional
+        C-contiguous uint8 output array of the same shape (not the input itself), or a .npy path to create it as a memmap
+
+    Returns:
+    --------
+    ndarray
+        uint8 array, 255 for foreground and filled holes, 0 elsewhere
+    """
+    if array.ndim not in (2, 3):
+        raise ValueError(f"Expected a 2D or 3D array, got {array.ndim} dimensions")
+    if mode not in ('planes', '3d'):
+        raise ValueError(f"Unknown mode {mode}; use 'planes' or '3d'")
+    out = _output(out, array.shape)
+    src = np.ascontiguousarray(array)
+    if src.dtype == bool:
+        src = src.view(np.uint8)
+    flat = out.reshape(-1)
+    _binary_255(src.reshape(-1), flat, _n_chunks(flat.size))
+    if out.size == 0:
+        return out
+    volume = out[np.newaxis] if out.ndim == 2 else out
+    if array.ndim == 2:
+        axes = (0,)
+        src = src[np.newaxis]
+
+    if mode == '3d':
+        thin = [axis for axis in range(3) if volume.shape[axis] == 1]
+        if not thin:
+            _flood_volume(volume)
+            _resolve_flood(flat, _n_chunks(flat.size))
+            return out
+        axes = (thin[0],)
+
+    # Floods read the input, so holes written for one axis do not block the floods of the next
+    for axis in dict.fromkeys(axes):
+        planes = np.moveaxis(src, axis, 0)
+        _fill_planes(planes, np.moveaxis(volume, axis, 0), _n_chunks(planes.shape[0]))
+    return out
@@ -0,0 +1,158 @@
+import threading
+import numpy as np
+from numba import njit, prange
+
+
+# Per-label voxel index for label volumes.
+# Every label is stored as a list of runs (flat start offset and length, each run inside one image row) plus a bounding box,
+# so painting the voxels of a handful of selected labels costs as much as those labels, not as much as the volume.
+# Edited slices can be marked dirty and rescanned on their own instead of rebuilding the whole index.
+
+
+@njit(cache=True, parallel=True)
+def _count_runs(rows):
+    """Number of nonzero runs in every row"""
+    n_rows, width = rows.shape
+    counts = np.zeros(n_rows, dtype=np.int64)
+    for r in prange(n_rows):
+        c = 0
+        prev = 0
+        for x in range(width):
+            v = rows[r, x]
+            if v != 0 and v != prev:
+                c += 1
+            prev = v
+        counts[r] = c
+    return counts
+
+
+@njit(cache=True, parallel=True)
+def _fill_runs(rows, offsets, row_base, labels, starts, lengths):
+    """Label, flat start and length of every run, written at each row's offset"""
+    n_rows, width = rows.shape
+    for r in prange(n_rows):
+        k = offsets[r]
+        prev = 0
+        base = (row_base + r) * width
+        for x in range(width):
+            v = rows[r, x]
+            if v != prev:
+                if prev != 0:
+                    lengths[k - 1] = base + x - starts[k - 1]
+                if v != 0:
+                    labels[k] = v
+                    starts[k] = base + x
+                    k += 1
+            prev = v
+        if prev != 0:
+            lengths[k - 1] = base + width - starts[k - 1]
+
+
+@njit(cache=True, parallel=True)
+def _paint_runs(flat, starts, lengths, value):
+    for i in prange(starts.shape[0]):
+        s = starts[i]
+        for j in range(s, s + lengths[i]):
+            flat[j] = value
+
+
+def _scan(array, z0, z1):
+    """Runs of slices z0:z1 as (labels, starts, lengths), starts being flat offsets into the full array"""
+    rows = np.ascontiguousarray(array[z0:z1]).reshape(-1, array.shape[-1])
+    counts = _count_runs(rows)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    total = int(counts.sum())
+    labels = np.empty(total, dtype=array.dtype)
+    starts = np.empty(total, dtype=np.int64)
+    lengths = np.empty(total, dtype=np.int64)
+    _fill_runs(rows, offsets, z0 * array.shape[1], labels, starts, lengths)
+    return labels, starts, lengths
+
+
+class LabelIndex:
+    """
+    Run-length voxel lists and bounding boxes of every label in a 3D integer label array.
+    Labels are kept sorted, with the runs of label_ids[i] at run_ptr[i]:run_ptr[i + 1].
+    """
+
+    def __init__(self, array, chunk_slices=64):
+        if array.ndim != 3 or not np.issubdtype(array.dtype, np.integer):
+            raise ValueError("LabelIndex needs a 3D integer label array")
+        self.shape = array.shape
+        self.dtype = array.dtype
+        self._dirty = set()
+        self._lock = threading.Lock()
+        # Scan in Z slabs so only one slab is ever copied to contiguous memory at a time
+        parts = [_scan(array, z, min(z + chunk_slices, array.shape[0])) for z in range(0, array.shape[0], chunk_slices)]
+        self._set_runs(*(np.concatenate(cols) for cols in zip(*parts)))
+
+    def _set_runs(self, labels, starts, lengths):
+        order = np.argsort(labels, kind='stable')
+        labels = labels[order]
+        self.run_starts = starts[order]
+        self.run_lengths = lengths[order]
+        self.label_ids, first = np.unique(labels, return_index=True)
+        self.run_ptr = np.append(first, len(labels)).astype(np.int64)
+
+        # Bounding boxes from run endpoints
+        plane = self.shape[1] * self.shape[2]
+        width = self.shape[2]
+        z = self.run_starts // plane
+        y = (self.run_starts % plane) // width
+        x0 = self.run_starts % width
+        x1 = x0 + self.run_lengths
+        if len(labels):
+            seg = self.run_ptr[:-1]
+            self.bboxes = np.stack([np.minimum.reduceat(z, seg), np.maximum.reduceat(z, seg) + 1,
+                                    np.minimum.reduceat(y, seg), np.maximum.reduceat(y, seg) + 1,
+                                    np.minimum.reduceat(x0, seg), np.maximum.reduceat(x1, seg)], axis=1)
+        else:
+            self.bboxes = np.zeros((0, 6), dtype=np.int64)
+
+    def mark_dirty(self, z):
+        """Record that slice z was edited in place"""
+        with self._lock:
+            self._dirty.add(int(z))
+
+    def refresh(self, array):
+        """Rescan dirty slices of the (edited) array and splice their runs back into the index"""
+        with self._lock:
+            dirty = sorted(self._dirty)
+            self._dirty.clear()
+        if not dirty:
+            return
+        plane = self.shape[1] * self.shape[2]
+        keep = ~np.isin(self.run_starts // plane, dirty)
+        labels = np.repeat(self.label_ids, np.diff(self.run_ptr))[keep]
+        parts = [(labels, self.run_starts[keep], self.run_lengths[keep])]
+        parts.extend(_scan(array, z, z + 1) for z in dirty)
+        self._set_runs(*(np.concatenate(cols) for cols in zip(*parts)))
+
+    def _positions(self, labels):
+        """Index positions of the given labels, skipping any that are not present"""
+        labels = np.unique(np.asarray(labels))
+        pos = np.searchsorted(self.label_ids, labels)
+        valid = pos < len(self.label_ids)
+        pos = pos[valid]
+        return pos[self.label_ids[pos] == labels[valid]]
+
+    def _runs(self, positions):
+        """Concatenated runs of the labels at the given positions"""
+        first = self.run_ptr[positions]
+        counts = self.run_ptr[positions + 1] - first
+        idx = np.repeat(first - np.concatenate(([0], np.cumsum(counts)[:-1])), counts) + np.arange(counts.sum())
+        return self.run_starts[idx], self.run_lengths[idx]
+
+    def bbox(self, labels):
+        """(z0, z1, y0, y1, x0, x1) box enclosing all the given labels, or None if none of them exist"""
+        positions = self._positions(labels)
+        if len(positions) == 0:
+            return None
+        b = self.bboxes[positions]
+        return (b[:, 0].min(), b[:, 1].max(), b[:, 2].min(), b[:, 3].max(), b[:, 4].min(), b[:, 5].max())
+
+    def paint(self, out, labels, value=255):
+        """Write value into every voxel of the given labels, in place. out must be a C-contiguous array of the indexed shape."""
+        starts, lengths = self._runs(self._positions(labels))
+        _paint_runs(out.reshape(-1), starts, lengths, out.dtype.type(value))
+        return out
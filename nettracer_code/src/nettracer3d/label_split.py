@@ -0,0 +1,346 @@
+import numpy as np
+import numba
+from numba import njit, prange
+
+
+# Splitting of label arrays into 26-connected pieces.
+# One union-find pass over the whole volume finds the connected components of every label at once: Z slabs are unioned in
+# parallel, then the planes where neighboring slabs meet are merged. Components get their output ids from a prefix sum, so the
+# output dtype is known before anything is written, and pieces that were split off can be handed back to the label they touch the
+# most through one scan of the label adjacencies instead of a dilation per piece.
+
+
+@njit(cache=True)
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+@njit(cache=True)
+def _union(parent, a, b):
+    ra = _find(parent, a)
+    rb = _find(parent, b)
+    # The smaller index is always the root, so every root is the first voxel of its component in raster order
+    if ra < rb:
+        parent[rb] = ra
+    elif rb < ra:
+        parent[ra] = rb
+
+
+@njit(cache=True)
+def _union_voxel(flat, parent, shape, z, y, x, zmin):
+    """Union voxel (z, y, x) with its same-valued neighbors that come before it in raster order, not looking above plane zmin"""
+    Z, Y, X = shape
+    i = (z * Y + y) * X + x
+    v = flat[i]
+    for dz in range(-1, 1):
+        nz = z + dz
+        if nz < zmin:
+            continue
+        for dy in range(-1, 2):
+            ny = y + dy
+            if ny < 0 or ny >= Y or (dz == 0 and dy > 0):
+                continue
+            for dx in range(-1, 2):
+                nx = x + dx
+                if nx < 0 or nx >= X or (dz == 0 and dy == 0 and dx >= 0):
+                    continue
+                j = (nz * Y + ny) * X + nx
+                if flat[j] == v:
+                    _union(parent, i, j)
+
+
+@njit(cache=True, parallel=True)
+def _label_components(flat, shape, bounds, parent):
+    """Union-find over the foreground of a flat label array. Fills parent with the root (first voxel) of every voxel's component."""
+    Z, Y, X = shape
+    n_blocks = bounds.shape[0] - 1
+    plane = Y * X
+
+    for b in prange(n_blocks):
+        z0 = bounds[b]
+        for i in range(z0 * plane, bounds[b + 1] * plane):
+            parent[i] = i
+        for z in range(z0, bounds[b + 1]):
+            for y in range(Y):
+                for x in range(X):
+                    if flat[(z * Y + y) * X + x] > 0:
+                        _union_voxel(flat, parent, shape, z, y, x, z0)
+
+    # Seams: the first plane of every slab against the last plane of the one above
+    for b in range(1, n_blocks):
+        z = bounds[b]
+        for y in range(Y):
+            for x in range(X):
+                i = (z * Y + y) * X + x
+                if flat[i] <= 0:
+                    continue
+                v = flat[i]
+                for dy in range(-1, 2):
+                    ny = y + dy
+                    if ny < 0 or ny >= Y:
+                        continue
+                    for dx in range(-1, 2):
+                        nx = x + dx
+                        if nx < 0 or nx >= X:
+                            continue
+                        j = ((z - 1) * Y + ny) * X + nx
+                        if flat[j] == v:
+                            _union(parent, i, j)
+
+    # Roots never move from here on, so concurrent compression only ever writes another ancestor of the same root
+    for b in prange(n_blocks):
+        for i in range(bounds[b] * plane, bounds[b + 1] * plane):
+            if flat[i] > 0:
+                parent[i] = _find(parent, i)
+
+
+@njit(cache=True, parallel=True)
+def _component_sizes(flat, parent, roots, bounds, plane):
+    """Voxel count of every component (by position in the sorted roots array)"""
+    n_blocks = bounds.shape[0] - 1
+    partial = np.zeros((n_blocks, roots.shape[0]), dtype=np.int64)
+    for b in prange(n_blocks):
+        for i in range(bounds[b] * plane, bounds[b + 1] * plane):
+            if flat[i] > 0:
+                partial[b, np.searchsorted(roots, parent[i])] += 1
+    return partial.sum(axis=0)
+
+
+@njit(cache=True, parallel=True)
+def _write_components(flat, parent, roots, values, out):
+    for i in prange(flat.shape[0]):
+        if flat[i] > 0:
+            out[i] = values[np.searchsorted(roots, parent[i])]
+
+
+@njit(cache=True)
+def _touching_new(arr, z, y, x, max_val, found):
+    """Distinct labels above max_val among the 26 neighbors of (z, y, x), written into found. Returns how many."""
+    Z, Y, X = arr.shape
+    n = 0
+    for dz in range(-1, 2):
+        nz = z + dz
+        if nz < 0 or nz >= Z:
+            continue
+        for dy in range(-1, 2):
+            ny = y + dy
+            if ny < 0 or ny >= Y:
+                continue
+            for dx in range(-1, 2):
+                nx = x + dx
+                if nx < 0 or nx >= X:
+                    continue
+                w = arr[nz, ny, nx]
+                if w > max_val:
+                    seen = False
+                    for k in range(n):
+                        if found[k] == w:
+                            seen = True
+                            break
+                    if not seen:
+                        found[n] = w
+                        n += 1
+    return n
+
+
+@njit(cache=True, parallel=True)
+def _count_contacts(arr, max_val):
+    """Per plane, the number of (old label voxel, touching new label) pairs"""
+    Z, Y, X = arr.shape
+    counts = np.zeros(Z, dtype=np.int64)
+    for z in prange(Z):
+        found = np.empty(27, dtype=arr.dtype)
+        c = 0
+        for y in range(Y):
+            for x in range(X):
+                v = arr[z, y, x]
+                if v > 0 and v <= max_val:
+                    c += _touching_new(arr, z, y, x, max_val, found)
+        counts[z] = c
+    return counts
+
+
+@njit(cache=True, parallel=True)
+def _fill_contacts(arr, max_val, offsets, new_labels, old_labels):
+    Z, Y, X = arr.shape
+    for z in prange(Z):
+        found = np.empty(27, dtype=arr.dtype)
+        k = offsets[z]
+        for y in range(Y):
+            for x in range(X):
+                v = arr[z, y, x]
+                if v > 0 and v <= max_val:
+                    n = _touching_new(arr, z, y, x, max_val, found)
+                    for m in range(n):
+                        new_labels[k] = found[m]
+                        old_labels[k] = v
+                        k += 1
+
+
+@njit(cache=True, parallel=True)
+def _remap_new(flat, max_val, lut):
+    for i in prange(flat.shape[0]):
+        v = flat[i]
+        if v > max_val:
+            flat[i] = lut[v - max_val - 1]
+
+
+def _output_dtype(dtype, top):
+    """dtype itself if it can hold top, otherwise the smallest unsigned dtype that can"""
+    if np.iinfo(dtype).max >= top:
+        return dtype
+    for candidate in (np.uint16, np.uint32, np.uint64):
+        if np.iinfo(candidate).max >= top and np.dtype(candidate).itemsize >= np.dtype(dtype).itemsize:
+            return np.dtype(candidate)
+    raise ValueError(f"Cannot represent label {top}")
+
+
+def _slab_bounds(depth, n_blocks=None):
+    if n_blocks is None:
+        n_blocks = 4 * numba.get_num_threads()
+    n_blocks = max(1, min(depth, n_blocks))
+    return np.linspace(0, depth, n_blocks + 1).astype(np.int64)
+
+
+def split_components(array, max_val=None, n_blocks=None):
+    """
+    Give every 26-connected piece of every label its own label. The largest piece of a label keeps it (the first one in raster
+    order on ties) and the others are numbered from max_val + 1, ordered by label and then by their first voxel.
+
+    Parameters:
+    -----------
+    array : ndarray
+        2D or 3D integer label array. Values <= 0 are background.
+    max_val : int, optional
+        New labels start above this. Defaults to the array maximum.
+    n_blocks : int, optional
+        Number of Z slabs processed in parallel. Defaults to four per numba thread.
+
+    Returns:
+    --------
+    tuple
+        (output array, number of new labels)
+    """
+    if array.ndim == 2:
+        out, n_new = split_components(array[np.newaxis], max_val, n_blocks)
+        return out[0], n_new
+    if not np.issubdtype(array.dtype, np.integer):
+        raise ValueError("split_components needs an integer label array")
+
+    array = np.ascontiguousarray(array)
+    flat = array.reshape(-1)
+    if max_val is None:
+        max_val = int(array.max()) if array.size else 0
+    max_val = int(max_val)
+    if not np.any(flat > 0):
+        return np.zeros_like(array), 0
+
+    bounds = _slab_bounds(array.shape[0], n_blocks)
+    parent = np.empty(flat.shape[0], dtype=np.int32 if flat.shape[0] < np.iinfo(np.int32).max else np.int64)
+    _label_components(flat, array.shape, bounds, parent)
+
+    roots = np.flatnonzero((flat > 0) & (parent == np.arange(flat.shape[0], dtype=parent.dtype))).astype(parent.dtype)
+    sizes = _component_sizes(flat, parent, roots, bounds, array.shape[1] * array.shape[2])
+    comp_labels = flat[roots]
+
+    # Group components by label (roots are already in raster order) and keep the label on each group's largest piece
+    order = np.lexsort((-sizes, comp_labels))
+    group_start = np.r_[True, comp_labels[order][1:] != comp_labels[order][:-1]]
+    keep = np.empty(len(roots), dtype=bool)
+    keep[order] = group_start
+
+    # New ids follow label order, then raster order within a label
+    label_order = np.argsort(comp_labels, kind='stable')
+    moved = ~keep[label_order]
+    n_new = int(moved.sum())
+    out_dtype = _output_dtype(array.dtype, max_val + n_new)
+    values = comp_labels.astype(out_dtype)
+    values[label_order[moved]] = max_val + 1 + np.arange(n_new, dtype=out_dtype)
+
+    out = np.zeros(array.shape, dtype=out_dtype)
+    _write_components(flat, parent, roots, values, out.reshape(-1))
+    return out, n_new
+
+
+def reassign_to_neighbors(array, max_val):
+    """
+    Relabel, in place, every label above max_val with the label at or below max_val that has the most voxels touching it
+    (26-connected, lowest label on ties). Labels with no such neighbor are left alone. All choices are made on the input
+    labels, so one new label is never merged through another.
+
+    Parameters:
+    -----------
+    array : ndarray
+        2D or 3D C-contiguous integer label array
+    max_val : int
+        Largest label that counts as an original label
+
+    Returns:
+    --------
+    ndarray
+        The relabeled array (the same object)
+    """
+    arr = array[np.newaxis] if array.ndim == 2 else array
+    max_val = int(max_val)
+    top = int(arr.max()) if arr.size else 0
+    if top <= max_val:
+        return array
+
+    counts = _count_contacts(arr, max_val)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    total = int(counts.sum())
+    new_labels = np.empty(total, dtype=arr.dtype)
+    old_labels = np.empty(total, dtype=arr.dtype)
+    _fill_contacts(arr, max_val, offsets, new_labels, old_labels)
+
+    lut = np.arange(max_val + 1, top + 1).astype(arr.dtype)
+    if total:
+        # Count touching voxels per (new, old) pair, then take the best old label of each new one
+        order = np.lexsort((old_labels, new_labels))
+        new_labels = new_labels[order]
+        old_labels = old_labels[order]
+        start = np.flatnonzero(np.r_[True, (new_labels[1:] != new_labels[:-1]) | (old_labels[1:] != old_labels[:-1])])
+        pair_new = new_labels[start]
+        pair_old = old_labels[start]
+        pair_count = np.diff(np.r_[start, total])
+        best = np.lexsort((pair_old, -pair_count, pair_new))
+        first = np.r_[True, pair_new[best][1:] != pair_new[best][:-1]]
+        winners = best[first]
+        lut[pair_new[winners].astype(np.int64) - max_val - 1] = pair_old[winners]
+
+    _remap_new(arr.reshape(-1), max_val, lut)
+    return array
+
+
+def separate_nontouching_objects(array, max_val=None, branches=False, n_blocks=None):
+    """
+    Split labels whose voxels are not all connected. The largest piece keeps its label and the rest get new labels above max_val.
+    With branches=True, each new piece then takes the label of the original object it touches most, so pieces only stay separate
+    when they touch nothing with an original label.
+
+    Parameters:
+    -----------
+    array : ndarray
+        2D or 3D integer label array
+    max_val : int, optional
+        Largest original label. Defaults to the array maximum.
+    branches : bool
+        Whether to hand split pieces back to their most-touching original neighbor
+    n_blocks : int, optional
+        Number of Z slabs labelled in parallel
+
+    Returns:
+    --------
+    ndarray
+        The relabeled array
+    """
+    if max_val is None:
+        max_val = int(np.max(array)) if array.size else 0
+    out, n_new = split_components(array, max_val, n_blocks)
+    print(f"Split off {n_new} new labels")
+    if branches and n_new:
+        reassign_to_neighbors(out, max_val)
+    return out
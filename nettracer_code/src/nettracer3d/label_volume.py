@@ -0,0 +1,204 @@
+import numpy as np
+import numba
+from numba import njit, prange
+
+
+# Arithmetic on whole label volumes without full-size temporaries.
+# Offsetting, merging and masking label arrays used to be written as chains like (a.astype(uint32) + k) * (a > 0) * (b == 0),
+# each step allocating another volume. Here the output dtype is worked out once from the largest label the result can hold,
+# the array is promoted (one allocation, only if needed) and the rest happens in place in one multithreaded pass, each thread
+# over its own slab of voxels.
+
+_UNSIGNED = (np.uint8, np.uint16, np.uint32, np.uint64)
+
+
+def _n_chunks(n):
+    return max(1, min(4 * numba.get_num_threads(), n))
+
+
+def _flat(array):
+    """Writable 1D view of a C-contiguous array"""
+    return array.reshape(-1)
+
+
+def minimal_dtype(top, dtype=None):
+    """
+    Smallest unsigned dtype holding every label up to top.
+
+    Parameters:
+    -----------
+    top : int
+        Largest label
+    dtype : numpy dtype, optional
+        If given, the result is never narrower than it
+
+    Returns:
+    --------
+    numpy dtype
+    """
+    top = int(top)
+    for candidate in _UNSIGNED:
+        if np.iinfo(candidate).max >= top and (dtype is None or np.dtype(candidate).itemsize >= np.dtype(dtype).itemsize):
+            return np.dtype(candidate)
+    raise ValueError(f"Cannot represent label {top}")
+
+
+def promote(array, top, copy=False):
+    """
+    The array in a dtype that holds labels up to top: the array itself when its dtype already does (a copy if copy is
+    True), otherwise one new C-contiguous array of the smallest wider unsigned dtype.
+    """
+    if array.dtype.kind in 'iu' and np.iinfo(array.dtype).max >= top:
+        if copy or not array.flags.c_contiguous:
+            return np.array(array, order='C', copy=True)
+        return array
+    out = np.empty(array.shape, dtype=minimal_dtype(top, array.dtype if array.dtype.kind in 'iu' else None))
+    np.copyto(out, array, casting='unsafe')
+    return out
+
+
+def fit(array, top=None):
+    """
+    The array in the smallest unsigned dtype holding its labels, or the array itself if that is no narrower.
+
+    Parameters:
+    -----------
+    array : ndarray
+        Non-negative label array
+    top : int, optional
+        Largest label, when already known
+    """
+    if array.size == 0:
+        return array
+    if top is None:
+        top = int(array.max())
+    dtype = minimal_dtype(top)
+    if dtype.itemsize >= array.dtype.itemsize:
+        return array
+    return array.astype(dtype)
+
+
+@njit(cache=True, parallel=True)
+def _offset_nonzero(flat, offset, n_chunks):
+    n = flat.shape[0]
+    for chunk in prange(n_chunks):
+        start = (n * chunk) // n_chunks
+        end = (n * (chunk + 1)) // n_chunks
+        for i in range(start, end):
+            if flat[i] != 0:
+                flat[i] += offset
+
+
+@njit(cache=True, parallel=True)
+def _overlay_offset(base, labels, offset, n_chunks):
+    n = base.shape[0]
+    for chunk in prange(n_chunks):
+        start = (n * chunk) // n_chunks
+        end = (n * (chunk + 1)) // n_chunks
+        for i in range(start, end):
+            if base[i] == 0 and labels[i] > 0:
+                base[i] = labels[i] + offset
+
+
+@njit(cache=True, parallel=True)
+def _overlay_value(base, labels, match, value, n_chunks):
+    n = base.shape[0]
+    for chunk in prange(n_chunks):
+        start = (n * chunk) // n_chunks
+        end = (n * (chunk + 1)) // n_chunks
+        for i in range(start, end):
+            if base[i] == 0 and labels[i] == match:
+                base[i] = value
+
+
+@njit(cache=True, parallel=True)
+def _clear_where(flat, mask, n_chunks):
+    n = flat.shape[0]
+    for chunk in prange(n_chunks):
+        start = (n * chunk) // n_chunks
+        end = (n * (chunk + 1)) // n_chunks
+        for i in range(start, end):
+            if mask[i] != 0:
+                flat[i] = 0
+
+
+def _as_source(array):
+    array = np.ascontiguousarray(array)
+    return array.view(np.uint8) if array.dtype == bool else array
+
+
+def offset_nonzero(array, offset, top=None, copy=False):
+    """
+    Add offset to every nonzero label, leaving background at 0. Runs in place when the array's dtype can hold the result and
+    copy is False.
+
+    Parameters:
+    -----------
+    array : ndarray
+        Non-negative integer label array
+    offset : int
+        Value added to the labels
+    top : int, optional
+        Largest label of the array, when already known
+    copy : bool
+        Leave the input untouched
+
+    Returns:
+    --------
+    ndarray
+        The offset labels (the input array itself when done in place)
+    """
+    if top is None:
+        top = int(array.max()) if array.size else 0
+    out = promote(array, top + int(offset), copy=copy)
+    if top > 0 and offset:
+        _offset_nonzero(_flat(out), out.dtype.type(offset), _n_chunks(out.size))
+    return out
+
+
+def overlay(base, labels, offset=0, match=None, value=None, top=None):
+    """
+    Write labels into the background of base: wherever base is 0 and labels is nonzero, base takes the label plus offset.
+    With match given instead, base takes value wherever it is 0 and labels equals match. base is promoted first if the new
+    labels do not fit its dtype, and otherwise written in place.
+
+    Parameters:
+    -----------
+    base : ndarray
+        Label array written into
+    labels : ndarray
+        Label array of the same shape
+    offset : int
+        Added to labels before they are written
+    match : int, optional
+        Only voxels of labels equal to match are written, as value
+    value : int, optional
+        Label written for match
+    top : int, optional
+        Largest label the result can hold, when already known
+
+    Returns:
+    --------
+    ndarray
+        base, or its promoted copy
+    """
+    if top is None:
+        top = int(base.max()) if base.size else 0
+        if match is None:
+            top = max(top, (int(labels.max()) if labels.size else 0) + int(offset))
+        else:
+            top = max(top, int(value))
+    out = promote(base, top)
+    src = _flat(_as_source(labels))
+    # labels keeps its own dtype; each written voxel is cast on the way into base
+    if match is None:
+        _overlay_offset(_flat(out), src, out.dtype.type(offset), _n_chunks(out.size))
+    else:
+        _overlay_value(_flat(out), src, np.int64(match), out.dtype.type(value), _n_chunks(out.size))
+    return out
+
+
+def clear_where(array, mask):
+    """Set array to 0 wherever mask is nonzero, in place (array must be C-contiguous)"""
+    _clear_where(_flat(array), _flat(_as_source(mask)), _n_chunks(array.size))
+    return array
@@ -7,8 +7,9 @@ import os
 from . import network_analysis
 from . import simple_network
 from . import nettracer as n3d
+from . import community_engine
 import numpy as np
-import itertools
+from scipy.sparse import csgraph
 
 def open_network(excel_file_path):
 
@@ -231,398 +232,131 @@ def show_communities_flex(G, master_list, normalized_weights, geo_info=None, geo
 
 
 
-def community_partition(G, weighted = False, style = 0, dostats = True, seed = None):
-
-    def calculate_network_stats(G, unweighted_G, communities):
-        """
-        Calculate comprehensive network statistics for the graph and its communities.
-        
-        Parameters:
-        -----------
-        G : networkx.Graph
-            The input graph
-        communities : list
-            List of sets/lists containing node ids for each community
-        
-        Returns:
-        --------
-        dict
-            Dictionary containing various network statistics
-        """
-        stats = {}
-
-        try:
-        
-            # Overall network modularity
-            stats['Modularity Entire Network'] = community.modularity(G, communities)
-        except:
-            pass
-
-        try:        
-            # Component-level modularity
-            connected_components = list(nx.connected_components(G))
-            if len(connected_components) > 1:
-                for i, component in enumerate(connected_components):
-                    subgraph = G.subgraph(component)
-                    component_communities = list(community.label_propagation_communities(subgraph))
-                    modularity = community.modularity(subgraph, component_communities)
-                    num_nodes = len(component)
-                    stats[f'Modularity of component with {num_nodes} nodes'] = modularity
-        except:
-            pass
-
-        try:        
-            # Community size statistics
-            stats['Number of Communities'] = len(communities)
-            community_sizes = [len(com) for com in communities]
-            stats['Community Sizes'] = community_sizes
-            stats['Average Community Size'] = np.mean(community_sizes)
-        except:
-            pass
-
-        try:
-        
-            # Per-community statistics
-            for i, com in enumerate(communities):
-                subgraph = unweighted_G.subgraph(com)
-                
-                # Basic community metrics
-                stats[f'Community {i+1} Density'] = nx.density(subgraph)
-                stats[f'Community {i+1} Conductance'] = nx.conductance(G, com)
-                stats[f'Community {i+1} Avg Clustering'] = nx.average_clustering(subgraph)
-                
-                # Degree centrality
-                degree_cent = nx.degree_centrality(subgraph)
-                stats[f'Community {i+1} Avg Degree Centrality'] = np.mean(list(degree_cent.values()))
-                
-                # Average path length (only for connected subgraphs)
-                if nx.is_connected(subgraph):
-                    stats[f'Community {i+1} Avg Path Length'] = nx.average_shortest_path_length(subgraph)
-        except:
-            pass
-
-        try:        
-            # Global network metrics
-            stats['Global Clustering Coefficient'] = nx.average_clustering(unweighted_G)
-        except:
-            pass
-        try:
-            stats['Assortativity'] = nx.degree_assortativity_coefficient(G)
-        except:
-            pass
-
-        def count_inter_community_edges(G, communities):
-            inter_edges = 0
-            for com1, com2 in itertools.combinations(communities, 2):
-                inter_edges += len(list(nx.edge_boundary(G, com1, com2)))
-            return inter_edges
-
-        try:
-            stats['Inter-community Edges'] = count_inter_community_edges(G, communities)
-        except:
-            pass
-
-        # Calculate mixing parameter (ratio of external to total edges for nodes)
-        def mixing_parameter(G, communities):
-            external_edges = 0
-            total_edges = 0
-            for com in communities:
-                subgraph = G.subgraph(com)
-                internal_edges = subgraph.number_of_edges()
-                total_com_edges = sum(G.degree(node) for node in com)
-                external_edges += total_com_edges - (2 * internal_edges)
-                total_edges += total_com_edges
-            return external_edges / total_edges
-
-        try:
-            stats['Mixing Parameter'] = mixing_parameter(G, communities)
-        except:
-            pass
-        
-        return stats
-
-    def calculate_louvain_network_stats(G, unweighted_G, partition, seed):
-        """
-        Calculate comprehensive network statistics for the graph using Louvain community detection.
-        
-        Parameters:
-        -----------
-        G : networkx.Graph
-            The input graph
-        partition : dict
-            Dictionary mapping node -> community id from Louvain detection
-        
-        Returns:
-        --------
-        dict
-            Dictionary containing various network statistics
-        """
-        stats = {}
-        
-        
-        try:
-            # Overall network modularity using Louvain
-            stats['Modularity Entire Network'] = community.modularity(G, partition)
-        except:
-            pass
-
-        try:        
-            # Component-level modularity
-            connected_components = list(nx.connected_components(G))
-            if len(connected_components) > 1:
-                for i, component in enumerate(connected_components):
-                    subgraph = G.subgraph(component)
-                    subgraph_partition = list(nx.community.louvain_communities(subgraph, seed = seed))
-                    modularity = community.modularity(subgraph, subgraph_partition)
-                    num_nodes = len(component)
-                    stats[f'Modularity of component with {num_nodes} nodes'] = modularity
-        except:
-            pass
-
-        try:            
-            # Community size statistics
-            stats['Number of Communities'] = len(communities)
-            community_sizes = [len(com) for com in communities]
-            stats['Community Sizes'] = community_sizes
-            stats['Average Community Size'] = np.mean(community_sizes)
-        except:
-            pass
-
-        #try:        
-            # Add some Louvain-specific statistics
-            #stats['Partition Resolution'] = 1.0  # Default resolution parameter
-        #except:
-            #pass
-        
-        # Global network metrics
-        try:
-            stats['Global Clustering Coefficient'] = nx.average_clustering(unweighted_G)
-        except:
-            pass
-        try:
-            stats['Assortativity'] = nx.degree_assortativity_coefficient(G)
-        except:
-            pass
-
-        def count_inter_community_edges(G, communities):
-            inter_edges = 0
-            for com1, com2 in itertools.combinations(communities, 2):
-                inter_edges += len(list(nx.edge_boundary(G, com1, com2)))
-            return inter_edges
-
-        try:
-            stats['Inter-community Edges'] = count_inter_community_edges(G, communities)
-        except:
-            pass
-
-        # Calculate mixing parameter (ratio of external to total edges for nodes)
-        def mixing_parameter(G, communities):
-            external_edges = 0
-            total_edges = 0
-            for com in communities:
-                subgraph = G.subgraph(com)
-                internal_edges = subgraph.number_of_edges()
-                total_com_edges = sum(G.degree(node) for node in com)
-                external_edges += total_com_edges - (2 * internal_edges)
-                total_edges += total_com_edges
-            return external_edges / total_edges
-
-        try:
-            stats['Mixing Parameter'] = mixing_parameter(G, communities)
-        except:
-            pass
-
-        try:        
-            # Per-community statistics
-            for i, com in enumerate(communities):
-                subgraph = unweighted_G.subgraph(com)
-                
-                # Basic community metrics
-                stats[f'Community {i+1} Density'] = nx.density(subgraph)
-                stats[f'Community {i+1} Conductance'] = nx.conductance(G, com)
-                stats[f'Community {i+1} Avg Clustering'] = nx.average_clustering(subgraph)
-                
-                # Degree centrality
-                degree_cent = nx.degree_centrality(subgraph)
-                stats[f'Community {i+1} Avg Degree Centrality'] = np.mean(list(degree_cent.values()))
-                
-                # Average path length (only for connected subgraphs)
-                if nx.is_connected(subgraph):
-                    stats[f'Community {i+1} Avg Path Length'] = nx.average_shortest_path_length(subgraph)
-        except:
-            pass
-        
-        return stats
-
-    def calculate_leiden_network_stats(G, unweighted_G, communities):
-        """
-        Calculate comprehensive network statistics for the graph using Leiden community detection.
-        """
-        stats = {}
-
-        try:
-            stats['Modularity Entire Network'] = community.modularity(G, communities)
-        except:
-            pass
-
-        try:
-            connected_components = list(nx.connected_components(G))
-            if len(connected_components) > 1:
-                for i, component in enumerate(connected_components):
-                    subgraph = G.subgraph(component)
-                    # Use Leiden for component-level modularity too
-                    import igraph as ig
-                    import leidenalg
-                    g_ig = ig.Graph.from_networkx(subgraph)
-                    if subgraph.is_multigraph():
-                        g_ig.simplify(combine_edges="sum")
-                    partition = leidenalg.find_partition(g_ig, leidenalg.ModularityVertexPartition)
-                    component_communities = [set() for _ in range(max(partition.membership) + 1)]
-                    nodes_list = list(subgraph.nodes())
-                    for idx, mem in enumerate(partition.membership):
-                        component_communities[mem].add(nodes_list[idx])
-                    component_communities = [c for c in component_communities if len(c) > 0]
-                    modularity = community.modularity(subgraph, component_communities)
-                    num_nodes = len(component)
-                    stats[f'Modularity of component with {num_nodes} nodes'] = modularity
-        except:
-            pass
-
-        try:
-            stats['Number of Communities'] = len(communities)
-            community_sizes = [len(com) for com in communities]
-            stats['Community Sizes'] = community_sizes
-            stats['Average Community Size'] = np.mean(community_sizes)
-        except:
-            pass
-
-        try:
-            stats['Global Clustering Coefficient'] = nx.average_clustering(unweighted_G)
-        except:
-            pass
-        try:
-            stats['Assortativity'] = nx.degree_assortativity_coefficient(G)
-        except:
-            pass
-
-        def count_inter_community_edges(G, communities):
-            inter_edges = 0
-            for com1, com2 in itertools.combinations(communities, 2):
-                inter_edges += len(list(nx.edge_boundary(G, com1, com2)))
-            return inter_edges
-
-        try:
-            stats['Inter-community Edges'] = count_inter_community_edges(G, communities)
-        except:
-            pass
-
-        def mixing_parameter(G, communities):
-            external_edges = 0
-            total_edges = 0
-            for com in communities:
-                subgraph = G.subgraph(com)
-                internal_edges = subgraph.number_of_edges()
-                total_com_edges = sum(G.degree(node) for node in com)
-                external_edges += total_com_edges - (2 * internal_edges)
-                total_edges += total_com_edges
-            return external_edges / total_edges
-
-        try:
-            stats['Mixing Parameter'] = mixing_parameter(G, communities)
-        except:
-            pass
-
-        try:
-            for i, com in enumerate(communities):
-                subgraph = unweighted_G.subgraph(com)
-                stats[f'Community {i+1} Density'] = nx.density(subgraph)
-                stats[f'Community {i+1} Conductance'] = nx.conductance(G, com)
-                stats[f'Community {i+1} Avg Clustering'] = nx.average_clustering(subgraph)
-                degree_cent = nx.degree_centrality(subgraph)
-                stats[f'Community {i+1} Avg Degree Centrality'] = np.mean(list(degree_cent.values()))
-                if nx.is_connected(subgraph):
-                    stats[f'Community {i+1} Avg Path Length'] = nx.average_shortest_path_length(subgraph)
-        except:
-            pass
-
-        return stats
-
-    stats = {}
-    unweighted_G = G
+def _community_adjacency(G, weighted):
+    """
+    CSR adjacency for community detection. Weighted networks are scored as if each weight were that many parallel edges,
+    which is what convert_to_multigraph produces, without building the multigraph.
+    Returns the node order, the adjacency used for modularity and the edge-count adjacency used for degree statistics.
+    """
+    nodes, A = community_engine.graph_to_csr(G)
     if weighted:
-        G = n3d.convert_to_multigraph(G)
-
-    if style == 1:
-        # Louvain
-        communities = list(nx.community.louvain_communities(G, seed = seed))
-        output = {}
-        for i, com in enumerate(communities):
-            for node in com:
-                output[node] = i + 1
-        if dostats:
-            stats = calculate_louvain_network_stats(G, unweighted_G, communities, seed)
-        return output, None, stats
+        A.data = np.maximum(1, np.round(A.data))
+        return nodes, A, A
+    return nodes, A, None
 
-    elif style == 2:
-        # Leiden
-        import igraph as ig
-        import leidenalg
 
-        g_ig = ig.Graph.from_networkx(G)
-
-        # igraph doesn't support multigraphs natively — simplify by summing edge weights
-        if G.is_multigraph():
-            g_ig.simplify(combine_edges="sum")
-
-        # Set up partition kwargs
-        partition_kwargs = {}
-        if seed is not None:
-            partition_kwargs['seed'] = seed
+def _membership_to_output(nodes, membership):
+    """Map node -> community id, numbered from 1"""
+    return {node: int(com) + 1 for node, com in zip(nodes, membership)}
 
-        # Use weights if available (convert_to_multigraph typically produces weighted edges)
-        if 'weight' in g_ig.es.attributes():
-            partition_kwargs['weights'] = 'weight'
 
-        partition = leidenalg.find_partition(
-            g_ig,
-            leidenalg.ModularityVertexPartition,
-            **partition_kwargs
-        )
+def community_partition(G, weighted = False, style = 0, dostats = True, seed = None, resolution = 1.0):
+    """
+    Partition a network into communities.
 
-        # Map igraph node indices back to original NetworkX node labels
-        nodes_list = list(G.nodes())
-        communities = [set() for _ in range(max(partition.membership) + 1)]
-        for idx, mem in enumerate(partition.membership):
-            communities[mem].add(nodes_list[idx])
-        communities = [c for c in communities if len(c) > 0]
+    Parameters:
+    -----------
+    G : networkx.Graph
+        The input graph
+    weighted : bool
+        Treat edge weights as duplicate connections
+    style : int
+        0 for label propagation, 1 for Louvain, 2 for Leiden (requires igraph and leidenalg)
+    dostats : bool
+        Also return community statistics
+    seed : int or None
+        Random seed
+    resolution : float
+        Resolution parameter for Louvain and Leiden. Higher values give more, smaller communities.
 
-        output = {}
-        for i, com in enumerate(communities):
-            for node in com:
-                output[node] = i + 1
+    Returns:
+    --------
+    tuple
+        (dict of node -> community id, None, stats dict)
+    """
+    stats = {}
+    nodes, A, D = _community_adjacency(G, weighted)
 
+    if style == 1 or style == 2:
+        method = 'louvain' if style == 1 else 'leiden'
+        membership = community_engine.detect(A, method = method, resolution = resolution, seed = seed)
+        output = _membership_to_output(nodes, membership)
         if dostats:
-            stats = calculate_leiden_network_stats(G, unweighted_G, communities)
-
+            # Per-component modularity comes from one Louvain run scored against each component's own edges,
+            # equivalent to partitioning every component separately
+            _, components = csgraph.connected_components(A, directed = False)
+            component_membership = None
+            if components.max() > 0:
+                component_membership = community_engine.louvain(A, resolution = resolution, seed = seed, components = components)
+            stats = community_engine.partition_stats(A, membership, D = D, components = components, component_membership = component_membership)
         return output, None, stats
 
     elif style == 0:
         # Label propagation
         if seed is not None:
             import random
-            import numpy as np
             random.seed(seed)
             np.random.seed(seed)
+        if weighted:
+            G = n3d.convert_to_multigraph(G)
         communities = list(community.label_propagation_communities(G))
         output = {}
         for i, com in enumerate(communities):
             for node in com:
                 output[node] = i + 1
         if dostats:
-            stats = calculate_network_stats(G, unweighted_G, communities)
+            membership = np.array([output[node] for node in nodes])
+            stats = community_engine.partition_stats(A, membership, D = D)
         return output, None, stats
 
 
+def community_resolution_sweep(G, resolutions, seeds = (42,), weighted = False, style = 1, consensus_threshold = 0.5, n_jobs = None):
+    """
+    Run Louvain or Leiden over several resolution parameters and seeds in a process pool.
+
+    Parameters:
+    -----------
+    G : networkx.Graph
+        The input graph
+    resolutions : iterable of float
+        Resolution parameters to try
+    seeds : iterable of int
+        Seeds to run at each resolution. With more than one seed, the runs at each resolution are merged into a consensus partition.
+    weighted : bool
+        Treat edge weights as duplicate connections
+    style : int
+        1 for Louvain, 2 for Leiden
+    consensus_threshold : float
+        Fraction of runs in which two neighbours must share a community to stay together in the consensus
+    n_jobs : int or None
+        Worker processes. Defaults to the cpu count.
+
+    Returns:
+    --------
+    dict
+        resolution -> {'modularity': float, 'num_communities': int, 'partition': dict of node -> community id}
+    """
+    nodes, A, D = _community_adjacency(G, weighted)
+    method = 'leiden' if style == 2 else 'louvain'
+    runs = community_engine.resolution_sweep(A, resolutions = resolutions, seeds = seeds, method = method, n_jobs = n_jobs)
+
+    results = {}
+    for resolution in resolutions:
+        resolution = float(resolution)
+        memberships = [run['membership'] for run in runs if run['resolution'] == resolution]
+        if len(memberships) > 1:
+            membership = community_engine.consensus_partition(A, memberships, threshold = consensus_threshold)
+        else:
+            membership = memberships[0]
+        results[resolution] = {
+            'modularity': community_engine.modularity(A, membership, resolution),
+            'num_communities': int(membership.max() + 1) if len(membership) else 0,
+            'partition': _membership_to_output(nodes, membership)
+        }
+
+    return results
+
+
 def create_directory(directory_name):
     try:
         os.mkdir(directory_name)
@@ -1,15 +1,13 @@
 import numpy as np
 from sklearn.cluster import KMeans
-from sklearn.metrics import calinski_harabasz_score
 import matplotlib.pyplot as plt
 from typing import Dict, Set, List, Tuple, Optional
-import umap
 from matplotlib.colors import LinearSegmentedColormap
 from sklearn.cluster import DBSCAN
-from sklearn.neighbors import NearestNeighbors
 import matplotlib.colors as mcolors
 from collections import Counter
 from . import community_extractor
+from . import embedding as embedding_lib
 import random
 import re
 import matplotlib.patches as mpatches
@@ -38,16 +36,7 @@ def cluster_arrays_dbscan(data_input, seed=42):
           Note: Outliers are excluded from the output
     """
     
-    # Handle both dict and list inputs
-    if isinstance(data_input, dict):
-        keys = list(data_input.keys())
-        array_values = list(data_input.values())
-    else:
-        keys = list(range(len(data_input)))
-        array_values = data_input
-    
-    # Convert to numpy
-    data = np.array(array_values)
+    keys, data = embedding_lib.feature_matrix(data_input)
     n_samples = len(data)
     
     # Simple heuristics for DBSCAN parameters
@@ -56,11 +45,8 @@ def cluster_arrays_dbscan(data_input, seed=42):
     # Estimate eps using 4th nearest neighbor distance (common heuristic)
     k = min(4, n_samples - 1)
     if k > 0:
-        nbrs = NearestNeighbors(n_neighbors=k + 1)
-        nbrs.fit(data)
-        distances, _ = nbrs.kneighbors(data)
-        # Use 80th percentile of k-nearest distances as eps
-        eps = np.percentile(distances[:, k], 80)
+        # Use 80th percentile of k-nearest distances as eps. The neighbor graph is cached for a later UMAP of the same data.
+        eps = float(np.percentile(embedding_lib.kth_neighbor_distances(data, k, seed), 80))
     else:
         eps = 0.1  # fallback
     
@@ -109,16 +95,7 @@ def cluster_arrays(data_input, n_clusters=None, seed=42):
     list: [[key1, key2], [key3, key4, key5]] - List of clusters, each containing keys/indices
     """
     
-    # Handle both dict and list inputs
-    if isinstance(data_input, dict):
-        keys = list(data_input.keys())
-        array_values = list(data_input.values())
-    else:
-        keys = list(range(len(data_input)))
-        array_values = data_input
-    
-    # Convert to numpy
-    data = np.array(array_values)
+    keys, data = embedding_lib.feature_matrix(data_input)
     
     # Auto-detect optimal number of clusters if not specified
     if n_clusters is None:
@@ -140,45 +117,11 @@ def _find_optimal_clusters(data, seed, max_k):
     """
     Find optimal number of clusters using Calinski-Harabasz index.
     """
-    n_samples = len(data)
-    
-    # Need at least 2 samples to cluster
-    if n_samples < 2:
-        return 1
-    
-    # Limit max_k to reasonable bounds
-    max_k = min(max_k, n_samples - 1, 20)
-    print(f"Max_k: {max_k}, n_samples: {n_samples}")
-    
-    if max_k < 2:
-        return 1
-    
-    # Use Calinski-Harabasz index to find optimal k
-    ch_scores = []
-    k_range = range(2, max_k + 1)
-    
-    for k in k_range:
-        try:
-            print(f"Testing {k} clusters")
-            kmeans = KMeans(n_clusters=k, random_state=seed, n_init=10)
-            labels = kmeans.fit_predict(data)
-            
-            # Check if we got the expected number of clusters
-            if len(np.unique(labels)) == k:
-                score = calinski_harabasz_score(data, labels)
-                ch_scores.append(score)
-            else:
-                ch_scores.append(0)  # Penalize solutions that didn't achieve k clusters
-                
-        except Exception:
-            ch_scores.append(0)
-    
-    # Find k with highest Calinski-Harabasz score
-    if ch_scores and max(ch_scores) > 0:
-        optimal_k = k_range[np.argmax(ch_scores)]
+    optimal_k = embedding_lib.optimal_cluster_count(data, max_k, seed=seed)
+    if optimal_k > 1:
         print(f"Using {optimal_k} neighborhoods")
-        return optimal_k
-    
+    return optimal_k
+
 def plot_dict_heatmap(unsorted_data_dict, id_set, figsize=(12, 8), title="Neighborhood Heatmap", 
                      center_at_one=False, center_at_zero=False, sublabel = "Community"):
     """
@@ -462,7 +405,8 @@ def visualize_cluster_composition_umap(cluster_data: Dict[int, np.ndarray],
                                      title = 'UMAP Visualization of Community Compositions',
                                      neighborhoods: Optional[Dict[int, int]] = None,
                                      original_communities = None,
-                                     subname = 'Supercommunity'):
+                                     subname = 'Supercommunity',
+                                     pca_components: Optional[int] = None):
     """
     Convert cluster composition data to UMAP visualization.
     
@@ -485,6 +429,8 @@ def visualize_cluster_composition_umap(cluster_data: Dict[int, np.ndarray],
     neighborhoods : dict, optional
         Dictionary mapping node IDs to neighborhood IDs {node_id: neighborhood_id}.
         If provided, points will be colored by neighborhood using community coloration methods.
+    pca_components : int, optional
+        Project the compositions to this many principal components before UMAP (for wide inputs)
     
     Returns:
     --------
@@ -505,13 +451,11 @@ def visualize_cluster_composition_umap(cluster_data: Dict[int, np.ndarray],
     import math
     n = len(cluster_ids)
     point_size = max(10, min(100, 100 / math.log2(n + 1)))
-    compositions = np.array([cluster_data[cluster_id] for cluster_id in cluster_ids])
-    
-    # Create UMAP reducer
-    reducer = umap.UMAP(n_components=n_components, random_state=random_state)
+    _, compositions = embedding_lib.feature_matrix(cluster_data)
     
     # Fit and transform the composition data
-    embedding = reducer.fit_transform(compositions)
+    embedding = embedding_lib.umap_embedding(compositions, n_components=n_components, random_state=random_state,
+                                             pca_components=pca_components)
     
     # Determine coloring scheme based on parameters
     if neighborhoods is not None and original_communities is not None:
@@ -27,11 +27,21 @@ from . import network_draw
 from skimage import morphology as mpg
 from . import smart_dilate
 from . import modularity
+from . import community_engine
+from . import centrality_engine
+from . import graph_core
+from . import label_split
 from . import simple_network
 from . import community_extractor
 from . import network_analysis
 from . import morphology
 from . import proximity
+from . import relabel
+from . import sampling
+from . import edge_table
+from . import label_volume
+from . import resample
+from . import hole_fill
 from skimage.segmentation import watershed as water
 import json
 from collections import defaultdict, deque
@@ -475,67 +485,8 @@ def upsample_with_padding(data, factor=None, original_shape=None):
         return _upsample_3d_array(data, factor, original_shape)
 
 def _upsample_3d_array(data, factor, original_shape):
-    """Helper function to handle the upsampling of a single 3D array"""
-    original_shape = np.array(original_shape)
-    current_shape = np.array(data.shape)
-    
-    # Calculate factors if not provided
-    if factor is None:
-        # Compute the ratio between original and current shape for each dimension
-        factors = [os / cs for os, cs in zip(original_shape, current_shape)]
-        # If all factors are the same, use a single number for efficiency
-        if len(set(factors)) == 1:
-            factor = factors[0]
-        else:
-            factor = tuple(factors)
-    elif isinstance(factor, (int, float)):
-        factor = factor  # Keep it as a single number
-        
-    # Upsample the input array
-    binary_array = zoom(data, factor, order=0)
-    upsampled_shape = np.array(binary_array.shape)
-    
-    # Calculate the positive differences in dimensions
-    difference_dims = original_shape - upsampled_shape
-    
-    # Calculate the padding amounts for each dimension
-    padding_dims = np.maximum(difference_dims, 0)
-    padding_before = padding_dims // 2
-    padding_after = padding_dims - padding_before
-    
-    # Pad the binary array along each dimension
-    padded_array = np.pad(binary_array, 
-                         [(padding_before[0], padding_after[0]),
-                          (padding_before[1], padding_after[1]),
-                          (padding_before[2], padding_after[2])],
-                         mode='constant',
-                         constant_values=0)
-    
-    # Calculate the subtraction amounts for each dimension
-    sub_dims = np.maximum(-difference_dims, 0)
-    sub_before = sub_dims // 2
-    sub_after = sub_dims - sub_before
-    
-    # Remove excess dimensions sequentially
-    # Remove planes from the beginning and end
-    if sub_dims[0] == 0:
-        trimmed_planes = padded_array
-    else:
-        trimmed_planes = padded_array[sub_before[0]:-sub_after[0], :, :]
-    
-    # Remove rows from the beginning and end
-    if sub_dims[1] == 0:
-        trimmed_rows = trimmed_planes
-    else:
-        trimmed_rows = trimmed_planes[:, sub_before[1]:-sub_after[1], :]
-    
-    # Remove    columns from the beginning and end
-    if sub_dims[2] == 0:
-        trimmed_array = trimmed_rows
-    else:
-        trimmed_array = trimmed_rows[:, :, sub_before[2]:-sub_after[2]]
-    
-    return trimmed_array
+    """Helper function to handle the upsampling of a single 3D array: nearest-neighbor zoom, then centered padding/trimming to original_shape, in one pass"""
+    return resample.upsample_to(data, factor, original_shape)
 
 
 def remove_branches_new(skeleton, length):
@@ -1346,60 +1297,20 @@ def z_project(array3d, method='max'):
         return np.stack(array_list, axis=-1)
 
 
-def fill_holes_3d(array, head_on = False, fill_borders = True):
-    def process_slice(slice_2d, border_threshold=0.08, fill_borders = True):
-        """
-        Process a 2D slice, considering components that touch less than border_threshold
-        of any border length as potential holes.
-        
-        Args:
-            slice_2d: 2D binary array
-            border_threshold: proportion of border that must be touched to be considered background
-        """
-        from scipy.ndimage import binary_fill_holes
-        
-        slice_2d = slice_2d.astype(np.uint8)
-
-        # Apply scipy's binary_fill_holes to the result
-        slice_2d = binary_fill_holes(slice_2d)
-        
-        return slice_2d
-        
+def fill_holes_3d(array, head_on = False, fill_borders = True, mode = 'planes', out = None):
+    """
+    Binarizes an array and fills its holes, slice by slice in the XY, XZ and YZ planes (a voxel is filled if it is a hole in any of them). Slices are filled in parallel into one output array.
+    :param array: (Mandatory, ndarray) - A 2D or 3D array, nonzero being foreground.
+    :param head_on: (Optional - Val = False, boolean) - If True, only XY slices are filled. This is also the case for arrays with 3 or fewer Z planes.
+    :param fill_borders: (Optional - Val = True, boolean) - Kept for compatibility, unused.
+    :param mode: (Optional - Val = 'planes', string) - 'planes' for the slice-wise fill, or '3d' to fill only the background fully enclosed in the volume, in a single pass (2D arrays and single plane volumes are filled as a plane).
+    :param out: (Optional - Val = None, ndarray or string) - A uint8 array to write the output into, or a .npy path to create it as a memmap.
+    :returns: a uint8 ndarray, 255 for foreground and filled holes, 0 elsewhere.
+    """
     print("Filling Holes...")
-    
-    array = binarize(array)
-    #inv_array = invert_array(array)
-    
-    # Create arrays for all three planes
-    array_xy = np.zeros_like(array, dtype=np.uint8)
-    array_xz = np.zeros_like(array, dtype=np.uint8)
-    array_yz = np.zeros_like(array, dtype=np.uint8)
-    
-    # Process XY plane
-    for z in range(array.shape[0]):
-        array_xy[z] = process_slice(array[z], fill_borders = fill_borders)
-        
-    if (array.shape[0] > 3) and not head_on: #only use these dimensions for sufficiently large zstacks
-        
-        # Process XZ plane    
-        for y in range(array.shape[1]):
-            slice_xz = array[:, y, :]
-            array_xz[:, y, :] = process_slice(slice_xz, fill_borders = fill_borders)
-            
-        # Process YZ plane
-        for x in range(array.shape[2]):
-            slice_yz = array[:, :, x]
-            array_yz[:, :, x] = process_slice(slice_yz, fill_borders = fill_borders)
-        
-        # Combine results from all three planes
-        filled = (array_xy | array_xz | array_yz) * 255
-        return array + filled
-    else:
-        # Apply scipy's binary_fill_holes to each XY slice
-        from scipy.ndimage import binary_fill_holes
-        for z in range(array_xy.shape[0]):
-            array_xy[z] = binary_fill_holes(array_xy[z])
-        return array_xy * 255
+
+    axes = (0, 1, 2) if array.ndim == 3 and array.shape[0] > 3 and not head_on else (0,) #only use these dimensions for sufficiently large zstacks
+    return hole_fill.fill_holes(array, axes = axes, mode = mode, out = out)
 
 def fill_holes_3d_old(array, head_on = False, fill_borders = True):
 
@@ -1495,7 +1406,7 @@ def resize(array, factor, order = 0):
         processed_arrays = []
         for i in range(array.shape[3]):  # iterate through the color dimension
             color_array = array[:, :, :, i]  # get 3D array for each color channel
-            processed_color = zoom(color_array, (factor), order = order)
+            processed_color = resample.zoom(color_array, (factor), order = order)
 
             processed_arrays.append(processed_color)
         
@@ -1503,7 +1414,7 @@ def resize(array, factor, order = 0):
         result = np.stack(processed_arrays, axis=3)
         return result
 
-    array = zoom(array, (factor), order = order)
+    array = resample.zoom(array, (factor), order = order)
 
     return array
 
@@ -1994,6 +1905,17 @@ def label_objects(nodes, dtype=int):
     return nodes, num_nodes
 
 
+def separate_nontouching_objects(array, max_val = None, branches = False):
+    """
+    Split labels whose voxels are not all 26-connected. The largest piece keeps its label and the rest are numbered above max_val.
+    :param array: (Mandatory, ndarray) - 2D or 3D integer label array.
+    :param max_val: (Optional - Val = None, int) - Largest original label. New labels start above it. Defaults to the array maximum.
+    :param branches: (Optional - Val = False, bool) - If True, every split off piece instead takes the original label it touches most, so only pieces touching no original label stay separate.
+    :returns: (ndarray) - The relabeled array.
+    """
+    return label_split.separate_nontouching_objects(array, max_val = max_val, branches = branches)
+
+
 def remove_zeros(input_list):
     """Internal method to remove zeroes from an array"""
     # Use boolean indexing to filter out zeros
@@ -2012,20 +1934,14 @@ def overlay_arrays_simple(edge_labels_1, edge_labels_2):
 
 def combine_edges(edge_labels_1, edge_labels_2):
     """
-    let NumPy handle promotion automatically
+    Where edge_labels_1 is 0 and edge_labels_2 is not, take the edge_labels_2 label offset by the maximum of edge_labels_1.
     """
     # Early exit if no combination needed
-    mask = (edge_labels_1 == 0) & (edge_labels_2 > 0)
-    if not np.any(mask):
-        return edge_labels_1.copy()
-    
-    max_val = np.max(edge_labels_1)
-    
-    # Let NumPy handle dtype promotion automatically
-    # This will promote to the smallest type that can handle the operation
-    offset_labels = edge_labels_2 + max_val
-    
-    return np.where(mask, offset_labels, edge_labels_1)
+    max_val = int(np.max(edge_labels_1))
+    top = max_val + int(np.max(edge_labels_2))
+
+    # Work on one copy of edge_labels_1, in a dtype chosen once to hold the offset labels
+    return label_volume.overlay(label_volume.promote(edge_labels_1, top, copy = True), edge_labels_2, offset = max_val, top = top)
 
 def directory_info(directory = None):
     """Internal method to get the files in a directory, optionally the current directory if nothing passed"""
@@ -2252,17 +2168,8 @@ def downsample(data, factor, directory=None, order=0):
         result = np.stack(processed_arrays, axis=3)
         return result
     
-    # Check if Z dimension is too small relative to downsample factor
-    if data.ndim == 3 and data.shape[0] < factor * 4:
-        print(f"Warning: Z dimension ({data.shape[0]}) is less than 4x the downsample factor ({factor}). "
-              f"Skipping Z-axis downsampling to preserve resolution.")
-        zoom_factors = (1, 1/factor, 1/factor)
-    else:
-        zoom_factors = 1/factor
-
-
-    # Apply downsampling
-    data = zoom(data, zoom_factors, order=order)
+    # Apply downsampling (Z is kept when it is under 4x the factor; order 0 streams over the input)
+    data = resample.downsample(data, factor, order=order)
     
     # Save if input was a file path
     if isinstance(data2, str):
@@ -3219,6 +3126,7 @@ class Network_3D:
         :attribute 8: _node_identities - a dictionary that relates all nodes to some string identity that details what the node actually represents
         :attribute 9: _node_centroids - a dictionary containing a [Z, Y, x] centroid for all labelled objects in the nodes attribute.
         :attribute 10: _edge_centroids - a dictionary containing a [Z, Y, x] centroid for all labelled objects in the edges attribute.
+        :attribute 11: _graph - a compact array-based copy of the network (graph_core.CompactGraph), rebuilt on demand whenever network_lists or network change.
         :returns: a Network-3D classs object. 
         """
         self._nodes = nodes
@@ -3235,6 +3143,9 @@ class Network_3D:
         self._network_overlay = network_overlay
         self._id_overlay = id_overlay
         self.normalized_weights = None
+        self._graph = None
+        self._graph_version = None
+        self._network_version = 0
 
     def copy(self):
         """
@@ -3271,9 +3182,11 @@ class Network_3D:
     @property
     def network(self):
         """
-        A networkx graph
+        A networkx graph. If only network_lists has been set, the graph is built from them on first access.
         :returns: the network attribute.
         """
+        if self._network is None and self._network_lists is not None:
+            self._network = self.graph.to_networkx() # Same edges, so the compact graph stays valid
         return self._network
 
     @network.setter
@@ -3281,6 +3194,7 @@ class Network_3D:
         """Sets the network property, which is intended be a networkx graph object. Additionally alters the network_lists property which is primarily an internal attribute"""
         if G is not None and not isinstance(G, nx.Graph):
             print("network attribute was not set to a networkX undirected graph, which may produce unintended results")
+        self._network_changed()
         if G is None:
             self._network = None 
             self._network_lists = None
@@ -3289,23 +3203,17 @@ class Network_3D:
 
         self._network = G
         self.communities = None
-        node_pairings = list(G.edges(data=True)) #Assembling the network lists property.
-        lista = []
-        listb = []
-        listc = []
 
         try:
-            #Networks default to have a weighted attribute of 1 if not otherwise weighted. Here we update the weights
-            for u, v, data in node_pairings:
-                weight = data.get('weight', 1)  # Default weight is 1 if not specified
-                for _ in range(weight):
-                    lista.append(u)
-                    listb.append(v)
-                    listc.append(0)
-            
-            self._network_lists = [lista, listb, listc]
-
-
+            #Networks default to have a weighted attribute of 1 if not otherwise weighted. Each edge is repeated weight times in the lists
+            if G.number_of_edges() == 0:
+                self._network_lists = [[], [], []]
+            else:
+                lista, listb, weights = (np.asarray(col) for col in zip(*G.edges(data='weight', default=1)))
+                weights = weights.astype(np.int64, casting='safe')
+                lista = np.repeat(lista, weights).tolist()
+                listb = np.repeat(listb, weights).tolist()
+                self._network_lists = [lista, listb, [0] * len(lista)]
         except:
             pass
 
@@ -3314,6 +3222,7 @@ class Network_3D:
     def network(self):
         """Removes the network property by setting it to none"""
         self._network = None
+        self._network_changed()
 
     @property
     def network_lists(self):
@@ -3329,7 +3238,8 @@ class Network_3D:
         if value is not None and not isinstance(value, list):
             raise ValueError("network lists must be a list.")
         self._network_lists = value
-        self._network, _ = network_analysis.weighted_network(self._network_lists)
+        self._network = None # Rebuilt from the lists by the network getter when first needed
+        self._network_changed()
         self.communities = None
 
     @network_lists.deleter
@@ -3337,6 +3247,29 @@ class Network_3D:
         """Removes the network_lists attribute by setting it to None"""
 
         self._network_lists = None
+        self._network_changed()
+
+    def _network_changed(self):
+        """Marks the network as edited so the compact graph is rebuilt on next access. Called by the network and network_lists setters and deleters and by every method that edits either in place; code editing them in place from outside should reassign them (my_network.network_lists = my_network.network_lists)."""
+        self._network_version += 1
+        self._graph = None
+
+    @property
+    def graph(self):
+        """
+        A compact array-based copy of the network (graph_core.CompactGraph) for degree, component, k-core, triangle, BFS and subgraph queries.
+        Built from network (which keeps isolated nodes) or, before the networkx graph has been built, directly from network_lists. Rebuilt whenever either changes.
+        :returns: a CompactGraph, or None if no network is set.
+        """
+        if self._graph is None or self._graph_version != self._network_version:
+            if self._network is not None:
+                self._graph = graph_core.CompactGraph.from_networkx(self._network)
+            elif self._network_lists is not None:
+                self._graph = graph_core.CompactGraph.from_lists(self._network_lists)
+            else:
+                self._graph = None
+            self._graph_version = self._network_version
+        return self._graph
 
     @property
     def xy_scale(self):
@@ -4009,6 +3942,7 @@ class Network_3D:
         if file_path is not None:
             self._network, net_weights = network_analysis.weighted_network(file_path)
             self._network_lists = network_analysis.read_excel_to_lists(file_path)
+            self._network_changed()
             print("Succesfully loaded network")
             return
 
@@ -4026,6 +3960,7 @@ class Network_3D:
                         self._network_lists = load_pickle(f'{directory}/{item}')
                     else:
                         self._network_lists = load_pickle(f'{item}')
+            self._network_changed()
             if self._network is not None and self._network_lists is not None:
                 print("Succesfully loaded network")
                 return
@@ -4039,11 +3974,13 @@ class Network_3D:
                     if directory is not None:
                         self._network, net_weights = network_analysis.weighted_network(f'{directory}/{item}')
                         self._network_lists = network_analysis.read_excel_to_lists(f'{directory}/{item}')
+                        self._network_changed()
                         print("Succesfully loaded network")
                         return
                     else:
                         self._network, net_weights = network_analysis.weighted_network(item)
                         self._network_lists = network_analysis.read_excel_to_lists(item)
+                        self._network_changed()
                         print("Succesfully loaded network")
                         return
 
@@ -4497,44 +4434,30 @@ class Network_3D:
         print("Combining node arrays")
         
         # Calculate the maximum value that will exist in the output
-        max_root = np.max(root_nodes)
-        max_other = np.max(other_nodes)
+        max_root = int(np.max(root_nodes))
+        max_other = int(np.max(other_nodes))
         max_output = max_root + max_other  # Worst case: all other_nodes shifted by max_root
-        
-        # Determine the minimum dtype needed
-        if max_output <= 255:
-            target_dtype = np.uint8
-        elif max_output <= 65535:
-            target_dtype = np.uint16
-        else:
-            target_dtype = np.uint32
-                
-        # Convert arrays to appropriate dtype
-        root_nodes = root_nodes.astype(target_dtype)
-        other_nodes = other_nodes.astype(target_dtype)
-        
-        # Now perform the merge
-        mask = (root_nodes == 0) & (other_nodes > 0)
-        if np.any(mask):
-            other_nodes_shifted = np.where(other_nodes > 0, other_nodes + max_root, 0)
-            if centroids:
-                new_dict = network_analysis._find_centroids(other_nodes_shifted, down_factor = down_factor)
-                if down_factor is not None:
-                    for item in new_dict:
-                        new_dict[item] = down_factor * new_dict[item]
-                self.node_centroids.update(new_dict)
-            other_nodes = np.where(mask, other_nodes_shifted, 0)
+
+        if centroids:
+            other_nodes_shifted = label_volume.offset_nonzero(other_nodes, max_root, top = max_other, copy = True)
+            new_dict = network_analysis._find_centroids(other_nodes_shifted, down_factor = down_factor)
+            del other_nodes_shifted
+            if down_factor is not None:
+                for item in new_dict:
+                    new_dict[item] = down_factor * new_dict[item]
+            self.node_centroids.update(new_dict)
+
+        # Now perform the merge: other labels, shifted by max_root, fill the background of a copy of the root nodes in the dtype (chosen once) that holds them all
+        nodes = label_volume.overlay(root_nodes.astype(label_volume.minimal_dtype(max_output)), other_nodes, offset = max_root, top = max_output)
 
         if root_ID is not None:
-            rootIDs = list(np.unique(root_nodes)) #Sets up adding these vals to the identitiy dictionary. Gets skipped if this has already been done.
+            rootIDs = list(relabel.unique_labels(root_nodes)) #Sets up adding these vals to the identitiy dictionary. Gets skipped if this has already been done.
 
             if rootIDs[0] == 0: #np unique can include 0 which we don't want.
                 del rootIDs[0]
 
-        otherIDs = list(np.unique(other_nodes)) #Sets up adding other vals to the identity dictionary.
-
-        if otherIDs[0] == 0:
-            del otherIDs[0]
+        otherIDs = relabel.unique_labels(nodes) #Sets up adding other vals to the identity dictionary.
+        otherIDs = list(otherIDs[otherIDs > max_root]) #Only the merged in labels sit above max_root
 
         if root_ID is not None: #Adds the root vals to the dictionary if it hasn't already
 
@@ -4558,8 +4481,6 @@ class Network_3D:
 
             identity_dict[item] = [other_ID]
 
-        nodes = root_nodes + other_nodes #Combine the outer edges with the inner edges modified via the above steps
-
         return nodes, identity_dict
 
     def merge_nodes(self, addn_nodes_name, label_nodes = True, root_id = "Root_Nodes", centroids = False, down_factor = None, is_array = False):
@@ -4664,6 +4585,7 @@ class Network_3D:
             df = create_and_save_dataframe(connections_parallel)
             self._network_lists = network_analysis.read_excel_to_lists(df)
             self._network, net_weights = network_analysis.weighted_network(df)
+            self._network_changed()
 
         if ignore_search_region and hasattr(self, '_edges') and self._edges is not None and hasattr(self, '_nodes') and self._nodes is not None:
             #dilate_xy, dilate_z = dilation_length_to_pixels(self._xy_scale, self._z_scale, search, search)
@@ -4675,6 +4597,7 @@ class Network_3D:
             df = create_and_save_dataframe(connections_parallel)
             self._network_lists = network_analysis.read_excel_to_lists(df)
             self._network, net_weights = network_analysis.weighted_network(df)
+            self._network_changed()
 
     def create_id_network(self, n=5):
         """This method is deprecated and does not work for the current program architecture"""
@@ -4892,53 +4815,51 @@ class Network_3D:
 
         return output        
 
-    def draw_node_indices(self, directory = None, down_factor = None):
+    def draw_node_indices(self, directory = None, down_factor = None, out = None):
         """
         Method that draws the numerical IDs for nodes in a Network_3D object, to be used as an overlay for viewing node IDs. 
         IDs will be saved as a .tif to the active directory if none is specified. Will used the node_centroids property for faster computation, unless passed the down_factor param.
         :param directory: (Optional - Val = None; string). Path to a directory to save the node_indicies to.
         :param down_factor: (Optional - Val = None; int).  Factor to downsample nodes by for calculating centroids. The node_centroids property will be used if this value is not set. If there are no node_centroids, this value must be set (to 1 or higher).
+        :param out: (Optional - Val = None; ndarray). A uint8 array (downsampled if down_factor is set) to draw the IDs into, such as an existing id_overlay.
         """
 
         num_nodes = np.max(self._nodes)
 
         if down_factor is not None:
-            nodes = downsample(self._nodes, down_factor)
-            centroids = self._node_centroids.copy()
-
-            for item in centroids:
-                centroids[item] = np.round(centroids[item]/down_factor)
+            # Only the downsampled shape is needed; the centroids are scaled as the IDs are drawn
+            if out is None:
+                out = np.zeros(resample.downsample_shape(self._nodes.shape, down_factor), dtype = np.uint8)
 
-            output = node_draw.draw_from_centroids(nodes, num_nodes, centroids, twod_bool = False, directory = directory)
+            output = node_draw.draw_from_centroids(out, num_nodes, self._node_centroids, twod_bool = False, directory = directory, out = out, down_factor = down_factor)
 
         else:
 
-            output = node_draw.draw_from_centroids(self._nodes, num_nodes, self._node_centroids, twod_bool = False, directory = directory)
+            output = node_draw.draw_from_centroids(self._nodes, num_nodes, self._node_centroids, twod_bool = False, directory = directory, out = out)
 
         return output
 
-    def draw_edge_indices(self, directory = None, down_factor = None):
+    def draw_edge_indices(self, directory = None, down_factor = None, out = None):
         """
         Method that draws the numerical IDs for edges in a Network_3D object, to be used as an overlay for viewing edge IDs. 
         IDs will be saved as a .tif to the active directory if none is specified. Will used the edge_centroids property for faster computation, unless passed the down_factor param.
         :param directory: (Optional - Val = None; string). Path to a directory to save the edge indices to.
         :param down_factor: (Optional - Val = None; int).  Factor to downsample edges by for calculating centroids. The edge_centroids property will be used if this value is not set. If there are no edgde_centroids, this value must be set (to 1 or higher).
+        :param out: (Optional - Val = None; ndarray). A uint8 array (downsampled if down_factor is set) to draw the IDs into, such as an existing id_overlay.
         """
 
         num_edge = np.max(self._edges)
 
         if down_factor is not None:
-            edges = downsample(self._edges, down_factor)
-            centroids = self._edge_centroids.copy()
-
-            for item in centroids:
-                centroids[item] = np.round(centroids[item]/down_factor)
+            # Only the downsampled shape is needed; the centroids are scaled as the IDs are drawn
+            if out is None:
+                out = np.zeros(resample.downsample_shape(self._edges.shape, down_factor), dtype = np.uint8)
 
-            output = node_draw.draw_from_centroids(edges, num_edge, centroids, twod_bool = False, directory = directory)
+            output = node_draw.draw_from_centroids(out, num_edge, self._edge_centroids, twod_bool = False, directory = directory, out = out, down_factor = down_factor)
 
         else:
 
-            output = node_draw.draw_from_centroids(self._edges, num_edge, self._edge_centroids, twod_bool = False, directory = directory)
+            output = node_draw.draw_from_centroids(self._edges, num_edge, self._edge_centroids, twod_bool = False, directory = directory, out = out)
 
         return output
 
@@ -4946,15 +4867,28 @@ class Network_3D:
 
     #Some methods that may be useful:
 
-    def community_partition(self, weighted = False, style = 0, dostats = True, seed = 42):
+    def community_partition(self, weighted = False, style = 0, dostats = True, seed = 42, resolution = 1.0):
         """
         Sets the communities attribute by splitting the network into communities
         """
 
-        self._communities, self.normalized_weights, stats = modularity.community_partition(self._network, weighted = weighted, style = style, dostats = dostats, seed = seed)
+        self._communities, self.normalized_weights, stats = modularity.community_partition(self.network, weighted = weighted, style = style, dostats = dostats, seed = seed, resolution = resolution)
 
         return stats
 
+    def community_resolution_sweep(self, resolutions, seeds = (42,), weighted = False, style = 1, n_jobs = None):
+        """
+        Partitions the network with Louvain (style 1) or Leiden (style 2) at several resolution parameters, in parallel processes. Does not set the communities attribute.
+        :param resolutions: (Mandatory, list of floats) - Resolution parameters to try. Higher values give more, smaller communities.
+        :param seeds: (Optional - Val = (42,), list of ints) - Seeds to run at each resolution. With more than one seed, the runs are merged into a consensus partition.
+        :param weighted: (Optional - Val = False, bool) - Treat edge weights as duplicate connections.
+        :param style: (Optional - Val = 1, int) - 1 for Louvain, 2 for Leiden.
+        :param n_jobs: (Optional - Val = None, int) - Number of worker processes. Defaults to the cpu count.
+        :returns: a dict of resolution -> {'modularity', 'num_communities', 'partition'}, where partition is a dict of node -> community id.
+        """
+
+        return modularity.community_resolution_sweep(self.network, resolutions, seeds = seeds, weighted = weighted, style = style, n_jobs = n_jobs)
+
     def remove_edge_weights(self):
         """
         Remove the weights from a network. Requires _network object to be calculated. Removes duplicates from network_list and removes weights from any network object.
@@ -4965,6 +4899,7 @@ class Network_3D:
         self._network_lists = network_analysis.remove_dupes(self._network_lists)
 
         self._network = network_analysis.open_network(self._network_lists)
+        self._network_changed()
 
 
 
@@ -5017,10 +4952,12 @@ class Network_3D:
         else:
             max_node = None
 
-        df, identity_dict, max_node = network_analysis.edge_to_node(self._network_lists, self._node_identities, maxnode = max_node)
+        identity_dict = {} if self._node_identities is None else self._node_identities.copy()
+        table, identity_dict, max_node = network_analysis.edge_to_node_table(edge_table.EdgeTable.from_lists(self._network_lists), identity_dict, maxnode = max_node)
 
-        self._network_lists = network_analysis.read_excel_to_lists(df)
-        self._network, net_weights = network_analysis.weighted_network(df)
+        self._network_lists = table.to_lists()
+        self._network = None #Rebuilt from the lists on next access
+        self._network_changed()
         self._node_identities = identity_dict
 
         print("Reassigning edge centroids to node centroids (requires both edge_centroids and node_centroids attributes to be present)")
@@ -5038,32 +4975,15 @@ class Network_3D:
 
         print("Relabelling self.edge array...")
 
-        num_edge = np.max(self._edges)
-
-        edge_bools = self._edges > 0
-
-        self._edges = self._edges.astype(np.uint32)
-
-        self._edges = self._edges + max_node
-
-        self._edges = self._edges * edge_bools
+        num_edge = int(np.max(self._edges))
 
-        if num_edge < 256:
-            self._edges = self._edges.astype(np.uint8)
-        elif num_edge < 65536:
-            self._edges = self._edges.astype(np.uint16)
+        # Edge labels move up by max_node in place (promoted once if they no longer fit), and are cleared where nodes sit
+        self._edges = label_volume.offset_nonzero(self._edges, max_node, top = num_edge)
+        label_volume.clear_where(self._edges, self._nodes)
 
-        node_bools = self._nodes == 0
-
-        self._nodes = self._nodes.astype(np.uint32)
-        self._edges = self._edges * node_bools
-        self._nodes = self._nodes + self._edges
-        num_node = np.max(self._nodes)
-
-        if num_node < 256:
-            self._nodes = self._nodes.astype(np.uint8)
-        elif num_node < 65536:
-            self._nodes = self._nodes.astype(np.uint16)
+        # Then fill the node array's background with them
+        num_node = max(int(np.max(self._nodes)), num_edge + max_node if num_edge > 0 else 0)
+        self._nodes = label_volume.fit(label_volume.overlay(self._nodes, self._edges, top = num_node), top = num_node)
 
 
     def com_by_size(self):
@@ -5104,22 +5024,26 @@ class Network_3D:
 
 
     def com_to_node(self, targets = None):
-
+        """
+        Collapses each community into a single node: the network pairs and the nodes array are relabeled from node to community, and pairs inside one community are removed.
+        Nodes that have no entry in the communities property keep their own ID and stay in the network as they are (they are not dropped).
+        :param targets: (Optional - Val = None; list). Communities to collapse in the nodes array, which get new labels above its current maximum. If None, every community is collapsed and labeled by its community ID.
+        """
 
         def update_array(array_3d, value_dict, targets = None):
-            ref_array = copy.deepcopy(array_3d)
+            mapping = {}
             if targets is None:
                 for key, value_list in value_dict.items():
                     for value in value_list:
-                        array_3d[ref_array == value] = key
+                        mapping[value] = key
             else:
-                max_val = np.max(array_3d) + 1
+                max_val = int(np.max(array_3d)) + 1
                 for key, value_list in value_dict.items():
                     for value in value_list:
-                        array_3d[ref_array == value] = max_val
+                        mapping[value] = max_val
                     max_val += 1
 
-            return array_3d
+            return relabel.remap(array_3d, mapping, in_place = True) #One lookup table pass instead of one full-volume pass per node
 
         if 0 in self.communities.values():
             self.communities = {k: v + 1 for k, v in self.communities.items()} 
@@ -5143,24 +5067,10 @@ class Network_3D:
             for com in inverted:
                 new_identities[com] = ""
 
-        list1 = self._network_lists[0] #Get network lists to change
-        list2 = self._network_lists[1]
-        list3 = self._network_lists[2]
-        return1 = []
-        return2 = []
-        return3 = []
+        table = edge_table.EdgeTable.from_lists(self._network_lists)
+        table = table.remap_nodes(self.communities).drop_self_loops() #Set each node to its community instead, avoiding self - self connections
 
-        for i in range(len(list1)):
-            list1[i] = self.communities[list1[i]] #Set node at network list spot to its community instead
-            list2[i] = self.communities[list2[i]]
-            if list1[i] != list2[i]: #Avoid self - self connections
-                return1.append(list1[i])
-                return2.append(list2[i])
-                return3.append(list3[i])
-
-
-
-        self.network_lists = [return1, return2, return3]
+        self.network_lists = table.to_lists()
 
         if self._nodes is not None:
             self._nodes = update_array(self._nodes, inverted, targets = targets) #Set the array to match the new network
@@ -5197,40 +5107,36 @@ class Network_3D:
         Alters the network and network_lists properties to absorb the Trunk. Alters (or sets, if none exists) the node_identities property to keep track of which new nodes is a 'Trunk'.
         """
 
-        nodesa = self._network_lists[0]
-        nodesb = self._network_lists[1]
-        edgesc = self._network_lists[2]
-        nodea = []
-        nodeb = []
-        edgec = []
+        table = edge_table.EdgeTable.from_lists(self._network_lists)
 
-        from collections import Counter
-        counts = Counter(edgesc)
-        if 0 not in edgesc:
-            trunk = stats.mode(edgesc)
+        ranked, counts = table.edge_ranking()
+        if 0 not in ranked:
+            if len(ranked) == 0:
+                return
+            trunk = ranked[0]
         else:
-            try:
-                sorted_edges = counts.most_common()
-                trunk = sorted_edges[1][0]
-            except:
+            if len(ranked) < 2:
                 return
+            trunk = ranked[1]
+        trunk = trunk.item()
 
-        addtrunk = max(set(nodesa + nodesb)) + 1
+        addtrunk = int(table.max_node()) + 1
 
-        for i in range(len(nodesa)):
-            if edgesc[i] == trunk:
-                nodea.append(nodesa[i])
-                nodeb.append(addtrunk)
-                nodea.append(nodesb[i])
-                nodeb.append(addtrunk)
-                edgec.append(0)
-                edgec.append(0)
-            else:
-                nodea.append(nodesa[i])
-                nodeb.append(nodesb[i])
-                edgec.append(edgesc[i])
+        # Each trunk row A-B becomes the two rows A-Trunk and B-Trunk, in place of the original row
+        is_trunk = table.edge == trunk
+        rows = np.repeat(np.arange(len(table)), np.where(is_trunk, 2, 1))
+        second = np.zeros(len(rows), dtype=bool)
+        second[1:] = rows[1:] == rows[:-1]
+
+        nodea = table.node_a[rows].copy()
+        nodea[second] = table.node_b[rows[second]]
+        nodeb = table.node_b[rows].copy()
+        nodeb[is_trunk[rows]] = addtrunk
+        edgec = table.edge[rows].copy()
+        edgec[is_trunk[rows]] = 0
 
-        self.network_lists = [nodea, nodeb, edgec]
+        self.network_lists = edge_table.EdgeTable(nodea, nodeb, edgec).to_lists()
+        nodea, nodeb, edgec = self._network_lists
 
         try:
             self._node_centroids[addtrunk] = self._edge_centroids[trunk]
@@ -5250,15 +5156,8 @@ class Network_3D:
 
         if self._edges is not None and self._nodes is not None:
 
-            node_bools = self._nodes == 0
-
-            trunk = self._edges == trunk
-
-            trunk = trunk * addtrunk
-
-            trunk = trunk * node_bools
-
-            self._nodes = self._nodes + trunk
+            # Trunk voxels outside the nodes become the new trunk node
+            self._nodes = label_volume.overlay(self._nodes, self._edges, match = trunk, value = addtrunk)
 
 
 
@@ -5272,7 +5171,8 @@ class Network_3D:
         """
 
         self._network_lists, self._node_identities = network_analysis.prune_samenode_connections(self._network_lists, self._node_identities, target = target)
-        self._network, num_weights = network_analysis.weighted_network(self._network_lists)
+        self._network = None #Rebuilt from the lists on next access
+        self._network_changed()
 
 
     def isolate_internode_connections(self, ID1, ID2):
@@ -5285,7 +5185,8 @@ class Network_3D:
         """
 
         self._network_lists, self._node_identities = network_analysis.isolate_internode_connections(self._network_lists, self._node_identities, ID1, ID2)
-        self._network, num_weights = network_analysis.weighted_network(self._network_lists)
+        self._network = None #Rebuilt from the lists on next access
+        self._network_changed()
 
     def downsample(self, down_factor):
         """
@@ -5425,6 +5326,7 @@ class Network_3D:
             self.network_lists[0] = src[mask].tolist()
             self.network_lists[1] = dst[mask].tolist()
             self.network_lists[2] = weights[mask].tolist()
+            self._network_changed()
             print("Updated Network")
         except Exception:
             pass
@@ -5464,6 +5366,7 @@ class Network_3D:
 
         self._network_lists = [nodesa, nodesb, edgesc]
         self._network, weights = network_analysis.weighted_network(self._network_lists)
+        self._network_changed()
 
 
 
@@ -5488,7 +5391,7 @@ class Network_3D:
     def show_communities_flex(self, geometric = False, directory = None, weighted = True, partition = False, style = 0, show_labels = True):
 
 
-        self._communities, self.normalized_weights = modularity.show_communities_flex(self._network, self._network_lists, self.normalized_weights, geo_info = [self._node_centroids, self._nodes.shape], geometric = geometric, directory = directory, weighted = weighted, partition = partition, style = style, show_labels = show_labels)
+        self._communities, self.normalized_weights = modularity.show_communities_flex(self.network, self._network_lists, self.normalized_weights, geo_info = [self._node_centroids, self._nodes.shape], geometric = geometric, directory = directory, weighted = weighted, partition = partition, style = style, show_labels = show_labels)
 
 
 
@@ -5572,7 +5475,12 @@ class Network_3D:
 
         #Removed depricated gen_images functions
 
-        G = community_extractor._isolate_connected(self._network, key = key)
+        graph = self.graph
+        if key is None:
+            component = graph.components()[0]
+        else:
+            component = graph.component_of(key)
+        G = graph.subgraph(component).to_networkx()
         return G
 
 
@@ -5590,7 +5498,7 @@ class Network_3D:
         """
 
         if ret_nodes:
-            mothers = community_extractor.extract_mothers(None, self._network, self._communities, ret_nodes = True, called = called)
+            mothers = community_extractor.extract_mothers(None, self.network, self._communities, ret_nodes = True, called = called)
             return mothers
         else:
 
@@ -5599,15 +5507,15 @@ class Network_3D:
                 for item in self._node_centroids:
                     centroids[item] = np.round((self._node_centroids[item]) / down_factor)
                 nodes = downsample(self._nodes, down_factor)
-                mothers, overlay = community_extractor.extract_mothers(nodes, self._network, self._communities, directory = directory, centroid_dic = centroids, called = called)
+                mothers, overlay = community_extractor.extract_mothers(nodes, self.network, self._communities, directory = directory, centroid_dic = centroids, called = called)
             else:
-                mothers, overlay = community_extractor.extract_mothers(self._nodes, self._network, self._communities, centroid_dic = self._node_centroids, directory = directory, called = called)
+                mothers, overlay = community_extractor.extract_mothers(self._nodes, self.network, self._communities, centroid_dic = self._node_centroids, directory = directory, called = called)
             return mothers, overlay
 
 
     def isolate_hubs(self, proportion = 0.1, retimg = True):
 
-        hubs = community_extractor.find_hub_nodes(self._network, proportion)
+        hubs = community_extractor.find_hub_nodes(self.graph, proportion)
 
         if retimg:
 
@@ -5669,7 +5577,7 @@ class Network_3D:
         elif mode == 1:
             array = self._edges
 
-        items = list(np.unique(array))
+        items = list(relabel.unique_labels(array))
         if 0 in items:
             del items[0]
 
@@ -5720,7 +5628,7 @@ class Network_3D:
         :returns: an equivalent random networkx graph object
         """
 
-        G, df = network_analysis.generate_random(self._network, self._network_lists, weighted = weighted)
+        G, df = network_analysis.generate_random(self.network, self._network_lists, weighted = weighted)
 
         return G, df
 
@@ -5733,75 +5641,78 @@ class Network_3D:
         :returns: A dictionary with degrees as keys and the proportion of nodes with that degree as a value.
         """
 
-        degrees = network_analysis.degree_distribution(self._network, directory = directory)
+        degrees = network_analysis.degree_distribution(self.graph, directory = directory)
 
         return degrees
 
-    def get_network_stats(self):
+    def get_network_stats(self, max_sources = None, time_budget = None):
         """
-        Calculate comprehensive network statistics from a NetworkX graph object.
-        
-        Parameters:
-        G (networkx.Graph): Input graph
-        
-        Returns:
-        dict: Dictionary containing various network statistics
+        Calculate comprehensive network statistics from the network.
+        Path based statistics (betweenness, closeness, diameter, average shortest path) all come from one shared BFS sweep over a sparse adjacency.
+        Weighted edges count as that many parallel edges, as in convert_to_multigraph.
+        :param max_sources: (Optional - Val = None, int) - Cap on BFS sources for the path based statistics. None sweeps every node (exact).
+        :param time_budget: (Optional - Val = None, float) - Stop sampling BFS sources after this many seconds. Sampled statistics become estimates and their error bounds are added to the output.
+        :returns: (dict) - Dictionary containing various network statistics
         """
-        G_unweighted = self._network
-        G = convert_to_multigraph(self._network)
+        graph = self.graph
         stats = {}
-        
+
+        S = graph.csr(weighted = False)
+        n = graph.num_nodes
+        degrees = graph.degree(weighted = True)
+        num_edges = int(degrees.sum() // 2)
+
         # Basic graph properties
-        stats['num_nodes'] = G.number_of_nodes()
-        stats['num_edges'] = G.number_of_edges()
-        stats['density'] = nx.density(G)
-        stats['is_directed'] = G.is_directed()
-        stats['is_connected'] = nx.is_connected(G) if not G.is_directed() else nx.is_strongly_connected(G)
+        stats['num_nodes'] = n
+        stats['num_edges'] = num_edges
+        stats['density'] = 2 * num_edges / (n * (n - 1)) if n > 1 else 0
+        stats['is_directed'] = False
+
+        sweep = centrality_engine.path_sweep(S, max_sources = max_sources, time_budget = time_budget)
+        component_sizes = sweep['component_sizes']
+        stats['is_connected'] = len(component_sizes) == 1
 
         # Component analysis
-        if not G.is_directed():
-            stats['num_connected_components'] = nx.number_connected_components(G)
-            largest_cc = max(nx.connected_components(G), key=len)
-            stats['largest_component_size'] = len(largest_cc)
-        else:
-            stats['num_strongly_connected_components'] = nx.number_strongly_connected_components(G)
-            largest_scc = max(nx.strongly_connected_components(G), key=len)
-            stats['largest_strongly_connected_component_size'] = len(largest_scc)
-        
+        stats['num_connected_components'] = len(component_sizes)
+        stats['largest_component_size'] = int(component_sizes.max())
+
         # Degree statistics
-        degrees = [d for _, d in G.degree()]
-        stats['avg_degree'] = sum(degrees) / len(degrees)
-        stats['max_degree'] = max(degrees)
-        stats['min_degree'] = min(degrees)
-        
+        stats['avg_degree'] = degrees.sum() / n
+        stats['max_degree'] = int(degrees.max())
+        stats['min_degree'] = int(degrees.min())
+
         # Centrality measures
-        # Note: These can be computationally expensive for large graphs
         try:
-            stats['avg_betweenness_centrality'] = np.mean(list(nx.betweenness_centrality(G).values()))
-            stats['avg_closeness_centrality'] = np.mean(list(nx.closeness_centrality(G).values()))
-            stats['avg_eigenvector_centrality'] = np.mean(list(nx.eigenvector_centrality(G_unweighted, max_iter=1000).values()))
+            stats['avg_betweenness_centrality'] = np.mean(centrality_engine.normalized_betweenness(sweep))
+            stats['avg_closeness_centrality'] = np.mean(sweep['closeness'])
+            stats['avg_eigenvector_centrality'] = np.mean(centrality_engine.eigenvector_centrality(S))
         except:
             stats['centrality_measures'] = "Failed to compute - graph might be too large or disconnected"
-        
+
         # Clustering and transitivity
-        stats['avg_clustering_coefficient'] = nx.average_clustering(G_unweighted)
-        stats['transitivity'] = nx.transitivity(G_unweighted)
-        
+        stats['avg_clustering_coefficient'] = np.mean(centrality_engine.clustering(S))
+        stats['transitivity'] = centrality_engine.transitivity(S)
+
         # Path lengths
-        if nx.is_connected(G):
-            stats['diameter'] = nx.diameter(G)
-            stats['avg_shortest_path_length'] = nx.average_shortest_path_length(G)
+        if stats['is_connected']:
+            hist = sweep['distance_histogram']
+            stats['diameter'] = len(hist) - 1
+            stats['avg_shortest_path_length'] = np.sum(np.arange(len(hist)) * hist) / (n * (n - 1)) if n > 1 else 0
         else:
             stats['diameter'] = "Undefined - Graph is not connected"
             stats['avg_shortest_path_length'] = "Undefined - Graph is not connected"
-        
+
+        if not sweep['exact']:
+            stats['path_stats_sources_sampled'] = sweep['sources_used']
+            stats['betweenness_error_bound (95%)'] = sweep['error_bounds']['betweenness']
+
         # Structural properties
-        stats['is_tree'] = nx.is_tree(G)
-        stats['num_triangles'] = sum(nx.triangles(G).values()) // 3
-        
+        stats['is_tree'] = stats['is_connected'] and num_edges == n - 1
+        stats['num_triangles'] = int(graph.triangles().sum() // 3)
+
         # Assortativity
         try:
-            stats['degree_assortativity'] = nx.degree_assortativity_coefficient(G)
+            stats['degree_assortativity'] = community_engine._assortativity(graph.csr(weighted = True), degrees)
         except:
             stats['degree_assortativity'] = "Failed to compute"
 
@@ -5809,7 +5720,7 @@ class Network_3D:
             nodes = np.unique(self._nodes)
             if nodes[0] == 0:
                 nodes = np.delete(nodes, 0)
-            stats['Unconnected nodes (left out from node image)'] = (len(nodes) - len(G.nodes()))
+            stats['Unconnected nodes (left out from node image)'] = (len(nodes) - n)
         except:
             stats['Unconnected nodes (left out from node image)'] = "Failed to compute"
 
@@ -5823,7 +5734,7 @@ class Network_3D:
         total_dict = {}
         neighborhood_dict = {}
         proportion_dict = {}
-        G = self._network
+        G = self.network
         node_identities = self._node_identities
 
         all_idens = list(self.node_identities.values())
@@ -6182,7 +6093,13 @@ class Network_3D:
 
 
 
-    def random_nodes(self, bounds = None, mask = None):
+    def random_nodes(self, bounds = None, mask = None, seed = None):
+        """
+        Moves every node centroid to a random, distinct position, for null models.
+        :param bounds: (Optional - Val = None; tuple). ((z1, y1, x1), (z2, y2, x2)) inclusive box to draw positions from.
+        :param mask: (Optional - Val = None; ndarray). Positions are drawn from the nonzero voxels of this array instead.
+        :param seed: (Optional - Val = None; int). Random seed. If None, the draw follows the global np.random state, so np.random.seed still makes it reproducible.
+        """
 
         if self.nodes is not None:
             try:
@@ -6192,62 +6109,38 @@ class Network_3D:
 
 
         if mask is not None:
-            coords = np.argwhere(mask != 0)
+            sampler = sampling.PositionSampler(mask = mask)
+        elif bounds is not None:
+            sampler = sampling.PositionSampler(bounds = bounds)
         else:
-            if bounds is not None:
-                (z1, y1, x1), (z2, y2, x2) = bounds
-                z1, y1, x1 = int(z1), int(y1), int(x1)
-                z2, y2, x2 = int(z2), int(y2), int(x2)
-                z_range = np.arange(z1, z2 + 1 )
-                y_range = np.arange(y1, y2 + 1 )
-                x_range = np.arange(x1, x2 + 1 )
-                z_grid, y_grid, x_grid = np.meshgrid(z_range, y_range, x_range, indexing='ij')
-                del z_range
-                del y_range
-                del x_range
-                coords = np.stack([z_grid.flatten(), y_grid.flatten(), x_grid.flatten()], axis=1)
-                del z_grid
-                del y_grid
-                del x_grid
-            else:
-                shape = ()
+            shape = ()
+            try:
+                shape = self.nodes.shape
+            except:
                 try:
-                    shape = self.nodes.shape
+                    shape = self.edges.shape
                 except:
                     try:
-                        shape = self.edges.shape
+                        shape = self._network_overlay.shape
                     except:
                         try:
-                            shape = self._network_overlay.shape
+                            shape = self._id_overlay.shape
                         except:
-                            try:
-                                shape = self._id_overlay.shape
-                            except:
-                                pass
-
-                ranges = [np.arange(s) for s in shape]
-                
-                # Create meshgrid
-                mesh = np.meshgrid(*ranges, indexing='ij')
-                del ranges
-
-                # Stack and reshape
-                coords = np.stack(mesh, axis=-1).reshape(-1, len(shape))
-                del mesh
+                            pass
+            sampler = sampling.PositionSampler(shape = shape)
 
-        if len(coords) < len(self.node_centroids):
-            print(f"Warning: Only {len(coords)} positions available for {len(self.node_centroids)} labels")
+        if sampler.count < len(self.node_centroids):
+            print(f"Warning: Only {sampler.count} positions available for {len(self.node_centroids)} labels")
 
         new_centroids = {}
         
-        # Generate random indices without replacement
-        available_count = min(len(coords), len(self.node_centroids))
-        rand_indices = np.random.choice(len(coords), available_count, replace=False)
+        # Random positions without replacement, drawn by index so no list of every available voxel is built
+        coords = sampler.draw(len(self.node_centroids), rng = seed)
         
         # Assign random positions to labels
         for i, label in enumerate(self.node_centroids.keys()):
-            if i < len(rand_indices):
-                centroid = coords[rand_indices[i]]
+            if i < len(coords):
+                centroid = coords[i]
                 new_centroids[label] = centroid
                 z, y, x = centroid
                 try:
@@ -6311,7 +6204,7 @@ class Network_3D:
 
             neighbor_classes = {}
 
-            umap_dict = copy.deepcopy(data)
+            umap_dict = data # Only read, the embedding copies it into one float32 matrix
 
             for item in data.keys():
                 if item in self.node_identities:
@@ -6696,22 +6589,12 @@ class Network_3D:
         max_coords = np.max(centroids, axis=0).astype(int)
         # dims needs to cover all centroids (Z, Y, X) - add padding
         dims = (max_coords[0] + 2, max_coords[1] + 2, max_coords[2] + 2)
-        # Generate hex label volume
-        hex_labels = hexagons.generate_hexagonal_labels(
-            side_length, dims, xy_scale=xy_scale, z_scale=z_scale, shape_3d=shape_3d
-        )
-        # Assign each node to the hex cell its centroid falls in
-        com_dict = {}
-        for label, centroid in self.node_centroids.items():
-            z, y, x = int(round(centroid[0])), int(round(centroid[1])), int(round(centroid[2]))
-            z = min(z, dims[0] - 1)
-            y = min(y, dims[1] - 1)
-            x = min(x, dims[2] - 1)
-            cell_id = int(hex_labels[z, y, x])
-            if cell_id not in com_dict:
-                com_dict[cell_id] = []
-            com_dict[cell_id].append(int(label))
-        self.communities = revert_dict(com_dict)
+        # Assign each node to the hex cell its centroid falls in, straight from the lattice (no label volume is drawn)
+        tessellation = hexagons.HexTessellation(side_length, dims, xy_scale=xy_scale, z_scale=z_scale, shape_3d=shape_3d)
+        cell_ids = tessellation.cell_ids(centroids)
+        occupied = np.count_nonzero(np.bincount(cell_ids, minlength=tessellation.n_cells + 1)[1:])
+        print(f"{len(labels)} nodes fall in {occupied} of {tessellation.n_cells} cells")
+        self.communities = dict(zip((int(label) for label in labels), cell_ids.tolist()))
 
     def community_heatmap(self, num_nodes = None, is3d = True, numpy = False):
 
@@ -6868,9 +6751,9 @@ class Network_3D:
             
             if mask is not None:
                 # Handle mask-based distribution
-                # Find all valid positions where mask is True
-                valid_positions = np.where(mask)
-                total_valid_positions = len(valid_positions[0])
+                # Valid positions are addressed by rank through per-row counts instead of being listed
+                sampler = sampling.PositionSampler(mask = mask)
+                total_valid_positions = sampler.count
                 
                 if total_valid_positions == 0:
                     raise ValueError("No valid positions found in mask")
@@ -6879,30 +6762,12 @@ class Network_3D:
                     # If we want more points than valid positions, return scaled unit distance
                     return xy_scale if is_2d else min(z_scale, xy_scale)
                 
-                # Create uniformly spaced indices within valid positions
-                valid_indices = np.linspace(0, total_valid_positions - 1, n, dtype=int)
-                
-                # Convert to coordinates and apply scaling
-                coords = []
-                for idx in valid_indices:
-                    if len(shape) == 3:
-                        coord = (valid_positions[0][idx], valid_positions[1][idx], valid_positions[2][idx])
-                        scaled_coord = [coord[0] * z_scale, coord[1] * xy_scale, coord[2] * xy_scale]
-                    elif len(shape) == 2:
-                        coord = (valid_positions[0][idx], valid_positions[1][idx])
-                        scaled_coord = [coord[0] * xy_scale, coord[1] * xy_scale]
-                    coords.append(scaled_coord)
-                
-                coords = np.array(coords)
+                # Uniformly spaced ranks within valid positions, converted to coordinates and scaled
+                axis_scale = np.array([z_scale, xy_scale, xy_scale] if len(shape) == 3 else [xy_scale, xy_scale])
+                coords = sampler.evenly_spaced(n) * axis_scale
                 
                 # Find a good query point (closest to center of valid region)
-                if len(shape) == 3:
-                    center_pos = [np.mean(valid_positions[0]) * z_scale, 
-                                 np.mean(valid_positions[1]) * xy_scale,
-                                 np.mean(valid_positions[2]) * xy_scale]
-                else:
-                    center_pos = [np.mean(valid_positions[0]) * xy_scale,
-                                 np.mean(valid_positions[1]) * xy_scale]
+                center_pos = sampler.centroid() * axis_scale
                 
                 # Find point closest to center of valid region
                 center_distances = np.sum((coords - center_pos)**2, axis=1)
@@ -6915,20 +6780,9 @@ class Network_3D:
                 if n >= total_positions:
                     return xy_scale if is_2d else min(z_scale, xy_scale)
                 
-                # Create uniformly spaced indices
-                indices = np.linspace(0, total_positions - 1, n, dtype=int)
-                
-                # Convert flat indices to coordinates
-                coords = []
-                for idx in indices:
-                    coord = np.unravel_index(idx, shape)
-                    if len(shape) == 3:
-                        scaled_coord = [coord[0] * z_scale, coord[1] * xy_scale, coord[2] * xy_scale]
-                    elif len(shape) == 2:
-                        scaled_coord = [coord[0] * xy_scale, coord[1] * xy_scale]
-                    coords.append(scaled_coord)
-                
-                coords = np.array(coords)
+                # Uniformly spaced flat indices, converted to coordinates and scaled
+                axis_scale = np.array([z_scale, xy_scale, xy_scale] if len(shape) == 3 else [xy_scale, xy_scale])
+                coords = sampling.PositionSampler(shape = shape).evenly_spaced(n) * axis_scale
                 
                 # Pick a point near the middle of the array
                 middle_idx = len(coords) // 2
@@ -34,12 +34,16 @@ except:
     pass
 from nettracer3d import excelotron
 import threading
+import weakref
 import queue
 from threading import Lock
 from scipy import ndimage
 import pyqtgraph as pg
 import os
 from . import painting
+from . import slice_cache
+from . import label_index
+from . import label_split
 from . import stats as net_stats
 from . import network_graph_widget as ngw
 from . import umap_widget as umw
@@ -1485,9 +1489,17 @@ class ImageViewerWindow(QMainWindow):
         if chunk_size < 1:
             chunk_size = 1
         
-        def process_channel(channel_data, indices, array_shape):
+        def process_channel(channel, indices, array_shape):
+            channel_data = self.channel_data[channel]
             if channel_data is None or not indices:
                 return None
+
+            # With a label index ready, paint only the selected labels' voxels straight into the overlay
+            index = self.get_label_index(channel)
+            if index is not None and not bounds and index.shape == self.highlight_overlay.shape:
+                index.refresh(channel_data)
+                index.paint(self.highlight_overlay, indices)
+                return None
                 
             # Create chunks
             chunks = []
@@ -1515,10 +1527,10 @@ class ImageViewerWindow(QMainWindow):
         
         # Process nodes and edges in parallel using multiprocessing
         with ThreadPoolExecutor(max_workers=num_cores) as executor:
-            future_nodes = executor.submit(process_channel, self.channel_data[0], node_indices, full_shape)
-            future_edges = executor.submit(process_channel, self.channel_data[1], edge_indices, full_shape)
-            future_overlay1 = executor.submit(process_channel, self.channel_data[2], overlay1_indices, full_shape)
-            future_overlay2 = executor.submit(process_channel, self.channel_data[3], overlay2_indices, full_shape)
+            future_nodes = executor.submit(process_channel, 0, node_indices, full_shape)
+            future_edges = executor.submit(process_channel, 1, edge_indices, full_shape)
+            future_overlay1 = executor.submit(process_channel, 2, overlay1_indices, full_shape)
+            future_overlay2 = executor.submit(process_channel, 3, overlay2_indices, full_shape)
 
             # Get results
             node_overlay = future_nodes.result()
@@ -1539,6 +1551,46 @@ class ImageViewerWindow(QMainWindow):
         # Update display
         self.update_display(preserve_zoom=(current_xlim, current_ylim))
 
+    def build_label_index(self, channel):
+        """Index the voxels of every label in a node or edge channel on a background thread, so highlighting skips full volume scans"""
+        if not hasattr(self, 'label_indices'):
+            self.label_indices = {}
+            self.label_index_pending = {}
+        self.label_indices.pop(channel, None)
+        self.label_index_pending[channel] = set()
+        array = self.channel_data[channel]
+        if channel not in (0, 1) or array is None or array.ndim != 3 or not np.issubdtype(array.dtype, np.integer):
+            return
+
+        def build():
+            try:
+                index = label_index.LabelIndex(array)
+            except Exception:
+                return
+            if self.channel_data[channel] is array: # Drop the index if the channel was replaced meanwhile
+                for z in self.label_index_pending.pop(channel, ()):
+                    index.mark_dirty(z)
+                self.label_indices[channel] = (weakref.ref(array), index)
+
+        threading.Thread(target=build, daemon=True).start()
+
+    def get_label_index(self, channel):
+        """The label index of a channel if it has finished building and still matches the channel, else None"""
+        entry = getattr(self, 'label_indices', {}).get(channel)
+        if entry is None or entry[0]() is not self.channel_data[channel]:
+            return None
+        return entry[1]
+
+    def mark_label_slice_dirty(self, channel, z):
+        """Note an in-place edit of slice z so the channel's label index rescans it before next use"""
+        if not hasattr(self, 'label_indices'):
+            return
+        entry = self.label_indices.get(channel)
+        if entry is not None:
+            entry[1].mark_dirty(z)
+        elif channel in self.label_index_pending:
+            self.label_index_pending[channel].add(z)
+
     def create_highlight_overlay_slice(self, indices, bounds = False, update = True):
 
         def crop_and_downsample(image, y_start, y_end, x_start, x_end, factor):
@@ -2914,243 +2966,13 @@ class ImageViewerWindow(QMainWindow):
             print(f"An error has occured: {e}")
 
 
-    def expand_bbox(self, bbox, array_shape, padding=1):
-        """Expand bounding box by padding in each dimension, clamped to array bounds"""
-        expanded = []
-        for i, slice_obj in enumerate(bbox):
-            start = max(0, slice_obj.start - padding)
-            stop = min(array_shape[i], slice_obj.stop + padding)
-            expanded.append(slice(start, stop, None))
-        return tuple(expanded)
-
-    def process_label_split_only(self, item, input_array):
-        """Pass 1: Split disconnected components, identify largest"""
-        orig_label, bbox = item
-        
-        try:
-            # Extract subarray
-            label_subarray = input_array[bbox]
-            
-            # Create binary mask for this label only
-            binary_mask = label_subarray == orig_label
-            
-            if not np.any(binary_mask):
-                return orig_label, bbox, None, 0, None
-            
-            # Find connected components
-            labeled_cc, num_cc = n3d.label_objects(binary_mask)
-            
-            if num_cc == 0:
-                return orig_label, bbox, None, 0, None
-            
-            # Find largest component
-            volumes = np.bincount(labeled_cc.ravel())[1:]
-            largest_cc_id = np.argmax(volumes) + 1
-            
-            return orig_label, bbox, labeled_cc, num_cc, largest_cc_id
-            
-        except Exception as e:
-            print(f"Error processing label {orig_label}: {e}")
-            return orig_label, bbox, None, 0, None
-
-    def process_illegal_label_reassign(self, item, pass1_array, original_max_val):
-        """Pass 2: Reassign illegal labels based on legal neighbors"""
-        illegal_label, bbox = item
-        
-        try:
-            # Expand bbox by 1
-            expanded_bbox = self.expand_bbox(bbox, pass1_array.shape, padding=1)
-            
-            # Extract subarray
-            subarray = pass1_array[expanded_bbox]
-            
-            # Create mask for this illegal label
-            illegal_mask = subarray == illegal_label
-            
-            if not np.any(illegal_mask):
-                return illegal_label, None
-            
-            # Dilate to find neighbors
-            dilated_mask = n3d.dilate_3D_old(illegal_mask, 3, 3, 3)
-            
-            # Border region
-            border_mask = dilated_mask & ~illegal_mask & (subarray > 0)
-            
-            # Get border labels
-            border_labels = subarray * border_mask
-            
-            # Filter out illegal labels (> original_max_val) and background (0)
-            legal_border_labels = border_labels.copy()
-            legal_border_labels[border_labels > original_max_val] = 0
-            
-            # Count occurrences of legal neighbors
-            unique_borders = np.bincount(legal_border_labels.ravel())[1:]  # Skip 0
-            
-            if len(unique_borders) > 0 and np.max(unique_borders) > 0:
-                # Found legal neighbors, pick largest shared border
-                chosen_label = np.argmax(unique_borders) + 1
-                return illegal_label, chosen_label
-            else:
-                # No legal neighbors, keep current label
-                return illegal_label, None
-            
-        except Exception as e:
-            print(f"Error processing illegal label {illegal_label}: {e}")
-            return illegal_label, None
-
     def separate_nontouching_objects(self, input_array, max_val=None, branches=False):
         """
-        Two-pass algorithm:
+        Two-pass algorithm (see label_split.separate_nontouching_objects):
         Pass 1: Split disconnected components (largest keeps label, others get new labels)
         Pass 2 (branches=True only): Reassign new labels based on legal neighbors
         """
-        if max_val == None:
-            max_val = np.max(input_array)
-        print("Splitting nontouching objects - Pass 1")
-        
-        binary_mask = input_array > 0
-        if not np.any(binary_mask):
-            return np.zeros_like(input_array)
-        
-        unique_labels = np.unique(input_array[binary_mask])
-        print(f"Processing {len(unique_labels)} unique labels")
-        
-        # Store original max_val for later
-        original_max_val = int(max_val)
-        
-        # Get all bounding boxes at once
-        bounding_boxes = ndimage.find_objects(input_array)
-        
-        # Prepare work items
-        work_items = []
-        for orig_label in unique_labels:
-            bbox_index = orig_label - 1
-            
-            if (bbox_index >= 0 and 
-                bbox_index < len(bounding_boxes) and 
-                bounding_boxes[bbox_index] is not None):
-                
-                bbox = bounding_boxes[bbox_index]
-                work_items.append((orig_label, bbox))
-        
-        if len(work_items) == 0:
-            print("No valid work items found!")
-            return np.zeros_like(input_array)
-        
-        # PASS 1: Split components, largest keeps label, others get new labels
-        max_workers = min(mp.cpu_count(), len(work_items))
-        
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            process_func = lambda item: self.process_label_split_only(item, input_array)
-            results = list(executor.map(process_func, work_items))
-        
-        # Reconstruct output array from pass 1
-        current_label = original_max_val + 1
-        pass1_array = np.zeros_like(input_array)
-        
-        for orig_label, bbox, labeled_sub, num_cc, largest_cc_id in results:
-            if num_cc > 0 and labeled_sub is not None:
-                for cc_id in range(1, num_cc + 1):
-                    mask = labeled_sub == cc_id
-                    
-                    if cc_id == largest_cc_id:
-                        # Largest component keeps original label
-                        assigned_label = orig_label
-                    else:
-                        # Others get new incremental labels
-                        assigned_label = current_label
-                        current_label += 1
-                    
-                    try:
-                        pass1_array[bbox][mask] = assigned_label
-                    except:
-                        # Handle dtype overflow
-                        if assigned_label < 256:
-                            dtype = np.uint8
-                        elif assigned_label < 65535:
-                            dtype = np.uint16
-                        else:
-                            dtype = np.uint32
-                        pass1_array = pass1_array.astype(dtype)
-                        pass1_array[bbox][mask] = assigned_label
-        
-        print(f"Pass 1 complete. Created {current_label - original_max_val - 1} new labels")
-        
-        # If branches=False, we're done
-        if not branches:
-            return pass1_array
-        
-        # PASS 2 (branches=True): Reassign illegal labels based on legal neighbors
-        print("Pass 2: Reassigning illegal labels based on legal neighbors")
-        
-        # Find all labels that are > original_max_val (these are "illegal")
-        illegal_mask = pass1_array > original_max_val
-        if not np.any(illegal_mask):
-            return pass1_array
-        
-        illegal_labels = np.unique(pass1_array[illegal_mask])
-        print(f"Processing {len(illegal_labels)} illegal labels")
-        
-        # Get bounding boxes for illegal labels
-        illegal_bboxes = ndimage.find_objects(pass1_array)
-        
-        # Prepare work items for pass 2
-        work_items_pass2 = []
-        for illegal_label in illegal_labels:
-            bbox_index = illegal_label - 1
-            
-            if (bbox_index >= 0 and 
-                bbox_index < len(illegal_bboxes) and 
-                illegal_bboxes[bbox_index] is not None):
-                
-                bbox = illegal_bboxes[bbox_index]
-                work_items_pass2.append((illegal_label, bbox))
-        
-        # Process illegal labels
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            process_func = lambda item: self.process_illegal_label_reassign(item, pass1_array, original_max_val)
-            results_pass2 = list(executor.map(process_func, work_items_pass2))
-        
-        # Apply pass 2 results
-        pass2_array = pass1_array.copy()
-        
-        def replace_labels_in_chunk(args):
-            """Process a single chunk of the array"""
-            pass1_chunk, results_pass2 = args
-            
-            # Create output chunk (copy of input)
-            pass2_chunk = pass1_chunk.copy()
-            
-            # Find which labels actually exist in this chunk
-            unique_labels = set(np.unique(pass1_chunk))
-            
-            for illegal_label, new_label in results_pass2:
-                if new_label is not None and new_label != illegal_label:
-                    # Only process if this label exists in this chunk
-                    if illegal_label in unique_labels:
-                        # Read from pass1_chunk, write to pass2_chunk
-                        pass2_chunk[pass1_chunk == illegal_label] = new_label
-            
-            return pass2_chunk
-
-        # Get number of CPU cores
-        num_cores = mp.cpu_count()
-
-        # Split array along y-axis (axis=1)
-        chunks = np.array_split(pass1_array, num_cores, axis=1)
-
-        # Prepare arguments for each worker
-        chunk_args = [(chunk, results_pass2) for chunk in chunks]
-
-        # Process chunks in parallel with threads
-        with ThreadPoolExecutor(max_workers=num_cores) as executor:
-            processed_chunks = list(executor.map(replace_labels_in_chunk, chunk_args))
-
-        # Stack results back together along y-axis
-        pass2_array = np.concatenate(processed_chunks, axis=1)
-        
-        print(f"Pass 2 complete")
-        return pass2_array
+        return label_split.separate_nontouching_objects(input_array, max_val=max_val, branches=branches)
 
     def handle_seperate(self):
         """
@@ -3316,6 +3138,7 @@ class ImageViewerWindow(QMainWindow):
                 my_network.network_lists[0].append(pair[0])
                 my_network.network_lists[1].append(pair[1])
                 my_network.network_lists[2].append(0)
+            my_network.network_lists = my_network.network_lists
             
             # Update the table
             if not hasattr(my_network, 'network_lists') or my_network.network_lists is None:
@@ -6539,6 +6362,10 @@ class ImageViewerWindow(QMainWindow):
     def load_channel(self, channel_index, channel_data=None, data=False, assign_shape = True, preserve_zoom = None, end_paint = False, begin_paint = False, color = False, load_highlight = False, filename = None):
         """Load a channel and enable active channel selection if needed."""
 
+        # Data is replaced or was edited in place before this call, either way cached display tiles are stale
+        if hasattr(self, 'slice_cache'):
+            self.slice_cache.invalidate(channel_index)
+
         try:
 
             if not data:  
@@ -6733,6 +6560,7 @@ class ImageViewerWindow(QMainWindow):
                 self.min_max[channel_index][0] = np.min(self.channel_data[channel_index])
                 self.min_max[channel_index][1] = max(1, np.max(self.channel_data[channel_index]))
                 self.volume_dict[channel_index] = None #reset volumes
+                self.build_label_index(channel_index)
 
             try:
                 if assign_shape: #keep original shape tracked to undo resampling.
@@ -7154,6 +6982,9 @@ class ImageViewerWindow(QMainWindow):
                 self.measurement_artists = []
                 self.view_initialized = False
                 self.original_dims = None
+            if not hasattr(self, 'slice_cache'):
+                self.slice_cache = slice_cache.SlicePyramidCache()
+                self.lut_cache = {}
                        
             if (hasattr(self, 'completed_paint_strokes') and self.completed_paint_strokes) or \
                (hasattr(self, 'current_stroke_points') and self.current_stroke_points) or \
@@ -7243,6 +7074,13 @@ class ImageViewerWindow(QMainWindow):
                     self.y_min_padded = max(0, y_min - padding)
                     self.y_max_padded = min(min_height, y_max + padding)
             
+            # Snap the render region to the downsample grid so it lines up with the cached tiles
+            self.x_min_padded -= self.x_min_padded % self.downsample_factor
+            self.y_min_padded -= self.y_min_padded % self.downsample_factor
+
+            # Tiles are only cached while no segmenter is live, since it rewrites its channels in place
+            use_cache = self.machine_window is None
+
             base_colors = self.base_colors
             
             # Helper function to crop and downsample
@@ -7295,9 +7133,19 @@ class ImageViewerWindow(QMainWindow):
                         current_image = self.channel_data[channel]
 
                     # Crop to visible region and downsample
-                    display_image = crop_and_downsample(
-                        current_image, self.y_min_padded, self.y_max_padded,
-                        self.x_min_padded, self.x_max_padded, self.downsample_factor)
+                    if use_cache and self.channel_data[channel].ndim >= 3:
+                        display_image = self.slice_cache.get_region(
+                            channel, self.channel_data[channel], self.current_slice,
+                            self.y_min_padded, self.y_max_padded,
+                            self.x_min_padded, self.x_max_padded, self.downsample_factor)
+                        self.slice_cache.prefetch(
+                            channel, self.channel_data[channel], self.current_slice,
+                            self.y_min_padded, self.y_max_padded,
+                            self.x_min_padded, self.x_max_padded, self.downsample_factor)
+                    else:
+                        display_image = crop_and_downsample(
+                            current_image, self.y_min_padded, self.y_max_padded,
+                            self.x_min_padded, self.x_max_padded, self.downsample_factor)
 
                     # Create or reuse ImageItem
                     if channel not in self.channel_images:
@@ -7335,19 +7183,19 @@ class ImageViewerWindow(QMainWindow):
                         
                         img_min, img_max = self.min_max[channel]
                         
-                        if img_min == img_max:
-                            normalized_image = np.zeros_like(display_image, dtype=np.float32)
-                        else:
+                        # Brightness is applied by pyqtgraph through levels, so no normalized float copy of the slice is made
+                        levels = None
+                        if img_min != img_max:
                             vmin = img_min + (img_max - img_min) * self.channel_brightness[channel]['min']
                             if self.channel_brightness[channel]['max'] < 2/65535:
                                 vmax = 0.5
                             else:
                                 vmax = img_min + (img_max - img_min) * self.channel_brightness[channel]['max']
 
-                            if vmin == vmax:
-                                normalized_image = np.zeros_like(display_image, dtype=np.float32)
-                            else:
-                                normalized_image = np.clip((display_image - vmin) / (vmax - vmin), 0, 1)
+                            if vmin != vmax:
+                                levels = (float(vmin), float(vmax))
+                        if display_image.dtype == bool:
+                            display_image = display_image.view(np.uint8)
                         
                         if channel == 2 and self.machine_window is not None:
                             colors = np.array([
@@ -7361,15 +7209,21 @@ class ImageViewerWindow(QMainWindow):
                             self.channel_images[channel].setLookupTable(lut)
                             self.channel_images[channel].setOpacity(0.7)
                         else:
-                            color = base_colors[channel]
-                            colors = np.array([
-                                [0, 0, 0, 0],
-                                [*color, 1]
-                            ])
-                            cmap = pg.ColorMap(pos=np.array([0, 1]), color=colors * 255)
-                            lut = cmap.getLookupTable(0, 1, 256)
+                            color = tuple(base_colors[channel])
+                            lut = self.lut_cache.get(color)
+                            if lut is None:
+                                colors = np.array([
+                                    [0, 0, 0, 0],
+                                    [*color, 1]
+                                ])
+                                cmap = pg.ColorMap(pos=np.array([0, 1]), color=colors * 255)
+                                lut = cmap.getLookupTable(0, 1, 256)
+                                self.lut_cache[color] = lut
                             
-                            self.channel_images[channel].setImage(normalized_image.T, levels=(0, 1))
+                            if levels is None:
+                                self.channel_images[channel].setImage(np.zeros(display_image.shape[::-1], dtype=np.uint8), levels=(0, 1))
+                            else:
+                                self.channel_images[channel].setImage(display_image.T, levels=levels)
                             self.channel_images[channel].setLookupTable(lut)
                             self.channel_images[channel].setOpacity(0.7)
                         
@@ -15354,13 +15208,13 @@ class MachineWindow(QMainWindow):
                 self,
                 f"Save Model As",
                 "",  # Default directory
-                "numpy data (*.npz);;All Files (*)"  # File type filter
+                "Segmenter model (*.n3dseg);;All Files (*)"  # File type filter
             )
             
             if filename:  # Only proceed if user didn't cancel
-                # If user didn't type an extension, add .tif
-                if not filename.endswith(('.npz')):
-                    filename += '.npz'
+                # If user didn't type an extension, add one
+                if not filename.endswith(('.n3dseg', '.npz')):
+                    filename += '.n3dseg'
 
             self.segmenter.save_model(filename, self.parent().channel_data[2])
 
@@ -15378,7 +15232,7 @@ class MachineWindow(QMainWindow):
                 self,
                 f"Load Model",
                 "",
-                "numpy data (*.npz)"
+                "Segmenter model (*.n3dseg *.npz)"
             )
 
             self.segmenter.load_model(filename)
@@ -4,13 +4,16 @@ import json
 import tifffile
 import numpy as np
 from networkx.algorithms import community
-from scipy.ndimage import zoom
 from scipy import ndimage
 from . import node_draw
 import matplotlib.pyplot as plt
 from scipy.optimize import curve_fit
 from . import nettracer
 from . import modularity
+from . import graph_core
+from . import relabel
+from . import edge_table
+from . import resample
 import multiprocessing as mp
 import random
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -39,16 +42,8 @@ def downsample(data, factor, directory=None, order=0):
     else:
         data2 = None
     
-    # Check if Z dimension is too small relative to downsample factor
-    if data.ndim == 3 and data.shape[0] < factor * 4:
-        print(f"Warning: Z dimension ({data.shape[0]}) is less than 4x the downsample factor ({factor}). "
-              f"Skipping Z-axis downsampling to preserve resolution.")
-        zoom_factors = (1, 1/factor, 1/factor)
-    else:
-        zoom_factors = 1/factor
-
-    # Apply downsampling
-    data = zoom(data, zoom_factors, order=order)
+    # Apply downsampling (Z is kept when it is under 4x the factor; order 0 streams over the input)
+    data = resample.downsample(data, factor, order=order)
     
     # Save if input was a file path
     if isinstance(data2, str):
@@ -307,15 +302,9 @@ def _color_code(grayscale_image):
         # Generate a colormap
         colormap = generate_colormap(num_labels)
         
-        # Create an empty RGB image
-        rgb_image = np.zeros((*grayscale_image.shape, 3), dtype=np.uint8)
-        
-        # Assign colors to each label
-        for label in range(1, num_labels):
-            color = (colormap[label][:3] * 255).astype(np.uint8)  # Convert to RGB and ensure dtype is uint8
-            rgb_image[grayscale_image == label] = color
-            
-        return rgb_image
+        # Assign colors to each label in one lookup table pass, 0 stays black
+        colors = (colormap[1:, :3] * 255).astype(np.uint8)  # Convert to RGB and ensure dtype is uint8
+        return relabel.lookup(grayscale_image, np.arange(1, num_labels), colors)
 
     # Convert the grayscale image to RGB
     rgb_image = grayscale_to_rgb(grayscale_image)
@@ -1039,17 +1028,17 @@ def get_distance_list(centroids, network, xy_scale, z_scale):
 
 
 def prune_samenode_connections(networkfile, nodeIDs, target=None):
-    """Even faster numpy-based version for very large datasets
+    """Remove the pairs whose two nodes share an identity, filtering the whole edge table at once
     
     Args:
         networkfile: Network file path or list of node pairs
         nodeIDs: Node identity mapping (file path or dict), where each node maps
-                 to a LIST of identity strings.
+                 to a LIST of identity strings. A bare string is taken as a single
+                 identity; nodes missing from the mapping have no identity.
         target: Optional string. If provided, only prunes pairs where BOTH nodes 
                 have this specific identity in their identity lists. If None, 
                 prunes all pairs that share at least one common identity.
     """
-    import numpy as np
     
     # Handle nodeIDs input
     if type(nodeIDs) == str:
@@ -1068,37 +1057,18 @@ def prune_samenode_connections(networkfile, nodeIDs, target=None):
     else:
         master_list = networkfile
     
-    nodesA = np.array(master_list[0])
-    nodesB = np.array(master_list[1])
-    
-    # Handle edgesC safely
-    if len(master_list) > 2 and master_list[2]:
-        edgesC = np.array(master_list[2], dtype=object)
-    else:
-        edgesC = np.array([None] * len(nodesA), dtype=object)
-    
-    # Lookup identity lists for each node (returns empty list if node not found)
-    idsA = [data_dict.get(node, []) for node in nodesA]
-    idsB = [data_dict.get(node, []) for node in nodesB]
+    table = edge_table.EdgeTable.from_lists(master_list)
     
     # Create boolean mask based on target parameter
     if target is None:
         # Keep pair only if the two nodes share NO common identity
-        keep_mask = np.array([
-            len(set(a) & set(b)) == 0
-            for a, b in zip(idsA, idsB)
-        ])
+        keep_mask = ~table.shares_identity(data_dict)
     else:
         # Keep pair unless BOTH nodes carry the target identity
-        keep_mask = np.array([
-            not (target in a and target in b)
-            for a, b in zip(idsA, idsB)
-        ])
+        keep_mask = ~table.both_have(data_dict, [target])
     
     # Apply filter
-    filtered_nodesA = nodesA[keep_mask].tolist()
-    filtered_nodesB = nodesB[keep_mask].tolist()
-    filtered_edgesC = edgesC[keep_mask].tolist()
+    filtered_nodesA, filtered_nodesB, filtered_edgesC = table.select(keep_mask).to_lists()
     
     # Create save_list
     save_list = [[filtered_nodesA[i], filtered_nodesB[i], filtered_edgesC[i]] 
@@ -1126,8 +1096,11 @@ def prune_samenode_connections(networkfile, nodeIDs, target=None):
 
 
 def isolate_internode_connections(networkfile, nodeIDs, ID1, ID2):
-    """Even faster numpy-based version for very large datasets"""
-    import numpy as np
+    """Keep only the connections between nodes of two identities, filtering the whole edge table at once
+
+    Keeps the pairs where both nodes carry ID1 or ID2. nodeIDs maps each node to a list of
+    identity strings (a bare string is taken as a single identity); nodes missing from it have none.
+    """
     
     # Handle nodeIDs input
     if type(nodeIDs) == str:
@@ -1145,24 +1118,13 @@ def isolate_internode_connections(networkfile, nodeIDs, ID1, ID2):
     else:
         master_list = networkfile
     
-    nodesA = np.array(master_list[0])
-    nodesB = np.array(master_list[1])
-    edgesC = np.array(master_list[2])
-    
-    # Lookup identity lists for each node
-    valuesA = [data_dict.get(node, []) for node in nodesA]
-    valuesB = [data_dict.get(node, []) for node in nodesB]
+    table = edge_table.EdgeTable.from_lists(master_list)
     
-    # Create boolean mask: keep pair only if BOTH nodes carry at least one of ID1/ID2
-    legalIDs_set = {str(ID1), str(ID2)}
-    maskA = np.array([any(v in legalIDs_set for v in vals) for vals in valuesA])
-    maskB = np.array([any(v in legalIDs_set for v in vals) for vals in valuesB])
-    keep_mask = maskA & maskB
+    # Keep pair only if BOTH nodes carry at least one of ID1/ID2
+    keep_mask = table.both_have(data_dict, [ID1, ID2])
     
     # Apply filter
-    filtered_nodesA = nodesA[keep_mask].tolist()
-    filtered_nodesB = nodesB[keep_mask].tolist()
-    filtered_edgesC = edgesC[keep_mask].tolist()
+    filtered_nodesA, filtered_nodesB, filtered_edgesC = table.select(keep_mask).to_lists()
     
     # Create save_list
     save_list = [[filtered_nodesA[i], filtered_nodesB[i], filtered_edgesC[i]] 
@@ -1188,9 +1150,45 @@ def isolate_internode_connections(networkfile, nodeIDs, ID1, ID2):
     master_list = [filtered_nodesA, filtered_nodesB, filtered_edgesC]
     return master_list, output_dict
 
+def edge_to_node_table(table, identity_dict, maxnode=None):
+    """
+    Edge-to-node transform on an edge_table.EdgeTable: every row A-B joined by edge C becomes the rows A-C' and C'-B, where
+    C' = C + maxnode so edge ids cannot collide with node ids. identity_dict gains ['Node'] for nodes it lacks and ['Edge'] for
+    the new edge nodes (it is updated in place).
+
+    Returns:
+    --------
+    tuple
+        (new table, identity_dict, maxnode)
+    """
+    # Calculate maxnode if not provided
+    if maxnode is None:
+        maxnode = int(table.max_node())
+    maxnode = int(maxnode)
+    
+    print(f"Transposing all edge vals by {maxnode} to prevent ID overlap with preexisting nodes")
+    
+    # Vectorized edge transposition
+    transposed_edges = table.edge + maxnode
+    
+    # All A-C' rows, then all C'-B rows
+    new_table = edge_table.EdgeTable(np.concatenate((table.node_a, transposed_edges)),
+                                     np.concatenate((transposed_edges, table.node_b)))
+    
+    # Add missing nodes
+    for node in table.node_ids().tolist():
+        if node not in identity_dict:
+            identity_dict[node] = ['Node']
+    
+    # Add all edges at once
+    for edge in np.unique(transposed_edges).tolist():
+        identity_dict[edge] = ['Edge']
+    
+    return new_table, identity_dict, maxnode
+
+
 def edge_to_node(network, node_identities=None, maxnode=None):
     """Even faster numpy-based version for very large datasets"""
-    import numpy as np
     
     # Handle node_identities input
     if node_identities is not None and type(node_identities) == str:
@@ -1207,41 +1205,8 @@ def edge_to_node(network, node_identities=None, maxnode=None):
     else:
         master_list = network
     
-    # Convert to numpy arrays for vectorized operations
-    nodesA = np.array(master_list[0])
-    nodesB = np.array(master_list[1])
-    edgesC = np.array(master_list[2])
-    
-    # Get all unique nodes efficiently
-    allnodes = set(np.concatenate([nodesA, nodesB]).tolist())
-    
-    # Calculate maxnode if not provided
-    if maxnode is None:
-        maxnode = int(np.max(np.concatenate([nodesA, nodesB])))
-    
-    print(f"Transposing all edge vals by {maxnode} to prevent ID overlap with preexisting nodes")
-    
-    # Vectorized edge transposition
-    transposed_edges = edgesC + maxnode
-    
-    # Create new_network using vectorized operations
-    # Create arrays for the two types of connections
-    connections1 = np.column_stack([nodesA, transposed_edges, np.zeros(len(nodesA))])
-    connections2 = np.column_stack([transposed_edges, nodesB, np.zeros(len(nodesB))])
-    
-    # Combine and convert to list format
-    new_network_array = np.vstack([connections1, connections2])
-    new_network = new_network_array.astype(int).tolist()
-    
-    # Update identity_dict efficiently
-    # Add missing nodes
-    for node in allnodes:
-        if node not in identity_dict:
-            identity_dict[node] = ['Node']
-    
-    # Add all edges at once
-    for edge in transposed_edges.tolist():
-        identity_dict[edge] = ['Edge']
+    new_table, identity_dict, maxnode = edge_to_node_table(edge_table.EdgeTable.from_lists(master_list), identity_dict, maxnode)
+    new_network = np.column_stack((new_table.node_a, new_table.node_b, new_table.edge)).astype(int).tolist()
     
     # Handle output
     if type(network) == str:
@@ -1420,21 +1385,17 @@ def degree_distribution(G, directory = None):
     def create_incremental_list(length, start=1):
         return list(range(start, start + length))
 
-    node_list = list(G.nodes)
-    degree_dict = {}
-
-    for node in node_list:
-        degree = G.degree(node)
-        if degree not in degree_dict:
-            degree_dict[degree] = 1
-        else:
-            degree_dict[degree] += 1
+    if isinstance(G, graph_core.CompactGraph):
+        node_degrees = G.degree()
+    else:
+        node_degrees = np.fromiter((degree for _, degree in G.degree()), dtype=np.int64, count=G.number_of_nodes())
+    degree_dict = dict(zip(*(arr.tolist() for arr in np.unique(node_degrees, return_counts=True))))
 
     high_degree = max(degree_dict.keys())
     proportion_list = [0] * high_degree
 
     for item in degree_dict:
-        proportion_list[item - 1] = float(degree_dict[item]/len(node_list))
+        proportion_list[item - 1] = float(degree_dict[item]/len(node_degrees))
     degrees = create_incremental_list(high_degree)
 
 
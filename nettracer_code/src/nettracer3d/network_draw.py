@@ -2,13 +2,14 @@ import tifffile
 import numpy as np
 import pandas as pd
 from scipy import ndimage
-from scipy.ndimage import zoom
 try:
     import cupy as cp
 except:
     pass
     
 from . import network_analysis
+from . import rasterize
+from . import resample
 
 def read_excel_to_lists(file_path, sheet_name=0):
     """Convert a pd dataframe to lists"""
@@ -75,30 +76,24 @@ def draw_line_inplace(start, end, array):
     """
     Draws a white line between two points in a 3D array.
     """
-    
-    # Calculate the distances between start and end coordinates
-    try:
-        distances = end - start
-    except:
-        end = np.array(end)
-        start = np.array(start)
-        distances = end - start
-
-    # Determine the number of steps along the line
-    num_steps = int(max(np.abs(distances)) + 1)
-
-    # Generate linearly spaced coordinates along each dimension
-    x_coords = np.linspace(start[0], end[0], num_steps, endpoint=True).round().astype(int)
-    y_coords = np.linspace(start[1], end[1], num_steps, endpoint=True).round().astype(int)
-    z_coords = np.linspace(start[2], end[2], num_steps, endpoint=True).round().astype(int)
-
-    # Clip coordinates to ensure they are within the valid range
-    x_coords = np.clip(x_coords, 0, array.shape[0] - 1)
-    y_coords = np.clip(y_coords, 0, array.shape[1] - 1)
-    z_coords = np.clip(z_coords, 0, array.shape[2] - 1)
-
-    # Set the line coordinates to 255 in the existing array
-    array[x_coords, y_coords, z_coords] = 255
+    rasterize.draw_lines(array, [start], [end], value=255, clip=True)
+
+def _centroid_segments(pair1, pair2, centroid_dic):
+    """
+    Gathers the centroids of each pair into (N, 3) start and end arrays for batched drawing. Pairs with a missing centroid are skipped.
+    """
+    starts = []
+    ends = []
+    for pair1_val, pair2_val in zip(pair1, pair2):
+        try:
+            pair1_centroid = centroid_dic[pair1_val]
+            pair2_centroid = centroid_dic[pair2_val]
+        except KeyError:
+            continue
+        starts.append(pair1_centroid)
+        ends.append(pair2_centroid)
+
+    return np.array(starts, dtype=np.float64).reshape(-1, 3), np.array(ends, dtype=np.float64).reshape(-1, 3)
 
 def downsample(data, factor, directory=None, order=0):
     """
@@ -117,16 +112,8 @@ def downsample(data, factor, directory=None, order=0):
     else:
         data2 = None
     
-    # Check if Z dimension is too small relative to downsample factor
-    if data.ndim == 3 and data.shape[0] < factor * 4:
-        print(f"Warning: Z dimension ({data.shape[0]}) is less than 4x the downsample factor ({factor}). "
-              f"Skipping Z-axis downsampling to preserve resolution.")
-        zoom_factors = (1, 1/factor, 1/factor)
-    else:
-        zoom_factors = 1/factor
-
-    # Apply downsampling
-    data = zoom(data, zoom_factors, order=order)
+    # Apply downsampling (Z is kept when it is under 4x the factor; order 0 streams over the input)
+    data = resample.downsample(data, factor, order=order)
     
     # Save if input was a file path
     if isinstance(data2, str):
@@ -168,64 +155,17 @@ def draw_network_lattice(nodes, network, label_nodes = None):
             centroid_dic[item] = centroid
     output_stack = np.zeros(np.shape(nodes), dtype=np.uint8)
 
-    for i, pair1_val in enumerate(pair1):
-        pair2_val = pair2[i]
-        try:
-            pair1_centroid = centroid_dic[pair1_val]
-            pair2_centroid = centroid_dic[pair2_val]
-            draw_line_inplace(pair1_centroid, pair2_centroid, output_stack)
-        except KeyError:
-            print(f"Missing centroid {i}")
-            pass
+    starts, ends = _centroid_segments(pair1, pair2, centroid_dic)
+    if len(starts) < len(pair1):
+        print(f"Missing centroids for {len(pair1) - len(starts)} pairs")
+    rasterize.draw_lines(output_stack, starts, ends, value=255)
 
     tifffile.imwrite("drawn_network.tif", output_stack)
     print("done")
 
 def upsample_with_padding(data, factor, original_shape):
     # Upsample the input binary array while adding padding to match the original shape
-
-    # Get the dimensions of the original and upsampled arrays
-    original_shape = np.array(original_shape)
-    binary_array = zoom(data, factor, order=0)
-    upsampled_shape = np.array(binary_array.shape)
-
-    # Calculate the positive differences in dimensions
-    difference_dims = original_shape - upsampled_shape
-
-    # Calculate the padding amounts for each dimension
-    padding_dims = np.maximum(difference_dims, 0)
-    padding_before = padding_dims // 2
-    padding_after = padding_dims - padding_before
-
-    # Pad the binary array along each dimension
-    padded_array = np.pad(binary_array, [(padding_before[0], padding_after[0]),
-                                         (padding_before[1], padding_after[1]),
-                                         (padding_before[2], padding_after[2])], mode='constant', constant_values=0)
-
-    # Calculate the subtraction amounts for each dimension
-    sub_dims = np.maximum(-difference_dims, 0)
-    sub_before = sub_dims // 2
-    sub_after = sub_dims - sub_before
-
-    # Remove planes from the beginning and end
-    if sub_dims[0] == 0:
-        trimmed_planes = padded_array
-    else:
-        trimmed_planes = padded_array[sub_before[0]:-sub_after[0], :, :]
-
-    # Remove rows from the beginning and end
-    if sub_dims[1] == 0:
-        trimmed_rows = trimmed_planes
-    else:
-        trimmed_rows = trimmed_planes[:, sub_before[1]:-sub_after[1], :]
-
-    # Remove columns from the beginning and end
-    if sub_dims[2] == 0:
-        trimmed_array = trimmed_rows
-    else:
-        trimmed_array = trimmed_rows[:, :, sub_before[2]:-sub_after[2]]
-
-    return trimmed_array
+    return resample.upsample_to(data, factor, original_shape)
 
 def draw_network_from_centroids(nodes, network, centroids, twod_bool, directory = None):
 
@@ -251,16 +191,9 @@ def draw_network_from_centroids(nodes, network, centroids, twod_bool, directory
             #print(f"Centroid {item} missing")
     output_stack = np.zeros(np.shape(nodes), dtype=np.uint8)
 
-    for i, pair1_val in enumerate(pair1):
-
-        pair2_val = pair2[i]
-        try:
-            pair1_centroid = centroid_dic[pair1_val]
-            pair2_centroid = centroid_dic[pair2_val]
-            draw_line_inplace(pair1_centroid, pair2_centroid, output_stack)
-        except KeyError:
-            #print(f"Missing centroid {i}")
-            pass
+    # All edges are rasterized in one parallel batch
+    starts, ends = _centroid_segments(pair1, pair2, centroid_dic)
+    rasterize.draw_lines(output_stack, starts, ends, value=255)
 
     if twod_bool:
         output_stack = output_stack[0,:,:] | output_stack[0,:,:]
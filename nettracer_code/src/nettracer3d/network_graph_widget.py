@@ -3,14 +3,16 @@ import networkx as nx
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QMenu,
                               QSizePolicy, QApplication, QScrollArea, QLabel, QFrame,
                               QFileDialog, QMessageBox)
-from PyQt6.QtCore import Qt, pyqtSignal, QThread, pyqtSlot, QTimer, QPointF, QRectF
-from PyQt6.QtGui import QColor, QPen, QBrush, QPainterPath, QPolygonF
+from PyQt6.QtCore import Qt, pyqtSignal, QThread, pyqtSlot, QTimer, QRectF
+from PyQt6.QtGui import QColor, QPen, QBrush
 import pyqtgraph as pg
 from pyqtgraph import ScatterPlotItem, PlotCurveItem, GraphicsLayoutWidget, ROI
 import colorsys
 import random
 import copy
 import math
+from . import point_select
+from . import graph_layout
 
 
 def remove_dupe_ids(idens):
@@ -34,7 +36,7 @@ class GraphLoadThread(QThread):
     
     def __init__(self, graph, geometric, component, centroids, communities, 
                  community_dict, identities, identity_dict, weight, z_size,
-                 shell, node_size, edge_size):
+                 shell, node_size, edge_size, spring_cache=None):
         super().__init__()
         self.graph = graph
         self.geometric = geometric
@@ -49,20 +51,34 @@ class GraphLoadThread(QThread):
         self.shell = shell
         self.node_size = node_size
         self.edge_size = edge_size
+        self.spring_cache = spring_cache  # (graph_layout.graph_key, {node: position}) of the last spring layout of this kind
+        self.previous_pos = None
+        self.cached_pos = None
     
     def run(self):
         """Compute layout and colors in background thread"""
         result = {}
-        
+
+        # Reuse the last spring layout if the graph is unchanged, warm-start from it if the graph is an edit of that one
+        result['layout_key'] = graph_layout.graph_key(self.graph)
+        if self.spring_cache is not None:
+            previous_key, positions = self.spring_cache
+            if previous_key == result['layout_key']:
+                self.cached_pos = positions
+            elif graph_layout.is_edit(result['layout_key'], previous_key):
+                self.previous_pos = positions
+
         # Compute node positions
-        if not self.geometric and not self.component:
+        if self.cached_pos is not None and not self.geometric and (self.component or not self.shell):
+            result['pos'] = dict(self.cached_pos)
+        elif not self.geometric and not self.component:
             result['pos'] = self._compute_fast_spring_layout()
         elif self.geometric:
             result['pos'] = self._compute_geometric_layout()
         elif self.component:
-            nodes = list(self.graph.nodes())
-            n = len(nodes)
-            result['pos'] = self._spring_layout_numpy_super(nodes, n)
+            result['pos'] = graph_layout.graph_spring_layout(self.graph, previous=self.previous_pos,
+                                                             separate_components=True)
+        result['spring'] = not self.geometric and (self.component or not self.shell)
 
         # Compute node colors and sizes
         result['colors'], result['sizes'] = self._compute_node_attributes()
@@ -82,21 +98,16 @@ class GraphLoadThread(QThread):
         self.finished.emit(result)
     
     def _compute_fast_spring_layout(self):
-        """Fast vectorized spring layout using numpy"""
+        """Barnes-Hut spring layout, or the shell layout when shell is set"""
         nodes = list(self.graph.nodes())
         n = len(nodes)
         
         if n == 0:
             return {}
         
-        # For small graphs, use networkx (overhead is negligible)
-        if n < 500 and not self.shell:
-            return nx.spring_layout(self.graph, seed=42, iterations=50)
-
-        # Use fast vectorized implementation for larger graphs
         try:
             if not self.shell:
-                return self._spring_layout_numpy(nodes, n)
+                return graph_layout.graph_spring_layout(self.graph, nodes, previous=self.previous_pos)
             else:
                 return self._shell_layout_numpy_super(nodes, n)
         except Exception as e:
@@ -294,192 +305,6 @@ class GraphLoadThread(QThread):
         
         return {node: positions[list(pos.keys()).index(node)] for node in nodes}
     
-    def _spring_layout_numpy_super(self, nodes, n, iterations=50):
-        """
-        Spring layout with physically separated connected components
-        """
-        from scipy.spatial import cKDTree
-        import networkx as nx
-        
-        np.random.seed(42)
-        
-        # Find connected components
-        components = list(nx.connected_components(self.graph))
-        
-        if len(components) == 1:
-            # Single component - use original algorithm
-            return self._spring_layout_numpy(nodes, n, iterations)
-        
-        # Layout each component independently
-        component_layouts = []
-        component_bounds = []
-        
-        for component in components:
-            comp_nodes = list(component)
-            comp_n = len(comp_nodes)
-            
-            # Create subgraph for this component
-            subgraph_edges = [
-                (u, v) for u, v in self.graph.edges() 
-                if u in component and v in component
-            ]
-            
-            # Run spring layout on this component only
-            comp_pos = self._layout_component(comp_nodes, comp_n, subgraph_edges, iterations)
-            
-            # Calculate bounding box
-            positions = np.array(list(comp_pos.values()))
-            min_coords = positions.min(axis=0)
-            max_coords = positions.max(axis=0)
-            size = max_coords - min_coords
-            
-            component_layouts.append((comp_nodes, comp_pos))
-            component_bounds.append(size)
-        
-        # Arrange components in a grid with spacing
-        num_components = len(components)
-        grid_cols = int(np.ceil(np.sqrt(num_components)))
-        
-        # Calculate spacing based on largest component
-        max_width = max(bounds[0] for bounds in component_bounds)
-        max_height = max(bounds[1] for bounds in component_bounds)
-        spacing_x = max_width * 1.5  # 50% padding between components
-        spacing_y = max_height * 1.5
-        
-        # Place components in grid
-        final_positions = {}
-        for idx, (comp_nodes, comp_pos) in enumerate(component_layouts):
-            grid_x = idx % grid_cols
-            grid_y = idx // grid_cols
-            
-            # Calculate offset for this component
-            offset = np.array([grid_x * spacing_x, grid_y * spacing_y])
-            
-            # Apply offset to all nodes in component
-            for node in comp_nodes:
-                final_positions[node] = comp_pos[node] + offset
-        
-        # Center the entire layout
-        all_pos = np.array([final_positions[node] for node in nodes])
-        all_pos -= all_pos.mean(axis=0)
-        
-        return {node: all_pos[i] for i, node in enumerate(nodes)}
-
-    def _layout_component(self, nodes, n, edges, iterations):
-        """
-        Spring layout for a single component
-        """
-        from scipy.spatial import cKDTree
-        
-        np.random.seed(42 + len(nodes))  # Different seed per component size
-        pos = np.random.rand(n, 2)
-        
-        if len(edges) == 0:
-            return {node: pos[i] for i, node in enumerate(nodes)}
-        
-        node_to_idx = {node: i for i, node in enumerate(nodes)}
-        edge_indices = np.array([[node_to_idx[u], node_to_idx[v]] for u, v in edges])
-        
-        k = np.sqrt(1.0 / n)
-        t = 0.1
-        dt = t / (iterations + 1)
-        cutoff_distance = 4 * k
-        
-        for iteration in range(iterations):
-            displacement = np.zeros_like(pos)
-            
-            tree = cKDTree(pos)
-            pairs = tree.query_pairs(r=cutoff_distance, output_type='ndarray')
-            
-            if len(pairs) > 0:
-                i_indices = pairs[:, 0]
-                j_indices = pairs[:, 1]
-                
-                delta = pos[i_indices] - pos[j_indices]
-                distance = np.linalg.norm(delta, axis=1, keepdims=True)
-                distance = np.maximum(distance, 0.01)
-                
-                force_magnitude = (k * k) / distance
-                force = delta * (force_magnitude / distance)
-                
-                np.add.at(displacement, i_indices, force)
-                np.add.at(displacement, j_indices, -force)
-            
-            if len(edge_indices) > 0:
-                edge_delta = pos[edge_indices[:, 0]] - pos[edge_indices[:, 1]]
-                edge_distance = np.sqrt((edge_delta ** 2).sum(axis=1, keepdims=True))
-                edge_distance = np.maximum(edge_distance, 0.01)
-                
-                edge_force_magnitude = (edge_distance * edge_distance) / k
-                edge_force = edge_delta * (edge_force_magnitude / edge_distance)
-                
-                np.add.at(displacement, edge_indices[:, 0], -edge_force)
-                np.add.at(displacement, edge_indices[:, 1], edge_force)
-            
-            disp_magnitude = np.sqrt((displacement ** 2).sum(axis=1, keepdims=True))
-            disp_magnitude = np.maximum(disp_magnitude, 0.01)
-            displacement = displacement * np.minimum(t / disp_magnitude, 1.0)
-            
-            pos += displacement
-            t -= dt
-        
-        pos -= pos.mean(axis=0)
-        return {node: pos[i] for i, node in enumerate(nodes)}
-
-    def _spring_layout_numpy(self, nodes, n, iterations = 50):
-        """
-        Original algorithm for single component case
-        """
-        from scipy.spatial import cKDTree
-        np.random.seed(42)
-        pos = np.random.rand(n, 2)
-        
-        edges = list(self.graph.edges())
-        if len(edges) == 0:
-            return {node: pos[i] for i, node in enumerate(nodes)}
-        
-        node_to_idx = {node: i for i, node in enumerate(nodes)}
-        edge_indices = np.array([[node_to_idx[u], node_to_idx[v]] for u, v in edges])
-        
-        k = np.sqrt(1.0 / n)
-        t = 0.1
-        dt = t / (iterations + 1)
-        cutoff_distance = 4 * k
-        
-        for iteration in range(iterations):
-            displacement = np.zeros_like(pos)
-            tree = cKDTree(pos)
-            pairs = tree.query_pairs(r=cutoff_distance, output_type='ndarray')
-            
-            if len(pairs) > 0:
-                i_indices = pairs[:, 0]
-                j_indices = pairs[:, 1]
-                delta = pos[i_indices] - pos[j_indices]
-                distance = np.linalg.norm(delta, axis=1, keepdims=True)
-                distance = np.maximum(distance, 0.01)
-                force_magnitude = (k * k) / distance
-                force = delta * (force_magnitude / distance)
-                np.add.at(displacement, i_indices, force)
-                np.add.at(displacement, j_indices, -force)
-            
-            if len(edge_indices) > 0:
-                edge_delta = pos[edge_indices[:, 0]] - pos[edge_indices[:, 1]]
-                edge_distance = np.sqrt((edge_delta ** 2).sum(axis=1, keepdims=True))
-                edge_distance = np.maximum(edge_distance, 0.01)
-                edge_force_magnitude = (edge_distance * edge_distance) / k
-                edge_force = edge_delta * (edge_force_magnitude / edge_distance)
-                np.add.at(displacement, edge_indices[:, 0], -edge_force)
-                np.add.at(displacement, edge_indices[:, 1], edge_force)
-            
-            disp_magnitude = np.sqrt((displacement ** 2).sum(axis=1, keepdims=True))
-            disp_magnitude = np.maximum(disp_magnitude, 0.01)
-            displacement = displacement * np.minimum(t / disp_magnitude, 1.0)
-            pos += displacement
-            t -= dt
-        
-        pos -= pos.mean(axis=0)
-        return {node: pos[i] for i, node in enumerate(nodes)}
-
     def _prepare_node_spots(self, pos, colors, sizes):
         """Prepare spots array and brush caches for ScatterPlotItem"""
         nodes = list(self.graph.nodes())
@@ -781,6 +606,7 @@ class NetworkGraphWidget(QWidget):
         # Graph data
         self.graph = None
         self.node_positions = {}
+        self._spring_layout = None  # (component, graph key, {node: position}) of the last spring layout, to reuse or warm-start from
         self.node_colors = []
         self.node_sizes = []
         self.node_items = {}
@@ -804,6 +630,7 @@ class NetworkGraphWidget(QWidget):
         self._brush_list = None         # list of N QBrush (current, with selection)
         self._data_list = None          # list of N node_id values
         self._base_sizes = None         # N float64 original per-node sizes
+        self._grid = None               # point_select.PointGrid over _pos_array (selection)
 
         # Cached full-graph bounds (avoids recomputing from dict every zoom)
         self._full_x_range = 0.0
@@ -1198,12 +1025,15 @@ class NetworkGraphWidget(QWidget):
         self.loading_text.setPos(0, 0)  # Center of view
         self.plot.addItem(self.loading_text)
         
-        # Start loading in thread
+        # Start loading in thread, with the last spring layout of the same kind to reuse or warm-start from
+        spring_cache = None
+        if self._spring_layout is not None and self._spring_layout[0] == self.component:
+            spring_cache = self._spring_layout[1:]
         self.load_thread = GraphLoadThread(
             self.graph, self.geometric, self.component, self.centroids,
             self.communities, self.community_dict,
             self.identities, self.identity_dict, self.weight, self.z_size,
-            self.shell, self.node_size, self.edge_size
+            self.shell, self.node_size, self.edge_size, spring_cache
         )
         self.load_thread.finished.connect(self._on_graph_loaded)
         self.load_thread.start()
@@ -1217,6 +1047,8 @@ class NetworkGraphWidget(QWidget):
             self.loading_text = None
         
         self.node_positions = result['pos']
+        if result['spring'] and result['pos']:
+            self._spring_layout = (self.component, result['layout_key'], dict(result['pos']))
         self.node_colors = result['colors']
         self.node_sizes = result['sizes']
         self.base_node_sizes = result['sizes'].copy()
@@ -1232,6 +1064,7 @@ class NetworkGraphWidget(QWidget):
 
         # Build parallel arrays for fast array-based setData
         n = len(self.cached_spots)
+        self._grid = None
         if n > 0:
             self._pos_array = np.array([s['pos'] for s in self.cached_spots], dtype=np.float64)
             self._size_array = np.array([s['size'] for s in self.cached_spots], dtype=np.float64)
@@ -1242,6 +1075,9 @@ class NetworkGraphWidget(QWidget):
             # Cache full-graph bounds (constant until graph reloads)
             self._full_x_range = float(self._pos_array[:, 0].max() - self._pos_array[:, 0].min())
             self._full_y_range = float(self._pos_array[:, 1].max() - self._pos_array[:, 1].min())
+
+            # Grid index over the positions for rectangle and lasso selection
+            self._grid = point_select.PointGrid(self._pos_array)
         
         # Fast render - data is already prepared
         self._render_prepared_data(result)
@@ -1608,10 +1444,10 @@ class NetworkGraphWidget(QWidget):
         # SELECTION MODE: Select nodes in rectangle
         if self.selection_mode:
             # Find nodes in rectangle
-            selected_in_rect = []
-            for node, pos in self.node_positions.items():
-                if x_min <= pos[0] <= x_max and y_min <= pos[1] <= y_max:
-                    selected_in_rect.append(node)
+            if self._grid is not None:
+                selected_in_rect = [self._data_list[i] for i in self._grid.select_rect(x_min, x_max, y_min, y_max)]
+            else:
+                selected_in_rect = []
             
             # Add to selection
             modifiers = ev.modifiers()
@@ -1728,59 +1564,16 @@ class NetworkGraphWidget(QWidget):
         ys = [p.y() for p in self.lasso_points]
         self.lasso_path_item.setData(x=np.array(xs), y=np.array(ys))
 
-    @staticmethod
-    def _segments_intersect(p1, p2, p3, p4):
-        """
-        Test if line segment (p1->p2) intersects (p3->p4).
-        Returns (True, t) where t is the parameter along p3->p4 at the
-        intersection, or (False, 0) if no intersection.
-        """
-        dx1 = p2[0] - p1[0]
-        dy1 = p2[1] - p1[1]
-        dx2 = p4[0] - p3[0]
-        dy2 = p4[1] - p3[1]
-
-        denom = dx1 * dy2 - dy1 * dx2
-        if abs(denom) < 1e-12:
-            return False, 0
-
-        dx3 = p3[0] - p1[0]
-        dy3 = p3[1] - p1[1]
-
-        t = (dx3 * dy2 - dy3 * dx2) / denom
-        u = (dx3 * dy1 - dy3 * dx1) / denom
-
-        if 0.0 <= t <= 1.0 and 0.0 <= u <= 1.0:
-            return True, u
-        return False, 0
-
     def _find_segment_crossing(self):
         """
         Check if the newest lasso segment crosses any earlier segment.
         Returns the index of the earlier segment's START point, or -1 if none.
         """
-        n = len(self.lasso_points)
-        if n < 6:
+        if len(self.lasso_points) < 6:
             return -1
-
-        a = self.lasso_points[-2]
-        b = self.lasso_points[-1]
-        seg_new = (a.x(), a.y()), (b.x(), b.y())
-
-        check_up_to = n - 5
-
-        for i in range(0, check_up_to):
-            c = self.lasso_points[i]
-            d = self.lasso_points[i + 1]
-            seg_old = (c.x(), c.y()), (d.x(), d.y())
-
-            hit, _ = self._segments_intersect(
-                seg_new[0], seg_new[1], seg_old[0], seg_old[1]
-            )
-            if hit:
-                return i
-
-        return -1
+        xy = np.array([(p.x(), p.y()) for p in self.lasso_points])
+        # Skips the last few segments to prevent self-crossing on tight curves
+        return point_select.first_crossing(xy)
 
     def _auto_close_lasso(self, crossing_segment_idx):
         """
@@ -1793,15 +1586,8 @@ class NetworkGraphWidget(QWidget):
         loop_points = self.lasso_points[crossing_segment_idx:]
 
         if len(loop_points) >= 3:
-            poly = QPolygonF([QPointF(p.x(), p.y()) for p in loop_points])
-            path = QPainterPath()
-            path.addPolygon(poly)
-            path.closeSubpath()
-
-            selected_in_lasso = []
-            for nid, pos in self.node_positions.items():
-                if path.contains(QPointF(float(pos[0]), float(pos[1]))):
-                    selected_in_lasso.append(nid)
+            polygon = np.array([(p.x(), p.y()) for p in loop_points])
+            selected_in_lasso = self._nodes_in_lasso(polygon)
 
             modifiers = QApplication.keyboardModifiers()
             ctrl = modifiers & Qt.KeyboardModifier.ControlModifier
@@ -1815,6 +1601,12 @@ class NetworkGraphWidget(QWidget):
 
         self._cleanup_lasso()
 
+    def _nodes_in_lasso(self, polygon):
+        """Node IDs inside the closed lasso polygon (Mx2 view coords)."""
+        if self._grid is None:
+            return []
+        return [self._data_list[i] for i in self._grid.select_polygon(polygon)]
+
     def _cleanup_lasso(self):
         """Remove lasso visuals and reset state."""
         if self.lasso_path_item is not None:
@@ -1843,15 +1635,8 @@ class NetworkGraphWidget(QWidget):
             pixel_dist = math.sqrt(dx * dx + dy * dy)
 
             if pixel_dist < self.lasso_close_threshold:
-                poly = QPolygonF([QPointF(p.x(), p.y()) for p in self.lasso_points])
-                path = QPainterPath()
-                path.addPolygon(poly)
-                path.closeSubpath()
-
-                selected_in_lasso = []
-                for nid, pos in self.node_positions.items():
-                    if path.contains(QPointF(float(pos[0]), float(pos[1]))):
-                        selected_in_lasso.append(nid)
+                polygon = np.array([(p.x(), p.y()) for p in self.lasso_points])
+                selected_in_lasso = self._nodes_in_lasso(polygon)
 
                 modifiers = event.modifiers()
                 ctrl = modifiers & Qt.KeyboardModifier.ControlModifier
@@ -2156,6 +1941,7 @@ class NetworkGraphWidget(QWidget):
         self._brush_list = None
         self._data_list = None
         self._base_sizes = None
+        self._grid = None
         self._full_x_range = 0.0
         self._full_y_range = 0.0
 
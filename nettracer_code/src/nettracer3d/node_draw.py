@@ -2,8 +2,9 @@ import numpy as np
 import tifffile
 from scipy import ndimage
 from PIL import Image, ImageDraw, ImageFont
-from scipy.ndimage import zoom
-import cv2
+from . import relabel
+from . import resample
+from . import text_overlay
 
 def downsample(data, factor, directory=None, order=0):
     """
@@ -22,16 +23,8 @@ def downsample(data, factor, directory=None, order=0):
     else:
         data2 = None
     
-    # Check if Z dimension is too small relative to downsample factor
-    if data.ndim == 3 and data.shape[0] < factor * 4:
-        print(f"Warning: Z dimension ({data.shape[0]}) is less than 4x the downsample factor ({factor}). "
-              f"Skipping Z-axis downsampling to preserve resolution.")
-        zoom_factors = (1, 1/factor, 1/factor)
-    else:
-        zoom_factors = 1/factor
-
-    # Apply downsampling
-    data = zoom(data, zoom_factors, order=order)
+    # Apply downsampling (Z is kept when it is under 4x the factor; order 0 streams over the input)
+    data = resample.downsample(data, factor, order=order)
     
     # Save if input was a file path
     if isinstance(data2, str):
@@ -45,101 +38,24 @@ def downsample(data, factor, directory=None, order=0):
 
 def upsample_with_padding(data, factor, original_shape):
     # Upsample the input binary array while adding padding to match the original shape
-
-    # Get the dimensions of the original and upsampled arrays
-    original_shape = np.array(original_shape)
-    binary_array = zoom(data, factor, order=0)
-    upsampled_shape = np.array(binary_array.shape)
-
-    # Calculate the positive differences in dimensions
-    difference_dims = original_shape - upsampled_shape
-
-    # Calculate the padding amounts for each dimension
-    padding_dims = np.maximum(difference_dims, 0)
-    padding_before = padding_dims // 2
-    padding_after = padding_dims - padding_before
-
-    # Pad the binary array along each dimension
-    padded_array = np.pad(binary_array, [(padding_before[0], padding_after[0]),
-                                         (padding_before[1], padding_after[1]),
-                                         (padding_before[2], padding_after[2])], mode='constant', constant_values=0)
-
-    # Calculate the subtraction amounts for each dimension
-    sub_dims = np.maximum(-difference_dims, 0)
-    sub_before = sub_dims // 2
-    sub_after = sub_dims - sub_before
-
-    # Remove planes from the beginning and end
-    if sub_dims[0] == 0:
-        trimmed_planes = padded_array
-    else:
-        trimmed_planes = padded_array[sub_before[0]:-sub_after[0], :, :]
-
-    # Remove rows from the beginning and end
-    if sub_dims[1] == 0:
-        trimmed_rows = trimmed_planes
-    else:
-        trimmed_rows = trimmed_planes[:, sub_before[1]:-sub_after[1], :]
-
-    # Remove columns from the beginning and end
-    if sub_dims[2] == 0:
-        trimmed_array = trimmed_rows
-    else:
-        trimmed_array = trimmed_rows[:, :, sub_before[2]:-sub_after[2]]
-
-    return trimmed_array
+    return resample.upsample_to(data, factor, original_shape)
 
 def draw_nodes(nodes, num_nodes):
     # Find centroids
     centroids = np.array([np.mean(np.argwhere(nodes == i), axis=0) for i in range(1, num_nodes + 1)])
 
-    # Create a new 3D array to draw on with the same dimensions as the original array
-    draw_array = np.zeros_like(nodes, dtype=np.uint8)
-
-    # Use the default font from ImageFont
-    font_size = None
-
-    # Iterate through each centroid
-    for idx, centroid in enumerate(centroids, start=1):
-        z, y, x = centroid.astype(int)
-
-        try:
-            draw_array = _draw_at_plane(z, y, x, draw_array, idx, font_size)
-        except IndexError:
-            pass
-
-        try:
-            draw_array = _draw_at_plane(z + 1, y, x, draw_array, idx, font_size)
-        except IndexError:
-            pass
-
-        try:
-            draw_array = _draw_at_plane(z - 1, y, x, draw_array, idx, font_size)
-        except IndexError:
-            pass
+    # Draw each ID on its centroid's plane and the planes either side
+    draw_array = text_overlay.render_labels(nodes.shape, centroids, range(1, num_nodes + 1))
 
     # Save the draw_array as a 3D TIFF file
     tifffile.imwrite("labelled_nodes.tif", draw_array)
 
-def draw_from_centroids(nodes, num_nodes, centroids, twod_bool, directory=None):
-    """Optimized version using OpenCV"""
+def draw_from_centroids(nodes, num_nodes, centroids, twod_bool, directory=None, out=None, down_factor=None):
+    """Draws every ID of centroids at its centroid, through the shared glyph atlas. Pass out to draw into an existing overlay,
+    and down_factor when nodes is a downsampled array and the centroids are full resolution."""
     print("Drawing node IDs...")
-    draw_array = np.zeros_like(nodes, dtype=np.uint8)
-    
-    # Draw text using OpenCV (no PIL conversions needed)
-    for idx in centroids.keys():
-        centroid = centroids[idx]
-
-        try:
-            z, y, x = centroid.astype(int)
-        except:
-            z, y, x = centroid
-        
-        for z_offset in [0, 1, -1]:
-            z_target = z + z_offset
-            if 0 <= z_target < draw_array.shape[0]:
-                cv2.putText(draw_array[z_target], str(idx), (x, y), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.4, 255, 1, cv2.LINE_AA)
+    ids = list(centroids.keys())
+    draw_array = text_overlay.render_labels(nodes.shape, [centroids[idx] for idx in ids], ids, out=out, down_factor=down_factor)
     
     if twod_bool:
         draw_array = draw_array[0,:,:] | draw_array[1,:,:]
@@ -152,88 +68,24 @@ def draw_from_centroids(nodes, num_nodes, centroids, twod_bool, directory=None):
     
     return draw_array
 
-def degree_draw(degree_dict, centroid_dict, nodes):
-    """Draw node degrees at centroid locations using OpenCV"""
-    # Create a new 3D array to draw on with the same dimensions as the original array
-    draw_array = np.zeros_like(nodes, dtype=np.uint8)
-    
-    for node in centroid_dict:
-        # Skip if node not in degree_dict
-        if node not in degree_dict:
-            continue
-            
-        degree = degree_dict[node]
-        z, y, x = centroid_dict[node].astype(int)
-        
-        # Draw on current z-plane and adjacent planes
-        for z_offset in [0, 1, -1]:
-            z_target = z + z_offset
-            # Check bounds
-            if 0 <= z_target < draw_array.shape[0]:
-                cv2.putText(
-                    draw_array[z_target],  # Image to draw on
-                    str(degree),            # Text to draw
-                    (x, y),                 # Position (x, y)
-                    cv2.FONT_HERSHEY_SIMPLEX,  # Font
-                    0.4,                    # Font scale
-                    255,                    # Color (white)
-                    1,                      # Thickness
-                    cv2.LINE_AA             # Anti-aliasing
-                )
-    
-    return draw_array
+def degree_draw(degree_dict, centroid_dict, nodes, out=None):
+    """Draw node degrees at centroid locations, on the centroid's plane and the planes either side"""
+    # Skip nodes without a degree
+    drawn = [node for node in centroid_dict if node in degree_dict]
 
-def degree_infect(degree_dict, nodes, make_floats = False):
+    return text_overlay.render_labels(nodes.shape, [centroid_dict[node] for node in drawn],
+                                      [degree_dict[node] for node in drawn], out=out)
 
-    if not make_floats:
-        return_nodes = np.zeros_like(nodes)  # Start with all zeros
-    else:
-        return_nodes = np.zeros(nodes.shape, dtype=np.float32)
-    
-    if not degree_dict:  # Handle empty dict
-        return return_nodes
-    
-    # Create arrays for old and new values
-    old_vals = np.array(list(degree_dict.keys()))
-    new_vals = np.array(list(degree_dict.values()))
-    
-    # Sort for searchsorted to work correctly
-    sort_idx = np.argsort(old_vals)
-    old_vals_sorted = old_vals[sort_idx]
-    new_vals_sorted = new_vals[sort_idx]
-    
-    # Find which nodes exist in the dictionary
-    mask = np.isin(nodes, old_vals_sorted)
-    
-    # Only process nodes that exist in the dictionary
-    if np.any(mask):
-        indices = np.searchsorted(old_vals_sorted, nodes[mask])
-        return_nodes[mask] = new_vals_sorted[indices]
-    
-    return return_nodes
-
-
-def _draw_at_plane(z_loc, y_loc, x_loc, array, num, font_size=None):
-    # Get the 2D slice at the specified Z position
-    slice_to_draw = array[z_loc, :, :]
-
-    # Create an image from the 2D slice
-    image = Image.fromarray(slice_to_draw.astype(np.uint8) * 255)
-
-    # Create a drawing object
-    draw = ImageDraw.Draw(image)
-
-    # Load the default font with the specified font size
+def degree_infect(degree_dict, nodes, make_floats = False):
 
-    font = ImageFont.load_default()
+    dtype = nodes.dtype if not make_floats else np.float32
 
-    # Draw the number at the centroid index
-    draw.text((x_loc, y_loc), str(num), fill='white', font=font)
+    if not degree_dict:  # Handle empty dict
+        return np.zeros(nodes.shape, dtype=dtype)
 
-    # Save the modified 2D slice into draw_array at the specified Z position
-    array[z_loc, :, :] = np.array(image)
+    # Nodes missing from the dictionary become 0
+    return relabel.remap(nodes, degree_dict, default = 0, dtype = dtype)
 
-    return array
 
 def compute_centroid(binary_stack, label):
     """
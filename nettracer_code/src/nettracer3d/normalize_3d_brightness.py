@@ -1,12 +1,12 @@
 import argparse
 import sys
-import warnings
 import numpy as np
 from scipy import ndimage
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Sequence
 import os
+from numba import njit
 
 try:
     import tifffile
@@ -16,7 +16,7 @@ except ImportError:
 
 
 # ---------------------------------------------------------------------------
-# Per-axis 2-D EDT stacks
+# Axes
 # ---------------------------------------------------------------------------
 
 AXIS_CONFIG = {
@@ -30,39 +30,72 @@ AXIS_CONFIG = {
 MAX_WORKERS = 16
 
 
-def compute_axis_edt(mask: np.ndarray, axis: int,
-                     voxel_spacing: tuple,
-                     max_workers: Optional[int] = None) -> np.ndarray:
-    """
-    Compute a stack of 2-D EDTs perpendicular to the given axis.
-
-    Uses float32 to halve memory vs float64.  Slices are computed in
-    parallel via ThreadPoolExecutor; scipy's distance_transform_edt
-    releases the GIL so threads run concurrently in native code.
-    """
-    _, _, sp_idx = AXIS_CONFIG[axis]
-    plane_spacing = (voxel_spacing[sp_idx[0]], voxel_spacing[sp_idx[1]])
-    edt = np.zeros(mask.shape, dtype=np.float32)
-    n_slices = mask.shape[axis]
-
-    def _process_slice(i: int) -> None:
-        slc = [slice(None)] * 3
-        slc[axis] = i
-        slc = tuple(slc)
-        plane_mask = mask[slc]
-        if plane_mask.any():
-            edt[slc] = ndimage.distance_transform_edt(
-                plane_mask, sampling=plane_spacing
-            ).astype(np.float32)
-
-    workers = max_workers or min(n_slices, min(os.cpu_count() or 4, MAX_WORKERS))
-
-    with ThreadPoolExecutor(max_workers=workers) as pool:
-        futs = [pool.submit(_process_slice, i) for i in range(n_slices)]
-        for f in futs:
-            f.result()
-
-    return edt
+# ---------------------------------------------------------------------------
+# Per-plane shell statistics
+# ---------------------------------------------------------------------------
+#
+# Every step of the correction along an axis works on one plane at a time
+# (the 2-D slice perpendicular to the axis), because the EDT, the shell
+# medians and the correction factors of a position along the axis all live
+# in that plane.  Nothing full-size is kept but the float32 result (which may
+# be a memmap) and a uint8 shell-label volume:
+#   pass 1  EDT of every plane -> global max distance (shell edges)
+#   pass 2  EDT again -> shell labels, plus the median of every shell in
+#           every plane (grouped by a bincount, in numba)
+#   pass 3  multiply every plane by its per-shell ratio, in place
+# Planes are spread over a thread pool; scipy's EDT and the nogil numba
+# kernel both release the GIL.
+
+# Slab depth (along Z) for whole-volume copies.
+COPY_SLAB = 16
+
+
+@njit(cache=True, nogil=True)
+def _shell_medians(values, shells, n_shells):
+    """Median of values in every shell 1..n_shells (NaN if empty), and the voxel count of every shell."""
+    counts = np.zeros(n_shells + 1, dtype=np.int64)
+    for i in range(shells.shape[0]):
+        counts[shells[i]] += 1
+    starts = np.zeros(n_shells + 2, dtype=np.int64)
+    for s in range(n_shells + 1):
+        starts[s + 1] = starts[s] + counts[s]
+    fill = starts[:-1].copy()
+    grouped = np.empty(shells.shape[0], dtype=np.float64)
+    for i in range(shells.shape[0]):
+        s = shells[i]
+        grouped[fill[s]] = values[i]
+        fill[s] += 1
+    medians = np.full(n_shells + 1, np.nan)
+    for s in range(1, n_shells + 1):
+        if counts[s] > 0:
+            medians[s] = np.median(grouped[starts[s]:starts[s + 1]])
+    return medians, counts
+
+
+def _plane_index(axis: int, i: int) -> tuple:
+    slc = [slice(None)] * 3
+    slc[axis] = i
+    return tuple(slc)
+
+
+def _plane_edt(plane_mask: np.ndarray, plane_spacing: tuple) -> np.ndarray:
+    """2-D EDT of one plane, with a background border so tissue at the volume edge has a boundary."""
+    padded = np.pad(plane_mask, 1)
+    return ndimage.distance_transform_edt(padded, sampling=plane_spacing)[1:-1, 1:-1].astype(np.float32)
+
+
+def _for_planes(fn, n_planes: int, max_workers: Optional[int] = None) -> list:
+    workers = max_workers or min(n_planes, min(os.cpu_count() or 4, MAX_WORKERS))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(fn, range(n_planes)))
+
+
+def _output_array(out, shape, dtype):
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if isinstance(out, (str, Path)):
+        return np.lib.format.open_memmap(str(out), mode='w+', dtype=dtype, shape=shape)
+    return out
 
 
 # ---------------------------------------------------------------------------
@@ -76,6 +109,8 @@ def normalize_brightness(
     max_correction: float = 10.0,
     boost_only: bool = False,
     axes: Sequence[int] = (0, 1, 2),
+    out=None,
+    max_workers: Optional[int] = None,
 ) -> np.ndarray:
     """
     Normalize illumination gradients along the specified axes.
@@ -89,100 +124,131 @@ def normalize_brightness(
     boost_only : if True, only brighten dim regions (never dim bright ones).
                  This preserves SNR in well-illuminated areas.
     axes : which axes to correct and in what order (default: Z→Y→X).
+    out : optional float32 array of img's shape, or a .npy path to create
+          as a memmap, to hold the result (shell labels then go to a
+          temporary memmap beside it).  img itself may be a memmap.
+    max_workers : threads for the per-plane passes.
 
     Returns
     -------
-    corrected : 3-D float64 array, same shape as input.
+    corrected : 3-D float32 array, same shape as input.
     """
-    # Pad so EDT always has a background boundary
-    padded = np.pad(img, pad_width=1, mode='constant', constant_values=0)
-    mask = padded > 0
-    result = padded.astype(np.float64)
-
     for axis in axes:
         if axis not in AXIS_CONFIG:
             raise ValueError(f"Invalid axis {axis}; must be 0, 1, or 2.")
-        label, collapse_axes, _ = AXIS_CONFIG[axis]
-        n_pos = result.shape[axis]
-        print(f"\n  [{label} axis]")
-
-        # --- 1. Per-axis 2-D EDT stack (float32) ---
-        edt = compute_axis_edt(mask, axis, voxel_spacing)
-        edt_tissue = edt[mask]
-        max_dist = float(edt_tissue.max()) if edt_tissue.size > 0 else 0.0
-
-        if max_dist < 1e-6:
-            print(f"    WARNING: {label} EDT max ~0, skipping.")
-            del edt
-            continue
-
-        # --- 2. Single-pass shell assignment via digitize ---
-        shell_edges = np.linspace(0, max_dist, n_shells + 1)
-        shell_edges[-1] += 1e-9
-
-        # shell_labels: 0 = background, 1..n_shells = shell id
-        shell_labels = np.digitize(edt, shell_edges)
-        shell_labels[~mask] = 0
-        np.clip(shell_labels, 0, n_shells, out=shell_labels)
 
-        print(f"    EDT range: [0, {max_dist:.2f}], "
-              f"{n_shells} shells (width {max_dist / n_shells:.2f})")
-
-        del edt  # free EDT before shell loop
-
-        # --- 3. Per-shell correction (v1-style nanmedian + broadcast) ---
-        correction = np.ones(result.shape, dtype=np.float64)
-        active = 0
-
-        for s in range(1, n_shells + 1):
-            shell_mask = shell_labels == s
-            if not shell_mask.any():
-                continue
-
-            # Mask image, collapse to 1-D profile along target axis
-            masked = np.where(shell_mask, result, np.nan)
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore", RuntimeWarning)
-                profile = np.nanmedian(masked, axis=collapse_axes)
-
-            valid = ~np.isnan(profile)
-            if valid.sum() < 2:
-                continue
-
-            shell_ref = np.nanmedian(profile[valid])
-            if shell_ref < 1e-6:
+    shape = img.shape
+    to_disk = isinstance(out, (str, Path))
+    result = _output_array(out, shape, np.float32)
+    for z in range(0, shape[0], COPY_SLAB):
+        slab = result[z:z + COPY_SLAB]
+        np.copyto(slab, img[z:z + COPY_SLAB], casting='unsafe')
+        np.maximum(slab, 0, out=slab)
+
+    # Tissue stays exactly the voxels > 0: corrections are positive factors
+    shell_dtype = np.uint8 if n_shells < 256 else np.uint16
+    shell_path = None
+    if to_disk:
+        shell_path = str(out) + '.shells.npy'
+        shells = np.lib.format.open_memmap(shell_path, mode='w+', dtype=shell_dtype, shape=shape)
+    else:
+        shells = np.empty(shape, dtype=shell_dtype)
+
+    try:
+        for axis in axes:
+            label, _, sp_idx = AXIS_CONFIG[axis]
+            plane_spacing = (voxel_spacing[sp_idx[0]], voxel_spacing[sp_idx[1]])
+            n_pos = shape[axis]
+            print(f"\n  [{label} axis]")
+
+            # --- 1. Max of the per-plane 2-D EDTs ---
+            def _plane_max(i):
+                plane_mask = result[_plane_index(axis, i)] > 0
+                if not plane_mask.any():
+                    return 0.0
+                return float(_plane_edt(plane_mask, plane_spacing).max())
+
+            max_dist = max(_for_planes(_plane_max, n_pos, max_workers), default=0.0)
+
+            if max_dist < 1e-6:
+                print(f"    WARNING: {label} EDT max ~0, skipping.")
                 continue
 
-            # Ratios: positions dimmer than reference get boosted
-            ratios = np.where(valid & (profile > 1e-6),
-                              shell_ref / profile, 1.0)
-
-            if boost_only:
-                ratios = np.clip(ratios, 1.0, max_correction)
-            else:
-                ratios = np.clip(ratios, 1.0 / max_correction, max_correction)
-
-            # Broadcast along target axis, apply to shell voxels only
-            bcast = [1, 1, 1]
-            bcast[axis] = n_pos
-            ratio_3d = np.broadcast_to(ratios.reshape(bcast), result.shape)
-            correction[shell_mask] = ratio_3d[shell_mask]
-            active += 1
-
-        # --- 4. Apply and clean up ---
-        result *= correction
-        result[~mask] = 0.0
-        np.clip(result, 0, None, out=result)
-
-        corr_tissue = correction[mask]
-        print(f"    Shells corrected: {active}/{n_shells}")
-        print(f"    Correction range: "
-              f"[{corr_tissue.min():.4f}, {corr_tissue.max():.4f}]")
-
-        del shell_labels, correction
-
-    # Strip padding
-    return result[1:-1, 1:-1, 1:-1]
+            shell_edges = np.linspace(0, max_dist, n_shells + 1)
+            shell_edges[-1] += 1e-9
+
+            print(f"    EDT range: [0, {max_dist:.2f}], "
+                  f"{n_shells} shells (width {max_dist / n_shells:.2f})")
+
+            # --- 2. Shell labels and per-plane shell medians ---
+            # shell labels: 0 = background, 1..n_shells = shell id
+            def _plane_shells(i):
+                idx = _plane_index(axis, i)
+                values = np.asarray(result[idx])
+                plane_mask = values > 0
+                if not plane_mask.any():
+                    shells[idx] = 0
+                    return np.full(n_shells + 1, np.nan), np.zeros(n_shells + 1, dtype=np.int64)
+                plane_shells = np.digitize(_plane_edt(plane_mask, plane_spacing), shell_edges)
+                plane_shells[~plane_mask] = 0
+                np.clip(plane_shells, 0, n_shells, out=plane_shells)
+                plane_shells = plane_shells.astype(shell_dtype)
+                shells[idx] = plane_shells
+                return _shell_medians(values.reshape(-1), plane_shells.reshape(-1), n_shells)
+
+            stats = _for_planes(_plane_shells, n_pos, max_workers)
+            profiles = np.stack([m for m, _ in stats])  # (n_pos, n_shells + 1)
+            counts = np.stack([c for _, c in stats])
+
+            # --- 3. Per-shell ratios (nanmedian of the profile as reference) ---
+            factors = np.ones((n_pos, n_shells + 1), dtype=np.float64)
+            factors[:, 0] = 0.0
+            active = 0
+            for s in range(1, n_shells + 1):
+                if counts[:, s].sum() == 0:
+                    continue
+                profile = profiles[:, s]
+                valid = ~np.isnan(profile)
+                if valid.sum() < 2:
+                    continue
+
+                shell_ref = np.median(profile[valid])
+                if shell_ref < 1e-6:
+                    continue
+
+                # Ratios: positions dimmer than reference get boosted
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    ratios = np.where(valid & (profile > 1e-6),
+                                      shell_ref / profile, 1.0)
+
+                if boost_only:
+                    ratios = np.clip(ratios, 1.0, max_correction)
+                else:
+                    ratios = np.clip(ratios, 1.0 / max_correction, max_correction)
+
+                factors[:, s] = ratios
+                active += 1
+
+            # --- 4. Apply in place, plane by plane ---
+            def _plane_apply(i):
+                idx = _plane_index(axis, i)
+                plane = result[idx]
+                plane *= factors[i].astype(np.float32)[shells[idx]]
+
+            _for_planes(_plane_apply, n_pos, max_workers)
+
+            tissue = counts[:, 1:] > 0
+            applied = factors[:, 1:][tissue]
+            print(f"    Shells corrected: {active}/{n_shells}")
+            if applied.size:
+                print(f"    Correction range: "
+                      f"[{applied.min():.4f}, {applied.max():.4f}]")
+    finally:
+        if shell_path is not None:
+            del shells
+            os.remove(shell_path)
+
+    return result
 
 
 # ---------------------------------------------------------------------------
@@ -249,9 +315,8 @@ Background must be 0, tissue > 0.
     print("3-D Brightness Normalization (v3)")
     print(f"{'='*60}")
 
-    raw = tifffile.imread(args.input)
-    orig_dtype = raw.dtype
-    img = raw.astype(np.float64)
+    img = tifffile.imread(args.input)
+    orig_dtype = img.dtype
     if img.ndim != 3:
         print(f"ERROR: Expected 3-D, got {img.ndim}-D ({img.shape})")
         sys.exit(1)
@@ -279,7 +344,7 @@ Background must be 0, tissue > 0.
         else np.dtype(args.output_dtype)
     if np.issubdtype(out_dtype, np.integer):
         info = np.iinfo(out_dtype)
-        corrected = np.clip(corrected, info.min, info.max)
+        np.clip(corrected, info.min, info.max, out=corrected)
     corrected = corrected.astype(out_dtype)
 
     # Save
@@ -406,4 +406,8 @@ class PaintManager(QMainWindow):
         mask = distances_sq <= radius ** 2
         
         # Paint on this slice
-        self.parent().channel_data[channel][slice_idx][y_min:y_max, x_min:x_max][mask] = val
\ No newline at end of file
+        self.parent().channel_data[channel][slice_idx][y_min:y_max, x_min:x_max][mask] = val
+        cache = getattr(self.parent(), 'slice_cache', None)
+        if cache is not None:
+            cache.invalidate(channel, slice_idx)
+        self.parent().mark_label_slice_dirty(channel, slice_idx)
\ No newline at end of file
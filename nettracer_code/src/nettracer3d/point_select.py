@@ -0,0 +1,230 @@
+import numpy as np
+
+
+# Spatial index and lasso geometry for selecting points of the 2D scatter plots (UMAP, flow cytometry and network graph
+# widgets).
+# Points are bucketed into a uniform grid (about 16 points per occupied cell on average) and stored sorted by cell, so the
+# points under any rectangle are a handful of contiguous slices and region queries never touch the rest of the plot.
+# Polygon queries classify whole cells: cells the outline passes through have their points tested one by one with a
+# vectorized even-odd test, every other cell is inside or outside as a whole, decided by testing its center.
+
+
+def points_in_polygon(px, py, polygon):
+    """
+    Even-odd (crossing number) test of points against a closed polygon, vectorized over the points.
+
+    Parameters:
+    -----------
+    px, py : ndarray
+        Point coordinates
+    polygon : ndarray
+        (M, 2) polygon vertices; the last vertex connects back to the first
+
+    Returns:
+    --------
+    ndarray
+        Boolean mask, True for points inside
+    """
+    px = np.asarray(px, dtype=np.float64)
+    py = np.asarray(py, dtype=np.float64)
+    a = np.asarray(polygon, dtype=np.float64)
+    b = np.roll(a, 1, axis=0)
+    # An edge straddles the horizontal line through a point when min(ya, yb) <= y < max(ya, yb), so with the points
+    # sorted by y each edge only looks at one contiguous run of them
+    order = np.argsort(py, kind='stable')
+    sx = px[order]
+    sy = py[order]
+    lo = np.searchsorted(sy, np.minimum(a[:, 1], b[:, 1]), side='left')
+    hi = np.searchsorted(sy, np.maximum(a[:, 1], b[:, 1]), side='left')
+    inside_sorted = np.zeros(len(px), dtype=bool)
+    for e in np.flatnonzero(hi > lo):
+        (xa, ya), (xb, yb) = a[e], b[e]
+        i0, i1 = lo[e], hi[e]
+        # Crossed to the right of the point
+        x_cross = xa + (xb - xa) * (sy[i0:i1] - ya) / (yb - ya)
+        inside_sorted[i0:i1] ^= sx[i0:i1] < x_cross
+    inside = np.empty(len(px), dtype=bool)
+    inside[order] = inside_sorted
+    return inside
+
+
+def first_crossing(points, skip=4):
+    """
+    Index of the first segment of a polyline that its last segment crosses, or -1. The skip segments just before the last
+    one are not tested, so tight curves do not count as crossings.
+
+    Parameters:
+    -----------
+    points : ndarray
+        (N, 2) polyline vertices
+    skip : int
+        Number of recent segments to ignore
+
+    Returns:
+    --------
+    int
+        Index of the start vertex of the crossed segment, or -1
+    """
+    n = len(points)
+    check = n - 1 - skip
+    if n < 6 or check <= 0:
+        return -1
+    p1, p2 = points[-2], points[-1]
+    p3, p4 = points[:check], points[1:check + 1]
+    d1 = p2 - p1
+    d2 = p4 - p3
+    d3 = p3 - p1
+    denom = d1[0] * d2[:, 1] - d1[1] * d2[:, 0]
+    valid = np.abs(denom) >= 1e-12
+    denom = np.where(valid, denom, 1.0)
+    t = (d3[:, 0] * d2[:, 1] - d3[:, 1] * d2[:, 0]) / denom
+    u = (d3[:, 0] * d1[1] - d3[:, 1] * d1[0]) / denom
+    hits = np.flatnonzero(valid & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1))
+    return int(hits[0]) if len(hits) else -1
+
+
+class PointGrid:
+
+    def __init__(self, pos, points_per_cell=16):
+        """
+        Parameters:
+        -----------
+        pos : ndarray
+            (N, 2) point coordinates
+        points_per_cell : int
+            Average number of points per cell the grid is sized for
+        """
+        self.pos = np.asarray(pos, dtype=np.float64)
+        n = len(self.pos)
+        if n == 0:
+            self.origin = np.zeros(2)
+            self.cell = np.ones(2)
+            self.shape = (1, 1)
+            self.order = np.zeros(0, dtype=np.int64)
+            self.cell_start = np.zeros(2, dtype=np.int64)
+            return
+        lo = self.pos.min(axis=0)
+        hi = self.pos.max(axis=0)
+        span = hi - lo
+        # An axis without spread (one point, duplicates, points sharing an x or y) still gets cells of a usable size: at
+        # least a 4096th of the other axis, the finest the grid goes, or of 1 when all points coincide
+        extent = np.maximum(span, (span.max() if span.max() > 0 else 1.0) / 4096)
+        cells = max(1, n // points_per_cell)
+        # Square-ish cells, as many as the target count allows
+        side = np.sqrt(extent[0] * extent[1] / cells)
+        nx = int(min(max(1, np.ceil(extent[0] / side)), 4096))
+        ny = int(min(max(1, np.ceil(extent[1] / side)), 4096))
+        self.origin = lo
+        self.cell = extent / np.array([nx, ny]) * (1 + 1e-9)
+        self.shape = (nx, ny)
+
+        cell_id = self._cell_ids(self.pos)
+        self.order = np.argsort(cell_id, kind='stable')
+        self.cell_start = np.searchsorted(cell_id[self.order], np.arange(nx * ny + 1))
+
+    def _cell_coords(self, xy):
+        c = np.floor((np.asarray(xy, dtype=np.float64) - self.origin) / self.cell).astype(np.int64)
+        return np.clip(c[..., 0], 0, self.shape[0] - 1), np.clip(c[..., 1], 0, self.shape[1] - 1)
+
+    def _cell_ids(self, xy):
+        cx, cy = self._cell_coords(xy)
+        return cy * self.shape[0] + cx
+
+    def _clip_edges(self, a, b):
+        """
+        Clip segments a-b to the grid grown by one cell on every side (Liang-Barsky), dropping those that miss it.
+        Returns the clipped start and end points.
+        """
+        lo = self.origin - self.cell
+        hi = self.origin + (np.array(self.shape) + 1) * self.cell
+        d = b - a
+        t0 = np.zeros(len(a))
+        t1 = np.ones(len(a))
+        keep = np.ones(len(a), dtype=bool)
+        # Inside the box on an axis where p * t <= q, for both sides of the box
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for p, q in ((-d, a - lo), (d, hi - a)):
+                ratio = q / p
+                t0 = np.maximum(t0, np.where(p < 0, ratio, -np.inf).max(axis=1))
+                t1 = np.minimum(t1, np.where(p > 0, ratio, np.inf).min(axis=1))
+                keep &= ~((p == 0) & (q < 0)).any(axis=1)
+        keep &= t0 <= t1
+        a, d, t0, t1 = a[keep], d[keep], t0[keep], t1[keep]
+        return a + d * t0[:, None], a + d * t1[:, None]
+
+    def _gather(self, cell_ids):
+        """Indices of the points in the given cells"""
+        starts = self.cell_start[cell_ids]
+        lengths = self.cell_start[cell_ids + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.int64)
+        idx = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths) + np.arange(total)
+        return self.order[idx]
+
+    def candidates(self, x0, x1, y0, y1):
+        """Indices of the points in every cell overlapping [x0, x1] x [y0, y1] (a superset of the points inside it)"""
+        if len(self.order) == 0:
+            return self.order
+        (cx0, cx1), (cy0, cy1) = self._cell_coords(np.array([[x0, y0], [x1, y1]]))
+        # One contiguous slice of the sorted points per row of cells
+        rows = np.arange(cy0, cy1 + 1) * self.shape[0]
+        starts = self.cell_start[rows + cx0]
+        lengths = self.cell_start[rows + cx1 + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.int64)
+        idx = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths) + np.arange(total)
+        return self.order[idx]
+
+    def select_rect(self, x0, x1, y0, y1):
+        """Indices of the points inside [x0, x1] x [y0, y1]"""
+        idx = self.candidates(x0, x1, y0, y1)
+        p = self.pos[idx]
+        return idx[(p[:, 0] >= x0) & (p[:, 0] <= x1) & (p[:, 1] >= y0) & (p[:, 1] <= y1)]
+
+    def select_polygon(self, polygon):
+        """
+        Indices of the points inside a closed polygon (even-odd rule, as QPainterPath fills a polygon).
+
+        Parameters:
+        -----------
+        polygon : ndarray
+            (M, 2) polygon vertices; the last vertex connects back to the first
+        """
+        polygon = np.asarray(polygon, dtype=np.float64)
+        if len(self.order) == 0 or len(polygon) < 3:
+            return np.zeros(0, dtype=np.int64)
+        (x0, y0), (x1, y1) = polygon.min(axis=0), polygon.max(axis=0)
+        (cx0, cx1), (cy0, cy1) = self._cell_coords(np.array([[x0, y0], [x1, y1]]))
+        w, h = cx1 - cx0 + 1, cy1 - cy0 + 1
+
+        # Cells the outline passes through: sample every edge at under half a cell, then grow by one cell so an edge
+        # slipping past a cell corner between samples is still covered. Edges are clipped to the grid first, so an
+        # outline reaching far past the points costs no more samples than one around them.
+        a, b = self._clip_edges(polygon, np.roll(polygon, -1, axis=0))
+        steps = np.ceil(np.abs((b - a) / self.cell).max(axis=1) * 2).astype(np.int64) + 1
+        edge = np.repeat(np.arange(len(a)), steps)
+        frac = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / np.repeat(np.maximum(steps - 1, 1), steps)
+        samples = a[edge] + (b[edge] - a[edge]) * frac[:, None]
+        sx, sy = self._cell_coords(samples)
+        boundary = np.zeros((h + 2, w + 2), dtype=bool)
+        boundary[sy - cy0 + 1, sx - cx0 + 1] = True
+        grown = boundary.copy()
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                grown[1 + dy:h + 1 + dy, 1 + dx:w + 1 + dx] |= boundary[1:h + 1, 1:w + 1]
+        boundary = grown[1:h + 1, 1:w + 1]
+
+        # Every other cell is wholly inside or outside; its center decides which
+        gy, gx = np.nonzero(~boundary)
+        centers_x = self.origin[0] + (gx + cx0 + 0.5) * self.cell[0]
+        centers_y = self.origin[1] + (gy + cy0 + 0.5) * self.cell[1]
+        whole = points_in_polygon(centers_x, centers_y, polygon)
+        inside_cells = (gy[whole] + cy0) * self.shape[0] + gx[whole] + cx0
+
+        by, bx = np.nonzero(boundary)
+        edge_points = self._gather((by + cy0) * self.shape[0] + bx + cx0)
+        p = self.pos[edge_points]
+        hit = edge_points[points_in_polygon(p[:, 0], p[:, 1], polygon)]
+        return np.concatenate((self._gather(inside_cells), hit))
@@ -522,14 +522,58 @@ def average_nearest_neighbor_distances(point_centroids, root_set, compare_set, x
 
 
 #voronois:
+# Voronoi labeling streams over blocks of whole Z-slabs (or of rows of one plane when a plane alone is too large), so memory
+# scales with one block instead of with a coordinate array for the whole volume. Each block only searches the centroids that
+# can own one of its voxels: the nearest-centroid distance is sampled on a coarse lattice over the block, which bounds it
+# everywhere in the block, and only centroids within that bound of the block's box go into the block's KD-tree.
+
+_VORONOI_BLOCK_VOXELS = 1 << 21
+_VORONOI_LATTICE = 8
+
+
+def _voronoi_blocks(shape, block_voxels):
+    """(z0, z1, y0, y1) blocks covering a (Z, Y, X) volume, each at most about block_voxels voxels"""
+    Z, Y, X = shape
+    plane = Y * X
+    if plane <= block_voxels:
+        depth = max(1, block_voxels // max(plane, 1))
+        for z0 in range(0, Z, depth):
+            yield z0, min(Z, z0 + depth), 0, Y
+    else:
+        rows = max(1, block_voxels // max(X, 1))
+        for z in range(Z):
+            for y0 in range(0, Y, rows):
+                yield z, z + 1, y0, min(Y, y0 + rows)
+
+
+def _voronoi_candidates(tree, points, lo, hi, scale):
+    """Indices of the centroids that can be nearest to some voxel in the box [lo, hi] (inclusive voxel indices)"""
+    axes = [np.linspace(lo[d], hi[d], min(_VORONOI_LATTICE, hi[d] - lo[d] + 1)) for d in range(3)]
+    lattice = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3) * scale
+    nearest, _ = tree.query(lattice)
+    # Every voxel is within half a lattice cell diagonal of a sample, and the nearest distance changes no faster than position
+    step = np.array([(hi[d] - lo[d]) / max(len(axes[d]) - 1, 1) for d in range(3)]) * scale
+    bound = nearest.max() + 0.5 * np.sqrt((step ** 2).sum())
+    gap = np.maximum(np.maximum(lo * scale - points, points - hi * scale), 0)
+    return np.flatnonzero((gap ** 2).sum(axis=1) <= bound ** 2)
+
+
 def create_voronoi_3d_kdtree(centroids: Dict[Union[int, str], Union[Tuple[int, int, int], List[int]]], 
-                            shape: Optional[Tuple[int, int, int]] = None) -> np.ndarray:
+                            shape: Optional[Tuple[int, int, int]] = None, xy_scale = 1, z_scale = 1, mask = None,
+                            out = None, method = 'kdtree') -> np.ndarray:
     """
     Create a 3D Voronoi diagram using scipy's KDTree for faster computation.
     
     Args:
         centroids: Dictionary with labels as keys and (z,y,x) coordinates as values
         shape: Optional tuple of (Z,Y,X) dimensions. If None, calculated from centroids
+        xy_scale: Size of a voxel in x and y, so distances are measured in real units for anisotropic volumes
+        z_scale: Size of a voxel in z
+        mask: Optional boolean array of the same shape. Voxels outside it are left 0
+        out: Optional preallocated uint32 array to write into (such as a np.memmap), or a path where a .npy memmap is created
+        method: 'kdtree' streams over blocks of the volume searching nearby centroids only. 'edt' labels from a Euclidean
+            distance transform of the seed voxels instead, which does not depend on the number of centroids but holds
+            12 bytes of nearest-seed indices per voxel, and snaps centroids to their nearest voxel
     
     Returns:
         3D numpy array where each cell contains the label of the closest centroid as uint32
@@ -542,32 +586,73 @@ def create_voronoi_3d_kdtree(centroids: Dict[Union[int, str], Union[Tuple[int, i
     
     # Convert centroids to array and keep track of labels
     labels = np.array(list(centroids.keys()), dtype=np.uint32)
-    centroid_points = np.array([centroids[label] for label in labels])
+    centroid_points = np.array([centroids[label] for label in labels], dtype=np.float64).reshape(-1, 3)
     
     # Calculate shape if not provided
     if shape is None:
         max_coords = centroid_points.max(axis=0)
-        shape = tuple(max_coord + 1 for max_coord in max_coords)
-    
+        shape = tuple(int(max_coord) + 1 for max_coord in max_coords)
+    shape = tuple(int(s) for s in shape)
+
+    if out is None:
+        out = np.zeros(shape, dtype=np.uint32)
+    elif isinstance(out, str):
+        out = np.lib.format.open_memmap(out, mode='w+', dtype=np.uint32, shape=shape)
+    if len(labels) == 0:
+        out[...] = 0
+        return out
+
+    scale = np.array([z_scale, xy_scale, xy_scale], dtype=np.float64)
+
+    if method == 'edt':
+        seeds = np.zeros(shape, dtype=np.uint32)
+        seed_idx = np.clip(np.round(centroid_points).astype(np.int64), 0, np.array(shape) - 1)
+        seeds[seed_idx[:, 0], seed_idx[:, 1], seed_idx[:, 2]] = labels
+        # int32 indices, half the size of the default ones
+        nearest = np.empty((3,) + shape, dtype=np.int32)
+        ndimage.distance_transform_edt(seeds == 0, sampling=scale, return_distances=False, return_indices=True, indices=nearest)
+        for z0, z1, y0, y1 in _voronoi_blocks(shape, _VORONOI_BLOCK_VOXELS):
+            block = seeds[nearest[0, z0:z1, y0:y1], nearest[1, z0:z1, y0:y1], nearest[2, z0:z1, y0:y1]]
+            if mask is not None:
+                block[~mask[z0:z1, y0:y1].astype(bool)] = 0
+            out[z0:z1, y0:y1] = block
+        return out
+
     # Create KD-tree
-    tree = KDTree(centroid_points)
-    
-    # Create coordinate arrays
-    coords = np.array(np.meshgrid(
-        np.arange(shape[0]),
-        np.arange(shape[1]),
-        np.arange(shape[2]),
-        indexing='ij'
-    )).reshape(3, -1).T
-    
-    # Find nearest centroid for each point
-    _, indices = tree.query(coords)
-    
-    # Convert indices to labels and ensure uint32 dtype
-    label_array = labels[indices].astype(np.uint32)
-    
-    # Reshape to final shape
-    return label_array.reshape(shape)
+    points = centroid_points * scale
+    tree = KDTree(points)
+
+    for z0, z1, y0, y1 in _voronoi_blocks(shape, _VORONOI_BLOCK_VOXELS):
+        lo = np.array([z0, y0, 0])
+        hi = np.array([z1 - 1, y1 - 1, shape[2] - 1])
+        if mask is not None:
+            # Only the voxels inside the mask are labeled
+            zz, yy, xx = np.nonzero(mask[z0:z1, y0:y1])
+            if len(zz) == 0:
+                out[z0:z1, y0:y1] = 0
+                continue
+            coords = np.column_stack((zz + z0, yy + y0, xx)).astype(np.float64)
+        else:
+            coords = np.stack(np.meshgrid(np.arange(z0, z1), np.arange(y0, y1), np.arange(shape[2]),
+                                          indexing='ij'), axis=-1).reshape(-1, 3).astype(np.float64)
+        coords *= scale
+
+        candidates = _voronoi_candidates(tree, points, lo, hi, scale)
+        if len(candidates) == 1:
+            block_labels = np.full(len(coords), labels[candidates[0]], dtype=np.uint32)
+        else:
+            # Find nearest centroid for each point
+            _, indices = KDTree(points[candidates]).query(coords, workers=-1)
+            block_labels = labels[candidates[indices]]
+
+        if mask is not None:
+            block = np.zeros((z1 - z0, y1 - y0, shape[2]), dtype=np.uint32)
+            block[zz, yy, xx] = block_labels
+            out[z0:z1, y0:y1] = block
+        else:
+            out[z0:z1, y0:y1] = block_labels.reshape(z1 - z0, y1 - y0, shape[2])
+
+    return out
 
 
 
@@ -0,0 +1,219 @@
+import numpy as np
+import numba
+from numba import njit, prange
+
+
+# Relabeling and recoloring of label volumes through lookup tables.
+# A mapping {old label: new value} is applied in one multithreaded pass over the voxels instead of one full-volume comparison
+# per label. Integer labels up to _DENSE_LIMIT index a dense table directly; anything else (sparse huge ids, float labels)
+# binary searches the sorted keys, remembering the last voxel's answer since neighboring voxels mostly share a label.
+# Values can be scalars (relabeling, grayscale) or rows (RGBA colors), and relabeling can run in place.
+
+_DENSE_LIMIT = 1 << 24
+
+
+def _n_chunks(n):
+    return max(1, min(4 * numba.get_num_threads(), n))
+
+
+@njit(cache=True, parallel=True)
+def _apply_dense(src, lut, dst, keep, fill, n_chunks):
+    """dst[i] = lut[src[i]]; labels outside the table are kept (scalar values only) or set to fill"""
+    n = src.shape[0]
+    m = lut.shape[0]
+    width = lut.shape[1]
+    for chunk in prange(n_chunks):
+        start = (n * chunk) // n_chunks
+        end = (n * (chunk + 1)) // n_chunks
+        for i in range(start, end):
+            v = src[i]
+            if v >= 0 and v < m:
+                for c in range(width):
+                    dst[i, c] = lut[v, c]
+            elif keep:
+                dst[i, 0] = v
+            else:
+                for c in range(width):
+                    dst[i, c] = fill
+
+
+@njit(cache=True, parallel=True)
+def _apply_sorted(src, keys, values, dst, keep, fill, n_chunks):
+    """dst[i] = values[j] where keys[j] == src[i]; labels without a key are kept (scalar values only) or set to fill"""
+    n = src.shape[0]
+    m = keys.shape[0]
+    width = values.shape[1]
+    for chunk in prange(n_chunks):
+        start = (n * chunk) // n_chunks
+        end = (n * (chunk + 1)) // n_chunks
+        if start == end:
+            continue
+        last = src[start]
+        j = np.searchsorted(keys, last)
+        hit = j < m and keys[j] == last
+        for i in range(start, end):
+            v = src[i]
+            if v != last:
+                last = v
+                j = np.searchsorted(keys, v)
+                hit = j < m and keys[j] == v
+            if hit:
+                for c in range(width):
+                    dst[i, c] = values[j, c]
+            elif keep:
+                dst[i, 0] = v
+            else:
+                for c in range(width):
+                    dst[i, c] = fill
+
+
+@njit(cache=True, parallel=True)
+def _mark_present(src, flags, n_chunks):
+    n = src.shape[0]
+    for chunk in prange(n_chunks):
+        start = (n * chunk) // n_chunks
+        end = (n * (chunk + 1)) // n_chunks
+        for i in range(start, end):
+            # Every writer stores True, so sharing flags between threads is harmless
+            flags[src[i]] = True
+
+
+def _split_mapping(mapping):
+    if isinstance(mapping, dict):
+        return list(mapping.keys()), list(mapping.values())
+    return mapping
+
+
+def _is_integral(a):
+    return a.dtype.kind in 'iu' or a.dtype == bool
+
+
+def _apply(array, keys, values, out, keep, fill):
+    """Run the dense or sorted kernel over array into out (array.shape + values.shape[1:])"""
+    values2d = values.reshape(len(values), -1)
+    src = np.ascontiguousarray(array).reshape(-1)
+    if src.dtype == bool:
+        src = src.view(np.uint8)
+    target = out if out.flags.c_contiguous else np.empty(out.shape, dtype=out.dtype)
+    dst = target.reshape(src.shape[0], values2d.shape[1])
+    fill = dst.dtype.type(fill)
+    n_chunks = _n_chunks(src.shape[0])
+
+    dense = (_is_integral(src) and _is_integral(keys) and
+             (len(keys) == 0 or (keys.min() >= 0 and keys.max() < _DENSE_LIMIT)))
+    if dense:
+        size = int(keys.max()) + 1 if len(keys) else 0
+        if keep:
+            # Labels without an entry map to themselves
+            lut = np.arange(size).astype(dst.dtype).reshape(size, 1)
+        else:
+            lut = np.full((size, values2d.shape[1]), fill, dtype=dst.dtype)
+        lut[keys] = values2d
+        _apply_dense(src, lut, dst, keep, fill, n_chunks)
+    else:
+        if _is_integral(src) and _is_integral(keys):
+            keys = keys.astype(np.int64)
+        else:
+            keys = keys.astype(np.float64)
+        order = np.argsort(keys, kind='stable')
+        # With repeated keys the last entry wins, as with a dict
+        sorted_keys = keys[order]
+        last = np.r_[sorted_keys[1:] != sorted_keys[:-1], True]
+        _apply_sorted(src, sorted_keys[last], values2d[order][last].astype(dst.dtype), dst, keep, fill, n_chunks)
+    if target is not out:
+        out[...] = target
+    return out
+
+
+def _value_dtype(array_dtype, values, default):
+    """Smallest dtype holding the array's own labels, the new values and the default"""
+    dtype = np.dtype(array_dtype)
+    if len(values):
+        if values.dtype.kind == 'f':
+            return np.promote_types(dtype, values.dtype)
+        dtype = np.promote_types(dtype, np.min_scalar_type(values.max()))
+        dtype = np.promote_types(dtype, np.min_scalar_type(values.min()))
+    if default is not None:
+        dtype = np.promote_types(dtype, np.min_scalar_type(default))
+    return dtype
+
+
+def remap(array, mapping, default=None, dtype=None, in_place=False):
+    """
+    Replace every label in array by the value the mapping gives it, in one pass.
+
+    Parameters:
+    -----------
+    array : ndarray
+        Label array of any shape
+    mapping : dict or (keys, values)
+        {old label: new value}
+    default : scalar, optional
+        Value for labels missing from the mapping. None leaves them unchanged.
+    dtype : numpy dtype, optional
+        Output dtype. Defaults to the smallest one holding the array's labels and the new values.
+    in_place : bool
+        Write into array itself when the new values fit its dtype (and dtype is not given or matches)
+
+    Returns:
+    --------
+    ndarray
+        The relabeled array (array itself when done in place)
+    """
+    keys, values = _split_mapping(mapping)
+    keys = np.asarray(keys)
+    values = np.asarray(values)
+    if keys.dtype == object or values.dtype == object:
+        raise TypeError("remap needs numeric labels and values")
+    if dtype is None:
+        dtype = _value_dtype(array.dtype, values, default)
+        if in_place and np.can_cast(dtype, array.dtype, casting='safe'):
+            dtype = array.dtype
+    dtype = np.dtype(dtype)
+    out = array if in_place and dtype == array.dtype else np.empty(array.shape, dtype=dtype)
+    return _apply(array, keys, values.astype(dtype, copy=False), out, default is None, 0 if default is None else default)
+
+
+def lookup(array, keys, values, fill=0, dtype=None):
+    """
+    Look up a value (or a row of values, such as an RGBA color) for every label in array.
+
+    Parameters:
+    -----------
+    array : ndarray
+        Label array of any shape
+    keys : sequence
+        Labels with an entry
+    values : ndarray
+        (K,) or (K, C) entries, parallel to keys
+    fill : scalar
+        Value for labels without an entry
+    dtype : numpy dtype, optional
+        Output dtype, defaults to that of values
+
+    Returns:
+    --------
+    ndarray
+        array.shape + values.shape[1:]
+    """
+    keys = np.asarray(keys)
+    values = np.asarray(values)
+    dtype = values.dtype if dtype is None else np.dtype(dtype)
+    out = np.empty(array.shape + values.shape[1:], dtype=dtype)
+    return _apply(array, keys, values.astype(dtype, copy=False), out, False, fill)
+
+
+def unique_labels(array):
+    """Sorted distinct values of an integer label array, from a presence table instead of a sort of the whole array"""
+    if array.size == 0:
+        return np.zeros(0, dtype=array.dtype)
+    if not _is_integral(array) or array.dtype == bool:
+        return np.unique(array)
+    lo = array.min()
+    hi = array.max()
+    if lo < 0 or hi >= _DENSE_LIMIT:
+        return np.unique(array)
+    src = np.ascontiguousarray(array).reshape(-1)
+    flags = np.zeros(int(hi) + 1, dtype=np.bool_)
+    _mark_present(src, flags, _n_chunks(src.shape[0]))
+    return np.flatnonzero(flags).astype(array.dtype)
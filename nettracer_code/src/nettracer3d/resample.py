@@ -0,0 +1,307 @@
+import numpy as np
+import numba
+from numba import njit, prange
+from scipy.ndimage import zoom as _scipy_zoom
+
+
+# Resampling of label and intensity volumes, for in-memory or memmapped arrays.
+# Nearest-neighbor zoom (order 0, the label-safe mode every downsample/upsample in the package uses) is separable: output
+# voxel (z, y, x) is input voxel (iz[z], iy[y], ix[x]) for three small index maps, computed as scipy.ndimage.zoom computes
+# them. The gather runs in parallel over output rows and reads only the input planes it needs, so a memmapped input is
+# streamed and the output (which can itself be a memmap) is the only full-size allocation. Upsampling back to an original
+# shape folds the centered padding/trimming into the same index maps (-1 meaning background).
+# Integer factors can also be reduced by blocks: mean (antialiased intensities) or majority (labels), and a pyramid of such
+# levels is built with every level reduced from the one before it.
+
+
+def _n_chunks(n):
+    return max(1, min(4 * numba.get_num_threads(), n))
+
+
+def _factors(factor, ndim):
+    if np.isscalar(factor):
+        return (float(factor),) * ndim
+    factor = tuple(float(f) for f in factor)
+    if len(factor) != ndim:
+        raise ValueError(f"Expected {ndim} factors, got {len(factor)}")
+    return factor
+
+
+def zoom_shape(shape, factor):
+    """Output shape of zooming shape by factor (scalar or per axis), as scipy.ndimage.zoom rounds it"""
+    return tuple(int(round(s * f)) for s, f in zip(shape, _factors(factor, len(shape))))
+
+
+def nearest_index(n_in, n_out):
+    """Input index of every output index for an order 0 zoom from n_in to n_out samples (ends aligned, as scipy's zoom)"""
+    if n_out <= 1:
+        return np.zeros(max(n_out, 0), dtype=np.int64)
+    ratio = (n_in - 1) / (n_out - 1)
+    # scipy can land a hair past the last sample through rounding and return background there; clamp instead
+    return np.minimum(np.floor(np.arange(n_out) * ratio + 0.5).astype(np.int64), n_in - 1)
+
+
+def _output(out, shape, dtype):
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if isinstance(out, str):
+        return np.lib.format.open_memmap(out, mode='w+', dtype=dtype, shape=shape)
+    return out
+
+
+@njit(cache=True, parallel=True)
+def _gather(data, iz, iy, ix, out, n_chunks):
+    """out[z, y, x] = data[iz[z], iy[y], ix[x]], or 0 where any index is -1"""
+    depth, height, width = out.shape
+    rows = depth * height
+    for chunk in prange(n_chunks):
+        for row in range((rows * chunk) // n_chunks, (rows * (chunk + 1)) // n_chunks):
+            z = row // height
+            y = row - z * height
+            sz = iz[z]
+            sy = iy[y]
+            if sz < 0 or sy < 0:
+                for x in range(width):
+                    out[z, y, x] = 0
+                continue
+            for x in range(width):
+                sx = ix[x]
+                if sx < 0:
+                    out[z, y, x] = 0
+                else:
+                    out[z, y, x] = data[sz, sy, sx]
+
+
+def _as_3d(array):
+    return array[np.newaxis] if array.ndim == 2 else array
+
+
+def _take(data, maps, out):
+    """Gather along index maps into out; bool arrays go through uint8 views"""
+    src = _as_3d(data)
+    dst = _as_3d(out)
+    maps = [np.zeros(1, dtype=np.int64)] * (3 - len(maps)) + list(maps)
+    if src.dtype == bool:
+        src = src.view(np.uint8)
+        dst = dst.view(np.uint8)
+    _gather(src, *maps, dst, _n_chunks(dst.shape[0] * dst.shape[1]))
+    return out
+
+
+def zoom(data, factor, order=0, out=None):
+    """
+    scipy.ndimage.zoom replacement. Order 0 (nearest) is computed by the streamed gather above, any other order falls back to
+    scipy on the whole array.
+
+    Parameters:
+    -----------
+    data : ndarray
+        2D or 3D array, possibly memmapped
+    factor : float or tuple
+        Zoom factor, for all axes or per axis
+    order : int
+        Spline order; 0 keeps labels intact
+    out : ndarray or str, optional
+        Output array, or a .npy path to create it as a memmap (order 0 only)
+
+    Returns:
+    --------
+    ndarray
+        The zoomed array
+    """
+    if order != 0 or data.ndim not in (2, 3):
+        return _scipy_zoom(data, factor, order=order)
+    shape = zoom_shape(data.shape, factor)
+    out = _output(out, shape, data.dtype)
+    maps = [nearest_index(n, m) for n, m in zip(data.shape, shape)]
+    return _take(data, maps, out)
+
+
+def downsample(data, factor, order=0, out=None):
+    """
+    Downsample by factor in every dimension, except Z when it is shorter than 4x the factor (as nettracer.downsample).
+
+    Parameters:
+    -----------
+    data : ndarray
+        2D or 3D array, possibly memmapped
+    factor : float
+        Downsample factor
+    order : int
+        Spline order; 0 (nearest) is label-safe and streamed
+    out : ndarray or str, optional
+        Output array or .npy path (order 0 only)
+    """
+    return zoom(data, _downsample_factors(data.shape, factor), order=order, out=out)
+
+
+def _downsample_factors(shape, factor):
+    if len(shape) == 3 and shape[0] < factor * 4:
+        print(f"Warning: Z dimension ({shape[0]}) is less than 4x the downsample factor ({factor}). "
+              f"Skipping Z-axis downsampling to preserve resolution.")
+        return (1, 1/factor, 1/factor)
+    return 1/factor
+
+
+def downsample_shape(shape, factor):
+    """Shape of downsample(data, factor) for data of the given shape, without computing it"""
+    return zoom_shape(shape, _downsample_factors(shape, factor))
+
+
+def upsample_to(data, factor, original_shape, out=None):
+    """
+    Nearest-neighbor upsample of a 3D array by factor, then centered zero-padding or trimming to original_shape, in one
+    gather with no intermediate arrays.
+
+    Parameters:
+    -----------
+    data : ndarray
+        3D array
+    factor : float or tuple, optional
+        Upsampling factor for all axes or per axis. If None, the ratio of original_shape to data.shape.
+    original_shape : tuple
+        Shape of the result
+    out : ndarray or str, optional
+        Output array or .npy path
+    """
+    original_shape = tuple(int(s) for s in original_shape)
+    if factor is None:
+        factor = tuple(o / c for o, c in zip(original_shape, data.shape))
+    zoomed = zoom_shape(data.shape, factor)
+    maps = []
+    for n, m, target in zip(data.shape, zoomed, original_shape):
+        idx = nearest_index(n, m)
+        difference = target - m
+        if difference >= 0:
+            # Padding before the zoomed samples, background after them
+            before = difference // 2
+            full = np.full(target, -1, dtype=np.int64)
+            full[before:before + m] = idx
+            maps.append(full)
+        else:
+            before = (-difference) // 2
+            maps.append(idx[before:before + target])
+    out = _output(out, original_shape, data.dtype)
+    return _take(data, maps, out)
+
+
+@njit(cache=True, parallel=True)
+def _block_mean(data, fz, fy, fx, out, n_chunks):
+    depth, height, width = out.shape
+    rows = depth * height
+    scale = 1.0 / (fz * fy * fx)
+    for chunk in prange(n_chunks):
+        for row in range((rows * chunk) // n_chunks, (rows * (chunk + 1)) // n_chunks):
+            z = row // height
+            y = row - z * height
+            for x in range(width):
+                total = 0.0
+                for a in range(z * fz, z * fz + fz):
+                    for b in range(y * fy, y * fy + fy):
+                        for c in range(x * fx, x * fx + fx):
+                            total += data[a, b, c]
+                out[z, y, x] = total * scale
+
+
+@njit(cache=True, parallel=True)
+def _block_majority(data, fz, fy, fx, out, n_chunks):
+    depth, height, width = out.shape
+    rows = depth * height
+    for chunk in prange(n_chunks):
+        block = np.empty(fz * fy * fx, dtype=data.dtype)
+        for row in range((rows * chunk) // n_chunks, (rows * (chunk + 1)) // n_chunks):
+            z = row // height
+            y = row - z * height
+            for x in range(width):
+                k = 0
+                for a in range(z * fz, z * fz + fz):
+                    for b in range(y * fy, y * fy + fy):
+                        for c in range(x * fx, x * fx + fx):
+                            block[k] = data[a, b, c]
+                            k += 1
+                block.sort()
+                # Most frequent value of the block, the smallest one on ties
+                best = block[0]
+                best_run = 0
+                run = 0
+                for i in range(k):
+                    if i > 0 and block[i] == block[i - 1]:
+                        run += 1
+                    else:
+                        run = 1
+                    if run > best_run:
+                        best_run = run
+                        best = block[i]
+                out[z, y, x] = best
+
+
+def block_reduce(data, factor, mode='mean', out=None):
+    """
+    Downsample by whole blocks: every output voxel summarizes a factor-sized block of input voxels (a trailing partial block
+    is dropped).
+
+    Parameters:
+    -----------
+    data : ndarray
+        2D or 3D array, possibly memmapped
+    factor : int or tuple
+        Block size, for all axes or per axis
+    mode : str
+        'mean' for intensities (float32 output, antialiased), 'majority' for labels (most frequent value of the block)
+    out : ndarray or str, optional
+        Output array or .npy path
+
+    Returns:
+    --------
+    ndarray
+        The reduced array
+    """
+    factors = tuple(int(f) for f in _factors(factor, data.ndim))
+    if min(factors) < 1:
+        raise ValueError("Block factors must be at least 1")
+    shape = tuple(s // f for s, f in zip(data.shape, factors))
+    src = _as_3d(data)
+    if src.dtype == bool:
+        src = src.view(np.uint8)
+    f3 = (1,) * (3 - data.ndim) + factors
+    n_chunks = _n_chunks(shape[0] if data.ndim == 2 else shape[0] * shape[1])
+    if mode == 'mean':
+        out = _output(out, shape, np.float32)
+        _block_mean(src, *f3, _as_3d(out), n_chunks)
+    elif mode == 'majority':
+        out = _output(out, shape, data.dtype)
+        dst = _as_3d(out)
+        _block_majority(src, *f3, dst.view(np.uint8) if dst.dtype == bool else dst, n_chunks)
+    else:
+        raise ValueError(f"Unknown mode {mode}; use 'mean' or 'majority'")
+    return out
+
+
+def pyramid(data, levels, factor=2, mode='mean'):
+    """
+    Multiscale pyramid [data, data / factor, data / factor**2, ...], each level block-reduced from the previous one, so the
+    full-resolution data is read once.
+
+    Parameters:
+    -----------
+    data : ndarray
+        2D or 3D array, possibly memmapped
+    levels : int
+        Number of reduced levels after data itself
+    factor : int or tuple
+        Block size between consecutive levels
+    mode : str
+        'mean' or 'majority', see block_reduce
+
+    Returns:
+    --------
+    list
+        The levels, data first
+    """
+    result = [data]
+    factors = tuple(int(f) for f in _factors(factor, data.ndim))
+    for _ in range(levels):
+        if any(s // f == 0 for s, f in zip(result[-1].shape, factors)):
+            break
+        result.append(block_reduce(result[-1], factors, mode=mode))
+    return result
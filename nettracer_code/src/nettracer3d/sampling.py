@@ -0,0 +1,145 @@
+import numpy as np
+from numba import njit, prange
+
+
+# Random and evenly spread voxel positions inside a volume, a box or a mask, without listing every candidate voxel.
+# Positions are drawn as ranks among the candidates and only the drawn ranks are turned into coordinates. For a box that is
+# an unravel of the rank; for a mask it goes through a table of cumulative nonzero counts per image row (one int64 per row,
+# not three per voxel), which finds the row of a rank by binary search, and a scan of that one row finds the column.
+# Replicate draws for null models reuse the table and hold one draw at a time.
+
+
+@njit(cache=True, parallel=True)
+def _row_counts(rows):
+    counts = np.zeros(rows.shape[0], dtype=np.int64)
+    for r in prange(rows.shape[0]):
+        c = 0
+        for x in range(rows.shape[1]):
+            if rows[r, x] != 0:
+                c += 1
+        counts[r] = c
+    return counts
+
+
+@njit(cache=True)
+def _column_counts(rows):
+    counts = np.zeros(rows.shape[1], dtype=np.int64)
+    for r in range(rows.shape[0]):
+        for x in range(rows.shape[1]):
+            if rows[r, x] != 0:
+                counts[x] += 1
+    return counts
+
+
+@njit(cache=True, parallel=True)
+def _locate(rows, row_of, rank_in_row):
+    """Column of the rank_in_row-th nonzero voxel of each requested row"""
+    n = row_of.shape[0]
+    cols = np.empty(n, dtype=np.int64)
+    for i in prange(n):
+        row = row_of[i]
+        left = rank_in_row[i]
+        for x in range(rows.shape[1]):
+            if rows[row, x] != 0:
+                if left == 0:
+                    cols[i] = x
+                    break
+                left -= 1
+    return cols
+
+
+def _generator(rng):
+    """numpy Generator for rng; with rng None it is seeded from the global np.random state, so np.random.seed still makes draws reproducible"""
+    if rng is None:
+        return np.random.default_rng(np.random.randint(0, 2**63 - 1, dtype=np.int64))
+    return np.random.default_rng(rng)
+
+
+class PositionSampler:
+    """
+    Candidate voxel positions of a volume: every voxel, the voxels of an inclusive bounding box, or the nonzero voxels of a
+    mask. Candidates are numbered in C order and addressed by that rank.
+    """
+
+    def __init__(self, shape=None, mask=None, bounds=None):
+        """
+        Parameters:
+        -----------
+        shape : tuple, optional
+            Volume shape, when there is no mask
+        mask : ndarray, optional
+            Candidates are its nonzero voxels
+        bounds : tuple, optional
+            ((z1, y1, x1), (z2, y2, x2)) inclusive box, when there is no mask
+        """
+        self.mask = None
+        if mask is not None:
+            mask = np.ascontiguousarray(mask)
+            self.mask = mask
+            self.shape = mask.shape
+            self._rows = mask.reshape(-1, mask.shape[-1])
+            counts = _row_counts(self._rows)
+            self._row_end = np.cumsum(counts)
+            self._row_start = self._row_end - counts
+            self.count = int(self._row_end[-1]) if len(self._row_end) else 0
+            return
+        if bounds is not None:
+            lo, hi = (np.asarray(b, dtype=np.float64).astype(np.int64) for b in bounds)
+            self.origin = lo
+            self.shape = tuple(int(s) for s in hi - lo + 1)
+        else:
+            self.origin = np.zeros(len(shape), dtype=np.int64)
+            self.shape = tuple(int(s) for s in shape)
+        self.count = int(np.prod(self.shape))
+
+    def coords(self, ranks):
+        """(N, ndim) int64 coordinates of the candidates with the given ranks"""
+        ranks = np.asarray(ranks, dtype=np.int64)
+        if self.mask is None:
+            return np.stack(np.unravel_index(ranks, self.shape), axis=1).astype(np.int64) + self.origin
+        row = np.searchsorted(self._row_end, ranks, side='right')
+        cols = _locate(self._rows, row, ranks - self._row_start[row])
+        lead = np.unravel_index(row, self.shape[:-1])
+        return np.column_stack(lead + (cols,)).astype(np.int64)
+
+    def centroid(self):
+        """Mean coordinate of the candidates"""
+        if self.mask is None:
+            return self.origin + (np.array(self.shape) - 1) / 2.0
+        counts = self._row_end - self._row_start
+        lead = np.unravel_index(np.arange(len(counts)), self.shape[:-1])
+        columns = _column_counts(self._rows)
+        total = max(self.count, 1)
+        return np.array([(c * counts).sum() / total for c in lead] +
+                        [(np.arange(len(columns)) * columns).sum() / total])
+
+    def draw(self, n, rng=None, replace=False):
+        """
+        Coordinates of n random candidates (fewer if there are fewer candidates and replace is False).
+
+        Parameters:
+        -----------
+        n : int
+            Number of positions
+        rng : numpy.random.Generator or int, optional
+            Random generator or seed. If None, the draw follows the global np.random state (np.random.seed)
+        replace : bool
+            Allow the same position more than once
+        """
+        rng = _generator(rng)
+        if not replace:
+            n = min(n, self.count)
+        if self.count == 0 or n == 0:
+            return np.zeros((0, len(self.shape)), dtype=np.int64)
+        # Generator.choice without replacement tracks only the drawn values for small draws from large populations
+        return self.coords(rng.choice(self.count, n, replace=replace))
+
+    def draws(self, n, replicates, rng=None, replace=False):
+        """Generator of independent draws, one (n, ndim) array at a time; rng as for draw"""
+        rng = _generator(rng)
+        for _ in range(replicates):
+            yield self.draw(n, rng, replace)
+
+    def evenly_spaced(self, n):
+        """Coordinates of n candidates at evenly spaced ranks, first and last included"""
+        return self.coords(np.linspace(0, self.count - 1, n, dtype=np.int64))
@@ -0,0 +1,202 @@
+import numpy as np
+
+
+# Level-of-detail drawing for the large 2D scatter plots (UMAP and flow cytometry widgets).
+# Colors live in one (N, 4) uint8 RGBA array. Brushes are made once per distinct color and handed out by fancy indexing,
+# so recoloring a million points creates a few hundred brushes instead of a million. When more points are in view than are
+# worth drawing as sprites, the view is drawn as one binned density image instead: every pixel bin gets the mean color of the
+# points in it, and an opacity that grows with the log of their count. Zoomed in past that, only the points inside the view
+# are handed to the scatter item.
+
+DEFAULT_MAX_SPRITES = 100000
+
+
+def hex_to_rgba(hex_colors, alphas):
+    """(N, 4) uint8 array from parallel lists of '#rrggbb' strings and 0-255 alphas"""
+    hex_colors = np.asarray(hex_colors)
+    rgba = np.empty((len(hex_colors), 4), dtype=np.uint8)
+    if len(hex_colors) == 0:
+        return rgba
+    unique, inverse = np.unique(hex_colors, return_inverse=True)
+    table = np.array([[int(h.lstrip('#')[j:j + 2], 16) for j in (0, 2, 4)] for h in unique], dtype=np.uint8)
+    rgba[:, :3] = table[inverse.reshape(-1)]
+    rgba[:, 3] = np.asarray(alphas, dtype=np.int64).astype(np.uint8)
+    return rgba
+
+
+def rgba_to_hex(rgba):
+    """'#rrggbb' strings and alphas (as lists) for an (N, 4) RGBA array"""
+    if len(rgba) == 0:
+        return [], []
+    packed = (rgba[:, 0].astype(np.uint32) << 16) | (rgba[:, 1].astype(np.uint32) << 8) | rgba[:, 2]
+    unique, inverse = np.unique(packed, return_inverse=True)
+    names = np.array(['#{:06x}'.format(int(v)) for v in unique], dtype=object)
+    return names[inverse.reshape(-1)].tolist(), rgba[:, 3].astype(np.int64).tolist()
+
+
+def label_rgba(node_ids, label_dict, color_map, default='#808080', default_alpha=100, alpha=200):
+    """
+    RGBA of every node from its label: color_map[label] at alpha, or the default color at default_alpha for nodes without a
+    label (or with a label missing from color_map).
+    """
+    n = len(node_ids)
+    labels = [label_dict.get(nid, None) for nid in node_ids]
+    # Factorize labels with a dict, they need not be sortable
+    codes = {}
+    inverse = np.fromiter((codes.setdefault(label, len(codes)) for label in labels), dtype=np.int64, count=n)
+    table = np.empty((max(len(codes), 1), 4), dtype=np.uint8)
+    for label, code in codes.items():
+        hex_c = default if label is None else color_map.get(label, default)
+        table[code] = hex_to_rgba([hex_c], [default_alpha if hex_c == default else alpha])[0]
+    return table[inverse] if n else np.empty((0, 4), dtype=np.uint8)
+
+
+def uniform_rgba(n, rgba):
+    return np.tile(np.asarray(rgba, dtype=np.uint8), (n, 1))
+
+
+def heatmap_rgba(values, present, vcenter=None):
+    """
+    Blue → white → red colors with center-point normalization (vcenter → white, min → most blue, max → most red), alpha
+    rising from 0.3 at the center to 0.7 at the extremes. Nodes that are not present are grey at alpha 100.
+
+    Returns:
+    --------
+    tuple
+        (rgba, vmin, vmax)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    present = np.asarray(present, dtype=bool)
+    n = len(values)
+    vmin = values[present].min() if present.any() else 0.0
+    vmax = values[present].max() if present.any() else 0.0
+    if vcenter is None:
+        vcenter = (vmin + vmax) / 2.0
+    vcenter = float(vcenter)
+
+    t = np.full(n, 0.5)
+    below = present & (values <= vcenter)
+    above = present & (values > vcenter)
+    lo_rng = vcenter - vmin
+    hi_rng = vmax - vcenter
+    if lo_rng > 0:
+        t[below] = 0.5 * (values[below] - vmin) / lo_rng
+    if hi_rng > 0:
+        t[above] = 0.5 + 0.5 * (values[above] - vcenter) / hi_rng
+    np.clip(t, 0.0, 1.0, out=t)
+
+    rgba = np.empty((n, 4), dtype=np.uint8)
+    lo = t <= 0.5
+    s_lo = (t[lo] / 0.5 * 255).astype(np.int32)
+    rgba[lo, 0] = s_lo
+    rgba[lo, 1] = s_lo
+    rgba[lo, 2] = 255
+    s_hi = ((1 - (t[~lo] - 0.5) / 0.5) * 255).astype(np.int32)
+    rgba[~lo, 0] = 255
+    rgba[~lo, 1] = s_hi
+    rgba[~lo, 2] = s_hi
+    rgba[:, 3] = ((0.3 + 0.4 * np.abs(2.0 * t - 1.0)) * 255).astype(np.int32)
+    rgba[~present] = (128, 128, 128, 100)
+    return rgba, vmin, vmax
+
+
+def brushes(rgba, make_brush):
+    """Object array of brushes parallel to rgba, with one brush object per distinct color"""
+    if len(rgba) == 0:
+        return np.empty(0, dtype=object)
+    packed = rgba.astype(np.uint32)
+    packed = (packed[:, 0] << 24) | (packed[:, 1] << 16) | (packed[:, 2] << 8) | packed[:, 3]
+    unique, first, inverse = np.unique(packed, return_index=True, return_inverse=True)
+    table = np.empty(len(unique), dtype=object)
+    for k, i in enumerate(first):
+        table[k] = make_brush(*(int(c) for c in rgba[i]))
+    return table[inverse.reshape(-1)]
+
+
+def visible_indices(pos, x0, x1, y0, y1, pad=0.0):
+    """Indices of the points inside [x0, x1] x [y0, y1], grown by pad on every side"""
+    x = pos[:, 0]
+    y = pos[:, 1]
+    return np.flatnonzero((x >= x0 - pad) & (x <= x1 + pad) & (y >= y0 - pad) & (y <= y1 + pad))
+
+
+def density_image(pos, rgba, x0, x1, y0, y1, width, height):
+    """
+    Bin the points inside [x0, x1) x [y0, y1) into a width x height grid.
+
+    Returns:
+    --------
+    ndarray
+        (height, width, 4) uint8 RGBA image, row 0 at y0. Empty bins are fully transparent.
+    """
+    width = max(1, int(width))
+    height = max(1, int(height))
+    image = np.zeros((height, width, 4), dtype=np.uint8)
+    if len(pos) == 0 or x1 <= x0 or y1 <= y0:
+        return image
+    bx = np.floor((pos[:, 0] - x0) * (width / (x1 - x0))).astype(np.int64)
+    by = np.floor((pos[:, 1] - y0) * (height / (y1 - y0))).astype(np.int64)
+    inside = (bx >= 0) & (bx < width) & (by >= 0) & (by < height)
+    if not inside.any():
+        return image
+    flat = by[inside] * width + bx[inside]
+    colors = rgba[inside]
+    counts = np.bincount(flat, minlength=width * height)
+    occupied = counts > 0
+    out = image.reshape(-1, 4)
+    for c in range(3):
+        sums = np.bincount(flat, weights=colors[:, c], minlength=width * height)
+        out[occupied, c] = np.round(sums[occupied] / counts[occupied]).astype(np.uint8)
+    # A lone point keeps its own alpha, and bins get more opaque with the log of their count
+    mean_alpha = np.bincount(flat, weights=colors[:, 3], minlength=width * height)[occupied] / counts[occupied]
+    level = np.log(counts[occupied]) / max(np.log(counts.max()), 1e-12)
+    out[occupied, 3] = np.clip(mean_alpha + (255 - mean_alpha) * level, 0, 255).astype(np.uint8)
+    return image
+
+
+class ScatterLOD:
+    """
+    Picks how to draw a point set for a given view: every point ('all'), only the visible ones ('points'), or a density image
+    ('density'). Point sets up to max_sprites are always drawn whole.
+    """
+
+    def __init__(self, pos, max_sprites=DEFAULT_MAX_SPRITES, bin_pixels=2):
+        self.pos = np.asarray(pos, dtype=np.float64)
+        self.max_sprites = max_sprites
+        self.bin_pixels = bin_pixels
+
+    @property
+    def active(self):
+        return len(self.pos) > self.max_sprites
+
+    def plan(self, x_range, y_range, pixel_size, rgba, point_size=0.0):
+        """
+        Parameters:
+        -----------
+        x_range, y_range : (float, float)
+            Visible data range
+        pixel_size : (int, int)
+            Size of the view in screen pixels (width, height)
+        rgba : ndarray
+            (N, 4) point colors, used for the density image
+        point_size : float
+            Sprite diameter in pixels, so points straddling the view edge are kept
+
+        Returns:
+        --------
+        tuple
+            ('all', None), ('points', indices) or ('density', (image, (x0, y0, width, height)))
+        """
+        if not self.active:
+            return 'all', None
+        (x0, x1), (y0, y1) = x_range, y_range
+        w_px = max(1, int(pixel_size[0]))
+        h_px = max(1, int(pixel_size[1]))
+        pad = point_size * max((x1 - x0) / w_px, (y1 - y0) / h_px)
+        idx = visible_indices(self.pos, x0, x1, y0, y1, pad)
+        if len(idx) <= self.max_sprites:
+            return 'points', idx
+        bins_x = max(1, w_px // self.bin_pixels)
+        bins_y = max(1, h_px // self.bin_pixels)
+        image = density_image(self.pos[idx], rgba[idx], x0, x1, y0, y1, bins_x, bins_y)
+        return 'density', (image, (x0, y0, x1 - x0, y1 - y0))
@@ -5,7 +5,9 @@ Architecture:
   - Features computed directly on padded chunk regions from the full source
     image
   - Numba: optional acceleration for eigenvalue hot loops (2x2 and 3x3).
-  - Threading: all parallelism uses ThreadPoolExecutor (no multiprocessing pools).
+  - Threading: interactive paths use ThreadPoolExecutor. segment_volume streams
+    tiles through worker processes that read the image from shared memory and
+    predict in fixed-size batches, falling back to threads if processes fail.
   - Speed mode: sigmas [1,2,4,8]. Deep mode: sigmas [1,2,4,8,16].
 """
 
@@ -18,11 +20,14 @@ import numpy as np
 import concurrent.futures
 from concurrent.futures import ThreadPoolExecutor
 import threading
+import time
 from scipy import ndimage
 import multiprocessing
+from multiprocessing import shared_memory
 from collections import defaultdict, OrderedDict
 from typing import List, Dict, Tuple, Any
 import math
+from . import segmenter_bundle
 
 # ============================================================
 # Optional Numba acceleration
@@ -134,28 +139,72 @@ def _d(image, axis, order=1):
     return ndimage.convolve1d(image, _K1 if order == 1 else _K2, axis=axis, mode='reflect')
 
 
+# ============================================================
+# Scale space - Gaussian levels and their derivatives, each computed once
+# ============================================================
+class _ScaleSpace:
+    """
+    Gaussian levels G[0] (the source) .. G[N] of one region. First, second and mixed derivatives are
+    convolved on first use and shared by every feature family (gradient, Laplacian, Hessian, structure tensor).
+    """
+
+    def __init__(self, G):
+        self.G = G
+        self._derivs = {}
+
+    def _get(self, key, compute):
+        value = self._derivs.get(key)
+        if value is None:
+            value = self._derivs[key] = compute()
+        return value
+
+    def d1(self, i, axis):
+        return self._get((i, axis), lambda: _d(self.G[i], axis))
+
+    def d2(self, i, axis):
+        return self._get((i, axis, axis), lambda: _d(self.G[i], axis, 2))
+
+    def dmix(self, i, a, b):
+        """d/db of d/da"""
+        return self._get((i, a, b), lambda: _d(self.d1(i, a), b))
+
+
+def _gaussian_levels(src, sigmas):
+    return [src] + [ndimage.gaussian_filter(src, s) for s in sigmas]
+
+
+def _assembly_margin(sigmas, st_scales, deep):
+    """
+    How far outside a target region features must be assembled for them to be exact inside it:
+    two voxels for the cascaded derivative stencils, plus the structure tensor Gaussians and local windows in deep mode.
+    """
+    if not deep:
+        return 2
+    return max([int(4.0 * g + 0.5) for g in st_scales] + [int(s) for s in sigmas]) + 2
+
+
 # ============================================================
 # Feature assembly functions
 # ============================================================
 def _assemble_2d(G, sigmas, st_scales, deep):
+    S = G if isinstance(G, _ScaleSpace) else _ScaleSpace(G)
+    G = S.G
     N = len(sigmas); feats = []
     feats.append(G[0])
     for i in range(1, N+1): feats.append(G[i])
     for i in range(1, N+1):
         for j in range(i+1, N+1): feats.append(G[i] - G[j])
     for i in range(N+1):
-        gx = _d(G[i], 1); gy = _d(G[i], 0)
+        gx = S.d1(i, 1); gy = S.d1(i, 0)
         feats.append(np.sqrt(gx*gx + gy*gy))
     for i in range(N+1):
-        feats.append(_d(G[i], 1, 2) + _d(G[i], 0, 2))
+        feats.append(S.d2(i, 1) + S.d2(i, 0))
     if deep:
         for i in range(N+1):
-            hxx = _d(G[i], 1, 2); hyy = _d(G[i], 0, 2)
-            hxy = _d(_d(G[i], 1), 0)
-            s, l = _eigen2x2(hxx, hyy, hxy)
+            s, l = _eigen2x2(S.d2(i, 1), S.d2(i, 0), S.dmix(i, 1, 0))
             feats.append(s); feats.append(l)
         for i in range(N+1):
-            gx = _d(G[i], 1); gy = _d(G[i], 0)
+            gx = S.d1(i, 1); gy = S.d1(i, 0)
             Pxx = gx*gx; Pxy = gx*gy; Pyy = gy*gy
             for gamma in st_scales:
                 Qxx = ndimage.gaussian_filter(Pxx, gamma)
@@ -176,24 +225,25 @@ def _assemble_2d(G, sigmas, st_scales, deep):
 
 
 def _assemble_3d(G, sigmas, st_scales, deep):
+    S = G if isinstance(G, _ScaleSpace) else _ScaleSpace(G)
+    G = S.G
     N = len(sigmas); feats = []
     feats.append(G[0])
     for i in range(1, N+1): feats.append(G[i])
     for i in range(1, N+1):
         for j in range(i+1, N+1): feats.append(G[i] - G[j])
     for i in range(N+1):
-        gx=_d(G[i],2); gy=_d(G[i],1); gz=_d(G[i],0)
+        gx=S.d1(i,2); gy=S.d1(i,1); gz=S.d1(i,0)
         feats.append(np.sqrt(gx*gx+gy*gy+gz*gz))
     for i in range(N+1):
-        feats.append(_d(G[i],2,2)+_d(G[i],1,2)+_d(G[i],0,2))
+        feats.append(S.d2(i,2)+S.d2(i,1)+S.d2(i,0))
     if deep:
         for i in range(N+1):
-            hxx=_d(G[i],2,2); hyy=_d(G[i],1,2); hzz=_d(G[i],0,2)
-            hxy=_d(_d(G[i],2),1); hxz=_d(_d(G[i],2),0); hyz=_d(_d(G[i],1),0)
-            e0,e1,e2=_eigen3x3(hxx,hyy,hzz,hxy,hxz,hyz)
+            e0,e1,e2=_eigen3x3(S.d2(i,2),S.d2(i,1),S.d2(i,0),
+                               S.dmix(i,2,1),S.dmix(i,2,0),S.dmix(i,1,0))
             feats.append(e0); feats.append(e1); feats.append(e2)
         for i in range(N+1):
-            gx=_d(G[i],2); gy=_d(G[i],1); gz=_d(G[i],0)
+            gx=S.d1(i,2); gy=S.d1(i,1); gz=S.d1(i,0)
             Pxx=gx*gx; Pxy=gx*gy; Pxz=gx*gz; Pyy=gy*gy; Pyz=gy*gz; Pzz=gz*gz
             for gamma in st_scales:
                 e0,e1,e2=_eigen3x3(
@@ -213,6 +263,130 @@ def _assemble_3d(G, sigmas, st_scales, deep):
     return np.stack(feats, axis=-1)
 
 
+# ============================================================
+# Region features - padded chunk regions of a source image
+# ============================================================
+def _is_rgb_image(image):
+    return image.ndim == 4 and image.shape[-1] in (3, 4)
+
+
+def _level_sets(image, prefix, lo, hi, sigmas):
+    """Gaussian levels of image[prefix + lo:hi] (spatial bounds), one list per color channel"""
+    region = prefix + tuple(slice(a, b) for a, b in zip(lo, hi))
+    if _is_rgb_image(image):
+        return [_gaussian_levels(np.ascontiguousarray(image[region + (ch,)], dtype=np.float32), sigmas)
+                for ch in range(image.shape[-1])]
+    return [_gaussian_levels(np.ascontiguousarray(image[region], dtype=np.float32), sigmas)]
+
+
+def _features_from_levels(level_sets, origin, lo, hi, sigmas, st_scales, deep, assemble):
+    """
+    Features of the region lo:hi (image coordinates) from levels computed on a larger region starting at origin.
+    Features are only assembled on the region plus _assembly_margin, which gives the same values inside it as
+    assembling the whole padded region would.
+    """
+    m = _assembly_margin(sigmas, st_scales, deep)
+    extent = level_sets[0][0].shape
+    w_lo = [max(0, a - o - m) for a, o in zip(lo, origin)]
+    w_hi = [min(e, b - o + m) for b, o, e in zip(hi, origin, extent)]
+    window = tuple(slice(a, b) for a, b in zip(w_lo, w_hi))
+    parts = [assemble(_ScaleSpace([g[window] for g in G]), sigmas, st_scales, deep) for G in level_sets]
+    features = parts[0] if len(parts) == 1 else np.concatenate(parts, axis=-1)
+    inner = tuple(slice(a - o - w, b - o - w) for a, b, o, w in zip(lo, hi, origin, w_lo))
+    return features[inner]
+
+
+def _region_features_2d(image, z, y_s, y_e, x_s, x_e, sigmas, st_scales, pad, deep):
+    """Features of image[z, y_s:y_e, x_s:x_e], from Gaussian levels of the region padded by pad."""
+    H, W = image.shape[1:3]
+    p_lo = (max(0, y_s - pad), max(0, x_s - pad))
+    p_hi = (min(H, y_e + pad), min(W, x_e + pad))
+    levels = _level_sets(image, (z,), p_lo, p_hi, sigmas)
+    return _features_from_levels(levels, p_lo, (y_s, x_s), (y_e, x_e), sigmas, st_scales, deep, _assemble_2d)
+
+
+def _region_features_3d(image, z_s, z_e, y_s, y_e, x_s, x_e, sigmas, st_scales, pad, deep):
+    """Features of image[z_s:z_e, y_s:y_e, x_s:x_e], from Gaussian levels of the region padded by pad."""
+    D, H, W = image.shape[:3]
+    p_lo = (max(0, z_s - pad), max(0, y_s - pad), max(0, x_s - pad))
+    p_hi = (min(D, z_e + pad), min(H, y_e + pad), min(W, x_e + pad))
+    levels = _level_sets(image, (), p_lo, p_hi, sigmas)
+    return _features_from_levels(levels, p_lo, (z_s, y_s, x_s), (z_e, y_e, x_e), sigmas, st_scales, deep, _assemble_3d)
+
+
+# ============================================================
+# Streaming segmentation - rows of tiles, in worker processes
+# ============================================================
+_worker_state = {}
+
+
+def _group_tiles(tiles, shape, pad, max_block_voxels):
+    """
+    Split consecutive tiles into blocks that share their z and y range (rows along x), each block's padded
+    volume staying under max_block_voxels. A block's Gaussian levels are computed once for all its tiles.
+    """
+    blocks = []
+    for tile in tiles:
+        if blocks:
+            block = blocks[-1]; first = block[0]
+            if first[:4] == tile[:4] and first[6] == tile[6]:
+                z0, z1, y0, y1, _, _, two_d = tile
+                depth = 1 if two_d else min(shape[0], z1 + pad) - max(0, z0 - pad)
+                rows = min(shape[1], y1 + pad) - max(0, y0 - pad)
+                cols = min(shape[2], tile[5] + pad) - max(0, first[4] - pad)
+                if depth * rows * cols <= max_block_voxels:
+                    block.append(tile)
+                    continue
+        blocks.append([tile])
+    return blocks
+
+
+def _segment_block(image, model, tiles, params, predict_kwargs):
+    """
+    Foreground masks of a row of tiles (z0, z1, y0, y1, x0, x1, two_d), predicted batch_rows voxels at a time.
+    Gaussian levels are computed once on the padded row, so neighboring tiles share their halo.
+    """
+    sigmas, st_scales, pad, deep, batch_rows = params
+    z0, z1, y0, y1, _, _, two_d = tiles[0]
+    x0 = tiles[0][4]; x1 = tiles[-1][5]
+    D, H, W = image.shape[:3]
+    if two_d:
+        prefix = (z0,); lo = (max(0, y0 - pad), max(0, x0 - pad)); hi = (min(H, y1 + pad), min(W, x1 + pad))
+    else:
+        prefix = (); lo = (max(0, z0 - pad), max(0, y0 - pad), max(0, x0 - pad))
+        hi = (min(D, z1 + pad), min(H, y1 + pad), min(W, x1 + pad))
+    levels = _level_sets(image, prefix, lo, hi, sigmas)
+
+    results = []
+    for tile in tiles:
+        tz0, tz1, ty0, ty1, tx0, tx1, _ = tile
+        if two_d:
+            fm = _features_from_levels(levels, lo, (ty0, tx0), (ty1, tx1), sigmas, st_scales, deep, _assemble_2d)[np.newaxis]
+        else:
+            fm = _features_from_levels(levels, lo, (tz0, ty0, tx0), (tz1, ty1, tx1), sigmas, st_scales, deep, _assemble_3d)
+        X = fm.reshape(-1, fm.shape[-1])
+        mask = np.empty(X.shape[0], dtype=bool)
+        for s in range(0, X.shape[0], batch_rows):
+            mask[s:s + batch_rows] = model.predict(X[s:s + batch_rows], **predict_kwargs).astype(bool)
+        results.append((tile, mask.reshape(fm.shape[:3])))
+        del fm, X
+    return results
+
+
+def _init_segment_worker(shm_name, shape, dtype_str, model, params):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_state['shm'] = shm
+    _worker_state['image'] = np.ndarray(shape, dtype=dtype_str, buffer=shm.buf)
+    _worker_state['model'] = model
+    _worker_state['params'] = params
+
+
+def _segment_block_worker(tiles):
+    # One process per core already, so each keeps LightGBM to a single thread
+    return _segment_block(_worker_state['image'], _worker_state['model'], tiles,
+                          _worker_state['params'], {'num_threads': 1})
+
+
 # ============================================================
 # Chunk Cache - LRU for computed feature chunks
 # ============================================================
@@ -254,6 +428,71 @@ class _ChunkCache:
         return self._current_bytes / (1024**2)
 
 
+# ============================================================
+# Training Store - feature rows of painted voxels, kept between trainings
+# ============================================================
+class _TrainingStore:
+    """
+    Feature rows of scribbled voxels keyed by flat voxel index (kept sorted), so retraining only
+    extracts features for voxels painted since the last run. config identifies the feature set
+    (speed/deep, 2D/3D); rows from a different config are discarded.
+    version counts modifications; base_version is the version of the last one that removed or
+    relabeled rows, so a model fitted at version >= base_version saw a subset of the current rows.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.clear()
+
+    def clear(self, config=None):
+        self.version += 1
+        self.base_version = self.version
+        self.config = config
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.labels = np.zeros(0, dtype=np.uint8)
+        self.features = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def sync(self, keys, labels, config):
+        """
+        Drop rows of voxels no longer painted and relabel repainted ones.
+        Returns the keys and labels still needing features, and whether any stored row was removed or relabeled
+        (always the case when the config changed).
+        """
+        reset = config != self.config and len(self.keys) > 0
+        if config != self.config:
+            self.clear(config)
+        pos = np.searchsorted(self.keys, keys)
+        pos_c = np.minimum(pos, max(len(self.keys) - 1, 0))
+        have = (pos < len(self.keys)) & (self.keys[pos_c] == keys) if len(self.keys) else np.zeros(len(keys), dtype=bool)
+
+        keep = np.zeros(len(self.keys), dtype=bool)
+        keep[pos[have]] = True
+        new_labels = self.labels.copy()
+        new_labels[pos[have]] = labels[have]
+        changed = reset or (not keep.all()) or bool(np.any(new_labels[keep] != self.labels[keep]))
+        self.keys = self.keys[keep]
+        self.labels = new_labels[keep]
+        if self.features is not None:
+            self.features = self.features[keep]
+        if changed:
+            self.version += 1
+            self.base_version = self.version
+        return keys[~have], labels[~have], changed
+
+    def add(self, keys, labels, features):
+        if len(keys) == 0:
+            return
+        self.version += 1
+        keys = np.concatenate([self.keys, keys])
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.labels = np.concatenate([self.labels, labels])[order]
+        self.features = (features if self.features is None else np.vstack([self.features, features]))[order]
+
+
 # ============================================================
 # Interactive Segmenter
 # ============================================================
@@ -263,27 +502,7 @@ class InteractiveSegmenter:
         self.patterns = []
         self.use_gpu = False
 
-        self.model = lgb.LGBMClassifier(
-            n_estimators=200,
-            learning_rate=0.1,
-            num_leaves=63,
-            max_depth=-1,
-
-            min_child_samples=10,
-            min_split_gain=0.01,
-
-            colsample_bytree=0.8,
-            subsample=0.8,
-            subsample_freq=1,
-
-            reg_alpha=0.1,
-            reg_lambda=1.0,
-
-            max_bin=255,
-            n_jobs=-1,
-            random_state=42,
-            verbose=-1,
-        )
+        self.model = self._new_model()
 
         self.feature_cache = None
         self.lock = threading.Lock()
@@ -316,6 +535,7 @@ class InteractiveSegmenter:
         self.master_chunk = 49
         self.twod_chunk_size = 117649
         self.batch_amplifier = 1
+        self.last_throughput = None
 
         # Chunk-level LRU cache for interactive preview reuse (1 GB)
         self._chunk_cache = _ChunkCache(max_bytes=1 * 1024**3)
@@ -326,10 +546,40 @@ class InteractiveSegmenter:
         self.previous_z_fore = None
         self.previous_z_back = None
 
+        # Features of scribbled voxels kept between trainings; retraining adds warm_start_trees trees
+        # to the last model when scribbles were only added, refitting from scratch past max_boosted_trees
+        self._training_store = _TrainingStore()
+        self._fit_version = None
+        self.warm_start_trees = 50
+        self.max_boosted_trees = 600
+
     # ================================================================
     # Helpers
     # ================================================================
 
+    def _new_model(self, n_estimators=200):
+        return lgb.LGBMClassifier(
+            n_estimators=n_estimators,
+            learning_rate=0.1,
+            num_leaves=63,
+            max_depth=-1,
+
+            min_child_samples=10,
+            min_split_gain=0.01,
+
+            colsample_bytree=0.8,
+            subsample=0.8,
+            subsample_freq=1,
+
+            reg_alpha=0.1,
+            reg_lambda=1.0,
+
+            max_bin=255,
+            n_jobs=-1,
+            random_state=42,
+            verbose=-1,
+        )
+
     def _is_rgb(self):
         return self.image_3d.ndim == 4 and self.image_3d.shape[-1] in (3, 4)
 
@@ -349,27 +599,8 @@ class InteractiveSegmenter:
 
     def _compute_features_for_region_2d(self, z, y_s, y_e, x_s, x_e, deep=False):
         """Compute features for a 2D chunk directly from the source image."""
-        sigmas = self._get_sigmas(deep)
-        pad = self._get_pad(deep)
-        _, H, W = self._spatial_shape()
-
-        py_s = max(0, y_s - pad); py_e = min(H, y_e + pad)
-        px_s = max(0, x_s - pad); px_e = min(W, x_e + pad)
-
-        if self._is_rgb():
-            parts = []
-            for ch in range(self.image_3d.shape[-1]):
-                src = np.ascontiguousarray(self.image_3d[z, py_s:py_e, px_s:px_e, ch], dtype=np.float32)
-                G = [src] + [ndimage.gaussian_filter(src, s) for s in sigmas]
-                parts.append(_assemble_2d(G, sigmas, self.structure_tensor_scales, deep))
-            features = np.concatenate(parts, axis=-1)
-        else:
-            src = np.ascontiguousarray(self.image_3d[z, py_s:py_e, px_s:px_e], dtype=np.float32)
-            G = [src] + [ndimage.gaussian_filter(src, s) for s in sigmas]
-            features = _assemble_2d(G, sigmas, self.structure_tensor_scales, deep)
-
-        cy = y_s - py_s; cx = x_s - px_s
-        return features[cy:cy + (y_e - y_s), cx:cx + (x_e - x_s)]
+        return _region_features_2d(self.image_3d, z, y_s, y_e, x_s, x_e, self._get_sigmas(deep),
+                                   self.structure_tensor_scales, self._get_pad(deep), deep)
 
     def _compute_features_for_region_2d_cached(self, z, y_s, y_e, x_s, x_e, deep=False):
         """Compute 2D region features with chunk-level LRU caching."""
@@ -383,28 +614,8 @@ class InteractiveSegmenter:
 
     def _compute_features_for_region_3d(self, z_s, z_e, y_s, y_e, x_s, x_e, deep=False):
         """Compute features for a 3D chunk directly from the source image."""
-        sigmas = self._get_sigmas(deep)
-        pad = self._get_pad(deep)
-        D, H, W = self._spatial_shape()
-
-        pz_s = max(0, z_s - pad); pz_e = min(D, z_e + pad)
-        py_s = max(0, y_s - pad); py_e = min(H, y_e + pad)
-        px_s = max(0, x_s - pad); px_e = min(W, x_e + pad)
-
-        if self._is_rgb():
-            parts = []
-            for ch in range(self.image_3d.shape[-1]):
-                src = np.ascontiguousarray(self.image_3d[pz_s:pz_e, py_s:py_e, px_s:px_e, ch], dtype=np.float32)
-                G = [src] + [ndimage.gaussian_filter(src, s) for s in sigmas]
-                parts.append(_assemble_3d(G, sigmas, self.structure_tensor_scales, deep))
-            features = np.concatenate(parts, axis=-1)
-        else:
-            src = np.ascontiguousarray(self.image_3d[pz_s:pz_e, py_s:py_e, px_s:px_e], dtype=np.float32)
-            G = [src] + [ndimage.gaussian_filter(src, s) for s in sigmas]
-            features = _assemble_3d(G, sigmas, self.structure_tensor_scales, deep)
-
-        cz = z_s - pz_s; cy = y_s - py_s; cx = x_s - px_s
-        return features[cz:cz+(z_e-z_s), cy:cy+(y_e-y_s), cx:cx+(x_e-x_s)]
+        return _region_features_3d(self.image_3d, z_s, z_e, y_s, y_e, x_s, x_e, self._get_sigmas(deep),
+                                   self.structure_tensor_scales, self._get_pad(deep), deep)
 
     # ================================================================
     # Backward-compatible direct computation (for arbitrary images)
@@ -566,77 +777,127 @@ class InteractiveSegmenter:
     # segment_volume
     # ================================================================
 
-    def segment_volume(self, array, chunk_size=None, gpu=False):
+    def _segmentation_tiles(self, chunk_size):
+        """Tiles covering the volume as (z0, z1, y0, y1, x0, x1, two_d), 2D tiles being one slice each."""
+        if not self.use_two:
+            return [tuple(int(v) for v in c) + (False,) for c in self.compute_3d_chunks(chunk_size)]
+        MAX = self.twod_chunk_size; tiles = []
+        D, yd, xd = self._spatial_shape(); tp = yd*xd
+        for z in range(D):
+            if tp <= MAX:
+                tiles.append((z, z+1, 0, yd, 0, xd, True))
+                continue
+            nn = int(np.ceil(tp/MAX))
+            byc=1; bxc=nn; bar=float('inf')
+            for ycc in range(1, nn+1):
+                xcc = int(np.ceil(nn/ycc))
+                cy=int(np.ceil(yd/ycc)); cx=int(np.ceil(xd/xcc))
+                if cy*cx > MAX: continue
+                ar = max(cy,cx)/max(min(cy,cx),1)
+                if ar < bar: bar=ar; byc=ycc; bxc=xcc
+            if bar == float('inf'):
+                ld = 'y' if yd >= xd else 'x'; nd = int(np.ceil(tp/MAX))
+                if ld == 'y':
+                    ds = int(np.ceil(yd/nd))
+                    for i in range(0, yd, ds):
+                        tiles.append((z, z+1, i, min(i+ds,yd), 0, xd, True))
+                else:
+                    ds = int(np.ceil(xd/nd))
+                    for i in range(0, xd, ds):
+                        tiles.append((z, z+1, 0, yd, i, min(i+ds,xd), True))
+            else:
+                ycs=int(np.ceil(yd/byc)); xcs=int(np.ceil(xd/bxc))
+                for yi in range(byc):
+                    for xi in range(bxc):
+                        yss=yi*ycs; yee=min(yss+ycs,yd)
+                        xss=xi*xcs; xee=min(xss+xcs,xd)
+                        if yss>=yd or xss>=xd: continue
+                        tiles.append((z, z+1, yss, yee, xss, xee, True))
+        return tiles
+
+    def segment_volume(self, array=None, chunk_size=None, gpu=False, processes=True,
+                       max_workers=None, predict_batch=262144, output_path=None,
+                       max_block_voxels=8 * 1024**2):
+        """
+        Predict the whole volume tile by tile and write foreground voxels (255) straight into array.
+        Tiles go to workers in rows whose Gaussian levels are computed once (padded volume up to
+        max_block_voxels per color channel), so adjacent tiles share their halo. Each tile's features are
+        assembled, predicted predict_batch voxels at a time and dropped, and only about two rows per worker
+        are in flight, so peak memory depends on the block size, not the volume.
+
+        processes=True runs tiles in worker processes reading the image from shared memory (threads are
+        used if that fails). array may be a memmap; with array=None and output_path set, a uint8 .npy memmap
+        is created there. Throughput is printed as it goes and kept in self.last_throughput (voxels/s).
+        """
         self.realtimechunks = None
         chunk_size = self.master_chunk
-
-        def create_2d_chunks():
-            MAX = self.twod_chunk_size; chunks = []
-            for z in range(self.image_3d.shape[0]):
-                yd = self.image_3d.shape[1]; xd = self.image_3d.shape[2]; tp = yd*xd
-                if tp <= MAX:
-                    chunks.append([yd, xd, z, tp, None])
-                else:
-                    nn = int(np.ceil(tp/MAX))
-                    byc=1; bxc=nn; bar=float('inf')
-                    for ycc in range(1, nn+1):
-                        xcc = int(np.ceil(nn/ycc))
-                        cy=int(np.ceil(yd/ycc)); cx=int(np.ceil(xd/xcc))
-                        if cy*cx > MAX: continue
-                        ar = max(cy,cx)/max(min(cy,cx),1)
-                        if ar < bar: bar=ar; byc=ycc; bxc=xcc
-                    if bar == float('inf'):
-                        ld = 'y' if yd >= xd else 'x'; nd = int(np.ceil(tp/MAX))
-                        if ld == 'y':
-                            ds = int(np.ceil(yd/nd))
-                            for i in range(0, yd, ds):
-                                chunks.append([yd,xd,z,None,['y',i,min(i+ds,yd)]])
-                        else:
-                            ds = int(np.ceil(xd/nd))
-                            for i in range(0, xd, ds):
-                                chunks.append([yd,xd,z,None,['x',i,min(i+ds,xd)]])
-                    else:
-                        ycs=int(np.ceil(yd/byc)); xcs=int(np.ceil(xd/bxc))
-                        for yi in range(byc):
-                            for xi in range(bxc):
-                                yss=yi*ycs; yee=min(yss+ycs,yd)
-                                xss=xi*xcs; xee=min(xss+xcs,xd)
-                                if yss>=yd or xss>=xd: continue
-                                chunks.append([yd,xd,z,None,['2d',yss,yee,xss,xee]])
-            return chunks
+        if array is None:
+            shape = self._spatial_shape()
+            array = (np.lib.format.open_memmap(output_path, mode='w+', dtype=np.uint8, shape=shape)
+                     if output_path is not None else np.zeros(shape, dtype=np.uint8))
 
         print("Chunking data...")
-        chunks = self.compute_3d_chunks(chunk_size) if not self.use_two else create_2d_chunks()
-        print("Processing chunks in batches...")
-
-        max_workers = self.batch_amplifier * multiprocessing.cpu_count()
-        batch_size = max_workers; total_processed = 0
-
-        try:
-            for bs in range(0, len(chunks), batch_size):
-                be = min(bs + batch_size, len(chunks))
-                batch = chunks[bs:be]
-                print(f"Processing batch {bs//batch_size+1}/{(len(chunks)+batch_size-1)//batch_size}")
-
-                results = []
-                with ThreadPoolExecutor(max_workers=len(batch)) as ex:
-                    futs = [ex.submit(self.extract_chunk_features, c) for c in batch]
-                    for f in futs:
-                        feat, coord = f.result()
-                        if len(feat) > 0: results.append((feat, coord))
-
-                if results:
-                    af = np.vstack([r[0] for r in results])
-                    ac = np.vstack([r[1] for r in results])
-                    preds = self.model.predict(af).astype(bool)
-                    fg = ac[preds]
-                    if len(fg) > 0: array[fg[:,0], fg[:,1], fg[:,2]] = 255
-                    del af, ac, preds, fg
-
-                total_processed += len(batch)
-                print(f"Completed {total_processed}/{len(chunks)} chunks")
-        finally:
-            pass
+        tiles = self._segmentation_tiles(chunk_size)
+        deep = not self.speed
+        params = (self._get_sigmas(deep), self.structure_tensor_scales, self._get_pad(deep), deep, int(predict_batch))
+        if max_workers is None:
+            max_workers = self.batch_amplifier * multiprocessing.cpu_count()
+        channels = self.image_3d.shape[-1] if self._is_rgb() else 1
+        blocks = _group_tiles(tiles, self._spatial_shape(), params[2], max(1, max_block_voxels // channels))
+        max_workers = max(1, min(max_workers, len(blocks)))
+        print(f"Segmenting {len(tiles)} tiles in {len(blocks)} blocks with {max_workers} {'processes' if processes and max_workers > 1 else 'threads'}...")
+
+        start = time.perf_counter()
+        state = {'done': 0, 'voxels': 0}
+
+        def write(results):
+            for tile, mask in results:
+                z0, z1, y0, y1, x0, x1, _ = tile
+                if mask.any():
+                    region = array[z0:z1, y0:y1, x0:x1]
+                    region[mask] = 255
+                state['done'] += 1; state['voxels'] += mask.size
+            rate = state['voxels'] / max(time.perf_counter() - start, 1e-9)
+            print(f"Completed {state['done']}/{len(tiles)} chunks ({rate:,.0f} voxels/s)")
+
+        def stream(executor, fn):
+            # Keep a bounded number of blocks in flight and write each as it finishes
+            pending = set()
+            for block in blocks:
+                pending.add(executor.submit(fn, block))
+                if len(pending) >= 2 * max_workers:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for f in done: write(f.result())
+            for f in concurrent.futures.as_completed(pending):
+                write(f.result())
+
+        used_processes = False
+        if processes and max_workers > 1:
+            shm = None
+            try:
+                src = np.ascontiguousarray(self.image_3d)
+                shm = shared_memory.SharedMemory(create=True, size=max(src.nbytes, 1))
+                np.copyto(np.ndarray(src.shape, dtype=src.dtype, buffer=shm.buf), src)
+                del src
+                with concurrent.futures.ProcessPoolExecutor(
+                        max_workers=max_workers, initializer=_init_segment_worker,
+                        initargs=(shm.name, self.image_3d.shape, self.image_3d.dtype.str, self.model, params)) as ex:
+                    stream(ex, _segment_block_worker)
+                used_processes = True
+            except Exception as e:
+                print(f"Process-parallel segmentation failed ({e}), falling back to threads")
+                state['done'] = 0; state['voxels'] = 0; start = time.perf_counter()
+            finally:
+                if shm is not None:
+                    shm.close(); shm.unlink()
+
+        if not used_processes:
+            with ThreadPoolExecutor(max_workers=max_workers) as ex:
+                stream(ex, lambda block: _segment_block(self.image_3d, self.model, block, params, {}))
+
+        self.last_throughput = state['voxels'] / max(time.perf_counter() - start, 1e-9)
+        if isinstance(array, np.memmap):
+            array.flush()
         return array
 
     # ================================================================
@@ -900,86 +1161,123 @@ class InteractiveSegmenter:
     # Training
     # ================================================================
 
+    def _voxel_features(self, coords, deep):
+        """
+        Feature rows for an (n, 3) array of voxel coordinates. Voxels are grouped by grid cell (by slice and
+        2D cell in 2D mode) and features are computed only over the bounding box of each group.
+        """
+        if len(coords) == 0:
+            return None
+        D, H, W = self._spatial_shape()
+        if self.use_two:
+            side = max(1, int(np.sqrt(self.twod_chunk_size)))
+            cells = (coords[:, 0] * ((H + side - 1) // side) + coords[:, 1] // side) * ((W + side - 1) // side) + coords[:, 2] // side
+        else:
+            ca = np.array(self.compute_3d_chunks(self.master_chunk))
+            zb = np.unique(ca[:, 0]); yb = np.unique(ca[:, 2]); xb = np.unique(ca[:, 4])
+            zi = np.searchsorted(zb, coords[:, 0], side='right') - 1
+            yi = np.searchsorted(yb, coords[:, 1], side='right') - 1
+            xi = np.searchsorted(xb, coords[:, 2], side='right') - 1
+            cells = (zi * len(yb) + yi) * len(xb) + xi
+        order = np.argsort(cells, kind='stable')
+        splits = np.flatnonzero(np.diff(cells[order])) + 1
+        groups = np.split(order, splits)
+
+        def extract(idx):
+            c = coords[idx]
+            lo = c.min(axis=0); hi = c.max(axis=0) + 1
+            if self.use_two:
+                fm = self._compute_features_for_region_2d(int(lo[0]), int(lo[1]), int(hi[1]), int(lo[2]), int(hi[2]), deep=deep)
+                return idx, fm[c[:, 1] - lo[1], c[:, 2] - lo[2]]
+            fm = self._compute_features_for_region_3d(int(lo[0]), int(hi[0]), int(lo[1]), int(hi[1]),
+                                                      int(lo[2]), int(hi[2]), deep=deep)
+            return idx, fm[c[:, 0] - lo[0], c[:, 1] - lo[1], c[:, 2] - lo[2]]
+
+        features = None
+        with ThreadPoolExecutor(max_workers=multiprocessing.cpu_count()) as ex:
+            for idx, rows in ex.map(extract, groups):
+                if features is None:
+                    features = np.empty((len(coords), rows.shape[1]), dtype=np.float32)
+                features[idx] = rows
+        return features
+
     def train_batch(self, foreground_array, speed=True, use_gpu=False,
                     use_two=False, mem_lock=False, saving=False):
+        """
+        Train on the scribbles in foreground_array (1 = foreground, 2 = background). Feature rows of voxels
+        seen in earlier calls are reused from the training store, so only newly painted voxels are extracted.
+        If scribbles were only added since the last fit, boosting continues from the current model instead
+        of refitting. saving=True returns (foreground features, background features, z_fore, z_back) instead.
+        """
         if not saving:
             print("Training model...")
-            self.model = lgb.LGBMClassifier(
-                n_estimators=200,
-                learning_rate=0.1,
-                num_leaves=63,
-                max_depth=-1,
-
-                min_child_samples=10,
-                min_split_gain=0.01,
-
-                colsample_bytree=0.8,
-                subsample=0.8,
-                subsample_freq=1,
-
-                reg_alpha=0.1,
-                reg_lambda=1.0,
-
-                max_bin=255,
-                n_jobs=-1,
-                random_state=42,
-                verbose=-1,
-            )
 
         self.speed = speed; self.cur_gpu = use_gpu
         if use_two != self.use_two: self.realtimechunks = None
         if not use_two: self.use_two = False
         self.mem_lock = mem_lock
-
         if use_two:
             if not self.use_two: self.use_two = True
             self.two_slices = []
-            zf,yf,xf = np.where(foreground_array==1)
-            zb,yb,xb = np.where(foreground_array==2)
-            fore_coords = list(zip(zf,yf,xf)); back_coords = list(zip(zb,yb,xb))
-            z_fores = self.organize_by_z(fore_coords)
-            z_backs = self.organize_by_z(back_coords)
-            azc = {}
-            for z in z_fores: azc.setdefault(z,[]).extend(z_fores[z])
-            for z in z_backs: azc.setdefault(z,[]).extend(z_backs[z])
-            nc = self.get_minimal_chunks_for_coordinates_cpu(azc)
-            foreground_features, background_features = self.extract_features_parallel(
-                nc, speed, use_gpu, z_fores, z_backs)
-            z_fore = np.argwhere(foreground_array==1)
-            z_back = np.argwhere(foreground_array==2)
-        else:
-            foreground_features=[]; background_features=[]
-            z_fore = np.argwhere(foreground_array==1)
-            z_back = np.argwhere(foreground_array==2)
-            if len(z_fore)==0 and len(z_back)==0:
-                return foreground_features, background_features
-            ac = self.compute_3d_chunks(self.master_chunk)
-            ca = np.array(ac)
-            asc = np.vstack((z_fore, z_back)) if len(z_back)>0 else z_fore
-            cws = set()
-            for z,y,x in asc:
-                zm=(ca[:,0]<=z)&(z<ca[:,1]); ym=(ca[:,2]<=y)&(y<ca[:,3]); xm=(ca[:,4]<=x)&(x<ca[:,5])
-                for idx in np.where(zm&ym&xm)[0]: cws.add(tuple(ca[idx]))
-            foreground_features, background_features = self.process_grid_cells_parallel(list(cws), foreground_array)
+
+        z_fore = np.argwhere(foreground_array==1)
+        z_back = np.argwhere(foreground_array==2)
+        if len(z_fore)==0 and len(z_back)==0 and self.previous_foreground is None:
+            return ([], [], z_fore, z_back) if saving else ([], [])
+
+        shape = self._spatial_shape()
+        coords = np.vstack((z_fore, z_back))
+        keys = np.ravel_multi_index(tuple(coords.T), shape).astype(np.int64)
+        labels = np.concatenate([np.ones(len(z_fore), dtype=np.uint8), np.full(len(z_back), 2, dtype=np.uint8)])
+        order = np.argsort(keys)
+        keys = keys[order]; labels = labels[order]
+
+        store = self._training_store
+        new_keys, new_labels, changed = store.sync(keys, labels, (bool(speed), bool(self.use_two)))
+        if len(new_keys):
+            print(f"Extracting features for {len(new_keys)} new voxels ({len(store)} reused)")
+            new_coords = np.column_stack(np.unravel_index(new_keys, shape))
+            store.add(new_keys, new_labels, self._voxel_features(new_coords, deep=not speed))
+
+        fg_rows = store.labels == 1
+        foreground_features = store.features[fg_rows] if store.features is not None else np.zeros((0, 0), np.float32)
+        background_features = store.features[~fg_rows] if store.features is not None else np.zeros((0, 0), np.float32)
+        z_fore = np.column_stack(np.unravel_index(store.keys[fg_rows], shape))
+        z_back = np.column_stack(np.unravel_index(store.keys[~fg_rows], shape))
 
         if self.previous_foreground is not None:
-            failed = True
-            try: foreground_features = np.vstack([self.previous_foreground, foreground_features]); failed=False
-            except: pass
-            try: background_features = np.vstack([self.previous_background, background_features]); failed=False
-            except: pass
-            try: z_fore = np.concatenate([self.previous_z_fore, z_fore])
-            except: pass
-            try: z_back = np.concatenate([self.previous_z_back, z_back])
-            except: pass
-            if failed: print("Could not combine new model with old loaded model.")
+            width = store.features.shape[1] if store.features is not None else None
+            prev_width = self.previous_foreground.shape[1] if self.previous_foreground.ndim == 2 else self.previous_background.shape[1]
+            if width is not None and width != prev_width:
+                print("Could not combine new model with old loaded model (feature sets differ - check speed/deep and 2D/3D mode).")
+            else:
+                def stack(prev, cur):
+                    return prev if len(cur) == 0 else np.vstack([prev, cur]) if len(prev) else cur
+                foreground_features = stack(self.previous_foreground.reshape(-1, prev_width), foreground_features)
+                background_features = stack(self.previous_background.reshape(-1, prev_width), background_features)
+                z_fore = np.concatenate([self.previous_z_fore.reshape(-1, 3), z_fore])
+                z_back = np.concatenate([self.previous_z_back.reshape(-1, 3), z_back])
 
         if saving: return foreground_features, background_features, z_fore, z_back
 
+        if self._fit_version == store.version:
+            print("No new scribbles, model unchanged"); return
+
         X = np.vstack([foreground_features, background_features])
-        y = np.hstack([np.ones(len(z_fore)), np.zeros(len(z_back))])
-        try: self.model.fit(X, y)
-        except: print(X); print(y)
+        y = np.hstack([np.ones(len(foreground_features)), np.zeros(len(background_features))])
+        warm = (self._fit_version is not None and self._fit_version >= store.base_version
+                and self.model.booster_.num_trees() + self.warm_start_trees <= self.max_boosted_trees)
+        try:
+            if warm:
+                previous = self.model
+                self.model = self._new_model(n_estimators=self.warm_start_trees)
+                self.model.fit(X, y, init_model=previous.booster_)
+            else:
+                self.model = self._new_model()
+                self.model.fit(X, y)
+            self._fit_version = store.version
+        except Exception as e:
+            print(f"Training failed: {e}"); print(X); print(y)
         self.current_speed = speed; print("Done")
 
     # ================================================================
@@ -987,26 +1285,69 @@ class InteractiveSegmenter:
     # ================================================================
 
     def save_model(self, file_name, foreground_array):
+        """
+        Save a model bundle (see segmenter_bundle): the classifier if it is fitted on the current scribbles,
+        the feature schema and the training rows as float16. Loading it resumes without refitting.
+        """
         print("Saving model data")
+        # Rows loaded from a bundle are memory-mapped; read them in before the file may be replaced
+        for name in ('previous_foreground', 'previous_background', 'previous_z_fore', 'previous_z_back'):
+            if isinstance(getattr(self, name), np.memmap):
+                setattr(self, name, np.array(getattr(self, name)))
         fg,bg,zf,zb = self.train_batch(foreground_array, speed=self.speed,
             use_gpu=self.use_gpu, use_two=self.use_two, mem_lock=self.mem_lock, saving=True)
-        np.savez(file_name, foreground_features=fg, background_features=bg,
-                 z_fore=zf, z_back=zb, speed=self.speed, use_gpu=self.use_gpu,
-                 use_two=self.use_two, mem_lock=self.mem_lock)
+        deep = not self.speed
+        channels = self.image_3d.shape[-1] if self._is_rgb() else 1
+        schema = segmenter_bundle.make_schema(self._get_sigmas(deep), self.structure_tensor_scales, deep, self.use_two, channels)
+        model = self.model if self._fit_version == self._training_store.version else None
+        settings = {'use_gpu': bool(self.use_gpu), 'mem_lock': bool(self.mem_lock)}
+        segmenter_bundle.save_bundle(file_name, model, schema, settings, fg, bg, zf, zb)
         print(f"Model data saved to {file_name}.")
 
+    def _adopt_loaded_rows(self, fg, bg, zf, zb, model=None):
+        """Keep loaded training rows as previous_* and use model as fitted on them, refitting if model is None."""
+        self.previous_foreground = fg; self.previous_background = bg
+        self.previous_z_fore = zf; self.previous_z_back = zb
+        self._chunk_cache.clear()
+        self._training_store.clear((bool(self.speed), bool(self.use_two)))
+        if model is None:
+            X = np.vstack([fg, bg]).astype(np.float32)
+            y = np.hstack([np.ones(len(zf)), np.zeros(len(zb))])
+            model = self._new_model()
+            try: model.fit(X, y)
+            except:
+                print(X); print(y)
+                self._fit_version = None
+                return
+        self.model = model
+        # The model matches the loaded rows plus an empty store, so new scribbles can continue boosting it
+        self._fit_version = self._training_store.version
+
     def load_model(self, file_name):
+        """Load a model bundle, or a training data .npz written by earlier versions (refit on load)."""
         print("Loading model data")
-        d = np.load(file_name)
-        self.previous_foreground = d['foreground_features']
-        self.previous_background = d['background_features']
-        self.previous_z_fore = d['z_fore']; self.previous_z_back = d['z_back']
-        self.speed = bool(d['speed']); self.use_gpu = bool(d['use_gpu'])
-        self.use_two = bool(d['use_two']); self.mem_lock = bool(d['mem_lock'])
-        X = np.vstack([self.previous_foreground, self.previous_background])
-        y = np.hstack([np.ones(len(self.previous_z_fore)), np.zeros(len(self.previous_z_back))])
-        try: self.model.fit(X, y)
-        except: print(X); print(y)
+        if not segmenter_bundle.is_bundle(file_name):
+            d = np.load(file_name)
+            self.speed = bool(d['speed']); self.use_gpu = bool(d['use_gpu'])
+            self.use_two = bool(d['use_two']); self.mem_lock = bool(d['mem_lock'])
+            self._adopt_loaded_rows(d['foreground_features'], d['background_features'], d['z_fore'], d['z_back'])
+            print("Done")
+            return
+
+        b = segmenter_bundle.load_bundle(file_name)
+        schema = b['schema']
+        channels = self.image_3d.shape[-1] if self._is_rgb() else 1
+        segmenter_bundle.validate_schema(schema, channels, b['foreground_features'].shape[1])
+        sigmas = [int(v) if float(v).is_integer() else v for v in schema['sigmas']]
+        if schema['deep']: self.sigmas_deep = sigmas
+        else: self.sigmas = sigmas
+        self.structure_tensor_scales = [int(v) if float(v).is_integer() else v for v in schema['structure_tensor_scales']]
+        if bool(schema['two_d']) != self.use_two: self.realtimechunks = None
+        self.speed = not schema['deep']; self.use_two = bool(schema['two_d'])
+        self.use_gpu = bool(b['settings'].get('use_gpu', False)); self.mem_lock = bool(b['settings'].get('mem_lock', False))
+        model = segmenter_bundle.restore_model(b['model'], schema['n_features'])
+        self._adopt_loaded_rows(b['foreground_features'], b['background_features'], b['z_fore'], b['z_back'], model)
+        print("Resumed saved model" if model is not None else "Refit model from saved training data")
         print("Done")
 
     # ================================================================
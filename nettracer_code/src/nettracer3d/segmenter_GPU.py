@@ -32,6 +32,7 @@ import multiprocessing
 from collections import defaultdict, OrderedDict
 from typing import List, Dict, Tuple, Any
 import math
+from . import segmenter_bundle
 
 
 # ============================================================
@@ -1103,28 +1104,53 @@ class InteractiveSegmenter:
     # ================================================================
 
     def save_model(self, file_name, foreground_array):
+        """Save a model bundle (see segmenter_bundle) with the training rows; it is refit from them on load."""
         print("Saving model data")
+        for name in ('previous_foreground', 'previous_background', 'previous_z_fore', 'previous_z_back'):
+            if isinstance(getattr(self, name), np.memmap):
+                setattr(self, name, np.array(getattr(self, name)))
         fg, bg, zf, zb = self.train_batch(foreground_array, speed=self.speed,
             use_gpu=self.use_gpu, use_two=self.use_two, mem_lock=self.mem_lock, saving=True)
-        np.savez(file_name, foreground_features=fg, background_features=bg,
-                 z_fore=zf, z_back=zb, speed=self.speed, use_gpu=self.use_gpu,
-                 use_two=self.use_two, mem_lock=self.mem_lock)
+        deep = not self.speed
+        channels = self.image_3d.shape[-1] if self._is_rgb() else 1
+        schema = segmenter_bundle.make_schema(self._get_sigmas(deep), self.structure_tensor_scales, deep, self.use_two, channels)
+        settings = {'use_gpu': bool(self.use_gpu), 'mem_lock': bool(self.mem_lock)}
+        segmenter_bundle.save_bundle(file_name, None, schema, settings, fg, bg, zf, zb)
         print(f"Model data saved to {file_name}.")
 
     def load_model(self, file_name):
+        """Load a model bundle, or a training data .npz written by earlier versions."""
         print("Loading model data")
-        d = np.load(file_name)
+        model = None
+        if segmenter_bundle.is_bundle(file_name):
+            d = segmenter_bundle.load_bundle(file_name)
+            schema = d['schema']
+            channels = self.image_3d.shape[-1] if self._is_rgb() else 1
+            segmenter_bundle.validate_schema(schema, channels, d['foreground_features'].shape[1])
+            sigmas = [int(v) if float(v).is_integer() else v for v in schema['sigmas']]
+            if schema['deep']: self.sigmas_deep = sigmas
+            else: self.sigmas = sigmas
+            self.structure_tensor_scales = [int(v) if float(v).is_integer() else v for v in schema['structure_tensor_scales']]
+            self.speed = not schema['deep']; self.use_two = bool(schema['two_d'])
+            self.use_gpu = bool(d['settings'].get('use_gpu', False)); self.mem_lock = bool(d['settings'].get('mem_lock', False))
+            self._chunk_cache.clear()
+            model = segmenter_bundle.restore_model(d['model'], schema['n_features'])
+        else:
+            d = np.load(file_name)
+            self.speed = bool(d['speed']); self.use_gpu = bool(d['use_gpu'])
+            self.use_two = bool(d['use_two']); self.mem_lock = bool(d['mem_lock'])
         self.previous_foreground = d['foreground_features']
         self.previous_background = d['background_features']
         self.previous_z_fore = d['z_fore']; self.previous_z_back = d['z_back']
-        self.speed = bool(d['speed']); self.use_gpu = bool(d['use_gpu'])
-        self.use_two = bool(d['use_two']); self.mem_lock = bool(d['mem_lock'])
-        X = np.vstack([self.previous_foreground, self.previous_background])
-        y = np.hstack([np.ones(len(self.previous_z_fore)), np.zeros(len(self.previous_z_back))])
-        try:
-            self.model.fit(X, y)
-        except:
-            print(X); print(y)
+        if model is not None:
+            self.model = model
+        else:
+            X = np.vstack([self.previous_foreground, self.previous_background]).astype(np.float32)
+            y = np.hstack([np.ones(len(self.previous_z_fore)), np.zeros(len(self.previous_z_back))])
+            try:
+                self.model.fit(X, y)
+            except:
+                print(X); print(y)
         print("Done")
 
     # ================================================================
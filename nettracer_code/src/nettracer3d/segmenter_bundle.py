@@ -0,0 +1,177 @@
+import json
+import os
+import struct
+import zlib
+import numpy as np
+
+
+# Model bundles for the interactive segmenters.
+# One file holds the fitted classifier (LightGBM's own text model format, zlib compressed), the feature schema the training
+# rows were computed with and the training rows themselves as float16, plus the scribble coordinates. Arrays are stored raw
+# at aligned offsets so loading memory-maps them instead of reading and decompressing everything, and the schema is checked
+# on load so rows from a different feature set are rejected up front instead of failing when they are stacked with new ones.
+# The model is plain text, so loading a bundle never unpickles anything; the pickled model of version 1 bundles is skipped
+# and refit from their training rows.
+#
+# Layout: MAGIC, uint32 version, uint64 header length, UTF-8 JSON header, then the sections the header points to.
+
+MAGIC = b'N3DSEGM\x00'
+VERSION = 2
+MODEL_FORMAT = 'lightgbm'
+EXTENSION = '.n3dseg'
+_ALIGN = 64
+_PREFIX = struct.Struct('<IQ')
+
+
+def feature_count(n_sigmas, n_st_scales, deep, two_d, channels=1):
+    """Number of features _assemble_2d/_assemble_3d produce per voxel"""
+    N = n_sigmas
+    per_channel = 1 + N + N * (N - 1) // 2 + 2 * (N + 1)
+    if deep:
+        eig = 2 if two_d else 3
+        per_channel += eig * (N + 1) + eig * (N + 1) * n_st_scales + 4 * N
+    return per_channel * channels
+
+
+def make_schema(sigmas, st_scales, deep, two_d, channels):
+    return {'sigmas': [float(s) for s in sigmas], 'structure_tensor_scales': [float(g) for g in st_scales],
+            'deep': bool(deep), 'two_d': bool(two_d), 'channels': int(channels),
+            'n_features': feature_count(len(sigmas), len(st_scales), deep, two_d, channels)}
+
+
+def validate_schema(schema, channels, n_features=None):
+    """Raise ValueError if a bundle's schema cannot be used on an image with the given number of color channels"""
+    expected = feature_count(len(schema['sigmas']), len(schema['structure_tensor_scales']),
+                             schema['deep'], schema['two_d'], schema['channels'])
+    if schema['n_features'] != expected:
+        raise ValueError(f"Model bundle is inconsistent: schema describes {expected} features but records {schema['n_features']}")
+    if n_features is not None and n_features != expected:
+        raise ValueError(f"Model bundle training rows have {n_features} features, the schema expects {expected}")
+    if schema['channels'] != channels:
+        raise ValueError(f"Model was trained on a {schema['channels']}-channel image, the current image has {channels}")
+
+
+def is_bundle(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def save_bundle(path, model, schema, settings, foreground_features, background_features, z_fore, z_back):
+    """
+    Write a model bundle. model is a fitted LightGBM model (anything with a booster_, such as an LGBMClassifier), stored
+    as booster_.model_to_string(), or None (training rows only, refit on load).
+    settings is a JSON-serializable dict of the remaining segmenter flags (use_gpu, mem_lock).
+    """
+    n_features = schema['n_features']
+    for rows in (foreground_features, background_features):
+        width = np.shape(rows)[-1] if np.ndim(rows) == 2 else None
+        if width is not None and len(rows) and width != n_features:
+            raise ValueError(f"Training rows have {width} features but the schema expects {n_features}")
+    arrays = {
+        'foreground_features': np.asarray(foreground_features, dtype=np.float16).reshape(-1, n_features),
+        'background_features': np.asarray(background_features, dtype=np.float16).reshape(-1, n_features),
+        'z_fore': np.asarray(z_fore, dtype=np.int32).reshape(-1, 3),
+        'z_back': np.asarray(z_back, dtype=np.int32).reshape(-1, 3),
+    }
+    model_bytes = zlib.compress(model.booster_.model_to_string().encode('utf-8')) if model is not None else b''
+
+    # Offsets depend on the header length, which depends on the offsets; reserve room and pad the header to it
+    sections = {}
+    header = {'version': VERSION, 'schema': schema, 'settings': settings, 'sections': sections}
+    payloads = [('model', model_bytes, None)] + [(name, arr, arr) for name, arr in arrays.items()]
+    for name, data, arr in payloads:
+        sections[name] = {'offset': 0, 'nbytes': len(data) if arr is None else arr.nbytes}
+        if arr is not None:
+            sections[name].update(dtype=arr.dtype.str, shape=list(arr.shape))
+    sections['model']['format'] = MODEL_FORMAT
+    reserve = len(json.dumps(header).encode('utf-8')) + 32 * len(sections) + _ALIGN
+    offset = -(-(len(MAGIC) + _PREFIX.size + reserve) // _ALIGN) * _ALIGN
+    for name, data, arr in payloads:
+        sections[name]['offset'] = offset
+        offset += -(-sections[name]['nbytes'] // _ALIGN) * _ALIGN
+    header_bytes = json.dumps(header).encode('utf-8').ljust(reserve)
+
+    # Written next to the target and swapped in, so memory maps of an older bundle at path stay valid
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_PREFIX.pack(VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, data, arr in payloads:
+            f.seek(sections[name]['offset'])
+            f.write(data if arr is None else np.ascontiguousarray(arr).tobytes())
+        f.truncate(offset)
+    os.replace(tmp, path)
+
+
+def load_bundle(path, mmap=True):
+    """
+    Read a model bundle. Returns a dict with 'schema', 'settings', 'model' (the LightGBM model text, see restore_model, or
+    None if the bundle has none or predates the text format) and the training arrays, memory-mapped read-only when mmap
+    is True.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a segmenter model bundle")
+        version, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+        if version > VERSION:
+            raise ValueError(f"Model bundle version {version} is newer than this version of nettracer3d supports ({VERSION})")
+        header = json.loads(f.read(header_len).decode('utf-8'))
+
+        result = {'schema': header['schema'], 'settings': header['settings'], 'model': None}
+        sections = header['sections']
+        model_info = sections['model']
+        if model_info['nbytes']:
+            if model_info.get('format') != MODEL_FORMAT:
+                # Version 1 pickled the classifier; unpickling a file can run arbitrary code, so it is never loaded
+                print("The saved classifier is in an old format that is not loaded, it will be refit from the training rows")
+            else:
+                f.seek(model_info['offset'])
+                result['model'] = zlib.decompress(f.read(model_info['nbytes'])).decode('utf-8')
+
+    for name, info in sections.items():
+        if name == 'model':
+            continue
+        shape = tuple(info['shape'])
+        if info['nbytes'] == 0:
+            result[name] = np.zeros(shape, dtype=info['dtype'])
+        elif mmap:
+            result[name] = np.memmap(path, dtype=info['dtype'], mode='r', offset=info['offset'], shape=shape)
+        else:
+            result[name] = np.fromfile(path, dtype=info['dtype'], count=int(np.prod(shape)), offset=info['offset']).reshape(shape)
+    return result
+
+
+class BoosterClassifier:
+    """
+    The parts of a fitted LGBMClassifier the segmenters use, around a Booster rebuilt from a bundle's model text:
+    predict() (0/1 labels) and booster_ (to save it again or keep boosting from it).
+    """
+
+    def __init__(self, booster):
+        self.booster_ = booster
+
+    def predict(self, X, **kwargs):
+        # As LGBMClassifier.predict for classes [0, 1]: the positive class where its probability is over 0.5
+        return (self.booster_.predict(X, **kwargs) > 0.5).astype(np.float64)
+
+
+def restore_model(model_text, n_features):
+    """
+    Classifier from the model text load_bundle returns, or None if there is none or it cannot be used (then the caller
+    refits from the training rows).
+    """
+    if model_text is None:
+        return None
+    import lightgbm as lgb
+    try:
+        booster = lgb.Booster(model_str=model_text)
+        if booster.num_feature() != n_features:
+            raise ValueError(f"it takes {booster.num_feature()} features, the schema {n_features}")
+    except Exception as e:
+        print(f"Could not restore the saved classifier ({e}), it will be refit from the training rows")
+        return None
+    return BoosterClassifier(booster)
@@ -0,0 +1,143 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+# Tile cache behind ImageViewerWindow.update_display.
+# Every Z slice of a channel is viewed as a pyramid of strided levels (one per display downsample factor), each split into
+# square tiles. Tiles are contiguous copies, so a pan, zoom or scroll only copies the visible tiles out of the cache instead of
+# striding the full resolution slice again. An LRU keeps memory bounded and a small thread pool fills in the tiles of
+# neighboring slices in the background so scrolling through a stack mostly hits the cache.
+
+
+class SlicePyramidCache:
+
+    def __init__(self, tile_size=512, max_bytes=512 * 1024 * 1024, prefetch_depth=2, workers=2):
+        """
+        Parameters:
+        -----------
+        tile_size : int
+            Edge length of a tile, in downsampled pixels
+        max_bytes : int
+            Memory budget for cached tiles. Least recently used tiles are evicted past it.
+        prefetch_depth : int
+            How many slices above and below the current one to prefetch
+        workers : int
+            Background threads used for prefetching
+        """
+        self.tile_size = tile_size
+        self.max_bytes = max_bytes
+        self.prefetch_depth = prefetch_depth
+        self._tiles = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._pending = set()
+        # Bumped by invalidate, and part of every tile key, so edited data never matches old tiles
+        self._channel_gen = {}
+        self._slice_gen = {}
+
+    def _source_key(self, channel, array, z):
+        return (channel, self._channel_gen.get(channel, 0), self._slice_gen.get((channel, z), 0),
+                id(array), array.shape, array.dtype.str)
+
+    def _build_tile(self, array, z, factor, ty, tx):
+        """Contiguous strided copy of one tile of slice z"""
+        span = self.tile_size * factor
+        y0 = ty * span
+        x0 = tx * span
+        image = array[z] if array.ndim >= 3 else array
+        return np.ascontiguousarray(image[y0:y0 + span:factor, x0:x0 + span:factor])
+
+    def _store(self, key, tile):
+        with self._lock:
+            if key in self._tiles:
+                return
+            self._tiles[key] = tile
+            self._nbytes += tile.nbytes
+            while self._nbytes > self.max_bytes and len(self._tiles) > 1:
+                _, old = self._tiles.popitem(last=False)
+                self._nbytes -= old.nbytes
+
+    def get_tile(self, channel, array, z, factor, ty, tx):
+        """Tile (ty, tx) of slice z at a downsample factor, from the cache if possible"""
+        key = (self._source_key(channel, array, z), factor, ty, tx)
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                return tile
+        tile = self._build_tile(array, z, factor, ty, tx)
+        self._store(key, tile)
+        return tile
+
+    def _tile_range(self, y0, y1, x0, x1, factor):
+        """Tile rows and columns covering a full resolution region, plus the region in downsampled pixels"""
+        ly0, lx0 = y0 // factor, x0 // factor
+        ly1, lx1 = -(-y1 // factor), -(-x1 // factor)
+        t = self.tile_size
+        return range(ly0 // t, (ly1 - 1) // t + 1), range(lx0 // t, (lx1 - 1) // t + 1), (ly0, ly1, lx0, lx1)
+
+    def get_region(self, channel, array, z, y0, y1, x0, x1, factor):
+        """
+        The region [y0:y1, x0:x1] of slice z, taking every factor-th pixel, assembled from cached tiles.
+        y0 and x0 are expected to be multiples of factor, in which case this equals image[y0:y1:factor, x0:x1:factor].
+        """
+        factor = max(1, int(factor))
+        rows, cols, (ly0, ly1, lx0, lx1) = self._tile_range(y0, y1, x0, x1, factor)
+        if ly1 <= ly0 or lx1 <= lx0:
+            image = array[z] if array.ndim >= 3 else array
+            return image[y0:y1:factor, x0:x1:factor]
+
+        t = self.tile_size
+        out = None
+        for ty in rows:
+            for tx in cols:
+                tile = self.get_tile(channel, array, z, factor, ty, tx)
+                if out is None:
+                    out = np.empty((ly1 - ly0, lx1 - lx0) + tile.shape[2:], dtype=tile.dtype)
+                # Overlap between this tile and the requested region, in downsampled pixels
+                ya, yb = max(ly0, ty * t), min(ly1, ty * t + tile.shape[0])
+                xa, xb = max(lx0, tx * t), min(lx1, tx * t + tile.shape[1])
+                if ya < yb and xa < xb:
+                    out[ya - ly0:yb - ly0, xa - lx0:xb - lx0] = tile[ya - ty * t:yb - ty * t, xa - tx * t:xb - tx * t]
+        return out
+
+    def _fill(self, channel, array, z, factor, tiles):
+        try:
+            for ty, tx in tiles:
+                self.get_tile(channel, array, z, factor, ty, tx)
+        finally:
+            with self._lock:
+                self._pending.discard((id(array), z, factor))
+
+    def prefetch(self, channel, array, z, y0, y1, x0, x1, factor):
+        """Queue the same region of the neighboring slices for background caching"""
+        if array.ndim < 3 or self.prefetch_depth < 1:
+            return
+        factor = max(1, int(factor))
+        rows, cols, _ = self._tile_range(y0, y1, x0, x1, factor)
+        tiles = [(ty, tx) for ty in rows for tx in cols]
+        # Nearest slices first, alternating above and below
+        for offset in range(1, self.prefetch_depth + 1):
+            for nz in (z + offset, z - offset):
+                if not 0 <= nz < array.shape[0]:
+                    continue
+                job = (id(array), nz, factor)
+                with self._lock:
+                    if job in self._pending:
+                        continue
+                    self._pending.add(job)
+                self._executor.submit(self._fill, channel, array, nz, factor, tiles)
+
+    def invalidate(self, channel=None, z=None):
+        """Mark cached tiles stale after the data changed: one slice, one channel, or everything"""
+        with self._lock:
+            if channel is None:
+                self._tiles.clear()
+                self._nbytes = 0
+            elif z is None:
+                self._channel_gen[channel] = self._channel_gen.get(channel, 0) + 1
+            else:
+                self._slice_gen[(channel, z)] = self._slice_gen.get((channel, z), 0) + 1
@@ -472,14 +472,14 @@ def smart_label(binary_array, label_array, directory = None, GPU = True, predown
                         binary_core = binarize(small_array)
                         nearest_label_indices = compute_distance_transform_GPU(invert_array(binary_core))
                         print(f"Using {down_factor} downsample ({downsample_needed} in each dim)")
-                        del small_array  # Don't need small_array anymore
                         break
                     except cp.cuda.memory.OutOfMemoryError:
                         del small_array, binary_core  # Clean up before retry
                         down_factor += 1
                 
-                # Update label_array for later use
-                label_array = nettracer.downsample(label_array, downsample_needed)
+                # Update label_array for later use (the downsample that fit, rather than computing it again)
+                label_array = small_array
+                del small_array
                 binary_small = nettracer.downsample(binary_array, downsample_needed)
                 binary_small = nettracer.dilate_3D_old(binary_small)
                 ring_mask = binary_small & invert_array(binary_core)
@@ -0,0 +1,184 @@
+import numpy as np
+import numba
+import cv2
+from numba import njit, prange
+
+
+# Text overlays (node/edge IDs, degrees) drawn into uint8 volumes.
+# cv2.putText per label and per plane is slow for many labels, so every character is rasterized once into a glyph atlas
+# (same font, scale and anti-aliasing as the per-label putText calls it replaces), kept as the list of its nonzero pixels
+# since glyphs are mostly empty, and labels become lists of glyph stamps:
+# the texts are laid out at once as fixed-width character arrays, each character's pen position being the running sum of
+# the advances before it. The stamps are sorted by plane and blitted in parallel, each thread over its own planes, so the
+# overlay can be written straight into an existing (and possibly memmapped or downsampled) buffer. Overlapping glyphs keep
+# the brighter pixel.
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def _n_chunks(n):
+    return max(1, min(4 * numba.get_num_threads(), n))
+
+
+class GlyphAtlas:
+    """
+    Characters rasterized once with cv2.putText, each into a cell of the same size with the text origin (the left end of
+    the baseline, as putText's org) at cell position (origin_y, origin_x). The nonzero pixels of glyph g are
+    pixel_y/pixel_x/pixel_value[start[g]:start[g + 1]], in cell coordinates.
+    """
+
+    def __init__(self, font_scale=0.4, thickness=1):
+        self.font_scale = font_scale
+        self.thickness = thickness
+        (_, height), baseline = cv2.getTextSize('0', FONT, font_scale, thickness)
+        # Generous margins: some glyphs reach past the digit box (descenders, anti-aliasing, thick strokes)
+        margin = 2 + thickness
+        self.origin_y = height + margin
+        self.origin_x = margin
+        self._cell_h = height + baseline + 2 * margin + thickness
+        self._cell_w = cv2.getTextSize('W', FONT, font_scale, thickness)[0][0] + 2 * margin
+        self._index = {}
+        self._advances = []
+        self._cells = []
+        self._pack()
+
+    def _add(self, char):
+        cell = np.zeros((self._cell_h, self._cell_w), dtype=np.uint8)
+        cv2.putText(cell, char, (self.origin_x, self.origin_y), FONT, self.font_scale, 255, self.thickness, cv2.LINE_AA)
+        # getTextSize adds the thickness to the summed advances; ten copies give the advance to a tenth of a pixel
+        width = cv2.getTextSize(char * 10, FONT, self.font_scale, self.thickness)[0][0]
+        self._index[char] = len(self._cells)
+        self._cells.append(cell)
+        self._advances.append((width - self.thickness) / 10)
+
+    def _pack(self):
+        cells = np.stack(self._cells) if self._cells else np.zeros((0, self._cell_h, self._cell_w), dtype=np.uint8)
+        g, self.pixel_y, self.pixel_x = (a.astype(np.int64) for a in np.nonzero(cells))
+        self.pixel_value = cells[g, self.pixel_y, self.pixel_x]
+        self.start = np.searchsorted(g, np.arange(len(self._cells) + 1)).astype(np.int64)
+        self.advances = np.asarray(self._advances, dtype=np.float64)
+
+    def glyph_ids(self, codes):
+        """Atlas indices of an array of unicode code points (0 meaning no character, mapped to -1), adding new characters"""
+        present = np.unique(codes[codes != 0])
+        missing = [chr(c) for c in present.tolist() if chr(c) not in self._index]
+        if missing:
+            for char in missing:
+                self._add(char)
+            self._pack()
+        lookup = np.full(int(present.max()) + 1 if len(present) else 1, -1, dtype=np.int64)
+        for c in present.tolist():
+            lookup[c] = self._index[chr(c)]
+        return np.where(codes != 0, lookup[codes], -1)
+
+    def layout(self, texts):
+        """
+        Glyph index and pen x offset of every character of every text.
+
+        Parameters:
+        -----------
+        texts : sequence
+            Labels; anything that is not a string is converted with str()
+
+        Returns:
+        --------
+        tuple
+            (glyphs, offsets), both (n_texts, max_length) int64; glyphs is -1 past the end of a text
+        """
+        strings = np.asarray([t if isinstance(t, str) else str(t) for t in texts], dtype=str)
+        if strings.size == 0:
+            return np.zeros((0, 0), dtype=np.int64), np.zeros((0, 0), dtype=np.int64)
+        codes = strings.reshape(-1, 1).view(np.uint32).astype(np.int64)
+        glyphs = self.glyph_ids(codes)
+        advances = np.where(glyphs >= 0, self.advances[np.maximum(glyphs, 0)] if len(self.advances) else 0.0, 0.0)
+        pen = np.cumsum(advances, axis=1) - advances
+        return glyphs, np.round(pen).astype(np.int64)
+
+
+_ATLASES = {}
+
+
+def get_atlas(font_scale=0.4, thickness=1):
+    """Shared GlyphAtlas for a font scale and thickness"""
+    key = (float(font_scale), int(thickness))
+    if key not in _ATLASES:
+        _ATLASES[key] = GlyphAtlas(font_scale, thickness)
+    return _ATLASES[key]
+
+
+@njit(cache=True, parallel=True)
+def _blit(out, start, pixel_y, pixel_x, pixel_value, z, y, x, glyph, plane_start, planes, n_chunks):
+    """Max-blend the pixels of glyph[i] into out[z[i]], its cell's top left corner at (y[i], x[i]); stamps sorted by z"""
+    height, width = out.shape[1], out.shape[2]
+    n_planes = planes.shape[0]
+    for chunk in prange(n_chunks):
+        for p in range((n_planes * chunk) // n_chunks, (n_planes * (chunk + 1)) // n_chunks):
+            plane = planes[p]
+            for i in range(plane_start[p], plane_start[p + 1]):
+                g = glyph[i]
+                for k in range(start[g], start[g + 1]):
+                    py = y[i] + pixel_y[k]
+                    px = x[i] + pixel_x[k]
+                    if 0 <= py < height and 0 <= px < width and pixel_value[k] > out[plane, py, px]:
+                        out[plane, py, px] = pixel_value[k]
+
+
+def render_labels(shape, positions, texts, out=None, z_offsets=(0, 1, -1), down_factor=None, font_scale=0.4, thickness=1):
+    """
+    Draw text labels into a uint8 volume, replacing one cv2.putText call per label and plane.
+
+    Parameters:
+    -----------
+    shape : tuple
+        Shape of the volume (2D or 3D), used when out is None
+    positions : ndarray or sequence
+        (N, 3) (z, y, x) text origins, the left end of each label's baseline (as putText's org)
+    texts : sequence
+        N labels, numbers or strings
+    out : ndarray, optional
+        uint8 volume to draw into, such as an existing overlay; labels are max-blended over its content
+    z_offsets : tuple
+        Planes, relative to each label's z, that it is drawn on
+    down_factor : float, optional
+        Positions are in full resolution coordinates and the volume is downsampled by this factor
+    font_scale : float
+        cv2 font scale
+    thickness : int
+        Stroke thickness
+
+    Returns:
+    --------
+    ndarray
+        The uint8 overlay (out itself when given)
+    """
+    if out is None:
+        out = np.zeros(shape, dtype=np.uint8)
+    volume = out[np.newaxis] if out.ndim == 2 else out
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    if down_factor is not None:
+        positions = np.round(positions / down_factor)
+    positions = positions.astype(np.int64)
+    if len(positions) == 0:
+        return out
+
+    atlas = get_atlas(font_scale, thickness)
+    glyphs, pen = atlas.layout(texts)
+    rows, cols = np.nonzero(glyphs >= 0)
+    glyph = glyphs[rows, cols]
+    top = positions[rows, 1] - atlas.origin_y
+    left = positions[rows, 2] + pen[rows, cols] - atlas.origin_x
+
+    offsets = np.asarray(z_offsets, dtype=np.int64)
+    z = (positions[rows, 0][np.newaxis] + offsets[:, np.newaxis]).reshape(-1)
+    repeat = len(offsets)
+    glyph, top, left = np.tile(glyph, repeat), np.tile(top, repeat), np.tile(left, repeat)
+    keep = (z >= 0) & (z < volume.shape[0])
+    z, glyph, top, left = z[keep], glyph[keep], top[keep], left[keep]
+
+    order = np.argsort(z, kind='stable')
+    z, glyph, top, left = z[order], glyph[order], top[order], left[order]
+    planes, plane_start = np.unique(z, return_index=True)
+    plane_start = np.append(plane_start, len(z)).astype(np.int64)
+    _blit(volume, atlas.start, atlas.pixel_y, atlas.pixel_x, atlas.pixel_value, z, top, left, glyph, plane_start, planes,
+          _n_chunks(len(planes)))
+    return out
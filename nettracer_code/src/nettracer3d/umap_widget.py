@@ -3,8 +3,8 @@ from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QMe
                               QSizePolicy, QApplication, QScrollArea, QLabel, QFrame,
                               QFileDialog, QMessageBox, QMainWindow, QDialog, QFormLayout,
                               QGroupBox, QComboBox, QLineEdit, QCheckBox, QSplitter)
-from PyQt6.QtCore import Qt, pyqtSignal, pyqtSlot, QTimer, QPointF, QRectF
-from PyQt6.QtGui import QColor, QPen, QBrush, QPainterPath, QPolygonF, QCloseEvent
+from PyQt6.QtCore import Qt, pyqtSignal, pyqtSlot, QTimer, QRectF
+from PyQt6.QtGui import QColor, QPen, QBrush, QCloseEvent
 import pyqtgraph as pg
 from pyqtgraph import ScatterPlotItem, PlotCurveItem, GraphicsLayoutWidget
 import colorsys
@@ -14,6 +14,9 @@ import json
 import math
 import pickle
 from . import nettracer_gui as netg
+from . import embedding as embedding_lib
+from . import scatter_lod
+from . import point_select
 
 import os
 os.environ['LOKY_MAX_CPU_COUNT'] = '4'
@@ -76,8 +79,7 @@ class UMAPGraphWidget(QWidget):
         self.node_ids = []              # ordered list of node IDs matching embedding rows
         self.embedding = None           # np.ndarray (N, 2)
         self.node_positions = {}        # {node_id: np.array([x, y])}
-        self.node_colors = []           # hex colours parallel to node_ids
-        self._node_alphas = []          # alpha values parallel to node_ids
+        self._rgba = None               # Nx4 uint8 base colours parallel to node_ids
         self.selected_nodes = set()
         self.rendered = False
 
@@ -88,11 +90,17 @@ class UMAPGraphWidget(QWidget):
         # --- fast array-based rendering (avoids spot-dict rebuild) ---
         self._pos_array = None          # Nx2 float64 positions
         self._size_array = None         # N float64 current sizes
-        self._brush_list = None         # list of N QBrush (base colours for base scatter)
-        self._normal_brush_list = None  # list of N QBrush (base colours, no selection)
-        self._data_list = None          # list of N node_id values
+        self._brush_list = None         # object array of N QBrush, one QBrush per distinct colour
+        self._normal_brush_list = None  # same as _brush_list (base colours, no selection)
+        self._data_list = None          # object array of N node_id values
         self._base_point_size = 10.0    # scalar base size (same for all nodes)
 
+        # --- level of detail for large embeddings ---
+        self._lod = None                # scatter_lod.ScatterLOD over the embedding
+        self._grid = None               # point_select.PointGrid over the embedding (lasso hit-testing)
+        self._lod_mode = 'all'          # what the base layer shows: 'all', 'points' or 'density'
+        self._shown_idx = None          # indices in the base scatter while in 'points' mode
+
         # Single shared brush for selected nodes – avoids N allocations
         self._selected_brush = pg.mkBrush(255, 255, 0, 255)
         self._highlight_size_boost = 3.0  # extra px added to highlighted nodes
@@ -184,8 +192,15 @@ class UMAPGraphWidget(QWidget):
         self.plot.addItem(self.highlight_scatter)
         self.highlight_scatter.sigClicked.connect(self._on_highlight_node_clicked)
 
+        # density image – stands in for the base scatter when too many nodes are in view
+        self.density_item = pg.ImageItem(axisOrder='row-major')
+        self.density_item.setZValue(9)
+        self.density_item.hide()
+        self.plot.addItem(self.density_item)
+
         self.plot.scene().sigMouseClicked.connect(self._on_plot_clicked)
         self.plot.sigRangeChanged.connect(self._on_view_changed)
+        self.plot.vb.sigResized.connect(self._on_view_resized)
 
         self.base_node_sizes = []
 
@@ -506,12 +521,13 @@ class UMAPGraphWidget(QWidget):
 
     def _get_saveable_state(self):
         """Extract all picklable graph state (no Qt objects)."""
+        node_colors, node_alphas = scatter_lod.rgba_to_hex(self._rgba)
         return {
             'format': 'umap_pickle_v1',
             'node_ids': list(self.node_ids),
             'embedding': self.embedding.copy(),
-            'node_colors': list(self.node_colors),
-            '_node_alphas': list(self._node_alphas),
+            'node_colors': node_colors,
+            '_node_alphas': node_alphas,
             'color_mode': self.color_mode,
             'community_dict': dict(self.community_dict),
             'identity_dict': dict(self.identity_dict),
@@ -598,8 +614,7 @@ class UMAPGraphWidget(QWidget):
         self.embedding = np.array(state['embedding'], dtype=np.float64)
         self.node_positions = {nid: self.embedding[i]
                                for i, nid in enumerate(self.node_ids)}
-        self.node_colors = list(state['node_colors'])
-        self._node_alphas = list(state['_node_alphas'])
+        rgba = scatter_lod.hex_to_rgba(state['node_colors'], state['_node_alphas'])
         self.color_mode = state['color_mode']
         self.community_dict = state.get('community_dict', {})
         self.identity_dict = state.get('identity_dict', {})
@@ -617,33 +632,15 @@ class UMAPGraphWidget(QWidget):
         n = len(self.node_ids)
         point_size = self._base_point_size
 
-        # --- reconstruct brushes from hex + alpha ---
-        normal_brushes = []
-        for i in range(n):
-            hx = self.node_colors[i].lstrip('#')
-            r, g, b = (int(hx[j:j+2], 16) for j in (0, 2, 4))
-            normal_brushes.append(pg.mkBrush(r, g, b, int(self._node_alphas[i])))
-
-        # --- parallel arrays ---
-        self._pos_array = self.embedding.copy()
-        self._size_array = np.full(n, point_size, dtype=np.float64)
-        self._normal_brush_list = normal_brushes
-        self._brush_list = list(normal_brushes)
-        self._data_list = list(self.node_ids)
-
-        self.cached_node_to_index = {nid: i for i, nid in enumerate(self.node_ids)}
+        # --- parallel arrays (brushes rebuilt from the saved hex + alpha) ---
+        self._set_point_arrays(point_size)
+        self._set_colors(rgba)
 
         # --- clear highlight overlay (selection re‑applied at end) ---
         self.highlight_scatter.clear()
 
         # --- push to base scatter ---
-        self.scatter.setData(
-            pos=self._pos_array,
-            size=self._size_array,
-            brush=self._brush_list,
-            data=self._data_list,
-            pen=None,
-        )
+        self._flush_brushes()
         self.scatter.setZValue(10)
 
         # --- labels ---
@@ -707,10 +704,9 @@ class UMAPGraphWidget(QWidget):
         color_mode : str, optional
             'community', 'identity', 'colorless', or 'heatmap'.
         umap_kwargs : dict, optional
-            Extra kwargs forwarded to umap.UMAP (e.g. n_neighbors, min_dist).
+            Extra kwargs forwarded to umap.UMAP (e.g. n_neighbors, min_dist), plus
+            pca_components to project wide vectors before embedding.
         """
-        import umap as umap_lib  # heavy import deferred
-
         if community_dict is not None:
             self.community_dict = community_dict
         if identity_dict is not None:
@@ -736,15 +732,13 @@ class UMAPGraphWidget(QWidget):
         QApplication.processEvents()
 
         # --- compute embedding (in main thread – intentional) ---
-        node_ids = list(cluster_data.keys())
-        compositions = np.array([cluster_data[nid] for nid in node_ids])
+        node_ids, compositions = embedding_lib.feature_matrix(cluster_data)
 
         kw = dict(n_components=2, random_state=42)
         if umap_kwargs:
             kw.update(umap_kwargs)
 
-        reducer = umap_lib.UMAP(**kw)
-        embedding = reducer.fit_transform(compositions)
+        embedding = embedding_lib.umap_embedding(compositions, **kw)
 
         self._apply_embedding(node_ids, embedding)
 
@@ -779,60 +773,16 @@ class UMAPGraphWidget(QWidget):
 
         self._base_point_size = float(point_size)
 
-        # --- colours ---
-        if self.color_mode == 'heatmap' and self.heatmap_dict:
-            normal_brushes, colors_hex, alphas, _hm_min, _hm_max = \
-                self._compute_heatmap_brushes(self.node_ids)
-            active_dict = {}
-            color_map = {}
-        else:
-            active_dict = self._active_color_dict()
-            color_map = self._generate_community_colors(active_dict)
-
-            colors_hex = []
-            alphas = []
-            normal_brushes = []
-
-            for nid in self.node_ids:
-                if self.color_mode == 'colorless':
-                    hex_c, alpha = '#4A90E2', 200
-                else:
-                    label = active_dict.get(nid, None)
-                    if label is None:
-                        hex_c, alpha = '#808080', 100
-                    else:
-                        hex_c = color_map.get(label, '#808080')
-                        alpha = 100 if hex_c == '#808080' else 200
-
-                colors_hex.append(hex_c)
-                alphas.append(alpha)
-                hx = hex_c.lstrip('#')
-                r, g, b = (int(hx[j:j+2], 16) for j in (0, 2, 4))
-                normal_brushes.append(pg.mkBrush(r, g, b, alpha))
-
-        self.node_colors = colors_hex
-        self._node_alphas = list(alphas)
-
-        # --- parallel arrays (fast path) ---
-        self._pos_array = self.embedding.copy()
-        self._size_array = np.full(n, point_size, dtype=np.float64)
-        self._normal_brush_list = normal_brushes          # immutable base colours
-        self._brush_list = list(normal_brushes)            # base layer only (no selection)
-        self._data_list = list(self.node_ids)
-
-        self.cached_node_to_index = {nid: i for i, nid in enumerate(self.node_ids)}
+        # --- colours + parallel arrays (fast path) ---
+        rgba, active_dict, color_map = self._compute_colors()
+        self._set_point_arrays(point_size)
+        self._set_colors(rgba)
 
         # --- clear highlight overlay (selection re‑applied at end) ---
         self.highlight_scatter.clear()
 
         # --- render base scatter (array path — much faster than spots dicts) ---
-        self.scatter.setData(
-            pos=self._pos_array,
-            size=self._size_array,
-            brush=self._brush_list,
-            data=self._data_list,
-            pen=None,
-        )
+        self._flush_brushes()
         self.scatter.setZValue(10)
 
         # --- labels ---
@@ -876,40 +826,8 @@ class UMAPGraphWidget(QWidget):
         if not self.rendered or len(self.node_ids) == 0:
             return
 
-        if self.color_mode == 'heatmap' and self.heatmap_dict:
-            normal_brushes, colors_hex, alphas, _, _ = \
-                self._compute_heatmap_brushes(self.node_ids)
-            active_dict = {}
-            color_map = {}
-        else:
-            active_dict = self._active_color_dict()
-            color_map = self._generate_community_colors(active_dict)
-
-            colors_hex = []
-            alphas = []
-            normal_brushes = []
-
-            for nid in self.node_ids:
-                if self.color_mode == 'colorless':
-                    hex_c, alpha = '#4A90E2', 200
-                else:
-                    label = active_dict.get(nid, None)
-                    if label is None:
-                        hex_c, alpha = '#808080', 100
-                    else:
-                        hex_c = color_map.get(label, '#808080')
-                        alpha = 100 if hex_c == '#808080' else 200
-
-                colors_hex.append(hex_c)
-                alphas.append(alpha)
-                hx = hex_c.lstrip('#')
-                r, g, b = (int(hx[j:j+2], 16) for j in (0, 2, 4))
-                normal_brushes.append(pg.mkBrush(r, g, b, alpha))
-
-        self.node_colors = colors_hex
-        self._node_alphas = list(alphas)
-        self._normal_brush_list = normal_brushes
-        self._brush_list = list(normal_brushes)  # base layer = normal colours only
+        rgba, active_dict, color_map = self._compute_colors()
+        self._set_colors(rgba)
 
         # Push to base scatter (no selection state — that lives in highlight_scatter)
         self._flush_brushes()
@@ -928,6 +846,23 @@ class UMAPGraphWidget(QWidget):
             return self.identity_dict
         return self.community_dict
 
+    def _compute_colors(self):
+        """Base RGBA of every node for the current colour mode.
+
+        Returns (rgba, active_dict, color_map); the last two drive the legend.
+        """
+        if self.color_mode == 'heatmap' and self.heatmap_dict:
+            rgba, _hm_min, _hm_max = self._compute_heatmap_colors(self.node_ids)
+            return rgba, {}, {}
+
+        active_dict = self._active_color_dict()
+        color_map = self._generate_community_colors(active_dict)
+        if self.color_mode == 'colorless':
+            rgba = scatter_lod.uniform_rgba(len(self.node_ids), (0x4A, 0x90, 0xE2, 200))
+        else:
+            rgba = scatter_lod.label_rgba(self.node_ids, active_dict, color_map)
+        return rgba, active_dict, color_map
+
     def _heatmap_color_for_value(self, value, vmin, vmax, vcenter=None):
         """
         Map *value* to a blue → white → red hex colour.
@@ -967,89 +902,17 @@ class UMAPGraphWidget(QWidget):
 
         return '#{:02x}{:02x}{:02x}'.format(r, g, b), alpha
 
-    def _compute_heatmap_brushes(self, node_ids):
+    def _compute_heatmap_colors(self, node_ids):
         """
-        Vectorised heatmap brush computation.
-        Returns (brush_list, hex_list, alpha_list) parallel to *node_ids*.
+        Vectorised heatmap colours.
+        Returns (rgba, vmin, vmax) with rgba an Nx4 uint8 array parallel to *node_ids*.
         """
-        n = len(node_ids)
         hm = self.heatmap_dict
-
-        # Gather values; mark missing nodes with NaN
-        vals = np.empty(n, dtype=np.float64)
-        missing_mask = np.empty(n, dtype=np.bool_)
-        for i, nid in enumerate(node_ids):
-            v = hm.get(nid)
-            if v is None:
-                vals[i] = 0.0
-                missing_mask[i] = True
-            else:
-                vals[i] = v
-                missing_mask[i] = False
-
-        present = ~missing_mask
-        vmin = vals[present].min() if present.any() else 0.0
-        vmax = vals[present].max() if present.any() else 0.0
+        vals = np.fromiter((hm.get(nid, np.nan) for nid in node_ids), dtype=np.float64, count=len(node_ids))
+        present = ~np.isnan(vals)
+        vals[~present] = 0.0
         # Use the caller-supplied centre-point; fall back to midpoint
-        if self.heatmap_center is not None:
-            vcenter = float(self.heatmap_center)
-        else:
-            vcenter = (vmin + vmax) / 2.0
-
-        # Centre-point normalisation: vcenter → 0.5, min → 0, max → 1
-        t = np.full(n, 0.5)
-        if present.any():
-            below = present & (vals <= vcenter)
-            above = present & (vals > vcenter)
-            lo_rng = vcenter - vmin
-            hi_rng = vmax - vcenter
-            if lo_rng > 0:
-                t[below] = 0.5 * (vals[below] - vmin) / lo_rng
-            # else: already 0.5
-            if hi_rng > 0:
-                t[above] = 0.5 + 0.5 * (vals[above] - vcenter) / hi_rng
-            # else: already 0.5
-        np.clip(t, 0.0, 1.0, out=t)
-
-        # --- vectorised RGB ---
-        r = np.empty(n, dtype=np.int32)
-        g = np.empty(n, dtype=np.int32)
-        b = np.empty(n, dtype=np.int32)
-
-        lo = t <= 0.5
-        hi = ~lo
-
-        # Blue → White  (t 0→0.5)
-        s_lo = t[lo] / 0.5
-        r[lo] = (s_lo * 255).astype(np.int32)
-        g[lo] = (s_lo * 255).astype(np.int32)
-        b[lo] = 255
-
-        # White → Red  (t 0.5→1)
-        s_hi = (t[hi] - 0.5) / 0.5
-        r[hi] = 255
-        g[hi] = ((1 - s_hi) * 255).astype(np.int32)
-        b[hi] = ((1 - s_hi) * 255).astype(np.int32)
-
-        # Alpha: 0.3 → 0.7 scaling with intensity (distance from midpoint)
-        intensity = np.abs(2.0 * t - 1.0)
-        alpha = ((0.3 + 0.4 * intensity) * 255).astype(np.int32)
-
-        # Override missing nodes → grey
-        r[missing_mask] = 128
-        g[missing_mask] = 128
-        b[missing_mask] = 128
-        alpha[missing_mask] = 100
-
-        # Build QBrush list
-        brushes = [None] * n
-        hex_list = [None] * n
-        alpha_list = alpha.tolist()
-        for i in range(n):
-            brushes[i] = pg.mkBrush(int(r[i]), int(g[i]), int(b[i]), int(alpha[i]))
-            hex_list[i] = '#{:02x}{:02x}{:02x}'.format(int(r[i]), int(g[i]), int(b[i]))
-
-        return brushes, hex_list, alpha_list, vmin, vmax
+        return scatter_lod.heatmap_rgba(vals, present, self.heatmap_center)
 
     def _generate_community_colors(self, my_dict):
         """
@@ -1300,20 +1163,63 @@ class UMAPGraphWidget(QWidget):
         self.push_selection()
 
     # ------------------------------------------------------- render helpers -----
+    def _set_point_arrays(self, point_size):
+        """Positions, sizes, ids and spatial indexes for the current embedding."""
+        n = len(self.node_ids)
+        self._pos_array = self.embedding.copy()
+        self._size_array = np.full(n, point_size, dtype=np.float64)
+        self._data_list = np.empty(n, dtype=object)
+        self._data_list[:] = self.node_ids
+        self.cached_node_to_index = {nid: i for i, nid in enumerate(self.node_ids)}
+        self._lod = scatter_lod.ScatterLOD(self._pos_array)
+        self._grid = point_select.PointGrid(self._pos_array)
+
+    def _set_colors(self, rgba):
+        """Adopt new base colours: one QBrush per distinct colour, shared by fancy indexing."""
+        self._rgba = rgba
+        self._normal_brush_list = scatter_lod.brushes(rgba, pg.mkBrush)
+        self._brush_list = self._normal_brush_list  # base layer only (no selection)
+
     def _flush_brushes(self):
-        """Push current _brush_list to the scatter.
+        """Push current _brush_list to the scatter, or redraw the density image.
         Uses array-based setData which is fast and reliably redraws brushes.
         (In-place recarray mutation works for numeric fields like size but
         does *not* invalidate pyqtgraph's cached symbol pixmaps for brush
-        changes, so we must go through setData here.)"""
-        if self._pos_array is not None:
-            self.scatter.setData(
-                pos=self._pos_array,
-                size=self._size_array,
-                brush=self._brush_list,
-                data=self._data_list,
-                pen=None,
-            )
+        changes, so we must go through setData here.)
+
+        Large embeddings only get the nodes inside the view, or a binned
+        density image when even that would be too many sprites."""
+        if self._pos_array is None:
+            return
+
+        mode, payload = 'all', None
+        if self._lod is not None and self._lod.active:
+            (x0, x1), (y0, y1) = self.plot.viewRange()
+            rect = self.plot.vb.sceneBoundingRect()
+            point_size = float(self._size_array[0]) if len(self._size_array) else 0.0
+            mode, payload = self._lod.plan((x0, x1), (y0, y1), (rect.width(), rect.height()),
+                                           self._rgba, point_size)
+        self._lod_mode = mode
+
+        if mode == 'density':
+            image, (x, y, w, h) = payload
+            self.scatter.clear()
+            self._shown_idx = None
+            self.density_item.setImage(image, autoLevels=False, levels=(0, 255))
+            self.density_item.setRect(QRectF(x, y, w, h))
+            self.density_item.show()
+            return
+
+        self.density_item.hide()
+        idx = payload if mode == 'points' else slice(None)
+        self._shown_idx = payload
+        self.scatter.setData(
+            pos=self._pos_array[idx],
+            size=self._size_array[idx],
+            brush=self._brush_list[idx],
+            data=self._data_list[idx],
+            pen=None,
+        )
 
     def _render_nodes(self):
         """Update the lightweight highlight overlay scatter.
@@ -1388,9 +1294,17 @@ class UMAPGraphWidget(QWidget):
                 # Debounce LOD: schedule update, coalescing rapid zoom events
                 self._schedule_lod_update()
             else:
+                if self._lod is not None and self._lod.active:
+                    # Panning changes which nodes are in view
+                    self._schedule_lod_update()
                 if self.labels:
                     self._update_labels_for_zoom()
 
+    def _on_view_resized(self):
+        # The density image is binned to screen pixels
+        if self._lod is not None and self._lod.active:
+            self._schedule_lod_update()
+
     def _schedule_lod_update(self):
         """Debounce LOD updates — coalesce rapid zoom events into one render."""
         if self._lod_timer is None:
@@ -1424,39 +1338,30 @@ class UMAPGraphWidget(QWidget):
 
         new_size = self._base_point_size * scale_factor
 
-        # --- fast path: modify pyqtgraph's internal data in‑place ---
-        # This bypasses the full setData() → generateSpots() pipeline.
-        # ScatterPlotItem stores point data in self.data (numpy recarray).
-        try:
-            if (self.scatter.data is not None
-                    and len(self.scatter.data) == len(self._size_array)):
-                self._size_array[:] = new_size
-                self.scatter.data['size'] = new_size
-                # Regenerate the cached spot fragments for the new sizes
-                self.scatter.updateSpots()
-                self.scatter.prepareGeometryChange()
-                self.scatter.bounds = [None, None]
-                self.scatter.update()
-            else:
-                # Fallback: full array‑based setData (still faster than spot dicts)
-                self._size_array[:] = new_size
-                self.scatter.setData(
-                    pos=self._pos_array,
-                    size=self._size_array,
-                    brush=self._brush_list,
-                    data=self._data_list,
-                    pen=None,
-                )
-        except (AttributeError, TypeError):
-            # Ultimate fallback for unexpected pyqtgraph internals
-            self._size_array[:] = new_size
-            self.scatter.setData(
-                pos=self._pos_array,
-                size=self._size_array,
-                brush=self._brush_list,
-                data=self._data_list,
-                pen=None,
-            )
+        self._size_array[:] = new_size
+
+        if self._lod is not None and self._lod.active:
+            # What gets drawn (visible nodes or a density image) depends on the view
+            self._flush_brushes()
+        else:
+            # --- fast path: modify pyqtgraph's internal data in‑place ---
+            # This bypasses the full setData() → generateSpots() pipeline.
+            # ScatterPlotItem stores point data in self.data (numpy recarray).
+            try:
+                if (self.scatter.data is not None
+                        and len(self.scatter.data) == len(self._size_array)):
+                    self.scatter.data['size'] = new_size
+                    # Regenerate the cached spot fragments for the new sizes
+                    self.scatter.updateSpots()
+                    self.scatter.prepareGeometryChange()
+                    self.scatter.bounds = [None, None]
+                    self.scatter.update()
+                else:
+                    # Fallback: full array‑based setData (still faster than spot dicts)
+                    self._flush_brushes()
+            except (AttributeError, TypeError):
+                # Ultimate fallback for unexpected pyqtgraph internals
+                self._flush_brushes()
 
         # Keep highlight overlay in sync with new LOD size
         if self.selected_nodes:
@@ -1580,12 +1485,17 @@ class UMAPGraphWidget(QWidget):
         self.plot.setXRange(x_min - padding * xr, x_max + padding * xr, padding=0)
         self.plot.setYRange(y_min - padding * yr, y_max + padding * yr, padding=0)
 
+        # Large plots are drawn per view, so redraw for the new range
+        if self._lod is not None and self._lod.active:
+            self._flush_brushes()
+
     def _clear_plot(self):
         """Clear all rendered items (keeps widget alive)."""
         self._remove_loading_text()
 
         self.scatter.clear()
         self.highlight_scatter.clear()
+        self.density_item.hide()
 
         for li in list(self.label_items.values()):
             try:
@@ -1631,6 +1541,11 @@ class UMAPGraphWidget(QWidget):
         self._brush_list = None
         self._normal_brush_list = None
         self._data_list = None
+        self._rgba = None
+        self._lod = None
+        self._grid = None
+        self._lod_mode = 'all'
+        self._shown_idx = None
 
         # Stop LOD timer
         if self._lod_timer is not None and self._lod_timer.isActive():
@@ -1745,33 +1660,6 @@ class UMAPGraphWidget(QWidget):
         ys = [p.y() for p in self.lasso_points]
         self.lasso_path_item.setData(x=np.array(xs), y=np.array(ys))
 
-    @staticmethod
-    def _segments_intersect(p1, p2, p3, p4):
-        """
-        Test if line segment (p1→p2) intersects (p3→p4).
-        Returns (True, t) where t is the parameter along p3→p4 at the
-        intersection, or (False, 0) if no intersection.
-        Each point is (x, y).
-        """
-        dx1 = p2[0] - p1[0]
-        dy1 = p2[1] - p1[1]
-        dx2 = p4[0] - p3[0]
-        dy2 = p4[1] - p3[1]
-
-        denom = dx1 * dy2 - dy1 * dx2
-        if abs(denom) < 1e-12:
-            return False, 0  # parallel
-
-        dx3 = p3[0] - p1[0]
-        dy3 = p3[1] - p1[1]
-
-        t = (dx3 * dy2 - dy3 * dx2) / denom
-        u = (dx3 * dy1 - dy3 * dx1) / denom
-
-        if 0.0 <= t <= 1.0 and 0.0 <= u <= 1.0:
-            return True, u
-        return False, 0
-
     def _find_segment_crossing(self):
         """
         Check if the newest lasso segment (points[-2] → points[-1]) crosses
@@ -1781,31 +1669,11 @@ class UMAPGraphWidget(QWidget):
         Returns the index of the earlier segment's START point where the
         crossing was found, or -1 if none.
         """
-        n = len(self.lasso_points)
-        if n < 6:
+        if len(self.lasso_points) < 6:
             return -1
-
-        # The new segment: second-to-last → last point
-        a = self.lasso_points[-2]
-        b = self.lasso_points[-1]
-        seg_new = (a.x(), a.y()), (b.x(), b.y())
-
-        # Skip the last few segments to prevent self-crossing on tight curves
-        # Check segments 0→1, 1→2, …, up to (n-6)→(n-5)
-        check_up_to = n - 5
-
-        for i in range(0, check_up_to):
-            c = self.lasso_points[i]
-            d = self.lasso_points[i + 1]
-            seg_old = (c.x(), c.y()), (d.x(), d.y())
-
-            hit, _ = self._segments_intersect(
-                seg_new[0], seg_new[1], seg_old[0], seg_old[1]
-            )
-            if hit:
-                return i
-
-        return -1
+        xy = np.array([(p.x(), p.y()) for p in self.lasso_points])
+        # Skips the last few segments to prevent self-crossing on tight curves
+        return point_select.first_crossing(xy)
 
     def _auto_close_lasso(self, crossing_segment_idx):
         """
@@ -1819,15 +1687,9 @@ class UMAPGraphWidget(QWidget):
         loop_points = self.lasso_points[crossing_segment_idx:]
 
         if len(loop_points) >= 3:
-            poly = QPolygonF([QPointF(p.x(), p.y()) for p in loop_points])
-            path = QPainterPath()
-            path.addPolygon(poly)
-            path.closeSubpath()
+            polygon = np.array([(p.x(), p.y()) for p in loop_points])
 
-            selected_in_lasso = []
-            for nid, pos in self.node_positions.items():
-                if path.contains(QPointF(float(pos[0]), float(pos[1]))):
-                    selected_in_lasso.append(nid)
+            selected_in_lasso = self._nodes_in_lasso(polygon)
 
             modifiers = QApplication.keyboardModifiers()
             ctrl = modifiers & Qt.KeyboardModifier.ControlModifier
@@ -1842,6 +1704,12 @@ class UMAPGraphWidget(QWidget):
         # Clean up
         self._cleanup_lasso()
 
+    def _nodes_in_lasso(self, polygon):
+        """Node IDs inside the closed lasso *polygon* (Mx2 view coords)."""
+        if self._grid is None:
+            return []
+        return [self.node_ids[i] for i in self._grid.select_polygon(polygon)]
+
     def _cleanup_lasso(self):
         """Remove lasso visuals and reset state."""
         if self.lasso_path_item is not None:
@@ -1871,15 +1739,9 @@ class UMAPGraphWidget(QWidget):
             pixel_dist = math.sqrt(dx * dx + dy * dy)
 
             if pixel_dist < self.lasso_close_threshold:
-                poly = QPolygonF([QPointF(p.x(), p.y()) for p in self.lasso_points])
-                path = QPainterPath()
-                path.addPolygon(poly)
-                path.closeSubpath()
-
-                selected_in_lasso = []
-                for nid, pos in self.node_positions.items():
-                    if path.contains(QPointF(float(pos[0]), float(pos[1]))):
-                        selected_in_lasso.append(nid)
+                polygon = np.array([(p.x(), p.y()) for p in self.lasso_points])
+
+                selected_in_lasso = self._nodes_in_lasso(polygon)
 
                 modifiers = event.modifiers()
                 ctrl = modifiers & Qt.KeyboardModifier.ControlModifier
@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from nettracer3d.endpoint_joiner import EndpointConnector
+
+
+def test_connect_endpoints_keeps_255_skeleton_values():
+    # Two rods with a gap between their tips, in 0/255 as a thresholded image
+    image = np.zeros((1, 11, 40), dtype=np.uint8)
+    image[0, 4:7, 2:16] = 255
+    image[0, 4:7, 22:38] = 255
+    result = EndpointConnector(connection_distance=10).connect_endpoints(image, verbose=False)
+    assert set(np.unique(result)) == {0, 255}
+    assert (result[image == 255] == 255).all()
+    assert (result[0, 5, 16:22] == 255).all()
@@ -0,0 +1,99 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from nettracer3d import hexagons
+from nettracer3d.hexagons import HexTessellation
+
+
+CASES = [
+    # (side_length, dims, xy_scale, z_scale, shape_3d)
+    (4.0, (1, 40, 50), 1.0, 1.0, 'prism'),
+    (3.3, (1, 37, 29), 0.9, 1.0, 'prism'),
+    (4.0, (13, 30, 34), 1.0, 1.15, 'prism'),
+    (5.0, (9, 26, 21), 1.3, 2.0, 'prism'),
+    (3.0, (16, 22, 26), 1.0, 0.8, 'dodecahedron'),
+    (4.2, (11, 19, 23), 1.1, 1.0, 'dodecahedron'),
+]
+
+
+def _seed_table(tess):
+    """Seed voxel (z, y, x) of every cell ID of one hexagon layer or of the dodecahedra, indexed by ID - 1"""
+    depth, height, width = tess.dims
+    if tess.kind == 'dodecahedron':
+        sx, sy, sz, inside = hexagons._fcc_seeds(tess.xy_side, tess.z_side, depth, height, width)
+        seeds = np.column_stack((sz[inside], sy[inside], sx[inside]))
+    else:
+        sx, sy, inside = hexagons._hex_seeds(tess.xy_side, height, width)
+        seeds = np.column_stack((np.zeros(inside.sum(), dtype=np.int64), sy[inside], sx[inside]))
+    return seeds[np.lexsort(seeds.T[::-1])]
+
+
+def _edt_labels(tess):
+    """The EDT tessellations the closed-form cells replace"""
+    depth, height, width = tess.dims
+    if tess.kind == 'dodecahedron':
+        return hexagons._generate_3d_dodecahedrons_edt(tess.xy_side, tess.z_side, depth, height, width)
+    base = hexagons._generate_2d_hexagons_edt(tess.xy_side, height, width)
+    if tess.kind == 'hexagon':
+        return base[np.newaxis]
+    # Prism layers, as _generate_3d_hexagonal_prisms_optimized replicated the 2D pattern
+    labels = np.zeros(tess.dims, dtype=np.int32)
+    for layer in range(int(np.ceil(depth / tess.z_side))):
+        z_start = int(layer * tess.z_side)
+        z_end = min(int((layer + 1) * tess.z_side), depth)
+        labels[z_start:z_end] = base + layer * base.max()
+    return labels
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_cell_ids_match_render(case):
+    side, dims, xy_scale, z_scale, shape_3d = case
+    tess = HexTessellation(side, dims, xy_scale=xy_scale, z_scale=z_scale, shape_3d=shape_3d)
+    labels = tess.render()
+    assert labels.shape == dims
+    assert np.array_equal(np.unique(labels), np.arange(1, tess.n_cells + 1))
+
+    voxels = np.argwhere(np.ones(dims, dtype=bool))
+    np.testing.assert_array_equal(tess.cell_ids(voxels), labels.ravel())
+    # Coordinates are rounded to a voxel and clipped into the volume
+    jitter = np.random.default_rng(0).uniform(-0.45, 0.45, voxels.shape)
+    np.testing.assert_array_equal(tess.cell_ids(voxels + jitter), labels.ravel())
+    outside = np.array([[-5, -3, -8], [dims[0] + 4, dims[1] + 2, dims[2] + 9]], dtype=np.float64)
+    np.testing.assert_array_equal(tess.cell_ids(outside), [labels[0, 0, 0], labels[-1, -1, -1]])
+
+    # Slabs are the same planes as the full render
+    middle = dims[0] // 2
+    np.testing.assert_array_equal(tess.render(middle, dims[0]), labels[middle:])
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_render_matches_edt_up_to_ties(case):
+    side, dims, xy_scale, z_scale, shape_3d = case
+    tess = HexTessellation(side, dims, xy_scale=xy_scale, z_scale=z_scale, shape_3d=shape_3d)
+    labels = tess.render()
+    expected = _edt_labels(tess)
+    # Both number the cells in raster order of their seeds
+    seeds = _seed_table(tess)
+    np.testing.assert_array_equal(labels[tuple(seeds.T)], np.arange(1, len(seeds) + 1))
+    np.testing.assert_array_equal(expected[tuple(seeds.T)], np.arange(1, len(seeds) + 1))
+
+    # A voxel may only differ where it is equally far from both seeds (frequent for the FCC lattice on a voxel grid)
+    differ = np.argwhere(labels != expected)
+    if len(differ) == 0:
+        return
+    per_layer = len(seeds) if tess.kind == 'prism' else None
+    a = labels[tuple(differ.T)] - 1
+    b = expected[tuple(differ.T)] - 1
+    if per_layer:
+        a, b = a % per_layer, b % per_layer
+    points = differ.astype(np.float64)
+    if tess.kind != 'dodecahedron':
+        points[:, 0] = 0
+    dist_a = ((points - seeds[a]) ** 2).sum(axis=1)
+    dist_b = ((points - seeds[b]) ** 2).sum(axis=1)
+    np.testing.assert_array_equal(dist_a, dist_b)
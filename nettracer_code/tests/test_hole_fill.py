@@ -0,0 +1,67 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from scipy import ndimage
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from nettracer3d.hole_fill import fill_holes
+
+
+def _old_fill_holes_3d(array, head_on=False):
+    """Slice-wise binary_fill_holes per axis, as fill_holes_3d did before the hole_fill module"""
+    array = (array != 0).astype(np.uint8)
+    array_xy = np.zeros_like(array)
+    array_xz = np.zeros_like(array)
+    array_yz = np.zeros_like(array)
+    for z in range(array.shape[0]):
+        array_xy[z] = ndimage.binary_fill_holes(array[z])
+    if array.shape[0] > 3 and not head_on:
+        for y in range(array.shape[1]):
+            array_xz[:, y, :] = ndimage.binary_fill_holes(array[:, y, :])
+        for x in range(array.shape[2]):
+            array_yz[:, :, x] = ndimage.binary_fill_holes(array[:, :, x])
+    return (array_xy | array_xz | array_yz) * 255
+
+
+def _shells(seed, shape):
+    """Random hollow boxes (some open on a side, some clipped by the border) over sparse noise"""
+    rng = np.random.default_rng(seed)
+    array = (rng.random(shape) < 0.08).astype(np.uint8)
+    for _ in range(6):
+        size = rng.integers(3, 9, 3)
+        corner = rng.integers(-2, np.array(shape) - 2)
+        lo = np.maximum(corner, 0)
+        hi = np.minimum(corner + size, shape)
+        array[lo[0]:hi[0], lo[1]:hi[1], lo[2]:hi[2]] = 1
+        array[lo[0] + 1:hi[0] - 1, lo[1] + 1:hi[1] - 1, lo[2] + 1:hi[2] - 1] = 0
+        if rng.random() < 0.3:
+            array[lo[0] + 1:hi[0] - 1, lo[1] + 1:hi[1] - 1, lo[2]] = 0
+    return array
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_3d_mode_matches_binary_fill_holes(seed):
+    array = _shells(seed, (14, 20, 18))
+    expected = ndimage.binary_fill_holes(array).astype(np.uint8) * 255
+    np.testing.assert_array_equal(fill_holes(array, mode='3d'), expected)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("head_on", [False, True])
+def test_planes_mode_matches_slice_wise_fill(seed, head_on):
+    array = _shells(seed, (14, 20, 18))
+    axes = (0,) if head_on else (0, 1, 2)
+    np.testing.assert_array_equal(fill_holes(array, axes=axes), _old_fill_holes_3d(array, head_on))
+
+
+@pytest.mark.parametrize("mode", ['planes', '3d'])
+def test_single_plane_is_filled_as_a_plane(mode):
+    plane = _shells(3, (3, 20, 18))[1]
+    expected = ndimage.binary_fill_holes(plane).astype(np.uint8) * 255
+    assert expected.sum() > (plane != 0).sum() * 255
+    np.testing.assert_array_equal(fill_holes(plane, mode=mode), expected)
+    np.testing.assert_array_equal(fill_holes(plane[np.newaxis], mode=mode)[0], expected)
+    np.testing.assert_array_equal(fill_holes(plane[:, np.newaxis], mode=mode)[:, 0], expected)
@@ -0,0 +1,74 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from nettracer3d.point_select import PointGrid, points_in_polygon
+
+
+def _brute_inside(pos, polygon):
+    """Per-point even-odd test, the reference for the grid queries"""
+    inside = np.zeros(len(pos), dtype=bool)
+    n = len(polygon)
+    for i, (x, y) in enumerate(pos):
+        for e in range(n):
+            (xa, ya), (xb, yb) = polygon[e], polygon[e - 1]
+            if min(ya, yb) <= y < max(ya, yb) and x < xa + (xb - xa) * (y - ya) / (yb - ya):
+                inside[i] = not inside[i]
+    return inside
+
+
+def _lasso(rng, center, radius, n=40):
+    angles = np.sort(rng.uniform(0, 2 * np.pi, n))
+    radii = radius * rng.uniform(0.3, 1.0, n)
+    return np.column_stack((center[0] + radii * np.cos(angles), center[1] + radii * np.sin(angles)))
+
+
+def _point_sets():
+    rng = np.random.default_rng(0)
+    spread = rng.normal(size=(3000, 2)) * [5.0, 2.0]
+    return {
+        'spread': spread,
+        'single': np.array([[1.5, -2.0]]),
+        'duplicates': np.tile([[3.0, 4.0]], (500, 1)),
+        'shared_x': np.column_stack((np.full(800, 2.0), rng.uniform(-3, 3, 800))),
+        'shared_y': np.column_stack((rng.uniform(-3, 3, 800), np.full(800, -1.0))),
+        'clustered': np.concatenate((spread[:100] * 1e-6, [[1e3, 1e3]])),
+    }
+
+
+@pytest.mark.parametrize("name", list(_point_sets()))
+def test_select_polygon_matches_brute_force(name):
+    pos = _point_sets()[name]
+    grid = PointGrid(pos)
+    rng = np.random.default_rng(1)
+    center = pos.mean(axis=0)
+    scale = max(np.ptp(pos, axis=0).max(), 1.0)
+    polygons = [_lasso(rng, center, r * scale) for r in (0.05, 0.3, 1.0)]
+    # An outline reaching far past the points, and one around nothing
+    polygons.append(_lasso(rng, center, 1e9))
+    polygons.append(_lasso(rng, center + 50 * scale, scale))
+    for polygon in polygons:
+        expected = np.flatnonzero(_brute_inside(pos, polygon))
+        np.testing.assert_array_equal(np.sort(grid.select_polygon(polygon)), expected)
+        np.testing.assert_array_equal(np.flatnonzero(points_in_polygon(pos[:, 0], pos[:, 1], polygon)), expected)
+
+
+@pytest.mark.parametrize("name", list(_point_sets()))
+def test_select_rect_matches_brute_force(name):
+    pos = _point_sets()[name]
+    grid = PointGrid(pos)
+    center = pos.mean(axis=0)
+    for half in (0.0, 0.5, 2.0, 1e9):
+        x0, x1, y0, y1 = center[0] - half, center[0] + half, center[1] - half, center[1] + half
+        expected = np.flatnonzero((pos[:, 0] >= x0) & (pos[:, 0] <= x1) & (pos[:, 1] >= y0) & (pos[:, 1] <= y1))
+        np.testing.assert_array_equal(np.sort(grid.select_rect(x0, x1, y0, y1)), expected)
+
+
+def test_empty_grid():
+    grid = PointGrid(np.zeros((0, 2)))
+    assert len(grid.select_polygon([[0, 0], [1, 0], [0, 1]])) == 0
+    assert len(grid.select_rect(0, 1, 0, 1)) == 0
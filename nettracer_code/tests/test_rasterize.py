@@ -0,0 +1,128 @@
+import sys
+from pathlib import Path
+
+import networkx as nx
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from nettracer3d import rasterize
+from nettracer3d.filaments import VesselDenoiser
+
+
+# Per-segment drawing as VesselDenoiser did it before the batched rasterizer, kept here as the reference.
+
+def _old_draw_line_3d(array, pos1, pos2):
+    num_points = int(np.linalg.norm(pos2 - pos1) * 2) + 1
+    t = np.linspace(0, 1, num_points)
+    line_points = pos1[:, None] * (1 - t) + pos2[:, None] * t
+    for i in range(num_points):
+        coords = np.round(line_points[:, i]).astype(int)
+        if (0 <= coords[0] < array.shape[0] and
+            0 <= coords[1] < array.shape[1] and
+            0 <= coords[2] < array.shape[2]):
+            array[tuple(coords)] = 1
+
+
+def _old_draw_sphere(array, center, radius):
+    cache_key = round(radius * 2) / 2
+    r = max(1, int(np.ceil(cache_key)))
+    zz, yy, xx = np.ogrid[-r:r+1, -r:r+1, -r:r+1]
+    mask = zz**2 + yy**2 + xx**2 <= cache_key**2
+
+    z, y, x = center
+    z_min = max(0, int(z - r))
+    z_max = min(array.shape[0], int(z + r + 1))
+    y_min = max(0, int(y - r))
+    y_max = min(array.shape[1], int(y + r + 1))
+    x_min = max(0, int(x - r))
+    x_max = min(array.shape[2], int(x + r + 1))
+    if z_max - z_min <= 0 or y_max - y_min <= 0 or x_max - x_min <= 0:
+        return
+
+    mask_z_start = max(0, r - int(z) + z_min)
+    mask_y_start = max(0, r - int(y) + y_min)
+    mask_x_start = max(0, r - int(x) + x_min)
+    mask_z_end = min(mask_z_start + z_max - z_min, mask.shape[0])
+    mask_y_end = min(mask_y_start + y_max - y_min, mask.shape[1])
+    mask_x_end = min(mask_x_start + x_max - x_min, mask.shape[2])
+    z_max = z_min + mask_z_end - mask_z_start
+    y_max = y_min + mask_y_end - mask_y_start
+    x_max = x_min + mask_x_end - mask_x_start
+    array[z_min:z_max, y_min:y_max, x_min:x_max] |= \
+        mask[mask_z_start:mask_z_end, mask_y_start:mask_y_end, mask_x_start:mask_x_end]
+
+
+def _old_draw_cylinder(array, pos1, pos2, radius1, radius2):
+    distance = np.linalg.norm(pos2 - pos1)
+    if distance < 0.5:
+        _old_draw_sphere(array, pos1, max(radius1, radius2))
+        return
+    samples_per_unit = 3.0 if abs(radius2 - radius1) > 2 else 2.0
+    num_samples = max(3, int(distance * samples_per_unit))
+    for t in np.linspace(0, 1, num_samples):
+        _old_draw_sphere(array, pos1 * (1 - t) + pos2 * t, radius1 * (1 - t) + radius2 * t)
+
+
+def _old_draw_vessel_lines(G, shape):
+    result = np.zeros(shape, dtype=np.uint8)
+    for i, j in G.edges():
+        _old_draw_line_3d(result, G.nodes[i]['pos'], G.nodes[j]['pos'])
+    for node in G.nodes():
+        z, y, x = np.round(G.nodes[node]['pos']).astype(int)
+        if 0 <= z < shape[0] and 0 <= y < shape[1] and 0 <= x < shape[2]:
+            result[z, y, x] = 1
+    return result
+
+
+def _old_draw_vessel_lines_optimized(G, shape):
+    result = np.zeros(shape, dtype=np.uint8)
+    for i, j in G.edges():
+        _old_draw_cylinder(result, G.nodes[i]['pos'], G.nodes[j]['pos'], G.nodes[i]['radius'], G.nodes[j]['radius'])
+    for node in G.nodes():
+        _old_draw_sphere(result, G.nodes[node]['pos'], G.nodes[node]['radius'])
+    return result
+
+
+def _kernel_graph(seed, shape):
+    """Random kernel graph with fractional positions, some of them outside the volume (negative included)"""
+    rng = np.random.default_rng(seed)
+    G = nx.Graph()
+    n = 60
+    for node in range(n):
+        G.add_node(node, pos=rng.uniform(-4, np.array(shape) + 4), radius=float(rng.uniform(0.3, 4.5)))
+    for node in range(n):
+        for other in rng.choice(n, 3, replace=False):
+            if other != node:
+                G.add_edge(node, int(other))
+    return G
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_draw_vessel_lines_matches_per_segment_drawing(seed):
+    shape = (24, 40, 36)
+    G = _kernel_graph(seed, shape)
+    result = VesselDenoiser().draw_vessel_lines(G, shape)
+    np.testing.assert_array_equal(result, _old_draw_vessel_lines(G, shape))
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_draw_vessel_lines_optimized_matches_cached_spheres(seed):
+    shape = (24, 40, 36)
+    G = _kernel_graph(seed, shape)
+    result = VesselDenoiser().draw_vessel_lines_optimized(G, shape)
+    np.testing.assert_array_equal(result, _old_draw_vessel_lines_optimized(G, shape))
+
+
+@pytest.mark.parametrize("draw", ["spheres", "cylinders"])
+def test_drawing_never_lowers_voxels(draw):
+    array = np.zeros((12, 12, 12), dtype=np.uint8)
+    array[4:8, 4:8, 4:8] = 255
+    before = array.copy()
+    if draw == "spheres":
+        rasterize.draw_spheres(array, [[6, 6, 6]], 4, value=1)
+    else:
+        rasterize.draw_cylinders(array, [[6, 6, 2]], [[6, 6, 10]], 3, 3, value=1)
+    assert (array[before == 255] == 255).all()
+    assert set(np.unique(array).tolist()) == {0, 1, 255}
@@ -0,0 +1,120 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from scipy import ndimage
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from nettracer3d import resample
+
+
+def _assert_matches_scipy(result, expected):
+    """Equal, except where scipy's rounding reads past the last input sample and returns background in a last plane"""
+    assert result.shape == expected.shape
+    differ = np.argwhere(result != expected)
+    assert (expected[tuple(differ.T)] == 0).all()
+    last = np.array(expected.shape) - 1
+    assert (differ == last).any(axis=1).all()
+
+
+def _old_upsample(data, factor, original_shape):
+    """Zoom then centered pad/trim, as nettracer._upsample_3d_array did before the resample module"""
+    original_shape = np.array(original_shape)
+    if factor is None:
+        factors = [o / c for o, c in zip(original_shape, data.shape)]
+        factor = factors[0] if len(set(factors)) == 1 else tuple(factors)
+    zoomed = ndimage.zoom(data, factor, order=0)
+    difference = original_shape - np.array(zoomed.shape)
+    padding = np.maximum(difference, 0)
+    zoomed = np.pad(zoomed, [(p // 2, p - p // 2) for p in padding], mode='constant', constant_values=0)
+    trim = np.maximum(-difference, 0)
+    return zoomed[tuple(slice(t // 2, zoomed.shape[i] - (t - t // 2)) for i, t in enumerate(trim))]
+
+
+def _labels(seed, shape):
+    # No zeros, so scipy's background slips are the only zeros in its output
+    return np.random.default_rng(seed).integers(1, 50, shape).astype(np.uint16)
+
+
+@pytest.mark.parametrize("shape, factor", [
+    ((9, 17, 23), 0.5),
+    ((9, 17, 23), 2),
+    ((9, 17, 23), (1, 1 / 3, 0.4)),
+    ((12, 10, 14), (2.5, 1.7, 0.3)),
+    ((31, 29), 1 / 3),
+    ((31, 29), (2, 0.75)),
+])
+def test_zoom_matches_scipy(shape, factor):
+    data = _labels(0, shape)
+    _assert_matches_scipy(resample.zoom(data, factor), ndimage.zoom(data, factor, order=0))
+    mask = data > 25
+    _assert_matches_scipy(resample.zoom(mask, factor), ndimage.zoom(mask, factor, order=0))
+
+
+@pytest.mark.parametrize("shape, factor", [((40, 32, 28), 2), ((6, 32, 28), 2), ((33, 31), 3)])
+def test_downsample_matches_scipy(shape, factor):
+    data = _labels(1, shape)
+    if len(shape) == 3 and shape[0] < factor * 4:
+        zoom_factors = (1, 1 / factor, 1 / factor)
+    else:
+        zoom_factors = 1 / factor
+    expected = ndimage.zoom(data, zoom_factors, order=0)
+    _assert_matches_scipy(resample.downsample(data, factor), expected)
+    assert resample.downsample_shape(shape, factor) == expected.shape
+
+
+@pytest.mark.parametrize("shape, factor, original_shape", [
+    ((5, 8, 7), 2, (10, 16, 14)),
+    ((5, 8, 7), 2, (11, 17, 15)),
+    ((5, 8, 7), 2, (9, 15, 13)),
+    ((5, 8, 7), 3, (14, 26, 20)),
+    ((5, 8, 7), None, (10, 17, 13)),
+    ((4, 9, 6), (1, 2.5, 3), (4, 22, 19)),
+])
+def test_upsample_to_matches_pad_and_trim(shape, factor, original_shape):
+    data = _labels(2, shape)
+    _assert_matches_scipy(resample.upsample_to(data, factor, original_shape), _old_upsample(data, factor, original_shape))
+
+
+def _block_reference(data, factors, reduce):
+    shape = tuple(s // f for s, f in zip(data.shape, factors))
+    out = np.empty(shape, dtype=np.float64)
+    for index in np.ndindex(shape):
+        block = data[tuple(slice(i * f, (i + 1) * f) for i, f in zip(index, factors))]
+        out[index] = reduce(block.ravel())
+    return out
+
+
+def _majority(values):
+    uniques, counts = np.unique(values, return_counts=True)
+    return uniques[np.argmax(counts)]
+
+
+@pytest.mark.parametrize("shape, factor", [((9, 14, 11), 2), ((9, 14, 11), (1, 3, 2)), ((17, 13), 3)])
+def test_block_reduce_matches_reference(shape, factor):
+    rng = np.random.default_rng(3)
+    factors = (factor,) * len(shape) if np.isscalar(factor) else factor
+    intensities = rng.random(shape).astype(np.float32) * 100
+    np.testing.assert_allclose(resample.block_reduce(intensities, factor, mode='mean'),
+                               _block_reference(intensities, factors, np.mean), rtol=1e-5)
+    labels = rng.integers(0, 4, shape).astype(np.uint8)
+    np.testing.assert_array_equal(resample.block_reduce(labels, factor, mode='majority'),
+                                  _block_reference(labels, factors, _majority))
+    mask = labels > 1
+    np.testing.assert_array_equal(resample.block_reduce(mask, factor, mode='majority'),
+                                  _block_reference(mask, factors, _majority).astype(bool))
+
+
+@pytest.mark.parametrize("mode", ['mean', 'majority'])
+def test_pyramid_reduces_each_level_from_the_previous(mode):
+    data = np.random.default_rng(4).integers(0, 5, (20, 36, 40)).astype(np.uint8)
+    levels = resample.pyramid(data, 4, factor=2, mode=mode)
+    # 20 -> 10 -> 5 -> 2 -> 1: all four levels fit
+    assert [level.shape for level in levels] == [(20, 36, 40), (10, 18, 20), (5, 9, 10), (2, 4, 5), (1, 2, 2)]
+    reduce = np.mean if mode == 'mean' else _majority
+    for previous, level in zip(levels, levels[1:]):
+        np.testing.assert_allclose(level, _block_reference(previous, (2, 2, 2), reduce), rtol=1e-5)
+    # A level that would be empty along an axis (Z after 1) ends the pyramid
+    assert len(resample.pyramid(data, 8, factor=2, mode=mode)) == len(levels)
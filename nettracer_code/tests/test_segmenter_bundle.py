@@ -0,0 +1,94 @@
+import json
+import pickle
+import sys
+import zlib
+from pathlib import Path
+
+import lightgbm as lgb
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from nettracer3d import segmenter_bundle
+
+
+def _training_rows(n_features, seed=0):
+    rng = np.random.default_rng(seed)
+    fg = rng.normal(1.0, 1.0, (300, n_features)).astype(np.float32)
+    bg = rng.normal(-1.0, 1.0, (400, n_features)).astype(np.float32)
+    zf = rng.integers(0, 50, (len(fg), 3))
+    zb = rng.integers(0, 50, (len(bg), 3))
+    return fg, bg, zf, zb
+
+
+def _schema():
+    return segmenter_bundle.make_schema([1, 2, 4], [1], False, True, 1)
+
+
+def test_bundle_round_trips_the_lightgbm_model(tmp_path):
+    schema = _schema()
+    fg, bg, zf, zb = _training_rows(schema['n_features'])
+    X = np.vstack([fg, bg])
+    y = np.hstack([np.ones(len(fg)), np.zeros(len(bg))])
+    model = lgb.LGBMClassifier(n_estimators=20, num_leaves=7, verbose=-1, random_state=0).fit(X, y)
+
+    path = tmp_path / "model.n3dseg"
+    segmenter_bundle.save_bundle(str(path), model, schema, {'use_gpu': False}, fg, bg, zf, zb)
+    b = segmenter_bundle.load_bundle(str(path))
+    assert isinstance(b['model'], str)
+    np.testing.assert_array_equal(b['foreground_features'], fg.astype(np.float16))
+    np.testing.assert_array_equal(b['z_back'], zb)
+
+    restored = segmenter_bundle.restore_model(b['model'], schema['n_features'])
+    np.testing.assert_array_equal(restored.predict(X), model.predict(X))
+    np.testing.assert_array_equal(restored.predict(X, num_threads=1), model.predict(X))
+    # Boosting continues from the restored trees
+    warm = lgb.LGBMClassifier(n_estimators=5, num_leaves=7, verbose=-1).fit(X, y, init_model=restored.booster_)
+    assert warm.booster_.num_trees() == 25
+
+    # Saving the restored classifier again writes the same model
+    segmenter_bundle.save_bundle(str(path), restored, schema, {}, fg, bg, zf, zb)
+    assert segmenter_bundle.load_bundle(str(path), mmap=False)['model'] == b['model']
+
+
+def test_restore_model_rejects_other_feature_counts():
+    schema = _schema()
+    fg, bg, _, _ = _training_rows(schema['n_features'] + 1)
+    model = lgb.LGBMClassifier(n_estimators=3, verbose=-1).fit(np.vstack([fg, bg]), np.r_[np.ones(len(fg)), np.zeros(len(bg))])
+    assert segmenter_bundle.restore_model(model.booster_.model_to_string(), schema['n_features']) is None
+    assert segmenter_bundle.restore_model(None, schema['n_features']) is None
+
+
+class _Payload:
+    """Pickled object whose unpickling creates a file"""
+
+    def __init__(self, marker):
+        self.marker = marker
+
+    def __reduce__(self):
+        return (Path.touch, (Path(self.marker),))
+
+
+def test_version_1_pickled_model_is_never_unpickled(tmp_path):
+    marker = tmp_path / "unpickled"
+    model_bytes = zlib.compress(pickle.dumps(_Payload(str(marker))))
+    schema = _schema()
+    empty = {'nbytes': 0, 'offset': 0, 'dtype': '<f2', 'shape': [0, schema['n_features']]}
+    coords = {'nbytes': 0, 'offset': 0, 'dtype': '<i4', 'shape': [0, 3]}
+    header = json.dumps({'version': 1, 'schema': schema, 'settings': {}, 'sections': {
+        'model': {'offset': 0, 'nbytes': len(model_bytes)},
+        'foreground_features': empty, 'background_features': empty, 'z_fore': coords, 'z_back': coords}})
+    start = len(segmenter_bundle.MAGIC) + segmenter_bundle._PREFIX.size + len(header) + 8
+    header = header.replace('"offset": 0, "nbytes": %d' % len(model_bytes), '"offset": %d, "nbytes": %d' % (start, len(model_bytes)), 1)
+    path = tmp_path / "old.n3dseg"
+    with open(path, 'wb') as f:
+        f.write(segmenter_bundle.MAGIC)
+        f.write(segmenter_bundle._PREFIX.pack(1, len(header)))
+        f.write(header.encode('utf-8'))
+        f.seek(start)
+        f.write(model_bytes)
+
+    b = segmenter_bundle.load_bundle(str(path))
+    assert b['model'] is None
+    assert not marker.exists()
+    assert b['foreground_features'].shape == (0, schema['n_features'])